@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""Advisor quality benchmark: do suggested indexes actually make queries faster?
+
+For each query in a corpus, in a scratch copy of the database:
+
+1. run the optimize pipeline (``run_optimize``: advisor + HypoPG what-if when
+   available) and keep its index suggestions with their predicted cost delta;
+2. measure the query's baseline runtime: one cold run, then ``--repeat`` warm
+   runs (median);
+3. for each suggestion, build the index for real, ANALYZE, re-measure cold and
+   warm, then drop it again;
+4. report actual speedup against the predicted delta per suggestion, plus how
+   often the advisor was right and the rank correlation between predicted and
+   actual improvement.
+
+Runtimes come from ``EXPLAIN (ANALYZE, TIMING OFF, FORMAT JSON)``: the query
+runs in full on the server but no rows are shipped to the client. "Cold" is the
+first run after the index is built (and after ``--cold-cmd``, e.g. a script
+that restarts Postgres and drops the OS page cache; without it the table's
+pages are usually still cached, so cold mostly shows the new index's cost).
+
+The scratch database is ``CREATE DATABASE <scratch> TEMPLATE <source>`` (the
+source must have no other sessions) and is dropped afterwards unless
+``--keep``. ``--in-place`` skips the copy and builds/drops indexes in the
+configured database itself; only use it on a disposable database.
+
+Usage:
+    RUN_DB_TESTS=1 PYTHONPATH=src python scripts/bench/advisor_quality.py --file bench/corpus.sql
+        [--repeat 5] [--scratch-db qeo_advq] [--cold-cmd ./restart_pg.sh] [--out bench/report/advisor_quality.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from app.core.config import settings
+
+DEFAULT_CORPUS = [
+    "SELECT * FROM orders WHERE user_id = 42 ORDER BY created_at DESC LIMIT 50",
+    "SELECT * FROM orders WHERE status = 'paid' AND created_at > now() - interval '7 days'",
+    "SELECT o.id, u.email FROM orders o JOIN users u ON u.id = o.user_id WHERE o.status = 'paid' LIMIT 100",
+    "SELECT user_id, count(*) FROM orders GROUP BY user_id ORDER BY count(*) DESC LIMIT 10",
+]
+
+# An index "helped" when the warm median improved by at least this much
+HELPED_PCT = 10.0
+
+_INDEX_NAME = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?([A-Za-z0-9_\.\"]+)\s+ON\b", re.IGNORECASE)
+
+
+def index_name(stmt: str) -> Optional[str]:
+    m = _INDEX_NAME.search(stmt or "")
+    return m.group(1) if m else None
+
+
+def with_database(url: str, dbname: str) -> str:
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, "/" + dbname, parts.query, parts.fragment))
+
+
+def database_name(url: str) -> str:
+    return urlsplit(url).path.lstrip("/") or "postgres"
+
+
+def _pct(before: float, after: float) -> Optional[float]:
+    return round((before - after) / before * 100.0, 2) if before > 0 else None
+
+
+def spearman(xs: List[float], ys: List[float]) -> Optional[float]:
+    """Rank correlation (average ranks for ties); None below 3 points or with a constant series."""
+    if len(xs) != len(ys) or len(xs) < 3:
+        return None
+
+    def ranks(vals: List[float]) -> List[float]:
+        order = sorted(range(len(vals)), key=lambda i: vals[i])
+        out = [0.0] * len(vals)
+        i = 0
+        while i < len(order):
+            j = i
+            while j + 1 < len(order) and vals[order[j + 1]] == vals[order[i]]:
+                j += 1
+            for k in range(i, j + 1):
+                out[order[k]] = (i + j) / 2.0 + 1.0
+            i = j + 1
+        return out
+
+    rx, ry = ranks(xs), ranks(ys)
+    mx, my = statistics.fmean(rx), statistics.fmean(ry)
+    sx = sum((a - mx) ** 2 for a in rx) ** 0.5
+    sy = sum((b - my) ** 2 for b in ry) ** 0.5
+    if sx == 0 or sy == 0:
+        return None
+    return round(sum((a - mx) * (b - my) for a, b in zip(rx, ry)) / (sx * sy), 3)
+
+
+def summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregate per-suggestion rows (see ``Runner.run_query``)."""
+    measured = [r for r in rows if r.get("actual")]
+    predicted = [r for r in measured if r["predicted"].get("costDeltaPct") is not None]
+    helped = [r for r in measured if (r["actual"].get("warmPct") or 0.0) >= HELPED_PCT]
+    speedups = [r["actual"]["speedup"] for r in measured if r["actual"].get("speedup")]
+    return {
+        "suggestions": len(rows),
+        "measured": len(measured),
+        "helped": len(helped),
+        "helpedRate": round(len(helped) / len(measured), 3) if measured else None,
+        "medianSpeedup": round(statistics.median(speedups), 3) if speedups else None,
+        "predictedVsActualSpearman": spearman(
+            [r["predicted"]["costDeltaPct"] for r in predicted], [r["actual"]["warmPct"] or 0.0 for r in predicted]
+        ),
+        "helpedThresholdPct": HELPED_PCT,
+    }
+
+
+class Runner:
+    """Timing and index DDL on a dedicated autocommit connection to the scratch database."""
+
+    def __init__(self, dsn: str, repeat: int = 5, timeout_ms: int = 60000, cold_cmd: Optional[str] = None):
+        import psycopg2
+
+        self.conn = psycopg2.connect(dsn)
+        self.conn.autocommit = True
+        self.repeat = max(1, repeat)
+        self.timeout_ms = timeout_ms
+        self.cold_cmd = cold_cmd
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _reconnect_after_cold(self) -> None:
+        if not self.cold_cmd:
+            return
+        import psycopg2
+
+        dsn = self.conn.dsn
+        self.conn.close()
+        subprocess.run(self.cold_cmd, shell=True, check=True)
+        # The cold command may restart the server: wait until it accepts connections again
+        for _ in range(60):
+            try:
+                self.conn = psycopg2.connect(dsn)
+                self.conn.autocommit = True
+                return
+            except psycopg2.OperationalError:
+                time.sleep(1.0)
+        raise RuntimeError("database did not come back after --cold-cmd")
+
+    def _exec_ms(self, sql: str) -> float:
+        with self.conn.cursor() as cur:
+            cur.execute(f"SET statement_timeout = {int(self.timeout_ms)}")
+            cur.execute("EXPLAIN (ANALYZE, TIMING OFF, FORMAT JSON) " + sql)
+            plan = cur.fetchone()[0]
+        root = plan[0] if isinstance(plan, list) else plan
+        return float(root.get("Execution Time") or 0.0)
+
+    def measure(self, sql: str) -> Dict[str, Any]:
+        self._reconnect_after_cold()
+        cold = self._exec_ms(sql)
+        warm = [self._exec_ms(sql) for _ in range(self.repeat)]
+        return {"coldMs": round(cold, 3), "warmMs": round(statistics.median(warm), 3), "warmRunsMs": [round(w, 3) for w in warm]}
+
+    def build(self, stmt: str) -> Tuple[str, float, int]:
+        name = index_name(stmt)
+        if not name:
+            raise ValueError(f"cannot parse index name from {stmt!r}")
+        table = re.search(r"\bON\s+([A-Za-z0-9_\.]+)", stmt, re.IGNORECASE).group(1)
+        t0 = time.perf_counter()
+        with self.conn.cursor() as cur:
+            cur.execute("SET statement_timeout = 0")
+            cur.execute(stmt)
+            build_ms = (time.perf_counter() - t0) * 1000.0
+            cur.execute(f"ANALYZE {table}")
+            cur.execute("SELECT pg_relation_size(%s::regclass)", (name,))
+            size = int(cur.fetchone()[0])
+        return name, build_ms, size
+
+    def drop(self, name: str) -> None:
+        with self.conn.cursor() as cur:
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+
+    def run_query(self, sql: str, suggestions: List[Dict[str, Any]], ranking: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        baseline = self.measure(sql)
+        rows: List[Dict[str, Any]] = []
+        for rank, s in enumerate(suggestions, start=1):
+            before, after = s.get("estCostBefore"), s.get("estCostAfter")
+            row: Dict[str, Any] = {
+                "sql": sql,
+                "rank": rank,
+                "title": s.get("title"),
+                "statement": (s.get("statements") or [""])[0],
+                "predicted": {
+                    "ranking": ranking,
+                    "costBefore": before,
+                    "costAfter": after,
+                    "costDeltaPct": _pct(before, after) if before is not None and after is not None else None,
+                    "estReductionPct": s.get("estReductionPct"),
+                    "impact": s.get("impact"),
+                },
+            }
+            name = None
+            try:
+                name, build_ms, size = self.build(row["statement"])
+                with_index = self.measure(sql)
+                row["actual"] = {
+                    "buildMs": round(build_ms, 1),
+                    "indexBytes": size,
+                    "coldMs": with_index["coldMs"],
+                    "warmMs": with_index["warmMs"],
+                    "coldPct": _pct(baseline["coldMs"], with_index["coldMs"]),
+                    "warmPct": _pct(baseline["warmMs"], with_index["warmMs"]),
+                    "speedup": round(baseline["warmMs"] / with_index["warmMs"], 3) if with_index["warmMs"] > 0 else None,
+                }
+            except Exception as e:
+                row["error"] = f"{type(e).__name__}: {e}"
+            finally:
+                if name:
+                    self.drop(name)
+            rows.append(row)
+        return baseline, rows
+
+
+def create_scratch(source_url: str, scratch: str) -> str:
+    import psycopg2
+
+    source = database_name(source_url)
+    admin = psycopg2.connect(with_database(source_url, "postgres"))
+    admin.autocommit = True
+    try:
+        with admin.cursor() as cur:
+            cur.execute(f'DROP DATABASE IF EXISTS "{scratch}"')
+            cur.execute(f'CREATE DATABASE "{scratch}" TEMPLATE "{source}"')
+    finally:
+        admin.close()
+    return with_database(source_url, scratch)
+
+
+def drop_scratch(source_url: str, scratch: str) -> None:
+    import psycopg2
+
+    admin = psycopg2.connect(with_database(source_url, "postgres"))
+    admin.autocommit = True
+    try:
+        with admin.cursor() as cur:
+            cur.execute(f'DROP DATABASE IF EXISTS "{scratch}" WITH (FORCE)')
+    finally:
+        admin.close()
+
+
+def index_suggestions(sql: str, top_k: int, timeout_ms: int) -> Tuple[List[Dict[str, Any]], str]:
+    from app.routers.optimize import OptimizeRequest, run_optimize
+
+    res = run_optimize(OptimizeRequest(sql=sql, advisors=["index"], top_k=top_k, timeout_ms=timeout_ms))
+    return [s for s in res.suggestions if s.get("kind") == "index" and s.get("statements")], res.ranking
+
+
+def _fmt(v: Any) -> str:
+    return "-" if v is None else f"{v:.1f}"
+
+
+def _print(report: Dict[str, Any]) -> None:
+    print(f"{'query':<48} {'suggestion':<40} {'pred%':>7} {'warm%':>7} {'cold%':>7} {'speedup':>8}")
+    for q in report["queries"]:
+        label = q["sql"][:47]
+        if not q["suggestions"]:
+            print(f"{label:<48} {'(no index suggestions)':<40}")
+        for r in q["suggestions"]:
+            a = r.get("actual") or {}
+            pred = r["predicted"].get("costDeltaPct")
+            print(f"{label:<48} {(r.get('title') or '')[:39]:<40} {_fmt(pred):>7} {_fmt(a.get('warmPct')):>7} "
+                  f"{_fmt(a.get('coldPct')):>7} {_fmt(a.get('speedup')):>8}{'  ' + r['error'] if r.get('error') else ''}")
+    s = report["summary"]
+    print(f"measured {s['measured']}/{s['suggestions']} suggestions; helped (>= {HELPED_PCT:g}% warm): {s['helped']}; "
+          f"median speedup {s['medianSpeedup']}; predicted-vs-actual spearman {s['predictedVsActualSpearman']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--file", help="Query corpus, one statement per line (default: a few queries over users/orders)")
+    ap.add_argument("--repeat", type=int, default=5, help="Warm runs per measurement (median)")
+    ap.add_argument("--top-k", type=int, default=3, help="Index suggestions to build per query")
+    ap.add_argument("--timeout-ms", type=int, default=60000, help="Statement timeout per measured run")
+    ap.add_argument("--cold-cmd", help="Shell command run before each cold measurement (e.g. restart Postgres)")
+    ap.add_argument("--scratch-db", default="qeo_advq_scratch", help="Name of the scratch copy")
+    ap.add_argument("--keep", action="store_true", help="Keep the scratch database afterwards")
+    ap.add_argument("--in-place", action="store_true", help="Use the configured database directly (no copy)")
+    ap.add_argument("--no-whatif", action="store_true", help="Do not force WHATIF_ENABLED (predictions stay heuristic)")
+    ap.add_argument("--out", default="bench/report/advisor_quality.json")
+    args = ap.parse_args([] if argv is None else argv)
+
+    if os.getenv("RUN_DB_TESTS") != "1":
+        print("advisor-quality: RUN_DB_TESTS=1 required")
+        return 2
+    if args.file:
+        corpus = [ln.strip().rstrip(";") for ln in Path(args.file).read_text(encoding="utf-8").splitlines()]
+        corpus = [q for q in corpus if q and not q.startswith("--")]
+    else:
+        corpus = list(DEFAULT_CORPUS)
+
+    if not args.no_whatif:
+        # Predicted cost deltas come from the HypoPG trials
+        settings.WHATIF_ENABLED = True
+    source_url = settings.db_url_psycopg
+    dsn = source_url if args.in_place else create_scratch(source_url, args.scratch_db)
+    if not args.in_place:
+        # Point the optimize pipeline (app.core.db) at the scratch copy too
+        settings.DB_URL = dsn
+    runner = Runner(dsn, repeat=args.repeat, timeout_ms=args.timeout_ms, cold_cmd=args.cold_cmd)
+    queries: List[Dict[str, Any]] = []
+    all_rows: List[Dict[str, Any]] = []
+    try:
+        for sql in corpus:
+            entry: Dict[str, Any] = {"sql": sql, "suggestions": []}
+            try:
+                suggestions, ranking = index_suggestions(sql, args.top_k, args.timeout_ms)
+                entry["baseline"], entry["suggestions"] = runner.run_query(sql, suggestions[: args.top_k], ranking)
+                all_rows.extend(entry["suggestions"])
+            except Exception as e:
+                entry["error"] = f"{type(e).__name__}: {e}"
+            queries.append(entry)
+    finally:
+        runner.close()
+        if not args.in_place:
+            from app.core import db
+
+            # Release the pipeline's connections before dropping the database
+            for conn in [db._global_conn, *db._POOL]:
+                if conn is not None and not conn.closed:
+                    conn.close()
+            db._POOL.clear()
+            settings.DB_URL = source_url
+            if not args.keep:
+                drop_scratch(source_url, args.scratch_db)
+
+    report = {
+        "meta": {
+            "database": database_name(dsn),
+            "inPlace": args.in_place,
+            "repeat": args.repeat,
+            "topK": args.top_k,
+            "coldCmd": args.cold_cmd,
+            "startedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "queries": queries,
+        "summary": summarize(all_rows),
+    }
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    _print(report)
+    print(f"advisor-quality: report written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""JSON serialization micro-benchmark for plan-heavy responses (no database).
+
+Compares the default FastAPI path (Pydantic response validation + stdlib json)
+with the fast path (model passed through + orjson when installed) for encoding
+ExplainResponse, and stdlib json.loads vs serialization.loads for decoding the
+EXPLAIN text psycopg2 returns.
+
+Usage:
+    PYTHONPATH=src python scripts/bench/bench_json.py [--nodes 100,1000,10000] [--plan recorded.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic_plans import make_plan  # noqa: E402
+
+from app.core import plan_heuristics, serialization  # noqa: E402
+from app.routers.explain import ExplainResponse  # noqa: E402
+
+
+def _time(fn: Callable[[], Any], min_time_s: float = 0.3) -> float:
+    """Return mean seconds per call, looping for at least ``min_time_s``."""
+    fn()
+    n = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        n += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time_s:
+            return elapsed / n
+
+
+def _bench_plan(name: str, plan: Dict[str, Any]) -> Dict[str, Any]:
+    warnings, metrics = plan_heuristics.analyze(plan)
+    text = json.dumps([plan])
+
+    def slow_encode() -> bytes:
+        model = ExplainResponse(plan=plan, warnings=warnings, metrics=metrics)
+        return json.dumps(model.model_dump(mode="json"), separators=(",", ":")).encode("utf-8")
+
+    def fast_encode() -> bytes:
+        model = ExplainResponse.model_construct(plan=plan, warnings=warnings, metrics=metrics)
+        return serialization.FastJSONResponse(content=dict(model)).body
+
+    assert json.loads(slow_encode()) == json.loads(fast_encode())
+    row = {
+        "case": name,
+        "bytes": len(text),
+        "encode_stdlib_ms": _time(slow_encode) * 1000.0,
+        "encode_fast_ms": _time(fast_encode) * 1000.0,
+        "decode_stdlib_ms": _time(lambda: json.loads(text)) * 1000.0,
+        "decode_fast_ms": _time(lambda: serialization.loads(text)) * 1000.0,
+    }
+    row["encode_speedup"] = row["encode_stdlib_ms"] / max(row["encode_fast_ms"], 1e-9)
+    row["decode_speedup"] = row["decode_stdlib_ms"] / max(row["decode_fast_ms"], 1e-9)
+    return row
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--nodes", default="100,1000,10000", help="Comma-separated synthetic plan sizes")
+    ap.add_argument("--plan", action="append", default=[], help="Recorded EXPLAIN JSON file (repeatable)")
+    ap.add_argument("--out", help="Write results as JSON to this path")
+    args = ap.parse_args(argv)
+
+    cases: List[tuple[str, Dict[str, Any]]] = []
+    for n in [int(x) for x in args.nodes.split(",") if x.strip()]:
+        cases.append((f"synthetic_{n}", make_plan(n)))
+    for p in args.plan:
+        data = json.loads(Path(p).read_text(encoding="utf-8"))
+        if isinstance(data, list) and data:
+            data = data[0]
+        cases.append((Path(p).name, data if "Plan" in data else {"Plan": data}))
+
+    rows = [_bench_plan(name, plan) for name, plan in cases]
+    print(f"orjson: {'yes' if serialization._orjson is not None else 'no (stdlib fallback)'}")
+    print(f"{'case':<20} {'bytes':>10} {'enc std':>9} {'enc fast':>9} {'x':>6} {'dec std':>9} {'dec fast':>9} {'x':>6}")
+    for r in rows:
+        print(
+            f"{r['case']:<20} {r['bytes']:>10} {r['encode_stdlib_ms']:>9.3f} {r['encode_fast_ms']:>9.3f} "
+            f"{r['encode_speedup']:>6.1f} {r['decode_stdlib_ms']:>9.3f} {r['decode_fast_ms']:>9.3f} {r['decode_speedup']:>6.1f}"
+        )
+    if args.out:
+        Path(args.out).write_text(json.dumps({"cases": rows}, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Access-log overhead micro-benchmark (no database).
+
+Measures the per-request cost seen by the caller for three ways of emitting
+the access record:
+
+- print(dict): the old middleware behaviour (repr + synchronous write)
+- sync: a plain StreamHandler with the JSON formatter on the calling thread
+- queued: app.core.logs (JSON formatting and I/O on the listener thread)
+
+With ``--sink devnull`` the numbers are pure formatting/handoff cost (the
+listener thread still competes for the GIL, so queued is not cheaper there).
+``--sink slow`` adds ``--write-us`` of blocking per write, like a container log
+pipe under backpressure: that is the case the queue exists for.
+
+Usage:
+    PYTHONPATH=src python scripts/bench/bench_logging.py [--records 20000] [--sink devnull|slow|stdout]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from app.core import logs
+
+STAGES = {"parse": {"ms": 0.4, "count": 1}, "explain": {"ms": 12.5, "count": 1}, "advisor": {"ms": 3.1, "count": 1}}
+
+
+class _SlowSink:
+    """File-like sink whose writes block for a fixed time (releases the GIL, like real I/O)."""
+
+    def __init__(self, write_us: float):
+        self.delay = write_us / 1e6
+        self._null = open(os.devnull, "w")
+
+    def write(self, data: str) -> int:
+        time.sleep(self.delay)
+        return self._null.write(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self._null.close()
+
+
+def _time(fn: Callable[[], Any], n: int) -> float:
+    """Return mean microseconds per call over ``n`` calls."""
+    fn()
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--records", type=int, default=20000, help="Records per variant")
+    ap.add_argument("--sink", choices=("devnull", "slow", "stdout"), default="devnull")
+    ap.add_argument("--write-us", type=float, default=200.0, help="Blocking time per write for --sink slow")
+    ap.add_argument("--out", help="Write results as JSON to this path")
+    args = ap.parse_args(argv)
+
+    if args.sink == "slow":
+        sink: Any = _SlowSink(args.write_us)
+    elif args.sink == "devnull":
+        sink = open(os.devnull, "w")
+    else:
+        sink = sys.stdout
+    rows: List[Dict[str, Any]] = []
+
+    def old_print() -> None:
+        print({"path": "/api/v1/optimize", "method": "POST", "status": 200, "duration_ms": 17, "stages": STAGES}, file=sink)
+
+    rows.append({"variant": "print(dict)", "us_per_record": _time(old_print, args.records)})
+
+    sync_logger = logging.getLogger("bench.sync")
+    sync_logger.propagate = False
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logs.JSONFormatter())
+    sync_logger.handlers = [handler]
+    sync_logger.setLevel(logging.INFO)
+
+    def sync_log() -> None:
+        sync_logger.info("request", extra={"method": "POST", "path": "/api/v1/optimize", "status": 200, "dur_ms": 17})
+
+    rows.append({"variant": "sync JSON", "us_per_record": _time(sync_log, args.records)})
+
+    logs.setup_logging(stream=sink)
+    token = logs.set_request_id("bench")
+
+    def queued_log() -> None:
+        logs.log_request("POST", "/api/v1/optimize", 200, 17, stages=STAGES)
+
+    rows.append({"variant": "queued JSON", "us_per_record": _time(queued_log, args.records)})
+    rows[-1]["dropped"] = logs.dropped_count()
+    drain_start = time.perf_counter()
+    logs.shutdown_logging()
+    drain_ms = (time.perf_counter() - drain_start) * 1000.0
+    logs.reset_request_id(token)
+    rows[-1]["drain_ms"] = drain_ms
+
+    with contextlib.suppress(Exception):
+        if sink is not sys.stdout:
+            sink.close()
+
+    print(f"{'variant':<14} {'us/record':>10}")
+    for r in rows:
+        print(f"{r['variant']:<14} {r['us_per_record']:>10.2f}")
+    print(f"queued: {rows[-1]['dropped']} dropped, drain after run {drain_ms:.1f} ms")
+    if args.out:
+        Path(args.out).write_text(json.dumps({"records": args.records, "variants": rows}, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Rule-based explanation throughput (explanations per second, no database or LLM).
+
+Times ``app.core.nl_rules.explain`` on synthetic plans of several sizes, both
+warm (PlanTable already built by the heuristics, as on the request path) and
+cold (plan flattened inside the timed call), for each audience.
+
+Usage:
+    PYTHONPATH=src python scripts/bench/bench_nl_rules.py [--nodes 10,100,1000,10000] [--plan recorded.json] [--out path]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic_plans import make_plan  # noqa: E402
+
+from app.core import nl_rules, plan_heuristics  # noqa: E402
+
+
+def _time(fn: Callable[[], Any], min_time_s: float = 0.3) -> float:
+    """Return mean seconds per call, looping for at least ``min_time_s``."""
+    fn()
+    n = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        n += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time_s:
+            return elapsed / n
+
+
+def _bench_plan(name: str, plan: Dict[str, Any], min_time_s: float) -> Dict[str, Any]:
+    warnings, metrics = plan_heuristics.analyze(plan)
+    row: Dict[str, Any] = {"case": name, "nodes": metrics.get("node_count", 0)}
+    for audience in ("beginner", "practitioner", "dba"):
+        warm = _time(
+            lambda audience=audience: nl_rules.explain(plan, warnings, metrics, audience=audience, length="long"), min_time_s
+        )
+        row[f"{audience}_us"] = warm * 1e6
+        row[f"{audience}_per_s"] = 1.0 / warm
+    # Fresh dict per call: plan_table caches by object identity
+    cold = _time(lambda: nl_rules.explain(dict(plan), warnings, metrics), min_time_s)
+    row["cold_us"] = cold * 1e6
+    row["cold_per_s"] = 1.0 / cold
+    return row
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--nodes", default="10,100,1000,10000", help="Comma-separated synthetic plan sizes")
+    ap.add_argument("--plan", action="append", default=[], help="Recorded EXPLAIN JSON file (repeatable)")
+    ap.add_argument("--min-time", type=float, default=0.3, help="Seconds to loop per measurement")
+    ap.add_argument("--out", help="Write results as JSON to this path")
+    args = ap.parse_args(argv)
+
+    cases: List[tuple[str, Dict[str, Any]]] = []
+    for n in [int(x) for x in args.nodes.split(",") if x.strip()]:
+        cases.append((f"synthetic_{n}", make_plan(n)))
+    for p in args.plan:
+        data = json.loads(Path(p).read_text(encoding="utf-8"))
+        if isinstance(data, list) and data:
+            data = data[0]
+        cases.append((Path(p).name, data if "Plan" in data else {"Plan": data}))
+
+    rows = [_bench_plan(name, plan, args.min_time) for name, plan in cases]
+    print(f"{'case':<20} {'nodes':>6} {'beginner/s':>11} {'practit./s':>11} {'dba/s':>11} {'cold/s':>11} {'dba us':>9}")
+    for r in rows:
+        print(
+            f"{r['case']:<20} {r['nodes']:>6} {r['beginner_per_s']:>11,.0f} {r['practitioner_per_s']:>11,.0f} "
+            f"{r['dba_per_s']:>11,.0f} {r['cold_per_s']:>11,.0f} {r['dba_us']:>9.1f}"
+        )
+    if args.out:
+        Path(args.out).write_text(json.dumps({"cases": rows}, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""Scale-factor synthetic dataset and query corpus for benchmarks.
+
+Builds an e-commerce style schema in its own schema (default ``bench_sf<N>``)
+and bulk-loads it with COPY, streaming generated rows (bounded memory):
+
+    users        10k x SF   country (Zipf), tier (skewed)
+    products      1k x SF   category (Zipf)
+    orders      100k x SF   user_id (Zipf, --skew), ship_country correlated with
+                            the user's country (--correlation), created_at
+                            correlated with id, status correlated with age
+    order_items 300k x SF   3 per order, product_id (Zipf)
+    events      200k x SF   user_id (Zipf), type (skewed)
+    dim_0..K      1k        --extra-tables, for many-table catalogs
+
+Scale factor 1 is ~600k rows, 100 is ~60M. Primary keys and a few indexes are
+created after the load (faster than maintaining them during COPY), then the
+schema is ANALYZEd. A matching query corpus (one statement per line, usable
+with ``qeo workload`` / ``qeo loadtest`` / suite.py) mixes hot and cold keys
+on the skewed columns, range scans, joins, aggregates and correlated filters.
+
+The target schema is dropped and recreated, so ``public``, system schemas and
+schemas holding tables datagen did not create are refused. Corpus statements
+name the schema (``bench_sf1.orders``); the advisor reads catalog and pg_stats
+from the schema a statement names.
+
+Generation is deterministic for a given --seed. With ``--csv-dir`` the rows are
+written as COPY text files instead of being loaded (no database needed).
+
+Usage:
+    RUN_DB_TESTS=1 PYTHONPATH=src python scripts/bench/datagen.py --scale 10 [--schema bench_sf10]
+        [--skew 1.1] [--correlation 0.9] [--extra-tables 50] [--unlogged] [--corpus bench/corpus_sf10.sql]
+    PYTHONPATH=src python scripts/bench/datagen.py --scale 1 --csv-dir /tmp/sf1 --corpus /tmp/sf1.sql
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import math
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+COUNTRIES = ["US", "DE", "GB", "FR", "IN", "BR", "JP", "CA", "AU", "ES", "IT", "NL", "SE", "PL", "MX",
+             "KR", "CN", "ZA", "AR", "NO", "DK", "FI", "IE", "PT", "AT", "CH", "BE", "NZ", "SG", "TR"]
+TIERS = (("free", 80), ("pro", 17), ("enterprise", 3))
+STATUSES = ("new", "paid", "shipped", "delivered", "cancelled", "refunded")
+EVENT_TYPES = (("page_view", 70), ("add_to_cart", 15), ("checkout", 8), ("search", 5), ("refund_request", 2))
+N_CATEGORIES = 50
+
+EPOCH_START = 1640995200  # 2022-01-01T00:00:00Z
+SPAN_S = 3 * 365 * 86400
+
+# name -> (rows per scale factor, [(column, type)], primary key, secondary indexes)
+TABLES: Dict[str, Tuple[int, List[Tuple[str, str]], str, List[str]]] = {
+    "users": (
+        10_000,
+        [("id", "bigint"), ("email", "text"), ("country", "text"), ("tier", "text"), ("created_at", "timestamptz")],
+        "id",
+        ["email"],
+    ),
+    "products": (
+        1_000,
+        [("id", "bigint"), ("category", "int"), ("name", "text"), ("price_cents", "int")],
+        "id",
+        [],
+    ),
+    "orders": (
+        100_000,
+        [("id", "bigint"), ("user_id", "bigint"), ("status", "text"), ("total_cents", "int"),
+         ("ship_country", "text"), ("created_at", "timestamptz")],
+        "id",
+        ["user_id"],
+    ),
+    "order_items": (
+        300_000,
+        [("order_id", "bigint"), ("line", "int"), ("product_id", "bigint"), ("qty", "int"), ("price_cents", "int")],
+        "order_id, line",
+        [],
+    ),
+    "events": (
+        200_000,
+        [("id", "bigint"), ("user_id", "bigint"), ("type", "text"), ("created_at", "timestamptz"), ("payload", "text")],
+        "id",
+        [],
+    ),
+}
+DIM_ROWS = 1_000
+DIM_COLUMNS = [("id", "bigint"), ("code", "text"), ("label", "text"), ("weight", "int")]
+
+
+def zipf_cum_weights(n: int, s: float) -> List[float]:
+    """Cumulative Zipf(s) weights over ranks 1..n (s=0 is uniform)."""
+    out: List[float] = []
+    acc = 0.0
+    for k in range(1, n + 1):
+        acc += 1.0 / (k ** s) if s > 0 else 1.0
+        out.append(acc)
+    return out
+
+
+def _ts(epoch_s: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S+00", time.gmtime(epoch_s))
+
+
+class Generator:
+    """Deterministic row streams for one scale factor."""
+
+    def __init__(self, scale: float = 1.0, seed: int = 42, skew: float = 1.1, correlation: float = 0.9, extra_tables: int = 0):
+        if scale <= 0:
+            raise ValueError("scale must be > 0")
+        self.scale = scale
+        self.seed = seed
+        self.skew = skew
+        self.correlation = min(1.0, max(0.0, correlation))
+        self.extra_tables = max(0, extra_tables)
+        self._user_country: Optional[bytearray] = None
+        self._user_cum: Optional[List[float]] = None
+        self._product_cum: Optional[List[float]] = None
+
+    # ---- sizes ----
+
+    def row_count(self, table: str) -> int:
+        if table.startswith("dim_"):
+            return DIM_ROWS
+        if table == "order_items":
+            # Fixed fan-out of 3 lines per order
+            return 3 * self.row_count("orders")
+        return max(1, int(TABLES[table][0] * self.scale))
+
+    def tables(self) -> List[str]:
+        return list(TABLES) + [f"dim_{k}" for k in range(self.extra_tables)]
+
+    def columns(self, table: str) -> List[Tuple[str, str]]:
+        return DIM_COLUMNS if table.startswith("dim_") else TABLES[table][1]
+
+    # ---- shared distributions ----
+
+    def _rng(self, table: str) -> random.Random:
+        # Per-table streams: a table's rows do not depend on which tables were generated before it
+        return random.Random(f"{self.seed}:{table}")
+
+    def _countries(self) -> bytearray:
+        """Country index per user id (1-based ids -> index id-1); drives ship_country correlation."""
+        if self._user_country is None:
+            rng = self._rng("users.country")
+            cum = zipf_cum_weights(len(COUNTRIES), 1.0)
+            n = self.row_count("users")
+            self._user_country = bytearray(rng.choices(range(len(COUNTRIES)), cum_weights=cum, k=n))
+        return self._user_country
+
+    def _user_ids(self, rng: random.Random, k: int) -> List[int]:
+        if self._user_cum is None:
+            self._user_cum = zipf_cum_weights(self.row_count("users"), self.skew)
+        # Rank r maps to a scattered id so hot users are not all low ids
+        n = self.row_count("users")
+        ranks = rng.choices(range(n), cum_weights=self._user_cum, k=k)
+        return [(r * 7919) % n + 1 for r in ranks]
+
+    def _product_ids(self, rng: random.Random, k: int) -> List[int]:
+        if self._product_cum is None:
+            self._product_cum = zipf_cum_weights(self.row_count("products"), 1.0)
+        return [r + 1 for r in rng.choices(range(self.row_count("products")), cum_weights=self._product_cum, k=k)]
+
+    def hot_user_ids(self, k: int = 10) -> List[int]:
+        n = self.row_count("users")
+        return [(r * 7919) % n + 1 for r in range(min(k, n))]
+
+    # ---- rows ----
+
+    def rows(self, table: str, chunk: int = 10_000) -> Iterator[Sequence[Any]]:
+        n = self.row_count(table)
+        rng = self._rng(table)
+        if table.startswith("dim_"):
+            for i in range(1, n + 1):
+                yield (i, f"{table}_{i:05d}", f"label {i % 97}", rng.randint(1, 1000))
+            return
+        gen = getattr(self, f"_rows_{table}")
+        for start in range(1, n + 1, chunk):
+            yield from gen(rng, start, min(n, start + chunk - 1))
+
+    def _rows_users(self, rng: random.Random, lo: int, hi: int) -> Iterator[Sequence[Any]]:
+        countries = self._countries()
+        tiers = [t for t, _ in TIERS]
+        tier_w = [w for _, w in TIERS]
+        n = self.row_count("users")
+        for i, tier in zip(range(lo, hi + 1), rng.choices(tiers, weights=tier_w, k=hi - lo + 1), strict=True):
+            created = EPOCH_START + SPAN_S * (i / n) * 0.8 + rng.random() * 86400
+            yield (i, f"user{i}@example.com", COUNTRIES[countries[i - 1]], tier, _ts(created))
+
+    def _rows_products(self, rng: random.Random, lo: int, hi: int) -> Iterator[Sequence[Any]]:
+        cum = zipf_cum_weights(N_CATEGORIES, 1.2)
+        cats = rng.choices(range(1, N_CATEGORIES + 1), cum_weights=cum, k=hi - lo + 1)
+        for i, cat in zip(range(lo, hi + 1), cats, strict=True):
+            yield (i, cat, f"product {i}", int(math.exp(rng.gauss(7.5, 1.0))))
+
+    def _rows_orders(self, rng: random.Random, lo: int, hi: int) -> Iterator[Sequence[Any]]:
+        countries = self._countries()
+        n = self.row_count("orders")
+        for i, uid in zip(range(lo, hi + 1), self._user_ids(rng, hi - lo + 1), strict=True):
+            # created_at follows id (append-only table) with a little jitter
+            age = 1.0 - i / n
+            created = EPOCH_START + SPAN_S * (i / n) + rng.random() * 3600
+            if age > 0.1:
+                status = "delivered" if rng.random() < 0.85 else rng.choice(("cancelled", "refunded"))
+            else:
+                status = rng.choice(("new", "paid", "shipped")) if rng.random() < 0.9 else "cancelled"
+            if rng.random() < self.correlation:
+                ship = COUNTRIES[countries[uid - 1]]
+            else:
+                ship = COUNTRIES[rng.randrange(len(COUNTRIES))]
+            yield (i, uid, status, int(math.exp(rng.gauss(8.0, 1.1))), ship, _ts(created))
+
+    def _rows_order_items(self, rng: random.Random, lo: int, hi: int) -> Iterator[Sequence[Any]]:
+        # Row r is line (r - 1) % 3 + 1 of order (r - 1) // 3 + 1, so items are clustered by order
+        products = self._product_ids(rng, hi - lo + 1)
+        for r, pid in zip(range(lo, hi + 1), products, strict=True):
+            qty = 1 + int(rng.expovariate(0.7))
+            yield ((r - 1) // 3 + 1, (r - 1) % 3 + 1, pid, qty, int(math.exp(rng.gauss(7.0, 1.0))))
+
+    def _rows_events(self, rng: random.Random, lo: int, hi: int) -> Iterator[Sequence[Any]]:
+        types = [t for t, _ in EVENT_TYPES]
+        w = [x for _, x in EVENT_TYPES]
+        n = self.row_count("events")
+        users = self._user_ids(rng, hi - lo + 1)
+        for i, uid, typ in zip(range(lo, hi + 1), users, rng.choices(types, weights=w, k=hi - lo + 1), strict=True):
+            created = EPOCH_START + SPAN_S * (i / n) + rng.random() * 60
+            yield (i, uid, typ, _ts(created), f"session={rng.getrandbits(32):08x}")
+
+    # ---- SQL ----
+
+    def ddl(self, schema: str, unlogged: bool = False) -> List[str]:
+        """DROP/CREATE of ``schema`` and its tables; refuses schemas that are not ours to drop."""
+        check_schema_name(schema)
+        kind = "UNLOGGED TABLE" if unlogged else "TABLE"
+        out = [f"DROP SCHEMA IF EXISTS {schema} CASCADE", f"CREATE SCHEMA {schema}"]
+        for t in self.tables():
+            cols = ", ".join(f"{c} {typ}" for c, typ in self.columns(t))
+            out.append(f"CREATE {kind} {schema}.{t} ({cols})")
+        return out
+
+    def index_ddl(self, schema: str) -> List[str]:
+        out: List[str] = []
+        for t in self.tables():
+            if t.startswith("dim_"):
+                out.append(f"ALTER TABLE {schema}.{t} ADD PRIMARY KEY (id)")
+                continue
+            _, _, pk, secondary = TABLES[t]
+            out.append(f"ALTER TABLE {schema}.{t} ADD PRIMARY KEY ({pk})")
+            for col in secondary:
+                out.append(f"CREATE INDEX ON {schema}.{t} ({col})")
+        return out
+
+    def corpus(self, schema: str, n: int = 200) -> List[str]:
+        """Query mix over the generated schema; deterministic for the generator's seed."""
+        rng = self._rng("corpus")
+        s = schema
+        hot = self.hot_user_ids(20)
+        n_users = self.row_count("users")
+        n_orders = self.row_count("orders")
+
+        def day(frac: float) -> str:
+            return _ts(EPOCH_START + SPAN_S * frac).split(" ")[0]
+
+        templates = [
+            lambda: f"SELECT * FROM {s}.orders WHERE user_id = {rng.choice(hot)} ORDER BY created_at DESC LIMIT 50",
+            lambda: f"SELECT * FROM {s}.orders WHERE user_id = {rng.randint(1, n_users)} ORDER BY created_at DESC LIMIT 50",
+            lambda: f"SELECT id, total_cents FROM {s}.orders WHERE created_at >= '{day(rng.uniform(0.5, 0.99))}' AND created_at < '{day(1.0)}'",
+            lambda: f"SELECT * FROM {s}.orders WHERE status = '{rng.choice(STATUSES)}' AND ship_country = '{rng.choice(COUNTRIES[:5])}' LIMIT 100",
+            lambda: (
+                f"SELECT o.id, u.email, o.total_cents FROM {s}.orders o JOIN {s}.users u ON u.id = o.user_id "
+                f"WHERE u.country = '{rng.choice(COUNTRIES[:10])}' AND o.ship_country = u.country AND o.status = 'paid' LIMIT 100"
+            ),
+            lambda: (
+                f"SELECT p.category, sum(oi.qty * oi.price_cents) AS revenue FROM {s}.order_items oi "
+                f"JOIN {s}.products p ON p.id = oi.product_id GROUP BY p.category ORDER BY revenue DESC LIMIT 10"
+            ),
+            lambda: (
+                f"SELECT oi.* FROM {s}.order_items oi JOIN {s}.orders o ON o.id = oi.order_id "
+                f"WHERE o.user_id = {rng.choice(hot)} AND o.created_at > '{day(rng.uniform(0.6, 0.95))}'"
+            ),
+            lambda: f"SELECT user_id, count(*) FROM {s}.events WHERE type = '{rng.choice(EVENT_TYPES)[0]}' GROUP BY user_id ORDER BY count(*) DESC LIMIT 20",
+            lambda: f"SELECT * FROM {s}.events WHERE user_id = {rng.randint(1, n_users)} AND created_at > '{day(rng.uniform(0.8, 0.99))}' ORDER BY created_at DESC LIMIT 20",
+            lambda: f"SELECT * FROM {s}.users WHERE email = 'user{rng.randint(1, n_users)}@example.com'",
+            lambda: f"SELECT tier, count(*) FROM {s}.users WHERE country = '{rng.choice(COUNTRIES)}' GROUP BY tier",
+            lambda: f"SELECT * FROM {s}.orders WHERE id BETWEEN {(lo := rng.randint(1, max(1, n_orders - 1000)))} AND {lo + 1000}",
+        ]
+        return [templates[i % len(templates)]() for i in range(n)]
+
+
+def check_schema_name(schema: str) -> None:
+    """Reject target schemas that must never be dropped (public, system schemas) or are not plain identifiers."""
+    if not re.fullmatch(r"[a-z_][a-z0-9_]*", schema or ""):
+        raise ValueError(f"schema must be a lower-case identifier, got {schema!r}")
+    if schema == "public" or schema == "information_schema" or schema.startswith("pg_"):
+        raise ValueError(f"refusing to drop and reload schema {schema!r}; pass a dedicated --schema such as bench_sf1")
+
+
+def is_bench_table(name: str) -> bool:
+    """Whether ``name`` is a table this generator creates (so dropping it loses nothing else)."""
+    return name in TABLES or re.fullmatch(r"dim_\d+", name) is not None
+
+
+def foreign_tables(cur: Any, schema: str) -> List[str]:
+    """Relations in an existing ``schema`` that datagen did not create."""
+    cur.execute(
+        "SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = %s AND c.relkind IN ('r', 'p', 'v', 'm', 'f') ORDER BY 1",
+        (schema,),
+    )
+    return [r[0] for r in cur.fetchall() if not is_bench_table(r[0])]
+
+
+def copy_text_lines(rows: Iterable[Sequence[Any]]) -> Iterator[str]:
+    """COPY text format lines (values here never contain tabs, newlines or backslashes)."""
+    for r in rows:
+        yield "\t".join("\\N" if v is None else str(v) for v in r) + "\n"
+
+
+class CopyStream:
+    """File-like object feeding generated lines to ``cursor.copy_expert`` without materializing the table."""
+
+    def __init__(self, lines: Iterator[str], batch: int = 2000):
+        self._lines = lines
+        self._batch = batch
+        self._buf = ""
+        self.rows = 0
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buf) < size:
+            chunk = list(itertools.islice(self._lines, self._batch))
+            if not chunk:
+                break
+            self.rows += len(chunk)
+            self._buf += "".join(chunk)
+        if size < 0:
+            out, self._buf = self._buf, ""
+        else:
+            out, self._buf = self._buf[:size], self._buf[size:]
+        return out
+
+
+def load(gen: Generator, schema: str, unlogged: bool = False, log=print) -> Dict[str, Any]:
+    """Create ``schema`` and COPY every table into it; returns per-table row counts and seconds."""
+    from app.core import db
+
+    stats: Dict[str, Any] = {}
+    ddl = gen.ddl(schema, unlogged=unlogged)
+    with db.get_conn() as conn:
+        with conn.cursor() as cur:
+            other = foreign_tables(cur, schema)
+            if other:
+                # DROP SCHEMA ... CASCADE would take these with it
+                raise ValueError(f"schema {schema!r} holds tables datagen did not create ({', '.join(other[:5])}); refusing to drop it")
+            cur.execute("SET synchronous_commit = off")
+            for stmt in ddl:
+                cur.execute(stmt)
+            conn.commit()
+            for t in gen.tables():
+                t0 = time.perf_counter()
+                stream = CopyStream(copy_text_lines(gen.rows(t)))
+                cols = ", ".join(c for c, _ in gen.columns(t))
+                cur.copy_expert(f"COPY {schema}.{t} ({cols}) FROM STDIN", stream, size=1 << 16)
+                conn.commit()
+                stats[t] = {"rows": stream.rows, "seconds": round(time.perf_counter() - t0, 2)}
+                log(f"datagen: {schema}.{t}: {stream.rows} rows in {stats[t]['seconds']}s")
+            t0 = time.perf_counter()
+            for stmt in gen.index_ddl(schema):
+                cur.execute(stmt)
+            conn.commit()
+            # ANALYZE cannot run inside a transaction block
+            conn.autocommit = True
+            try:
+                for t in gen.tables():
+                    cur.execute(f"ANALYZE {schema}.{t}")
+            finally:
+                conn.autocommit = False
+            log(f"datagen: indexes + ANALYZE in {time.perf_counter() - t0:.1f}s")
+    return stats
+
+
+def write_csv(gen: Generator, out_dir: str) -> Dict[str, Any]:
+    """Write each table as a COPY text file ``<out_dir>/<table>.tsv``."""
+    os.makedirs(out_dir, exist_ok=True)
+    stats: Dict[str, Any] = {}
+    for t in gen.tables():
+        n = 0
+        with open(os.path.join(out_dir, f"{t}.tsv"), "w", encoding="utf-8") as f:
+            for line in copy_text_lines(gen.rows(t)):
+                f.write(line)
+                n += 1
+        stats[t] = {"rows": n}
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--scale", type=float, default=1.0, help="Scale factor (1 = ~600k rows, 100 = ~60M)")
+    ap.add_argument("--schema", help="Target schema (default bench_sf<scale>); dropped and recreated, so never public "
+                    "or a schema holding other tables")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for user_id/product_id (0 = uniform)")
+    ap.add_argument("--correlation", type=float, default=0.9, help="P(orders.ship_country = user's country)")
+    ap.add_argument("--extra-tables", type=int, default=0, help="Additional small dim_<k> tables")
+    ap.add_argument("--unlogged", action="store_true", help="Create UNLOGGED tables (faster load, not crash-safe)")
+    ap.add_argument("--csv-dir", help="Write COPY text files here instead of loading into Postgres")
+    ap.add_argument("--corpus", help="Write the matching query corpus (one SQL per line) to this path")
+    ap.add_argument("--queries", type=int, default=200, help="Statements in the corpus")
+    args = ap.parse_args(argv)
+
+    gen = Generator(args.scale, seed=args.seed, skew=args.skew, correlation=args.correlation, extra_tables=args.extra_tables)
+    schema = args.schema or f"bench_sf{str(args.scale).replace('.', '_').removesuffix('_0')}"
+    try:
+        check_schema_name(schema)
+    except ValueError as e:
+        print(f"datagen: {e}")
+        return 2
+    if args.csv_dir:
+        write_csv(gen, args.csv_dir)
+        Path(args.csv_dir, "schema.sql").write_text(
+            ";\n".join(gen.ddl(schema, unlogged=args.unlogged) + gen.index_ddl(schema)) + ";\n", encoding="utf-8"
+        )
+        print(f"datagen: wrote {len(gen.tables())} tables to {args.csv_dir}")
+    else:
+        if os.getenv("RUN_DB_TESTS") != "1":
+            print("datagen: RUN_DB_TESTS=1 required to load into Postgres (or use --csv-dir)")
+            return 2
+        try:
+            load(gen, schema, unlogged=args.unlogged)
+        except ValueError as e:
+            print(f"datagen: {e}")
+            return 2
+    if args.corpus:
+        Path(args.corpus).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.corpus).write_text("\n".join(gen.corpus(schema, args.queries)) + "\n", encoding="utf-8")
+        print(f"datagen: wrote {args.queries} queries to {args.corpus}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,32 @@
 #!/usr/bin/env python3
-"""Benchmark micro-suite (opt-in; requires RUN_DB_TESTS=1).
+"""Benchmark micro-suite (opt-in; requires RUN_DB_TESTS=1, or --replay).
 
 Seeds ephemeral schema `bench_qeo`, runs representative queries through internal
 APIs, captures EXPLAIN ANALYZE timings and plan metrics, writes JSON/CSV reports
 under bench/report/. Drops schema afterwards.
 
+With ``--record BUNDLE`` every db result seen during the run is captured into a
+replay bundle; ``--replay BUNDLE`` runs the same cases from it without a
+database (no seeding), so the optimizer pipeline timings are deterministic.
+
 This script is safe and read-only for product schemas; DDL is confined to
 `bench_qeo` only.
 """
 
 from __future__ import annotations
 
+import argparse
+import contextlib
 import os
 import csv
 import json
+import sys
+import time
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
-from app.core import db, plan_heuristics
+from app.core import db, plan_heuristics, replay
+from app.routers.optimize import OptimizeRequest, run_optimize
 
 
 def ensure_dir(p: Path) -> None:
@@ -60,11 +69,15 @@ def run_queries(schema: str) -> Dict[str, Any]:
         try:
             plan = db.run_explain(sql, analyze=True, timeout_ms=15000)
             warnings, metrics = plan_heuristics.analyze(plan)
+            t0 = time.perf_counter()
+            run_optimize(OptimizeRequest(sql=sql, analyze=True, timeout_ms=15000))
+            optimize_ms = (time.perf_counter() - t0) * 1000.0
             report["cases"][name] = {
                 "sql": sql,
                 "planning_time_ms": metrics.get("planning_time_ms", 0),
                 "execution_time_ms": metrics.get("execution_time_ms", 0),
                 "node_count": metrics.get("node_count", 0),
+                "optimize_ms": round(optimize_ms, 3),
                 "warnings": warnings,
             }
         except Exception as e:
@@ -85,23 +98,37 @@ def write_reports(data: Dict[str, Any]) -> None:
                 "planning_time_ms": d.get("planning_time_ms", 0),
                 "execution_time_ms": d.get("execution_time_ms", 0),
                 "node_count": d.get("node_count", 0),
+                "optimize_ms": d.get("optimize_ms", 0),
                 "error": d.get("error", ""),
             }
         )
     with (out_dir / "report.csv").open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=["case", "planning_time_ms", "execution_time_ms", "node_count", "error"])
+        w = csv.DictWriter(f, fieldnames=["case", "planning_time_ms", "execution_time_ms", "node_count", "optimize_ms", "error"])
         w.writeheader()
         w.writerows(rows)
 
 
-def main() -> None:
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--record", metavar="BUNDLE", help="Capture db results of this run into a replay bundle")
+    mode.add_argument("--replay", metavar="BUNDLE", help="Run from a recorded bundle (no database)")
+    args = ap.parse_args([] if argv is None else argv)
+    schema = "bench_qeo"
+    if args.replay:
+        with replay.replaying(args.replay):
+            data = run_queries(schema)
+        write_reports(data)
+        print("bench: report written to bench/report/ (replayed)")
+        return
     if os.getenv("RUN_DB_TESTS") != "1":
         print("bench: RUN_DB_TESTS=1 required")
         return
-    schema = "bench_qeo"
     try:
         seed(schema)
-        data = run_queries(schema)
+        ctx = replay.recording(args.record, meta={"suite": "run_bench", "schema": schema}) if args.record else contextlib.nullcontext()
+        with ctx:
+            data = run_queries(schema)
         write_reports(data)
         print("bench: report written to bench/report/")
     finally:
@@ -109,7 +136,4 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
-
-
-
+    main(sys.argv[1:])
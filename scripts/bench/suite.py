@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""Hot-path benchmark suite with baseline regression checks (no database by default).
+
+Each hot path is timed separately at several input sizes:
+
+    parse, lint                 SQL with 0 / 3 / 15 joins
+    heuristics                  plans of 100 / 1000 / 10000 nodes
+    suggest_indexes             SQL with 0 / 3 / 15 joins over a 97-table catalog
+    fetch_schema                catalogs of 10 / 100 / 500 tables
+    fetch_table_stats           10 / 50 / 97 tables
+    whatif                      SQL with 1 / 3 / 7 joins (one trial per candidate)
+    workload                    10 / 100 statements
+    json_encode                 ExplainResponse with 100 / 1000 / 10000 plan nodes
+    nl_rules                    rule-based explanation of 100 / 1000 / 10000-node plans
+
+Database-bound paths run against a synthetic replay bundle (app.core.replay),
+so they measure the Python side of each call (decode, copy, merge). Pass
+``--replay BUNDLE`` to use a recorded bundle, or ``--live`` (RUN_DB_TESTS=1)
+to hit Postgres.
+
+Per case the report has p50/p95/p99/mean in microseconds and, from one extra
+run under tracemalloc, peak and retained KiB. ``--baseline`` compares against
+a previous report and exits 1 when a case's p50 (or peak KiB) grew more than
+``--threshold-pct`` and more than the absolute noise floor.
+
+Usage:
+    PYTHONPATH=src python scripts/bench/suite.py [--only parse,heuristics] [--quick]
+        [--out bench/report/suite.json] [--baseline bench/baseline.json] [--threshold-pct 15]
+        [--save-baseline bench/baseline.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic_db import SyntheticBundle, make_sql  # noqa: E402
+from synthetic_plans import make_plan  # noqa: E402
+
+from app.core import (  # noqa: E402
+    db,
+    nl_rules,
+    optimizer,
+    plan_heuristics,
+    replay,
+    serialization,
+    sql_analyzer,
+    whatif,
+    workload,
+)
+from app.core.config import settings  # noqa: E402
+from app.routers.explain import ExplainResponse  # noqa: E402
+
+# (bench name, size label, setup -> timed callable)
+Case = Tuple[str, str, Callable[[], Callable[[], Any]]]
+
+GROUPS = ("parse", "lint", "heuristics", "suggest_indexes", "fetch_schema", "fetch_table_stats", "whatif", "workload", "json_encode", "nl_rules")
+
+
+def _parse_case(n_joins: int) -> Callable[[], Any]:
+    sql = make_sql(7, n_joins)
+    return lambda: sql_analyzer.parse_sql(sql)
+
+
+def _lint_case(n_joins: int) -> Callable[[], Any]:
+    info = sql_analyzer.parse_sql(make_sql(7, n_joins))
+    return lambda: sql_analyzer.lint_rules(info)
+
+
+def _heuristics_case(nodes: int) -> Callable[[], Any]:
+    plan = make_plan(nodes)
+    # Fresh dict per call: plan_heuristics caches its PlanTable on the plan object
+    return lambda: plan_heuristics.analyze(dict(plan))
+
+
+def _suggest_case(n_joins: int) -> Callable[[], Any]:
+    sql = make_sql(7, n_joins)
+    info = sql_analyzer.parse_sql(sql)
+    schema = db.fetch_schema()
+    tables = [t.get("name") for t in info.get("tables") or []]
+    stats = db.fetch_table_stats(tables)
+    options = {"min_index_rows": settings.OPT_MIN_ROWS_FOR_INDEX, "max_index_cols": settings.OPT_MAX_INDEX_COLS}
+    return lambda: optimizer.suggest_indexes(info, schema, stats, options)
+
+
+def _whatif_case(n_joins: int) -> Callable[[], Any]:
+    sql = make_sql(7, n_joins)
+    info = sql_analyzer.parse_sql(sql)
+    tables = [t.get("name") for t in info.get("tables") or []]
+    options = {"min_index_rows": settings.OPT_MIN_ROWS_FOR_INDEX, "max_index_cols": settings.OPT_MAX_INDEX_COLS}
+    res = optimizer.analyze(sql, info, None, db.fetch_schema(), db.fetch_table_stats(tables), options)
+    suggestions = res.get("suggestions", [])
+    return lambda: whatif.evaluate(sql, suggestions, timeout_ms=5000, force_enabled=True)
+
+
+def _json_case(nodes: int) -> Callable[[], Any]:
+    plan = make_plan(nodes)
+    warnings, metrics = plan_heuristics.analyze(dict(plan))
+    model = ExplainResponse.model_construct(plan=plan, warnings=warnings, metrics=metrics)
+    return lambda: serialization.dumps(dict(model))
+
+
+def _nl_rules_case(nodes: int) -> Callable[[], Any]:
+    plan = make_plan(nodes)
+    # Heuristics have already flattened the plan on the request path, so the PlanTable is warm
+    warnings, metrics = plan_heuristics.analyze(plan)
+    return lambda: nl_rules.explain(plan, warnings, metrics)
+
+
+def build_cases(quick: bool = False) -> List[Case]:
+    joins = (0, 3) if quick else (0, 3, 15)
+    nodes = (100, 1000) if quick else (100, 1000, 10000)
+    cases: List[Case] = []
+    for j in joins:
+        cases.append(("parse", f"joins={j}", lambda j=j: _parse_case(j)))
+    for j in joins:
+        cases.append(("lint", f"joins={j}", lambda j=j: _lint_case(j)))
+    for n in nodes:
+        cases.append(("heuristics", f"nodes={n}", lambda n=n: _heuristics_case(n)))
+    for j in joins:
+        cases.append(("suggest_indexes", f"joins={j}", lambda j=j: _suggest_case(j)))
+    for n in (10, 100) if quick else (10, 100, 500):
+        # Synthetic schema "sN" has N tables; with a recording or live db these are whatever exists
+        cases.append(("fetch_schema", f"tables={n}", lambda n=n: lambda: db.fetch_schema(schema=f"s{n}")))
+    for n in (10, 50) if quick else (10, 50, 97):
+        names = [f"t{k}" for k in range(n)]
+        cases.append(("fetch_table_stats", f"tables={n}", lambda names=names: lambda: db.fetch_table_stats(names)))
+    for j in (1, 3) if quick else (1, 3, 7):
+        cases.append(("whatif", f"joins={j}", lambda j=j: _whatif_case(j)))
+    for n in (10,) if quick else (10, 100):
+        sqls = [make_sql(i, i % 4) for i in range(n)]
+        cases.append(("workload", f"queries={n}", lambda sqls=sqls: lambda: workload.analyze_workload(sqls)))
+    for n in nodes:
+        cases.append(("json_encode", f"nodes={n}", lambda n=n: _json_case(n)))
+    for n in nodes:
+        cases.append(("nl_rules", f"nodes={n}", lambda n=n: _nl_rules_case(n)))
+    return cases
+
+
+def _percentile(sorted_vals: List[float], pct: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, int(round(pct / 100.0 * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[k]
+
+
+def measure(fn: Callable[[], Any], min_time_s: float, min_iter: int, max_iter: int) -> Dict[str, Any]:
+    """Per-call timings (us) until both ``min_time_s`` and ``min_iter`` are reached."""
+    fn()
+    samples: List[float] = []
+    gc_was = gc.isenabled()
+    start = time.perf_counter()
+    try:
+        gc.disable()
+        while len(samples) < max_iter:
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1e6)
+            if len(samples) >= min_iter and time.perf_counter() - start >= min_time_s:
+                break
+            if len(samples) % 64 == 0:
+                gc.collect()
+    finally:
+        if gc_was:
+            gc.enable()
+    samples.sort()
+    return {
+        "iterations": len(samples),
+        "p50_us": round(_percentile(samples, 50), 2),
+        "p95_us": round(_percentile(samples, 95), 2),
+        "p99_us": round(_percentile(samples, 99), 2),
+        "mean_us": round(sum(samples) / len(samples), 2),
+    }
+
+
+def measure_alloc(fn: Callable[[], Any]) -> Dict[str, float]:
+    """Peak and retained traced memory of one call, in KiB."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {"peak_kb": round(max(0, peak - before) / 1024.0, 1), "retained_kb": round(max(0, current - before) / 1024.0, 1)}
+
+
+@contextlib.contextmanager
+def backend(args: argparse.Namespace) -> Iterator[str]:
+    if args.live:
+        yield "live"
+        return
+    if args.replay:
+        with replay.replaying(args.replay):
+            yield f"replay:{Path(args.replay).name}"
+        return
+    with replay.replaying(SyntheticBundle()):
+        yield "synthetic"
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    only = {x.strip() for x in (args.only or "").split(",") if x.strip()}
+    results: List[Dict[str, Any]] = []
+    with backend(args) as backend_name:
+        for name, size, setup in build_cases(quick=args.quick):
+            if only and name not in only:
+                continue
+            fn = setup()
+            row: Dict[str, Any] = {"bench": name, "size": size}
+            try:
+                row.update(measure(fn, args.min_time, args.min_iter, args.max_iter))
+                row.update(measure_alloc(fn))
+            except Exception as e:
+                row["error"] = str(e)
+            results.append(row)
+            if not args.quiet:
+                _print_row(row)
+    return {
+        "meta": {
+            "backend": backend_name,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "orjson": serialization._orjson is not None,
+            "createdAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+
+
+def compare(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    threshold_pct: float,
+    min_delta_us: float = 5.0,
+    min_delta_kb: float = 16.0,
+) -> List[Dict[str, Any]]:
+    """Cases whose p50 or peak allocation grew beyond ``threshold_pct`` (and the absolute floor)."""
+    base = {(r["bench"], r["size"]): r for r in baseline.get("results", []) if "error" not in r}
+    regressions: List[Dict[str, Any]] = []
+    for r in current.get("results", []):
+        b = base.get((r["bench"], r["size"]))
+        if b is None or "error" in r:
+            continue
+        for metric, floor in (("p50_us", min_delta_us), ("peak_kb", min_delta_kb)):
+            old, new = float(b.get(metric, 0.0)), float(r.get(metric, 0.0))
+            if old <= 0:
+                continue
+            pct = (new - old) / old * 100.0
+            if pct > threshold_pct and new - old > floor:
+                regressions.append({"bench": r["bench"], "size": r["size"], "metric": metric, "baseline": old, "current": new, "pct": round(pct, 1)})
+    return regressions
+
+
+def _print_row(r: Dict[str, Any]) -> None:
+    if "error" in r:
+        print(f"{r['bench']:<18} {r['size']:<12} ERROR {r['error']}")
+        return
+    print(
+        f"{r['bench']:<18} {r['size']:<12} {r['p50_us']:>11.1f} {r['p95_us']:>11.1f} {r['p99_us']:>11.1f} "
+        f"{r['peak_kb']:>10.1f} {r['iterations']:>7}"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--only", help=f"Comma-separated subset of: {', '.join(GROUPS)}")
+    ap.add_argument("--quick", action="store_true", help="Smaller size matrix (CI smoke)")
+    ap.add_argument("--min-time", type=float, default=0.5, help="Minimum seconds per case")
+    ap.add_argument("--min-iter", type=int, default=10)
+    ap.add_argument("--max-iter", type=int, default=100000)
+    ap.add_argument("--out", default="bench/report/suite.json")
+    ap.add_argument("--baseline", help="Previous suite report to compare against")
+    ap.add_argument("--threshold-pct", type=float, default=15.0, help="Allowed growth of p50 / peak KiB before failing")
+    ap.add_argument("--min-delta-us", type=float, default=5.0, help="Ignore p50 growth below this many microseconds")
+    ap.add_argument("--save-baseline", help="Also write this run as the new baseline")
+    ap.add_argument("--quiet", action="store_true")
+    src = ap.add_mutually_exclusive_group()
+    src.add_argument("--replay", metavar="BUNDLE", help="Serve db calls from a recorded bundle")
+    src.add_argument("--live", action="store_true", help="Use the configured database (requires RUN_DB_TESTS=1)")
+    args = ap.parse_args(argv)
+
+    if args.live and os.getenv("RUN_DB_TESTS") != "1":
+        print("bench: RUN_DB_TESTS=1 required for --live")
+        return 2
+    if not args.quiet:
+        print(f"{'bench':<18} {'size':<12} {'p50 us':>11} {'p95 us':>11} {'p99 us':>11} {'peak KiB':>10} {'iters':>7}")
+    report = run(args)
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        Path(args.save_baseline).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    code = 1 if any("error" in r for r in report["results"]) else 0
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        if baseline.get("meta", {}).get("backend") != report["meta"]["backend"]:
+            print(f"bench: warning: baseline backend {baseline.get('meta', {}).get('backend')!r} != {report['meta']['backend']!r}")
+        regressions = compare(report, baseline, args.threshold_pct, min_delta_us=args.min_delta_us)
+        for reg in regressions:
+            print(f"REGRESSION {reg['bench']} {reg['size']} {reg['metric']}: {reg['baseline']} -> {reg['current']} (+{reg['pct']}%)")
+        if regressions:
+            code = 1
+        elif not args.quiet:
+            print(f"bench: no regressions beyond {args.threshold_pct}% vs {args.baseline}")
+    return code
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,93 @@
+"""Synthetic replay bundle: a deterministic stand-in database for offline benchmarks.
+
+``SyntheticBundle`` answers every replayed db call (see app.core.replay) from
+generated data instead of a recording: EXPLAIN returns ``make_plan`` trees,
+the catalog has ``n_tables`` tables ``t0..tN`` with the columns the generated
+SQL uses (schema ``sN`` has N tables, for catalog-size sweeps), stats give each table 50k+ rows, HypoPG trials return a cost
+derived from the candidate index so what-if ranking is stable across runs.
+"""
+
+from __future__ import annotations
+
+import zlib
+from typing import Any, Dict
+
+from synthetic_plans import make_plan
+
+from app.core import replay
+
+COLUMNS = ["id", "user_id", "status", "amount", "created_at"]
+_TYPES = {"id": "integer", "user_id": "integer", "status": "text", "amount": "numeric", "created_at": "timestamp"}
+
+
+def make_sql(i: int, n_joins: int = 1) -> str:
+    """SELECT over ``n_joins + 1`` tables with equality/range filters, ORDER BY and LIMIT."""
+    n = max(0, n_joins)
+    base = f"t{i % 97}"
+    parts = [f"SELECT {base}.id, {base}.amount FROM {base}"]
+    where = [f"{base}.user_id = {i}", f"{base}.status = 'paid'"]
+    for j in range(1, n + 1):
+        t = f"t{(i + j) % 97}"
+        parts.append(f"JOIN {t} ON {t}.user_id = {base}.id")
+        where.append(f"{t}.created_at > '2024-01-01'")
+    parts.append("WHERE " + " AND ".join(where))
+    parts.append(f"ORDER BY {base}.created_at DESC LIMIT 50")
+    return " ".join(parts)
+
+
+def make_schema(n_tables: int, name: str = "public") -> Dict[str, Any]:
+    return {"schema": name, "tables": [_table(k) for k in range(n_tables)]}
+
+
+def _table(k: int) -> Dict[str, Any]:
+    return {
+        "name": f"t{k}",
+        "columns": [{"name": c, "data_type": _TYPES[c], "nullable": c != "id", "default": None} for c in COLUMNS],
+        "indexes": [{"name": f"t{k}_status_idx", "unique": False, "columns": ["status"]}] if k % 3 == 0 else [],
+        "primary_key": ["id"],
+        "foreign_keys": [],
+    }
+
+
+def _rows(table: str) -> float:
+    return 50000.0 + 1000.0 * (zlib.crc32(table.encode()) % 200)
+
+
+class SyntheticBundle(replay.Bundle):
+    def __init__(self, plan_nodes: int = 50, n_tables: int = 97):
+        super().__init__(meta={"synthetic": True, "planNodes": plan_nodes, "tables": n_tables})
+        self.plan_nodes = plan_nodes
+        self.n_tables = n_tables
+        self._plans: Dict[bool, Dict[str, Any]] = {}
+        self._schemas: Dict[int, Dict[str, Any]] = {}
+
+    def get(self, kind: str, key: str) -> Any:
+        if self.has(kind, key):
+            return super().get(kind, key)
+        table = key.split(".", 1)[-1]
+        if kind == "explain":
+            analyze = key.startswith("analyze:")
+            if analyze not in self._plans:
+                self._plans[analyze] = make_plan(self.plan_nodes, analyze=analyze)
+            return self._plans[analyze]
+        if kind == "explain_costs":
+            return {"Plan": {"Node Type": "Seq Scan", "Total Cost": 10000.0, "Plan Rows": 1000}}
+        if kind == "hypo_costs":
+            return {"Plan": {"Node Type": "Index Scan", "Total Cost": 10000.0 * (0.2 + (zlib.crc32(key.encode()) % 70) / 100.0), "Plan Rows": 50}}
+        if kind == "schema":
+            name = key.split(".", 1)[0]
+            n = int(name[1:]) if name[:1] == "s" and name[1:].isdigit() else self.n_tables
+            if n not in self._schemas:
+                self._schemas[n] = make_schema(n)
+            return self._schemas[n]
+        if kind == "table_stats":
+            return {"present": True, "value": {"rows": _rows(table), "indexes": _table(int(table[1:]) if table[1:].isdigit() else 0)["indexes"]}}
+        if kind == "table_rows":
+            return {"rows": _rows(table)}
+        if kind == "column_stats":
+            cols = {c: {"n_distinct": -1.0 if c == "id" else 200.0, "null_frac": 0.0, "avg_width": 8} for c in COLUMNS}
+            return replay.table_entry(cols)
+        if kind == "sql":
+            return [["hypopg"]] if "pg_extension" in key else []
+        return super().get(kind, key)
+
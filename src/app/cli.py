@@ -7,12 +7,14 @@ Deterministic outputs; no DDL execution.
 from __future__ import annotations
 
 import argparse
+import contextlib
 import json
 import sys
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List
 
 from app.core import sql_analyzer, plan_heuristics, db
-from app.core import whatif
+from app.core import replay, whatif
+from app.core.streaming import ndjson_line
 
 
 def _print(data: Dict[str, Any], fmt: str) -> None:
@@ -113,10 +115,11 @@ def cmd_optimize(args: argparse.Namespace) -> int:
     except Exception:
         plan = None
 
-    schema = db.fetch_schema()
+    schema_name = sql_analyzer.query_schema(info)
+    schema = db.fetch_schema(schema=schema_name)
     try:
         tables = [t.get("name") for t in (info.get("tables") or []) if t.get("name")]
-        stats = db.fetch_table_stats(tables, timeout_ms=args.timeout_ms)
+        stats = db.fetch_table_stats(tables, schema=schema_name, timeout_ms=args.timeout_ms)
     except Exception:
         stats = {}
 
@@ -161,13 +164,8 @@ def cmd_optimize(args: argparse.Namespace) -> int:
                 if stmt_list:
                     table, cols = _parse_index_stmt(stmt_list[0])
                     if table and cols:
-                        with db.get_conn() as conn:
-                            with conn.cursor() as cur:
-                                cur.execute("SELECT hypopg_reset()")
-                                cur.execute("SELECT * FROM hypopg_create_index(%s)", (f"CREATE INDEX ON {table} ({', '.join(cols)})",))
-                                after = db.run_explain_costs(sql, timeout_ms=args.timeout_ms)
-                                cur.execute("SELECT hypopg_reset()")
-                                out["planDiff"] = diff_plans(baseline, after)
+                        after = db.run_hypothetical_costs(sql, table, cols, timeout_ms=args.timeout_ms)
+                        out["planDiff"] = diff_plans(baseline, after)
         except Exception:
             pass
     if getattr(args, "markdown", False):
@@ -179,19 +177,25 @@ def cmd_optimize(args: argparse.Namespace) -> int:
     return 0
 
 
-def cmd_workload(args: argparse.Namespace) -> int:
-    from app.core.workload import analyze_workload
-    # read SQLs from file (one per line or separated by ';')
-    sqls: List[str] = []
-    with open(args.file, "r", encoding="utf-8") as f:
-        data = f.read()
-    # split by newline; keep non-empty
-    for line in data.splitlines():
-        s = line.strip()
-        if s:
-            sqls.append(s)
-    res = analyze_workload(sqls, top_k=int(args.top_k), what_if=bool(args.what_if))
-    out = {"ok": True, "suggestions": res.get("suggestions", []), "perQuery": res.get("perQuery", [])}
+def _iter_workload_file(path: str) -> Iterator[str]:
+    # read SQLs from file lazily (one per line); keep non-empty
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            s = line.strip()
+            if s:
+                yield s
+
+
+def _read_workload_file(path: str) -> List[str]:
+    return list(_iter_workload_file(path))
+
+
+def _print_ndjson(event: Dict[str, Any]) -> None:
+    sys.stdout.write(ndjson_line(event))
+    sys.stdout.flush()
+
+
+def _print_workload(out: Dict[str, Any], args: argparse.Namespace) -> None:
     if getattr(args, "markdown", False):
         print("# QEO Workload Report\n\n## Top Suggestions\n")
         for s in out["suggestions"]:
@@ -200,6 +204,179 @@ def cmd_workload(args: argparse.Namespace) -> int:
         _print_table(out.get("suggestions", []))
     else:
         _print(out, "json")
+
+
+def _follow_job(api: str, job_id: str, poll_s: float) -> Dict[str, Any]:
+    """Poll a workload job until it finishes; progress goes to stderr."""
+    import time
+    import requests
+
+    url = f"{api.rstrip('/')}/api/v1/workload/jobs/{job_id}"
+    while True:
+        r = requests.get(url, params={"include_results": "false"}, timeout=30)
+        r.raise_for_status()
+        job = r.json()
+        prog = job.get("progress") or {}
+        print(
+            f"job {job_id}: {job.get('status')} {prog.get('processed', 0)}/{prog.get('total', 0)}",
+            file=sys.stderr,
+        )
+        if job.get("status") in ("done", "failed"):
+            break
+        time.sleep(poll_s)
+    # Page through the full result set once finished
+    per_query: List[Dict[str, Any]] = []
+    while True:
+        r = requests.get(url, params={"offset": len(per_query), "limit": 1000}, timeout=30)
+        r.raise_for_status()
+        job = r.json()
+        page = job.get("perQuery") or []
+        per_query.extend(page)
+        if len(page) < 1000:
+            break
+    job["perQuery"] = per_query
+    return job
+
+
+def _stream_job(api: str, job_id: str) -> int:
+    """Relay a job's NDJSON event stream to stdout, dropping progress events."""
+    import requests
+
+    url = f"{api.rstrip('/')}/api/v1/workload/jobs/{job_id}/stream"
+    status = None
+    with requests.get(url, stream=True, timeout=(10, None)) as r:
+        r.raise_for_status()
+        for line in r.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            event = json.loads(line)
+            if event.get("event") == "progress":
+                continue
+            status = event.get("status", status)
+            _print_ndjson(event)
+    return 0 if status == "done" else 3
+
+
+def cmd_workload(args: argparse.Namespace) -> int:
+    from app.core.workload import analyze_workload, stream_workload
+
+    if args.submit or args.job:
+        import requests
+
+        job_id = args.job
+        if not job_id:
+            if not args.file:
+                raise SystemExit("workload --submit requires --file")
+            payload = {"sqls": _read_workload_file(args.file), "top_k": int(args.top_k), "what_if": bool(args.what_if)}
+            r = requests.post(f"{args.api.rstrip('/')}/api/v1/workload/jobs", json=payload, timeout=30)
+            r.raise_for_status()
+            job_id = r.json()["id"]
+            if not args.follow:
+                _print({"ok": True, "id": job_id, "status": r.json().get("status")}, "json")
+                return 0
+        if args.format == "ndjson":
+            return _stream_job(args.api, job_id)
+        job = _follow_job(args.api, job_id, args.poll_s)
+        if job.get("status") != "done":
+            _print({"ok": False, "id": job_id, "status": job.get("status"), "error": job.get("error")}, "json")
+            return 3
+        out = {"ok": True, "suggestions": job.get("suggestions", []), "perQuery": job.get("perQuery", [])}
+        _print_workload(out, args)
+        return 0
+
+    if not args.file:
+        raise SystemExit("workload requires --file")
+    if args.format == "ndjson":
+        # Emit each per-query result as soon as it is ready; merged suggestions last
+        for event in stream_workload(_iter_workload_file(args.file), top_k=int(args.top_k)):
+            _print_ndjson(event)
+        return 0
+    sqls = _read_workload_file(args.file)
+    res = analyze_workload(sqls, top_k=int(args.top_k), what_if=bool(args.what_if))
+    out = {"ok": True, "suggestions": res.get("suggestions", []), "perQuery": res.get("perQuery", [])}
+    _print_workload(out, args)
+    return 0
+
+
+def _print_loadtest(report: Dict[str, Any], deltas: List[Dict[str, Any]]) -> None:
+    meta = report["meta"]
+    mode = f"{meta['rps']} rps (open loop)" if meta["mode"] == "open" else f"concurrency {meta['concurrency']} (closed loop)"
+    print(f"target {meta['target']} (server {meta.get('serverVersion') or '?'}), {mode}, {meta['durationS']}s")
+    print(f"{'endpoint':<10} {'reqs':>7} {'rps':>8} {'err%':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    rows = list(report["endpoints"].items()) + [("total", report["total"])]
+    for name, s in rows:
+        lat = s["latencyMs"]
+        print(
+            f"{name:<10} {s['requests']:>7} {s['throughputRps']:>8.1f} {s['errorRate'] * 100:>6.2f} "
+            f"{lat['p50']:>9.1f} {lat['p95']:>9.1f} {lat['p99']:>9.1f} {lat['max']:>9.1f}"
+        )
+    if meta.get("droppedClientSide"):
+        print(f"warning: {meta['droppedClientSide']} scheduled requests skipped (max in-flight reached)")
+    llm = report.get("llm")
+    if llm:
+        print(
+            f"mock llm: {llm['requests']} requests, {llm['completed']} completed, {llm['errors']} errors, "
+            f"{llm['rejected']} rejected (busy), peak {llm['peakActive']} concurrent"
+        )
+    for d in deltas:
+        parts = [f"{k} {v['pct']:+.1f}%" for k, v in d.items() if k != "endpoint" and v["pct"] is not None]
+        print(f"vs previous {d['endpoint']}: " + ", ".join(parts))
+
+
+def cmd_loadtest(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from app import loadtest
+
+    corpus = _read_workload_file(args.file) if args.file else None
+    lt = loadtest.LoadTest(
+        args.api,
+        corpus=corpus,
+        mix=loadtest.parse_mix(args.mix),
+        duration_s=args.duration,
+        warmup_s=args.warmup,
+        concurrency=args.concurrency,
+        rps=args.rps,
+        max_inflight=args.max_inflight,
+        timeout_s=args.request_timeout,
+        nl=args.nl,
+        workload_size=args.workload_size,
+        llm_stats_url=args.mock_llm,
+    )
+    report = asyncio.run(lt.run())
+    deltas = loadtest.compare(report, loadtest.load_report(args.compare)) if args.compare else []
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.format == "json":
+        _print({**report, "comparison": deltas} if deltas else report, "json")
+    else:
+        _print_loadtest(report, deltas)
+    return 0 if report["total"]["requests"] else 3
+
+
+def cmd_mock_ollama(args: argparse.Namespace) -> int:
+    from app.mock_ollama import MockConfig, MockOllamaServer
+
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        latency_dist=args.latency_dist,
+        latency_spread=args.latency_spread,
+        tokens_per_s=args.tokens_per_s,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        max_concurrent=args.max_concurrent,
+        max_queue=args.max_queue,
+        seed=args.seed,
+    )
+    server = MockOllamaServer(args.host, args.port, config)
+    print(f"mock Ollama listening on {server.url} (OLLAMA_HOST={server.url})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
     return 0
 
 
@@ -219,6 +396,9 @@ def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(prog="qeo", description="Query Explain & Optimize CLI")
     p.add_argument("--format", choices=["json", "text"], default="json")
     p.add_argument("--timeout-ms", type=int, default=10000)
+    backend = p.add_mutually_exclusive_group()
+    backend.add_argument("--record", metavar="BUNDLE", help="Capture EXPLAIN/catalog/stats results into a replay bundle")
+    backend.add_argument("--replay", metavar="BUNDLE", help="Serve database calls from a recorded bundle (no database)")
 
     sp = p.add_subparsers(dest="cmd", required=True)
 
@@ -249,13 +429,57 @@ def build_parser() -> argparse.ArgumentParser:
     opt.set_defaults(func=cmd_optimize)
 
     wl = sp.add_parser("workload", help="Analyze a file with multiple SQL statements (one per line)")
-    wl.add_argument("--file", required=True)
+    wl.add_argument("--file")
     wl.add_argument("--top-k", type=int, default=10)
     wl.add_argument("--what-if", dest="what_if", action="store_true")
     wl.add_argument("--table", action="store_true")
     wl.add_argument("--markdown", action="store_true")
+    wl.add_argument("--submit", action="store_true", help="Submit as a background job to a running API instead of analyzing locally")
+    wl.add_argument("--job", help="Follow an already submitted job id")
+    wl.add_argument("--follow", action="store_true", help="With --submit, wait for the job and print its result")
+    wl.add_argument("--api", default="http://localhost:8000", help="API base URL for --submit/--job")
+    wl.add_argument("--poll-s", type=float, default=1.0, help="Polling interval when following a job")
+    wl.add_argument(
+        "--format",
+        choices=["json", "text", "ndjson"],
+        default=argparse.SUPPRESS,
+        help="ndjson streams one line per query as it completes, then the merged suggestions",
+    )
     wl.set_defaults(func=cmd_workload)
 
+    lt = sp.add_parser("loadtest", help="Replay a query corpus against a running API under load")
+    lt.add_argument("--api", default="http://localhost:8000", help="API base URL")
+    lt.add_argument("--file", help="Query corpus, one SQL per line (default: small built-in corpus)")
+    lt.add_argument("--mix", default="explain=1,optimize=1", help="Endpoint weights, e.g. explain=5,optimize=3,workload=1")
+    load = lt.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, help="Closed loop: concurrent clients (default 8)")
+    load.add_argument("--rps", type=float, help="Open loop: target requests per second")
+    lt.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    lt.add_argument("--warmup", type=float, default=5.0, help="Seconds of load before measuring")
+    lt.add_argument("--max-inflight", type=int, default=256, help="Open loop: cap on outstanding requests")
+    lt.add_argument("--request-timeout", type=float, default=60.0)
+    lt.add_argument("--nl", action="store_true", help="Request natural-language explanations on /explain")
+    lt.add_argument("--workload-size", type=int, default=10, help="Statements per /workload request")
+    lt.add_argument("--mock-llm", help="URL of a qeo mock-ollama server used by the API; adds its counters to the report")
+    lt.add_argument("--out", help="Write the JSON report to this path")
+    lt.add_argument("--compare", help="Previous JSON report to diff against")
+    lt.add_argument("--format", choices=["json", "text"], default=argparse.SUPPRESS)
+    lt.set_defaults(func=cmd_loadtest, format="text")
+
+    mo = sp.add_parser("mock-ollama", help="Run a stand-in Ollama server with configurable latency and failures")
+    mo.add_argument("--host", default="127.0.0.1")
+    mo.add_argument("--port", type=int, default=11435)
+    mo.add_argument("--latency-ms", type=float, default=200.0, help="Time to first token (median for lognormal)")
+    mo.add_argument("--latency-dist", choices=["fixed", "uniform", "exponential", "lognormal"], default="lognormal")
+    mo.add_argument("--latency-spread", type=float, default=0.5, help="Lognormal sigma, or +/- fraction for uniform")
+    mo.add_argument("--tokens-per-s", type=float, default=50.0, help="Generation speed after the first token (0 = instant)")
+    mo.add_argument("--response-tokens", type=int, default=60)
+    mo.add_argument("--error-rate", type=float, default=0.0, help="Fraction of generations answered with HTTP 500")
+    mo.add_argument("--max-concurrent", type=int, default=4, help="Generations running at once (0 = unlimited)")
+    mo.add_argument("--max-queue", type=int, default=64, help="Generations waiting for a slot before HTTP 503")
+    mo.add_argument("--seed", type=int, help="Seed for latency and error sampling")
+    mo.set_defaults(func=cmd_mock_ollama)
+
     return p
 
 
@@ -263,7 +487,14 @@ def main() -> None:
     parser = build_parser()
     args = parser.parse_args()
     try:
-        code = args.func(args)
+        if getattr(args, "record", None):
+            ctx = replay.recording(args.record)
+        elif getattr(args, "replay", None):
+            ctx = replay.replaying(args.replay)
+        else:
+            ctx = contextlib.nullcontext()
+        with ctx:
+            code = args.func(args)
         sys.exit(code)
     except SystemExit as e:
         raise e
@@ -0,0 +1,285 @@
+"""
+Admission control for expensive database work.
+
+EXPLAIN, EXPLAIN ANALYZE and HypoPG what-if batches are admitted through a
+single priority gate before they touch the database:
+
+- a global cap on concurrent admitted operations (ADMISSION_MAX_CONCURRENT),
+- a per-class cap (ADMISSION_<CLASS>_MAX),
+- a bounded wait queue per class (ADMISSION_QUEUE_MAX); a full queue is
+  rejected immediately with 429,
+- waiters are served by priority (explain, then analyze, then whatif) and FIFO
+  within a class; a waiter not admitted within ADMISSION_MAX_WAIT_MS is shed
+  with 503.
+
+The gate is blocking and meant to be entered from worker threads (request
+pipelines already run off the event loop, see app.core.cancel);
+``aacquire`` waits on the event loop without parking a thread.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.core import cancel
+from app.core.config import settings
+from app.core.metrics import (
+    count_admission_rejected,
+    observe_admission_wait,
+    set_admission_queue_depth,
+)
+
+# Lower value = served first
+PRIORITIES: Dict[str, int] = {"explain": 0, "analyze": 1, "whatif": 2}
+
+
+class AdmissionRejected(Exception):
+    """Raised when an operation is shed; ``status_code`` is 429 (queue full) or 503 (waited too long)."""
+
+    def __init__(self, klass: str, status_code: int, reason: str, retry_after_s: int = 1):
+        super().__init__(f"Server busy: {klass} {reason}")
+        self.klass = klass
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+class _Waiter:
+    __slots__ = ("klass", "event", "admitted", "abandoned", "wake")
+
+    def __init__(self, klass: str, wake: Optional[Callable[[], None]] = None):
+        self.klass = klass
+        self.event = threading.Event()
+        self.admitted = False
+        self.abandoned = False
+        # Called (under the gate lock) on admission; async waiters resolve their future with it
+        self.wake = wake
+
+
+class AdmissionGate:
+    """Priority gate with global and per-class concurrency limits.
+
+    Subclasses may serve other work (see app.core.llm_scheduler) by overriding
+    ``priorities`` and the ``_report_*`` metric hooks.
+    """
+
+    priorities: Dict[str, int] = PRIORITIES
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        class_limits: Dict[str, int],
+        queue_max: int,
+        max_wait_ms: int,
+    ):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.class_limits = {k: max(1, int(v)) for k, v in class_limits.items()}
+        self.queue_max = max(0, int(queue_max))
+        self.max_wait_ms = int(max_wait_ms)
+        self._lock = threading.Lock()
+        self._running = 0
+        self._running_by_class: Dict[str, int] = {k: 0 for k in self.priorities}
+        self._queued_by_class: Dict[str, int] = {k: 0 for k in self.priorities}
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+
+    def _report_depth(self, klass: str, depth: int) -> None:
+        set_admission_queue_depth(klass, depth)
+
+    def _report_wait(self, klass: str, seconds: float) -> None:
+        observe_admission_wait(klass, seconds)
+
+    def _report_rejected(self, klass: str, reason: str) -> None:
+        count_admission_rejected(klass, reason)
+
+    def _can_run(self, klass: str) -> bool:
+        return self._running < self.max_concurrent and self._running_by_class[klass] < self.class_limits.get(klass, self.max_concurrent)
+
+    def _start(self, klass: str) -> None:
+        self._running += 1
+        self._running_by_class[klass] += 1
+
+    def _dispatch(self) -> None:
+        # Admit queued waiters in priority order; a class at its own cap does not block lower classes
+        skipped: List[tuple] = []
+        while self._heap and self._running < self.max_concurrent:
+            item = heapq.heappop(self._heap)
+            w: _Waiter = item[2]
+            if w.abandoned:
+                continue
+            if not self._can_run(w.klass):
+                skipped.append(item)
+                continue
+            self._queued_by_class[w.klass] -= 1
+            self._report_depth(w.klass, self._queued_by_class[w.klass])
+            self._start(w.klass)
+            w.admitted = True
+            w.event.set()
+            if w.wake is not None:
+                w.wake()
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+
+    def _abandon(self, w: _Waiter) -> None:
+        w.abandoned = True
+        self._queued_by_class[w.klass] -= 1
+        self._report_depth(w.klass, self._queued_by_class[w.klass])
+
+    def _enqueue(self, w: _Waiter) -> bool:
+        """Queue ``w``; True when admitted at once, AdmissionRejected (429) when its class queue is full."""
+        klass = w.klass
+        if klass not in self.priorities:
+            raise ValueError(f"unknown admission class: {klass}")
+        with self._lock:
+            heapq.heappush(self._heap, (self.priorities[klass], next(self._seq), w))
+            self._queued_by_class[klass] += 1
+            self._dispatch()
+            if w.admitted:
+                self._report_wait(klass, 0.0)
+                return True
+            if self._queued_by_class[klass] > self.queue_max:
+                self._abandon(w)
+                self._report_rejected(klass, "queue_full")
+                raise AdmissionRejected(klass, 429, "queue full")
+            self._report_depth(klass, self._queued_by_class[klass])
+        return False
+
+    def _finish_wait(self, w: _Waiter, t0: float, wait_ms: int) -> None:
+        with self._lock:
+            if not w.admitted:
+                self._abandon(w)
+                self._report_rejected(w.klass, "wait_timeout")
+                raise AdmissionRejected(w.klass, 503, "wait timeout", retry_after_s=max(1, wait_ms // 1000))
+        self._report_wait(w.klass, time.monotonic() - t0)
+
+    def acquire(self, klass: str, max_wait_ms: Optional[int] = None, abort: Optional[Callable[[], None]] = None) -> None:
+        """Block until admitted; raises AdmissionRejected when shed.
+
+        ``abort`` is called periodically while queued; if it raises, the waiter
+        leaves the queue and the exception propagates (used for client disconnects).
+        """
+        t0 = time.monotonic()
+        w = _Waiter(klass)
+        if self._enqueue(w):
+            return
+        wait_ms = self.max_wait_ms if max_wait_ms is None else max_wait_ms
+        until = t0 + max(wait_ms, 0) / 1000.0
+        while not w.event.is_set():
+            remaining = until - time.monotonic()
+            if remaining <= 0:
+                break
+            w.event.wait(min(remaining, 0.1) if abort else remaining)
+            if abort and not w.event.is_set():
+                try:
+                    abort()
+                except BaseException:
+                    with self._lock:
+                        if not w.admitted:
+                            self._abandon(w)
+                            raise
+                    # Admitted in the meantime: hand the slot straight back
+                    self.release(klass)
+                    raise
+        self._finish_wait(w, t0, wait_ms)
+
+    async def aacquire(self, klass: str, max_wait_ms: Optional[int] = None) -> None:
+        """``acquire`` for the event loop: waits on a future, not a thread.
+
+        A cancelled waiter leaves the queue (or hands back a slot it was just given).
+        """
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        def _resolve() -> None:
+            if not admitted.done():
+                admitted.set_result(None)
+
+        def _wake() -> None:
+            try:
+                loop.call_soon_threadsafe(_resolve)
+            except RuntimeError:
+                # Loop already closed: the waiter is gone, release() below is never reached
+                pass
+
+        t0 = time.monotonic()
+        w = _Waiter(klass, wake=_wake)
+        if self._enqueue(w):
+            return
+        wait_ms = self.max_wait_ms if max_wait_ms is None else max_wait_ms
+        try:
+            await asyncio.wait_for(admitted, timeout=max(wait_ms, 0) / 1000.0)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                if not w.admitted:
+                    self._abandon(w)
+                    raise
+            self.release(klass)
+            raise
+        self._finish_wait(w, t0, wait_ms)
+
+    def release(self, klass: str) -> None:
+        with self._lock:
+            self._running -= 1
+            self._running_by_class[klass] -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, klass: str, max_wait_ms: Optional[int] = None, abort: Optional[Callable[[], None]] = None) -> Iterator[None]:
+        self.acquire(klass, max_wait_ms=max_wait_ms, abort=abort)
+        try:
+            yield
+        finally:
+            self.release(klass)
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                k: {"running": self._running_by_class[k], "queued": self._queued_by_class[k], "limit": self.class_limits.get(k, self.max_concurrent)}
+                for k in self.priorities
+            }
+
+
+_gate: Optional[AdmissionGate] = None
+_gate_lock = threading.Lock()
+
+
+def get_gate() -> AdmissionGate:
+    global _gate
+    with _gate_lock:
+        if _gate is None:
+            _gate = AdmissionGate(
+                max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+                class_limits={
+                    "explain": settings.ADMISSION_EXPLAIN_MAX,
+                    "analyze": settings.ADMISSION_ANALYZE_MAX,
+                    "whatif": settings.ADMISSION_WHATIF_MAX,
+                },
+                queue_max=settings.ADMISSION_QUEUE_MAX,
+                max_wait_ms=settings.ADMISSION_MAX_WAIT_MS,
+            )
+        return _gate
+
+
+def reset_gate() -> None:
+    """Drop the process-wide gate so it is rebuilt from current settings (tests)."""
+    global _gate
+    with _gate_lock:
+        _gate = None
+
+
+@contextmanager
+def slot(klass: str) -> Iterator[None]:
+    """Hold one admission slot of ``klass`` for the duration of the block (no-op when disabled)."""
+    if not settings.ADMISSION_ENABLED:
+        yield
+        return
+    with get_gate().slot(klass, abort=cancel.checkpoint):
+        yield
@@ -0,0 +1,252 @@
+"""
+Cooperative cancellation of in-flight database work.
+
+Request handlers run their blocking pipeline (EXPLAIN, catalog reads, what-if)
+in a worker thread under a CancelScope. Every connection handed out by
+``db.get_conn`` while the scope is active is attached to it, so the scope can
+interrupt the running statement with a connection-level cancel (the same
+mechanism as pg_cancel_backend) when:
+
+- the HTTP client disconnects (reason ``client_disconnect``), or
+- a statement outlives its timeout plus a grace period (reason ``timeout``),
+  a backstop for sessions where statement_timeout did not take effect.
+
+The worker thread is always awaited, so cancelled connections are rolled back
+and returned to the pool by the normal ``get_conn`` exit path.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import count_cancellation
+
+T = TypeVar("T")
+
+_current: contextvars.ContextVar[Optional["CancelScope"]] = contextvars.ContextVar("qeo_cancel_scope", default=None)
+
+
+class QueryCancelled(Exception):
+    """Raised when work was interrupted by a CancelScope."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Query cancelled: {reason}")
+        self.reason = reason
+
+
+class CancelScope:
+    """Tracks the connections used by one request and cancels them on demand."""
+
+    def __init__(self, query_timeout_ms: Optional[int] = None, grace_ms: Optional[int] = None):
+        self.query_timeout_ms = query_timeout_ms
+        self.grace_ms = settings.CANCEL_GRACE_MS if grace_ms is None else grace_ms
+        self.reason: Optional[str] = None
+        self._lock = threading.Lock()
+        # attach token -> (conn, attach time); the same connection may be attached by nested get_conn calls
+        self._active: Dict[object, tuple] = {}
+        self._cancelled_conns: set[int] = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def check(self) -> None:
+        """Raise QueryCancelled if the scope has been cancelled."""
+        if self.reason is not None:
+            raise QueryCancelled(self.reason)
+
+    @contextmanager
+    def attach(self, conn: Any) -> Iterator[Any]:
+        self.check()
+        key = object()
+        with self._lock:
+            self._active[key] = (conn, time.monotonic())
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                self._active.pop(key, None)
+
+    def consume_cancelled(self, conn: Any) -> bool:
+        """True (once) if this scope cancelled ``conn``'s running statement."""
+        with self._lock:
+            if id(conn) in self._cancelled_conns:
+                self._cancelled_conns.discard(id(conn))
+                return True
+        return False
+
+    def _cancel_conn(self, conn: Any) -> None:
+        with self._lock:
+            self._cancelled_conns.add(id(conn))
+        try:
+            conn.cancel()
+        except Exception:
+            pass
+
+    def cancel(self, reason: str) -> None:
+        """Cancel every attached connection and fail any later DB access."""
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            active = [c for c, _ in self._active.values()]
+        count_cancellation(reason)
+        for conn in active:
+            self._cancel_conn(conn)
+
+    def check_deadlines(self, now: Optional[float] = None) -> None:
+        """Cancel statements running longer than query_timeout_ms + grace_ms."""
+        if not self.query_timeout_ms:
+            return
+        limit_s = (self.query_timeout_ms + self.grace_ms) / 1000.0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            overdue = [c for c, t0 in self._active.values() if now - t0 > limit_s and id(c) not in self._cancelled_conns]
+        for conn in overdue:
+            count_cancellation("timeout")
+            self._cancel_conn(conn)
+
+
+def current_scope() -> Optional[CancelScope]:
+    return _current.get()
+
+
+def checkpoint() -> None:
+    """Stop between pipeline stages once the current scope has been cancelled."""
+    scope = _current.get()
+    if scope is not None:
+        scope.check()
+
+
+def status_code(exc: QueryCancelled) -> int:
+    """HTTP status for a cancelled request: 499 (client closed request) or 400 for timeouts."""
+    return 499 if exc.reason == "client_disconnect" else 400
+
+
+@contextmanager
+def attach(conn: Any) -> Iterator[Any]:
+    """Attach ``conn`` to the current scope (no-op outside a scope).
+
+    If the scope cancelled this connection, the error raised by the
+    interrupted statement is re-raised as QueryCancelled.
+    """
+    scope = _current.get()
+    if scope is None:
+        yield conn
+        return
+    with scope.attach(conn):
+        try:
+            yield conn
+        except QueryCancelled:
+            raise
+        except Exception as e:
+            if scope.consume_cancelled(conn):
+                raise QueryCancelled(scope.reason or "timeout") from e
+            raise
+
+
+async def run_cancellable(
+    request: Any,
+    func: Callable[..., T],
+    *args: Any,
+    query_timeout_ms: Optional[int] = None,
+    **kwargs: Any,
+) -> T:
+    """Run blocking ``func`` in a worker thread under a new CancelScope.
+
+    While it runs, polls ``request.is_disconnected()`` and statement deadlines
+    every CANCEL_POLL_MS. If the client went away, raises QueryCancelled once
+    the worker has finished unwinding.
+    """
+    scope = CancelScope(query_timeout_ms=query_timeout_ms)
+    ctx = contextvars.copy_context()
+    ctx.run(_current.set, scope)
+    loop = asyncio.get_running_loop()
+    fut = loop.run_in_executor(None, functools.partial(ctx.run, func, *args, **kwargs))
+    poll_s = max(settings.CANCEL_POLL_MS, 1) / 1000.0
+    while True:
+        done, _ = await asyncio.wait({fut}, timeout=poll_s)
+        if done:
+            break
+        if request is not None and not scope.cancelled:
+            try:
+                if await request.is_disconnected():
+                    scope.cancel("client_disconnect")
+            except Exception:
+                pass
+        scope.check_deadlines()
+    if scope.reason == "client_disconnect":
+        # Nobody is listening for the result; retrieve the worker's exception so it is not logged as unhandled
+        fut.exception()
+        raise QueryCancelled(scope.reason)
+    return fut.result()
+
+
+async def iter_cancellable(
+    request: Any,
+    func: Callable[..., Iterator[T]],
+    *args: Any,
+    query_timeout_ms: Optional[int] = None,
+    **kwargs: Any,
+) -> AsyncIterator[T]:
+    """Streaming ``run_cancellable``: drive the blocking iterator ``func(...)`` in worker threads under a new CancelScope.
+
+    Items are yielded as the iterator produces them. A client disconnect (or
+    the consumer closing this generator early) cancels the scope, which stops
+    running statements, and the iterator is then closed in a worker thread so
+    it can drop work it has not started.
+    """
+    scope = CancelScope(query_timeout_ms=query_timeout_ms)
+    ctx = contextvars.copy_context()
+    ctx.run(_current.set, scope)
+    it = ctx.run(func, *args, **kwargs)
+    loop = asyncio.get_running_loop()
+    poll_s = max(settings.CANCEL_POLL_MS, 1) / 1000.0
+    end = object()
+    fut: Optional[asyncio.Future] = None
+    finished = False
+    try:
+        while True:
+            fut = loop.run_in_executor(None, ctx.run, next, it, end)
+            while True:
+                done, _ = await asyncio.wait({fut}, timeout=poll_s)
+                if done:
+                    break
+                if request is not None and not scope.cancelled:
+                    try:
+                        if await request.is_disconnected():
+                            scope.cancel("client_disconnect")
+                    except Exception:
+                        pass
+                scope.check_deadlines()
+            try:
+                item = fut.result()
+            except QueryCancelled:
+                if scope.reason == "client_disconnect":
+                    # Nobody is reading the stream any more
+                    finished = True
+                    return
+                raise
+            if item is end:
+                finished = True
+                return
+            yield item
+    finally:
+        if not finished:
+            scope.cancel("client_disconnect")
+
+            def _close(_: Any = None) -> None:
+                # After the pending next() has left the context (a context cannot be entered twice)
+                loop.run_in_executor(None, ctx.run, it.close)
+
+            if fut is not None and not fut.done():
+                fut.add_done_callback(_close)
+            else:
+                _close()
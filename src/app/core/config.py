@@ -27,7 +27,22 @@ class Settings:
     LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "dummy")
     LLM_MODEL: str = os.getenv("LLM_MODEL", "llama2")
     LLM_TIMEOUT_S: int = int(os.getenv("LLM_TIMEOUT_S", "30"))
+    # Prompt size in (estimated) tokens; 0 = derived from the model's context window (see app.core.prompts)
+    LLM_PROMPT_MAX_TOKENS: int = int(os.getenv("LLM_PROMPT_MAX_TOKENS", "0"))
+    # Retries (bounded by the request deadline) and circuit breaker for LLM backends (see app.core.llm_adapter)
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_RETRY_BACKOFF_MS: int = int(os.getenv("LLM_RETRY_BACKOFF_MS", "250"))
+    LLM_BREAKER_FAILURES: int = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+    LLM_BREAKER_COOLDOWN_S: float = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
     OLLAMA_HOST: str = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+    # In-process LLM scheduler (see app.core.llm_scheduler): calls past the queue limits get a rule-based explanation
+    LLM_SCHEDULER_ENABLED: bool = os.getenv("LLM_SCHEDULER_ENABLED", "true").lower() == "true"
+    LLM_MAX_CONCURRENT: int = int(os.getenv("LLM_MAX_CONCURRENT", "2"))
+    LLM_BATCH_MAX: int = int(os.getenv("LLM_BATCH_MAX", "1"))
+    LLM_QUEUE_MAX: int = int(os.getenv("LLM_QUEUE_MAX", "16"))
+    LLM_QUEUE_MAX_WAIT_MS: int = int(os.getenv("LLM_QUEUE_MAX_WAIT_MS", "5000"))
+    # Batch-priority explanations: "rules" (instant, app.core.nl_rules) or "llm" (queued behind interactive calls)
+    LLM_BATCH_PROVIDER: str = os.getenv("LLM_BATCH_PROVIDER", "rules")
 
     # API configuration
     API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
@@ -44,6 +59,24 @@ class Settings:
     OPT_TOP_K: int = int(os.getenv("OPT_TOP_K", "10"))
     OPT_ANALYZE_DEFAULT: bool = os.getenv("OPT_ANALYZE_DEFAULT", "false").lower() == "true"
     OPT_TIMEOUT_MS_DEFAULT: int = int(os.getenv("OPT_TIMEOUT_MS_DEFAULT", "10000"))
+    BATCH_PARALLELISM: int = int(os.getenv("BATCH_PARALLELISM", "4"))
+    BATCH_MAX_STATEMENTS: int = int(os.getenv("BATCH_MAX_STATEMENTS", "500"))
+    # Client-disconnect / overdue-statement cancellation (see app.core.cancel)
+    CANCEL_POLL_MS: int = int(os.getenv("CANCEL_POLL_MS", "100"))
+    CANCEL_GRACE_MS: int = int(os.getenv("CANCEL_GRACE_MS", "2000"))
+    # End-to-end request deadline (see app.core.deadline): stages with less budget left are skipped
+    DEADLINE_MIN_STAGE_MS: int = int(os.getenv("DEADLINE_MIN_STAGE_MS", "50"))
+    DEADLINE_MIN_WHATIF_MS: int = int(os.getenv("DEADLINE_MIN_WHATIF_MS", "500"))
+    # Admission control for EXPLAIN / EXPLAIN ANALYZE / what-if (see app.core.admission)
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_MAX_CONCURRENT: int = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+    ADMISSION_EXPLAIN_MAX: int = int(os.getenv("ADMISSION_EXPLAIN_MAX", "8"))
+    ADMISSION_ANALYZE_MAX: int = int(os.getenv("ADMISSION_ANALYZE_MAX", "2"))
+    ADMISSION_WHATIF_MAX: int = int(os.getenv("ADMISSION_WHATIF_MAX", "1"))
+    ADMISSION_QUEUE_MAX: int = int(os.getenv("ADMISSION_QUEUE_MAX", "32"))
+    ADMISSION_MAX_WAIT_MS: int = int(os.getenv("ADMISSION_MAX_WAIT_MS", "5000"))
+    # Share one in-flight computation among identical concurrent /explain and /optimize requests (see app.core.singleflight)
+    SINGLEFLIGHT_ENABLED: bool = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
 
     # Advanced index advisor (EPIC A)
     OPT_SUPPRESS_LOW_GAIN_PCT: float = float(os.getenv("OPT_SUPPRESS_LOW_GAIN_PCT", "5"))
@@ -55,6 +88,24 @@ class Settings:
     METRICS_NAMESPACE: str = os.getenv("METRICS_NAMESPACE", "qeo")
     METRICS_BUCKETS: str = os.getenv("METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2,5")
 
+    # Structured logging (see app.core.logs)
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_QUEUE_MAX: int = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+    LOG_SAMPLE_RATE: float = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+    LOG_SAMPLE_ROUTES: str = os.getenv("LOG_SAMPLE_ROUTES", "/healthz=0.01,/metrics=0")
+    LOG_SLOW_MS: int = int(os.getenv("LOG_SLOW_MS", "1000"))
+
+    # Per-stage tracing (Server-Timing header; optional JSONL trace file)
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "")
+
+    # On-demand profiling (POST /admin/profile, see app.core.profiler); 404 unless enabled, 403 without a token
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_ADMIN_TOKEN: str = os.getenv("PROFILING_ADMIN_TOKEN", "")
+    PROFILING_MAX_SECONDS: int = int(os.getenv("PROFILING_MAX_SECONDS", "60"))
+    PROFILING_INTERVAL_MS: int = int(os.getenv("PROFILING_INTERVAL_MS", "10"))
+    PROFILING_TRACEMALLOC_FRAMES: int = int(os.getenv("PROFILING_TRACEMALLOC_FRAMES", "10"))
+
     # What-if (HypoPG) evaluator configuration
     WHATIF_ENABLED: bool = os.getenv("WHATIF_ENABLED", "false").lower() == "true"
     WHATIF_MAX_TRIALS: int = int(os.getenv("WHATIF_MAX_TRIALS", "10"))
@@ -64,13 +115,32 @@ class Settings:
     WHATIF_GLOBAL_TIMEOUT_MS: int = int(os.getenv("WHATIF_GLOBAL_TIMEOUT_MS", "12000"))
     WHATIF_EARLY_STOP_PCT: float = float(os.getenv("WHATIF_EARLY_STOP_PCT", "2"))
 
+    # Database backend: live, record (capture db results to REPLAY_BUNDLE) or replay (serve them, no database)
+    DB_BACKEND: str = os.getenv("DB_BACKEND", "live").lower()
+    REPLAY_BUNDLE: str = os.getenv("REPLAY_BUNDLE", "")
+
     # Caching / pooling / workload
     CACHE_SCHEMA_TTL_S: int = int(os.getenv("CACHE_SCHEMA_TTL_S", "60"))
     WORKLOAD_MAX_INDEXES: int = int(os.getenv("WORKLOAD_MAX_INDEXES", "5"))
     NL_CACHE_ENABLED: bool = os.getenv("NL_CACHE_ENABLED", "true").lower() == "true"
+    # Explanation cache (see app.core.nl_cache): in-memory LRU, plus a shared SQLite file when NL_CACHE_PATH is set
+    NL_CACHE_MAX_ENTRIES: int = int(os.getenv("NL_CACHE_MAX_ENTRIES", "1000"))
+    NL_CACHE_PATH: str = os.getenv("NL_CACHE_PATH", "")
+    NL_CACHE_DISK_MAX_ENTRIES: int = int(os.getenv("NL_CACHE_DISK_MAX_ENTRIES", "10000"))
+    # Speculative explanations (see app.core.nl_prefetch): /optimize and /explain without nl warm the explanation cache
+    NL_PREFETCH_ENABLED: bool = os.getenv("NL_PREFETCH_ENABLED", "false").lower() == "true"
+    NL_PREFETCH_MAX_CONCURRENT: int = int(os.getenv("NL_PREFETCH_MAX_CONCURRENT", "1"))
+    NL_PREFETCH_MAX_PENDING: int = int(os.getenv("NL_PREFETCH_MAX_PENDING", "16"))
+    NL_PREFETCH_PER_MINUTE: int = int(os.getenv("NL_PREFETCH_PER_MINUTE", "30"))
     POOL_MINCONN: int = int(os.getenv("POOL_MINCONN", "1"))
     POOL_MAXCONN: int = int(os.getenv("POOL_MAXCONN", "5"))
 
+    # Background workload jobs
+    JOBS_DIR: str = os.getenv("JOBS_DIR", ".qeo/jobs")
+    JOBS_MAX_WORKERS: int = int(os.getenv("JOBS_MAX_WORKERS", "2"))
+    JOBS_MAX_QUEUED: int = int(os.getenv("JOBS_MAX_QUEUED", "100"))
+    JOBS_CHECKPOINT_EVERY: int = int(os.getenv("JOBS_CHECKPOINT_EVERY", "10"))
+
     # SQL Linting configuration
     LARGE_TABLE_PATTERNS: List[str] = [
         s.strip() for s in os.getenv(
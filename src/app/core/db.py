@@ -7,13 +7,21 @@ utilities for the Query Explain & Optimize engine.
 
 from contextlib import contextmanager
 import os
-from typing import Any, Dict, List, Optional, Tuple, Union
-import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 import psycopg2
 from psycopg2.extensions import connection as pg_connection
 from psycopg2.extras import RealDictCursor
 
 from app.core.config import settings
+from app.core import admission, cancel, replay
+from app.core.metrics import time_db_explain
+from app.core.tracing import traced
+from app.core.serialization import loads as json_loads, register_psycopg2_json
+
+# Decode EXPLAIN (FORMAT JSON) results with the fast parser inside psycopg2
+register_psycopg2_json()
 
 # Simple opt-in pool & TTL caches (EPIC F)
 _POOL: List[pg_connection] = []
@@ -21,42 +29,119 @@ _CACHE_SCHEMA_TTL_S = int(os.getenv("CACHE_SCHEMA_TTL_S", "0") or 0)
 _SCHEMA_CACHE: Dict[str, Any] = {}
 _SCHEMA_CACHE_TS: Dict[str, float] = {}
 
+# Bumped when this process runs DDL; part of the key for sharing in-flight results (app.core.singleflight)
+_CATALOG_VERSION = 0
+_DDL_RE = re.compile(r"^\s*(create|alter|drop|truncate|comment|rename|reindex|cluster)\b", re.IGNORECASE)
+
 # Optional global connection reuse to support TEMP objects across requests in tests
 _global_conn: Optional[pg_connection] = None
+# One thread at a time in the shared session (BEGIN/SET LOCAL/ROLLBACK must not interleave)
+_global_lock = threading.RLock()
+_pool_lock = threading.Lock()
+# Connection held by the current thread, reused by nested get_conn calls (e.g. HypoPG create + EXPLAIN)
+_held = threading.local()
+
+
+def uses_shared_conn() -> bool:
+    """True when get_conn in this context hands out the process-wide session (QEO_GLOBAL_CONN, no cancel scope)."""
+    if cancel.current_scope() is not None:
+        return False
+    return os.getenv("QEO_GLOBAL_CONN", "1").lower() in ("1", "true", "yes")
+
 
 @contextmanager
 def get_conn() -> pg_connection:
     """
     Get a PostgreSQL connection with proper error handling and automatic closing.
     Uses connection parameters from settings.DB_URL.
+
+    Inside a cancel scope (see app.core.cancel) the connection is registered so
+    the scope can interrupt its running statement; a cancelled statement surfaces
+    as QueryCancelled and the connection is rolled back before reuse. Cancellable
+    work always gets a pooled connection of its own, so cancelling it cannot hit
+    another request's statement; the shared global session (QEO_GLOBAL_CONN) is
+    only used outside a scope, one thread at a time. Nested calls in the same
+    thread get the outer connection.
     """
-    use_global = os.getenv("QEO_GLOBAL_CONN", "1").lower() in ("1", "true", "yes")
-    global _global_conn
-    if use_global:
-        if _global_conn is None or _global_conn.closed:
-            _global_conn = psycopg2.connect(settings.db_url_psycopg)
-        # Do not close global connection on exit to preserve TEMP objects
-        yield _global_conn
+    replay.check_live()
+    scope = cancel.current_scope()
+    if scope is not None:
+        scope.check()
+    held = getattr(_held, "conn", None)
+    if held is not None:
+        with cancel.attach(held) as conn:
+            yield conn
         return
-    # Non-global mode: open/close per context
-    conn_local: Optional[pg_connection] = None
-    # Simple pool reuse
-    pool_min = int(os.getenv("POOL_MINCONN", "1"))
+    if uses_shared_conn():
+        with _global_lock:
+            global _global_conn
+            if _global_conn is None or _global_conn.closed:
+                _global_conn = psycopg2.connect(settings.db_url_psycopg)
+            # Do not close global connection on exit to preserve TEMP objects
+            _held.conn = _global_conn
+            try:
+                with cancel.attach(_global_conn) as conn:
+                    yield conn
+            finally:
+                _held.conn = None
+                _reset_if_dirty(_global_conn)
+        return
+    # Per-context pooled connection
     pool_max = int(os.getenv("POOL_MAXCONN", "5"))
+    with _pool_lock:
+        conn_local = _POOL.pop() if _POOL else None
+    if conn_local is None:
+        conn_local = psycopg2.connect(settings.db_url_psycopg)
+    _held.conn = conn_local
     try:
-        if _POOL:
-            conn_local = _POOL.pop()
-        else:
-            conn_local = psycopg2.connect(settings.db_url_psycopg)
-        try:
-            yield conn_local
-        finally:
-            if len(_POOL) < pool_max:
+        with cancel.attach(conn_local) as conn:
+            yield conn
+    finally:
+        _held.conn = None
+        reusable = _reset_if_dirty(conn_local)
+        with _pool_lock:
+            if reusable and len(_POOL) < pool_max:
                 _POOL.append(conn_local)
-            else:
+                conn_local = None
+        if conn_local is not None:
+            try:
                 conn_local.close()
+            except Exception:
+                pass
+
+
+def catalog_version() -> int:
+    """Process-local catalog version: changes after DDL run through ``run_sql``."""
+    return _CATALOG_VERSION
 
 
+def bump_catalog_version() -> None:
+    global _CATALOG_VERSION
+    _CATALOG_VERSION += 1
+
+
+def _reset_if_dirty(conn: pg_connection, aborted_only: bool = False) -> bool:
+    """Roll back an aborted/open transaction (e.g. after a cancel). False if the connection is unusable."""
+    try:
+        if conn.closed:
+            return False
+        status = conn.get_transaction_status()
+        if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if status == psycopg2.extensions.TRANSACTION_STATUS_INERROR or (
+            not aborted_only and status != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        ):
+            conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def _rows(value: Any) -> List[Tuple]:
+    return [tuple(r) for r in value]
+
+
+@replay.recorded("sql", key=lambda sql, params, **_: f"{replay.normalize_sql(sql)}|{list(params or ())!r}", decode=_rows)
 def run_sql(sql: str, params: Optional[Tuple] = None, timeout_ms: int = 10000) -> List[Tuple]:
     """
     Execute SQL with proper connection handling and timeout.
@@ -85,6 +170,8 @@ def run_sql(sql: str, params: Optional[Tuple] = None, timeout_ms: int = 10000) -
                 except Exception:
                     rows = []
                 cur.execute("COMMIT")
+                if _DDL_RE.match(sql or ""):
+                    bump_catalog_version()
                 return rows
             except Exception as e:
                 try:
@@ -93,6 +180,9 @@ def run_sql(sql: str, params: Optional[Tuple] = None, timeout_ms: int = 10000) -
                     pass
                 raise e
 
+@time_db_explain
+@traced("explain")
+@replay.recorded("explain", key=lambda sql, analyze, **_: f"{'analyze' if analyze else 'plan'}:{replay.normalize_sql(sql)}")
 def run_explain(sql: str, analyze: bool = False, timeout_ms: int = 10000) -> Dict:
     """
     Run EXPLAIN on a query and return the execution plan.
@@ -104,6 +194,9 @@ def run_explain(sql: str, analyze: bool = False, timeout_ms: int = 10000) -> Dic
     
     Returns:
         Normalized plan dictionary
+
+    Raises:
+        AdmissionRejected: if admission control sheds the request (busy database)
     """
     explain_options = ["FORMAT JSON"]
     if analyze:
@@ -111,7 +204,8 @@ def run_explain(sql: str, analyze: bool = False, timeout_ms: int = 10000) -> Dic
     
     explain_sql = f"EXPLAIN ({', '.join(explain_options)}) {sql}"
     
-    with get_conn() as conn:
+    # Admitted before taking a connection; ANALYZE executes the query and gets its own (smaller) class
+    with admission.slot("analyze" if analyze else "explain"), get_conn() as conn:
         with conn.cursor() as cur:
             try:
                 try:
@@ -128,7 +222,7 @@ def run_explain(sql: str, analyze: bool = False, timeout_ms: int = 10000) -> Dic
                 cur.execute("COMMIT")
                 # Handle both text and native JSON formats
                 if isinstance(result[0], str):
-                    plan_json = json.loads(result[0])
+                    plan_json = json_loads(result[0])
                 else:
                     plan_json = result[0]
                 # Normalize plan shape: EXPLAIN returns a list with one item
@@ -147,6 +241,8 @@ def run_explain(sql: str, analyze: bool = False, timeout_ms: int = 10000) -> Dic
                     pass
                 raise Exception(f"EXPLAIN failed: {str(e)}")
 
+@traced("explain_costs")
+@replay.recorded("explain_costs", key=lambda sql, **_: replay.normalize_sql(sql))
 def run_explain_costs(sql: str, timeout_ms: int = 10000) -> Dict:
     """
     Run EXPLAIN with costs enabled (no analyze, no timing) and return plan JSON.
@@ -171,7 +267,7 @@ def run_explain_costs(sql: str, timeout_ms: int = 10000) -> Dict:
                     pass
                 raise e
             if isinstance(result[0], str):
-                plan_json = json.loads(result[0])
+                plan_json = json_loads(result[0])
             else:
                 plan_json = result[0]
             plan_obj = plan_json[0] if isinstance(plan_json, list) and plan_json else plan_json
@@ -181,13 +277,35 @@ def run_explain_costs(sql: str, timeout_ms: int = 10000) -> Dict:
                 return {"Plan": plan_obj}
             return {"Plan": {}}
 
-def fetch_schema(schema: str = "public", table: Optional[str] = None) -> Dict:
+@replay.recorded(
+    "hypo_costs",
+    key=lambda sql, table, cols, **_: f"{table}({','.join(cols)}):{replay.normalize_sql(sql)}",
+)
+def run_hypothetical_costs(sql: str, table: str, cols: List[str], timeout_ms: int = 10000) -> Dict:
+    """
+    EXPLAIN costs of ``sql`` with one HypoPG hypothetical index on ``table(cols)``.
+
+    The hypothetical index lives in the session only for the duration of the call.
+    """
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+            cur.execute("SELECT hypopg_reset()")
+            cur.execute("SELECT * FROM hypopg_create_index(%s)", (f"CREATE INDEX ON {table} ({', '.join(cols)})",))
+            plan = run_explain_costs(sql, timeout_ms=int(timeout_ms))
+            cur.execute("SELECT hypopg_reset()")
+            return plan
+
+@traced("catalog")
+@replay.recorded("schema", key=lambda schema, table, **_: f"{schema}.{table or '*'}")
+def fetch_schema(schema: str = "public", table: Optional[str] = None, timeout_ms: Optional[int] = None) -> Dict:
     """
     Fetch database schema information using information_schema views.
     
     Args:
         schema: Schema name to inspect
         table: Optional table name to filter results
+        timeout_ms: Optional statement timeout for the catalog queries
     
     Returns:
         Dictionary containing tables, columns, indexes, and constraints
@@ -203,6 +321,8 @@ def fetch_schema(schema: str = "public", table: Optional[str] = None) -> Dict:
                 return cached
     with get_conn() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if timeout_ms:
+                cur.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
             # Base table query
             table_where = f"AND table_name = %s" if table else ""
             table_params = (schema, table) if table else (schema,)
@@ -322,6 +442,8 @@ def fetch_schema(schema: str = "public", table: Optional[str] = None) -> Dict:
             return result
 
 
+@traced("stats")
+@replay.recorded_per_table("table_stats")
 def fetch_table_stats(tables: List[str], schema: str = "public", timeout_ms: int = 5000) -> Dict[str, Any]:
     """
     Fetch per-table stats for given tables: approximate row counts and existing indexes.
@@ -394,6 +516,7 @@ def fetch_table_stats(tables: List[str], schema: str = "public", timeout_ms: int
     return out
 
 
+@replay.recorded("table_rows", key=lambda schema, table, **_: f"{schema}.{table}")
 def get_table_stats(schema: str, table: str, timeout_ms: int = 5000) -> Dict[str, Any]:
     """Return reltuples and basic table stats.
 
@@ -416,6 +539,13 @@ def get_table_stats(schema: str, table: str, timeout_ms: int = 5000) -> Dict[str
             return {"rows": float(r.get("rows") or 0.0)}
 
 
+@traced("column_stats")
+@replay.recorded(
+    "column_stats",
+    key=lambda schema, table, **_: f"{schema}.{table}",
+    encode=replay.table_entry,
+    decode=replay.table_value,
+)
 def get_column_stats(schema: str, table: str, timeout_ms: int = 5000) -> Dict[str, Dict[str, Any]]:
     """Return pg_stats per column: { col: { n_distinct, null_frac, avg_width } }.
     Safe defaults when missing.
@@ -438,4 +568,36 @@ def get_column_stats(schema: str, table: str, timeout_ms: int = 5000) -> Dict[st
                     "null_frac": float(r.get("null_frac") or 0.0),
                     "avg_width": int(r.get("avg_width") or 0),
                 }
-    return out
\ No newline at end of file
+    return out
+
+
+@traced("column_stats")
+@replay.recorded_per_table("column_stats")
+def get_column_stats_many(tables: List[str], schema: str = "public", timeout_ms: int = 5000) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Batch variant of get_column_stats for several tables in one catalog query.
+
+    Returns { table: { col: { n_distinct, null_frac, avg_width } } }; tables
+    without pg_stats rows map to an empty dict.
+    """
+    norm_tables = sorted({t for t in tables if t and not t.startswith("(")})
+    out: Dict[str, Dict[str, Dict[str, Any]]] = {t: {} for t in norm_tables}
+    if not norm_tables:
+        return out
+    with get_conn() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f"SET LOCAL statement_timeout = {timeout_ms}")
+            cur.execute(
+                """
+                SELECT tablename AS table_name, attname AS column, n_distinct, null_frac, avg_width
+                FROM pg_stats
+                WHERE schemaname = %s AND tablename = ANY(%s)
+                """,
+                (schema, norm_tables),
+            )
+            for r in cur.fetchall() or []:
+                out.setdefault(str(r.get("table_name")), {})[str(r.get("column"))] = {
+                    "n_distinct": float(r.get("n_distinct") or 0.0),
+                    "null_frac": float(r.get("null_frac") or 0.0),
+                    "avg_width": int(r.get("avg_width") or 0),
+                }
+    return out
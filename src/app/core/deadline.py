@@ -0,0 +1,85 @@
+"""
+Request-scoped deadline budget.
+
+A Deadline is created once per request from the caller's budget and threaded
+through the pipeline (parse, EXPLAIN, schema/stats fetch, advisor, what-if,
+LLM). Each stage asks for its share with ``stage_ms(cap)`` — the remaining
+budget, capped by the stage's own default timeout — and skips itself
+(recording the stage name in ``skipped``) when too little is left, so the
+whole request stays close to what the caller asked for.
+
+The active deadline is also published in a context variable for code that is
+reached without an explicit parameter (LLM providers).
+"""
+
+from __future__ import annotations
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from app.core.config import settings
+
+_current: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar("qeo_deadline", default=None)
+
+
+class Deadline:
+    """Monotonic end-to-end time budget."""
+
+    __slots__ = ("budget_ms", "_end", "skipped")
+
+    def __init__(self, budget_ms: float):
+        self.budget_ms = int(budget_ms)
+        self._end = time.monotonic() + max(float(budget_ms), 0.0) / 1000.0
+        self.skipped: List[str] = []
+
+    def remaining_ms(self) -> int:
+        return max(0, int((self._end - time.monotonic()) * 1000))
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self._end
+
+    def stage_ms(self, cap_ms: Optional[float] = None, min_ms: Optional[int] = None) -> int:
+        """Timeout for the next stage: remaining budget capped at ``cap_ms``.
+
+        Returns 0 when less than ``min_ms`` (DEADLINE_MIN_STAGE_MS by default)
+        is left; callers treat 0 as "skip this stage".
+        """
+        floor = settings.DEADLINE_MIN_STAGE_MS if min_ms is None else min_ms
+        remaining = self.remaining_ms()
+        if remaining < max(floor, 1):
+            return 0
+        if cap_ms is not None:
+            remaining = min(remaining, int(cap_ms))
+        return max(remaining, 1)
+
+    def skip(self, stage: str) -> None:
+        if stage not in self.skipped:
+            self.skipped.append(stage)
+
+    def summary(self) -> dict:
+        return {"budgetMs": self.budget_ms, "remainingMs": self.remaining_ms(), "skipped": list(self.skipped)}
+
+
+def current() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def use(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Publish ``deadline`` as the current deadline for the duration of the block."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def stage_ms(cap_ms: float, min_ms: Optional[int] = None) -> int:
+    """``cap_ms`` bounded by the current deadline, if any (0 = no budget left)."""
+    d = _current.get()
+    if d is None:
+        return int(cap_ms)
+    return d.stage_ms(cap_ms, min_ms=min_ms)
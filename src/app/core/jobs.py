@@ -0,0 +1,345 @@
+"""Background job queue for workload analysis.
+
+Workloads submitted as jobs run on a bounded thread pool instead of the request
+worker. Job state is checkpointed under JOBS_DIR: the statements are saved once
+in ``<id>.sqls.json``, per-query results are appended to ``<id>.results.jsonl``
+and a small ``<id>.json`` holds the status, so queued or running jobs resume
+after a restart from the last checkpoint rather than starting over. A ``<id>.lock`` file (flock) keeps workers sharing JOBS_DIR from
+running the same job twice; the others serve status and results of jobs they do
+not own from the checkpoint files.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Optional
+
+from app.core import workload
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+TERMINAL_STATUSES = ("done", "failed")
+# Ids become file names under JOBS_DIR
+_JOB_ID = re.compile(r"[A-Za-z0-9_-]+")
+
+
+class JobQueueFull(Exception):
+    """Raised when the number of pending jobs reached JOBS_MAX_QUEUED."""
+
+
+@dataclass
+class WorkloadJob:
+    id: str
+    sqls: List[str]
+    top_k: int = 10
+    what_if: bool = False
+    status: str = "queued"  # "queued" | "running" | "done" | "failed"
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    processed: int = 0
+    per_query: List[Dict[str, Any]] = field(default_factory=list)
+    suggestions: List[Dict[str, Any]] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def total(self) -> int:
+        return len(self.sqls)
+
+    def progress(self) -> Dict[str, Any]:
+        pct = (self.processed / self.total * 100.0) if self.total else 100.0
+        return {"processed": self.processed, "total": self.total, "pct": float(f"{pct:.1f}")}
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": self.progress(),
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Owns the worker pool, the in-memory job table and the checkpoint files."""
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        checkpoint_every: Optional[int] = None,
+    ) -> None:
+        self.directory = directory or settings.JOBS_DIR
+        self.max_queued = int(max_queued if max_queued is not None else settings.JOBS_MAX_QUEUED)
+        self.checkpoint_every = max(1, int(checkpoint_every or settings.JOBS_CHECKPOINT_EVERY))
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, int(max_workers or settings.JOBS_MAX_WORKERS)),
+            thread_name_prefix="qeo-job",
+        )
+        self._jobs: Dict[str, WorkloadJob] = {}
+        self._lock = threading.Lock()
+        # Checkpoint writes; per job: results already in the sidecar, its committed size, lock file fd
+        self._io_lock = threading.Lock()
+        self._written: Dict[str, int] = {}
+        self._results_bytes: Dict[str, int] = {}
+        self._claims: Dict[str, int] = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    # ---- persistence ----
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _results_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.results.jsonl")
+
+    def _sqls_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.sqls.json")
+
+    def _write_json(self, path: str, data: Any) -> None:
+        # Unique per writer: workers sharing JOBS_DIR never interleave into one temp file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"), ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _checkpoint(self, job: WorkloadJob) -> None:
+        """Append results not yet on disk to the job's JSONL sidecar, then rewrite its (small) status file.
+
+        The statements are written once at submit (``<id>.sqls.json``). The
+        status file records how many results and bytes of the sidecar are
+        committed, so a crash between the two writes loses nothing already
+        checkpointed and recovery can drop a torn tail.
+        """
+        with self._io_lock:
+            written = self._written.get(job.id, 0)
+            with self._lock:
+                data = {f.name: getattr(job, f.name) for f in fields(job) if f.name not in ("sqls", "per_query")}
+                new = job.per_query[written:job.processed]
+            size = self._results_bytes.get(job.id, 0)
+            if new:
+                lines = "".join(json.dumps(e, separators=(",", ":"), ensure_ascii=False) + "\n" for e in new)
+                with open(self._results_path(job.id), "ab") as f:
+                    f.write(lines.encode("utf-8"))
+                    size = f.tell()
+                self._written[job.id] = written + len(new)
+                self._results_bytes[job.id] = size
+            data["processed"] = written + len(new)
+            data["results_bytes"] = size
+            self._write_json(self._path(job.id), data)
+
+    def _load(self, job_id: str, repair: bool = False, with_results: bool = True) -> Optional[WorkloadJob]:
+        """Job from its status file and committed results; None when unreadable.
+
+        ``repair`` (only for the process holding the job's lock) cuts the
+        sidecar back to what the status file committed before the job resumes.
+        Without ``with_results`` only the status is read (listing).
+        """
+        if not _JOB_ID.fullmatch(job_id or ""):
+            return None
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            size = int(data.pop("results_bytes", 0))
+            # Checkpoints written before the sidecars existed kept statements and results inline
+            inline = data.pop("per_query", [])
+            if "sqls" not in data:
+                with open(self._sqls_path(job_id), "r", encoding="utf-8") as f:
+                    data["sqls"] = json.load(f)
+            job = WorkloadJob(**data)
+        except Exception:
+            return None
+        if not with_results:
+            return job
+        results: List[Dict[str, Any]] = []
+        path = self._results_path(job_id)
+        if size and os.path.exists(path):
+            with open(path, "rb") as f:
+                results = [json.loads(line) for line in f.read(size).decode("utf-8").splitlines() if line]
+        if repair and os.path.exists(path):
+            # Drop anything appended after the last status write
+            os.truncate(path, size if results else 0)
+        job.per_query = (results or inline)[: job.processed]
+        job.processed = len(job.per_query)
+        if repair:
+            self._written[job_id] = len(job.per_query) if results else 0
+            self._results_bytes[job_id] = size if results else 0
+        return job
+
+    def _claim(self, job_id: str) -> bool:
+        """Take the job's lock file so only one process sharing JOBS_DIR runs it (held until it finishes)."""
+        if fcntl is None:  # pragma: no cover - no cross-process locking on this platform
+            return True
+        fd = os.open(os.path.join(self.directory, f"{job_id}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        with self._lock:
+            self._claims[job_id] = fd
+        return True
+
+    def _release(self, job_id: str) -> None:
+        with self._lock:
+            fd = self._claims.pop(job_id, None)
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def recover(self) -> List[str]:
+        """Load checkpointed jobs and re-enqueue the ones that did not finish.
+
+        An unfinished job is resumed only by the process that gets its lock
+        file; other uvicorn workers sharing JOBS_DIR leave it alone.
+
+        Returns the ids of resumed jobs.
+        """
+        resumed: List[str] = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json") or name.endswith(".sqls.json"):
+                continue
+            job_id = name[: -len(".json")]
+            with self._lock:
+                if job_id in self._jobs:
+                    continue
+            job = self._load(job_id)
+            if job is None:
+                continue
+            if job.status not in TERMINAL_STATUSES:
+                if not self._claim(job_id):
+                    continue
+                # Re-read under the lock: the previous owner may have finished it meanwhile
+                job = self._load(job_id, repair=True)
+                if job is None or job.status in TERMINAL_STATUSES:
+                    self._release(job_id)
+                    if job is None:
+                        continue
+            with self._lock:
+                self._jobs[job.id] = job
+            if job.status not in TERMINAL_STATUSES:
+                # Results past the last checkpoint were lost; resume from there
+                job.status = "queued"
+                self._executor.submit(self._run, job.id)
+                resumed.append(job.id)
+        return resumed
+
+    # ---- public API ----
+
+    def submit(self, sqls: List[str], top_k: int = 10, what_if: bool = False) -> WorkloadJob:
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j.status not in TERMINAL_STATUSES)
+            if pending >= self.max_queued:
+                raise JobQueueFull(f"Job queue full ({pending} pending jobs)")
+            job = WorkloadJob(
+                id=uuid.uuid4().hex,
+                sqls=list(sqls),
+                top_k=int(top_k),
+                what_if=bool(what_if),
+                created_at=time.time(),
+            )
+            self._jobs[job.id] = job
+        self._claim(job.id)
+        self._write_json(self._sqls_path(job.id), job.sqls)
+        self._checkpoint(job)
+        self._executor.submit(self._run, job.id)
+        return job
+
+    def get(self, job_id: str) -> Optional[WorkloadJob]:
+        """The job, from memory or, when another worker sharing JOBS_DIR owns it, from its last checkpoint."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None else self._load(job_id)
+
+    def list(self) -> List[WorkloadJob]:
+        """Jobs of every worker sharing JOBS_DIR (others' as of their last checkpoint, without results)."""
+        with self._lock:
+            found = dict(self._jobs)
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json") or name.endswith(".sqls.json"):
+                continue
+            job_id = name[: -len(".json")]
+            if job_id not in found:
+                job = self._load(job_id, with_results=False)
+                if job is not None:
+                    found[job_id] = job
+        return sorted(found.values(), key=lambda j: (j.created_at, j.id))
+
+    def results_since(self, job_id: str, offset: int) -> List[Dict[str, Any]]:
+        """Return per-query results from ``offset`` onward (safe while running)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return list(job.per_query[offset:])
+        job = self._load(job_id)
+        return list(job.per_query[offset:]) if job is not None else []
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    # ---- worker ----
+
+    def _run(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job is None or job.status in TERMINAL_STATUSES:
+            return
+        with self._lock:
+            job.status = "running"
+            job.started_at = job.started_at or time.time()
+        self._checkpoint(job)
+        try:
+            for entry in workload.iter_workload(job.sqls, start=job.processed):
+                with self._lock:
+                    job.per_query.append(entry)
+                    job.processed += 1
+                if job.processed % self.checkpoint_every == 0:
+                    self._checkpoint(job)
+            merged = workload.merge_per_query(job.per_query, job.top_k)
+            with self._lock:
+                job.suggestions = merged
+                job.status = "done"
+                job.finished_at = time.time()
+        except Exception as e:
+            with self._lock:
+                job.status = "failed"
+                job.error = str(e)
+                job.finished_at = time.time()
+        self._checkpoint(job)
+        self._release(job.id)
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_manager() -> JobManager:
+    """Return the process-wide job manager, recovering checkpointed jobs on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+            _manager.recover()
+        return _manager
+
+
+def shutdown_manager() -> None:
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.shutdown(wait=False)
+            _manager = None
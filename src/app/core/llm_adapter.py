@@ -3,17 +3,36 @@ LLM provider interface and factory.
 
 This module provides a common interface for LLM providers and a factory
 to instantiate the configured provider.
+
+Providers are long-lived singletons (one per provider name) so HTTP clients
+and their keep-alive connections are reused across requests. Each provider
+name has a circuit breaker: after LLM_BREAKER_FAILURES consecutive failures
+it opens and ``get_llm`` returns the rules provider without touching the
+backend for LLM_BREAKER_COOLDOWN_S; then a single trial call is let through
+(half-open) and its outcome closes or re-opens the breaker. The trial is
+claimed by the provider when it actually contacts the backend, not by
+``get_llm``; a provider whose breaker refuses the call raises CircuitOpen.
 """
 
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any
+import asyncio
+from typing import Any, AsyncIterator, Optional, Dict, Iterator
 import importlib
+import threading
+import time
+from contextlib import contextmanager
 
 import os
 from app.core.config import settings
+from app.core.metrics import count_llm_short_circuit, set_llm_breaker_state
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers."""
+
+    # Local providers (no backend call) are never queued by the scheduler
+    local: bool = False
+    # Structured providers explain from the plan itself (explain_plan context), not the prompt text
+    structured: bool = False
     
     @abstractmethod
     def complete(self, prompt: str, system: Optional[str] = None) -> str:
@@ -32,71 +51,247 @@ class LLMProvider(ABC):
         """
         pass
 
+    def stream(self, prompt: str, system: Optional[str] = None) -> Iterator[str]:
+        """
+        Generate a completion incrementally, yielding text pieces as they arrive.
+        
+        Providers without native streaming yield the whole completion at once.
+        """
+        yield self.complete(prompt, system=system)
+
+    async def acomplete(self, prompt: str, system: Optional[str] = None) -> str:
+        """
+        Async ``complete`` for use on the event loop.
+
+        The default runs the blocking ``complete`` in a worker thread; providers
+        with a native async client override it.
+        """
+        return await asyncio.to_thread(self.complete, prompt, system)
+
+    async def astream(self, prompt: str, system: Optional[str] = None) -> AsyncIterator[str]:
+        """Async ``stream``; the default yields ``acomplete`` in one piece."""
+        yield await self.acomplete(prompt, system=system)
+
+    def explain_plan(self, prompt: str, system: Optional[str] = None, **context: Any) -> str:
+        """
+        Explain a plan; ``context`` holds sql, plan, warnings, metrics, audience, style and length.
+
+        Text models only need the prompt (built from the same context), so the default is ``complete``.
+        """
+        return self.complete(prompt, system=system)
+
+    async def astream_plan(self, prompt: str, system: Optional[str] = None, **context: Any) -> AsyncIterator[str]:
+        """Async streaming ``explain_plan``; the default is ``astream``."""
+        async for piece in self.astream(prompt, system=system):
+            yield piece
+
+    async def aclose(self) -> None:
+        """Release clients held by the provider (called when providers are reset); most hold none."""
+        return None
+
+
+class CircuitOpen(Exception):
+    """Raised by a provider whose breaker refused the call (open, or its half-open trial is taken)."""
+
+    def __init__(self, name: str):
+        super().__init__(f"{name} circuit breaker is open")
+        self.name = name
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open (cooldown) -> half-open (one trial) -> closed/open.
+
+    ``available`` is a non-claiming check for routing (get_llm); the half-open
+    trial slot is only claimed by ``allow`` / ``call`` where the backend is
+    actually contacted, and handed back when a call ends without a verdict.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, cooldown_s: float, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown_s = float(cooldown_s)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.state = self.CLOSED
+
+    def _set(self, state: str) -> None:
+        self.state = state
+        set_llm_breaker_state(self.name, state)
+
+    def _refresh(self) -> None:
+        if self.state == self.OPEN and self._clock() - self._opened_at >= self.cooldown_s:
+            self._set(self.HALF_OPEN)
+            self._trial_in_flight = False
+
+    def available(self) -> bool:
+        """Whether a call could go to the backend now; does not claim the half-open trial."""
+        with self._lock:
+            self._refresh()
+            return self.state == self.CLOSED or (self.state == self.HALF_OPEN and not self._trial_in_flight)
+
+    def _claim(self) -> Optional[bool]:
+        # None: refused; True: this call holds the half-open trial; False: closed, no trial involved
+        with self._lock:
+            self._refresh()
+            if self.state == self.CLOSED:
+                return False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return None
+
+    def allow(self) -> bool:
+        """Whether a call may go to the backend now (claims the trial slot when half-open)."""
+        return self._claim() is not None
+
+    def release(self) -> None:
+        """Hand back an undecided half-open trial (the call ended without reaching a verdict)."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial_in_flight = False
+
+    @contextmanager
+    def call(self) -> Iterator["CircuitBreaker"]:
+        """Guard one backend call: raises CircuitOpen when refused; an undecided trial is released on exit."""
+        trial = self._claim()
+        if trial is None:
+            raise CircuitOpen(self.name)
+        try:
+            yield self
+        finally:
+            if trial:
+                self.release()
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self.state != self.CLOSED:
+                self._set(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                self._set(self.OPEN)
+
+
+_PROVIDER_MAP = {
+    "dummy": "app.providers.provider_dummy",
+    "ollama": "app.providers.provider_ollama",
+    "rules": "app.providers.provider_rules",
+}
+
+_instances: Dict[str, LLMProvider] = {}
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def breaker(provider_name: str) -> CircuitBreaker:
+    """The circuit breaker guarding ``provider_name`` (created on first use)."""
+    with _registry_lock:
+        b = _breakers.get(provider_name)
+        if b is None:
+            b = _breakers[provider_name] = CircuitBreaker(
+                provider_name, settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_COOLDOWN_S
+            )
+        return b
+
+
+def _instance(provider_name: str) -> LLMProvider:
+    with _registry_lock:
+        inst = _instances.get(provider_name)
+        if inst is not None:
+            return inst
+    provider_module = _PROVIDER_MAP[provider_name]
+    # Import the provider module
+    module = importlib.import_module(provider_module)
+
+    # Get the provider class (assumed to be the only class inheriting from LLMProvider)
+    provider_class = None
+    for attr in dir(module):
+        obj = getattr(module, attr)
+        if (isinstance(obj, type) and
+            issubclass(obj, LLMProvider) and
+            obj != LLMProvider):
+            provider_class = obj
+            break
+
+    if not provider_class:
+        raise ValueError(f"No LLMProvider implementation found in {provider_module}")
+
+    with _registry_lock:
+        # Another thread may have created it meanwhile; keep the first
+        return _instances.setdefault(provider_name, provider_class())
+
+
+def provider_name(llm: LLMProvider) -> str:
+    """Name of the provider ``llm`` belongs to (the configured one may have fallen back to rules)."""
+    cls_name = type(llm).__name__.lower()
+    if "dummy" in cls_name:
+        return "dummy"
+    if "rules" in cls_name:
+        return "rules"
+    if "ollama" in cls_name:
+        return "ollama"
+    return os.getenv("LLM_PROVIDER", getattr(settings, "LLM_PROVIDER", "dummy"))
+
+
+def fallback_provider() -> LLMProvider:
+    """Rule-based provider used when the configured backend is unhealthy or too busy (and for batch callers)."""
+    return _instance("rules")
+
+
 def get_llm() -> LLMProvider:
     """
     Get the configured LLM provider instance.
-    
+
     The provider is determined by settings.LLM_PROVIDER:
     - "dummy": Returns fixed responses (for testing)
     - "ollama": Uses local Ollama server
-    
+    - "rules": Deterministic explanations from the plan (app.core.nl_rules)
+
+    While the provider's circuit breaker is open the rules provider is
+    returned instead.
+
     Returns:
         LLMProvider instance
-    
+
     Raises:
         ValueError: If provider not found or initialization fails
     """
-    provider_map = {
-        "dummy": "app.providers.provider_dummy",
-        "ollama": "app.providers.provider_ollama"
-    }
-    
     # Always read from env at call time to respect test overrides
     provider_name = os.getenv("LLM_PROVIDER", "dummy")  # Default to dummy if not set
-    provider_module = provider_map.get(provider_name)
-    if not provider_module:
+    if provider_name not in _PROVIDER_MAP:
         raise ValueError(
             f"Unknown LLM provider: {provider_name}. "
-            f"Valid options are: {list(provider_map.keys())}"
+            f"Valid options are: {list(_PROVIDER_MAP.keys())}"
         )
-    
+
     try:
-        # Import the provider module
-        module = importlib.import_module(provider_module)
-        
-        # Get the provider class (assumed to be the only class inheriting from LLMProvider)
-        provider_class = None
-        for attr in dir(module):
-            obj = getattr(module, attr)
-            if (isinstance(obj, type) and 
-                issubclass(obj, LLMProvider) and 
-                obj != LLMProvider):
-                provider_class = obj
-                break
-        
-        if not provider_class:
-            raise ValueError(f"No LLMProvider implementation found in {provider_module}")
-        
-        # Instantiate the provider
-        instance = provider_class()
-        
-        # If ollama selected but unavailable, fallback to dummy
-        if provider_name == "ollama":
-            try:
-                from app.providers.provider_ollama import OllamaLLMProvider as _OL
-                if hasattr(_OL, "is_available") and not _OL.is_available():
-                    # fallback to dummy
-                    module = importlib.import_module(provider_map["dummy"])
-                    for attr in dir(module):
-                        obj = getattr(module, attr)
-                        if (isinstance(obj, type) and issubclass(obj, LLMProvider) and obj != LLMProvider):
-                            return obj()
-            except Exception:
-                pass
-        
-        return instance
-        
+        if provider_name not in ("dummy", "rules") and not breaker(provider_name).available():
+            # Backend unhealthy: fail fast to the deterministic provider
+            count_llm_short_circuit(provider_name)
+            return fallback_provider()
+        return _instance(provider_name)
     except Exception as e:
         raise ValueError(
             f"Failed to initialize LLM provider '{provider_name}': {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+async def reset_providers() -> None:
+    """Close and forget provider singletons and breakers (shutdown, settings changes, tests)."""
+    with _registry_lock:
+        instances = list(_instances.values())
+        _instances.clear()
+        _breakers.clear()
+    for inst in instances:
+        await inst.aclose()
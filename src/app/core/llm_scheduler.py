@@ -0,0 +1,166 @@
+"""
+In-process scheduler for LLM calls.
+
+A local Ollama server runs only a few generations at a time; without a limit a
+burst of ``nl=true`` requests queues up inside Ollama and every request times
+out together. Calls to the configured provider go through a priority gate (the
+admission gate of app.core.admission with LLM classes):
+
+- at most LLM_MAX_CONCURRENT calls run at once, batch callers at most LLM_BATCH_MAX;
+- interactive callers (/explain, /explain/stream) are served before batch ones,
+  FIFO within a priority;
+- a call that finds LLM_QUEUE_MAX callers already waiting, or is not started
+  within LLM_QUEUE_MAX_WAIT_MS (and half of what is left of the request
+  deadline, so an admitted call still has time to generate), is served by the
+  rule-based provider (app.core.nl_rules) instead;
+- batch callers get the rule-based provider without queueing unless
+  LLM_BATCH_PROVIDER=llm;
+- speculative callers (app.core.nl_prefetch) come last, at most
+  NL_PREFETCH_MAX_CONCURRENT at once.
+
+Local providers (dummy, rules) are never queued.
+
+Queue depth and wait are exported as ``qeo_llm_queue_depth{priority}`` and
+``qeo_llm_queue_wait_seconds{priority}``, fallbacks as
+``qeo_llm_fallback_total{priority,reason}``.
+"""
+
+from __future__ import annotations
+
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional
+
+from app.core import deadline, llm_adapter
+from app.core.admission import AdmissionGate, AdmissionRejected
+from app.core.config import settings
+from app.core.llm_adapter import LLMProvider
+from app.core.logs import get_logger
+from app.core.metrics import (
+    count_llm_fallback,
+    observe_llm_queue_wait,
+    set_llm_queue_depth,
+)
+
+_log = get_logger("llm.scheduler")
+
+# Lower value = served first
+PRIORITIES: Dict[str, int] = {"interactive": 0, "batch": 1, "speculative": 2}
+
+
+class LLMGate(AdmissionGate):
+    """Admission gate over LLM priorities, reporting to the LLM queue metrics."""
+
+    priorities = PRIORITIES
+
+    def _report_depth(self, klass: str, depth: int) -> None:
+        set_llm_queue_depth(klass, depth)
+
+    def _report_wait(self, klass: str, seconds: float) -> None:
+        observe_llm_queue_wait(klass, seconds)
+
+    def _report_rejected(self, klass: str, reason: str) -> None:
+        count_llm_fallback(klass, reason)
+
+
+_gate: Optional[LLMGate] = None
+_gate_lock = threading.Lock()
+
+
+def get_gate() -> LLMGate:
+    global _gate
+    with _gate_lock:
+        if _gate is None:
+            _gate = LLMGate(
+                max_concurrent=settings.LLM_MAX_CONCURRENT,
+                class_limits={
+                    "interactive": settings.LLM_MAX_CONCURRENT,
+                    "batch": settings.LLM_BATCH_MAX,
+                    "speculative": settings.NL_PREFETCH_MAX_CONCURRENT,
+                },
+                queue_max=settings.LLM_QUEUE_MAX,
+                max_wait_ms=settings.LLM_QUEUE_MAX_WAIT_MS,
+            )
+        return _gate
+
+
+def reset_gate() -> None:
+    """Drop the process-wide gate so it is rebuilt from current settings (tests)."""
+    global _gate
+    with _gate_lock:
+        _gate = None
+
+
+def _max_wait_ms() -> int:
+    wait_ms = settings.LLM_QUEUE_MAX_WAIT_MS
+    d = deadline.current()
+    if d is not None:
+        wait_ms = min(wait_ms, d.remaining_ms() // 2)
+    return max(wait_ms, 0)
+
+
+def _bypass(llm: LLMProvider) -> bool:
+    return not settings.LLM_SCHEDULER_ENABLED or llm.local
+
+
+def _batch_fast_path(priority: str) -> bool:
+    return priority == "batch" and settings.LLM_BATCH_PROVIDER == "rules"
+
+
+def _shed(priority: str, e: AdmissionRejected) -> LLMProvider:
+    _log.info("llm call served by fallback", extra={"priority": priority, "reason": e.reason})
+    return llm_adapter.fallback_provider()
+
+
+@contextmanager
+def scheduled(llm: LLMProvider, priority: str = "interactive", abort: Optional[Callable[[], None]] = None) -> Iterator[LLMProvider]:
+    """Hold an LLM slot while the block runs; yields ``llm``, or the fallback provider when shed.
+
+    Blocking; for worker threads. ``abort`` is polled while queued (see AdmissionGate.acquire).
+    """
+    if _bypass(llm):
+        yield llm
+        return
+    if _batch_fast_path(priority):
+        yield llm_adapter.fallback_provider()
+        return
+    gate = get_gate()
+    try:
+        gate.acquire(priority, max_wait_ms=_max_wait_ms(), abort=abort)
+    except AdmissionRejected as e:
+        shed = e
+    else:
+        shed = None
+    if shed is not None:
+        yield _shed(priority, shed)
+        return
+    try:
+        yield llm
+    finally:
+        gate.release(priority)
+
+
+@asynccontextmanager
+async def ascheduled(llm: LLMProvider, priority: str = "interactive") -> AsyncIterator[LLMProvider]:
+    """``scheduled`` for the event loop; neither the wait nor the generation holds a thread."""
+    if _bypass(llm):
+        yield llm
+        return
+    if _batch_fast_path(priority):
+        yield llm_adapter.fallback_provider()
+        return
+    gate = get_gate()
+    try:
+        # Waits on the loop: queued LLM callers do not hold threads the request pipelines need
+        await gate.aacquire(priority, max_wait_ms=_max_wait_ms())
+    except AdmissionRejected as e:
+        shed = e
+    else:
+        shed = None
+    if shed is not None:
+        yield _shed(priority, shed)
+        return
+    try:
+        yield llm
+    finally:
+        gate.release(priority)
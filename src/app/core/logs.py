@@ -0,0 +1,203 @@
+"""
+Structured JSON logging off the request path.
+
+Records from the ``qeo`` logger tree are formatted as one JSON object per line
+and handed to a bounded in-memory queue; a QueueListener thread does the
+actual stdout writes, so request handlers never block on log I/O. When the
+queue is full, records are dropped and counted instead of stalling the caller.
+
+The current request id lives in a context variable (set by the HTTP
+middleware) and is stamped on every record, including records emitted from
+worker threads that run in a copy of the request context.
+
+Access-log sampling: ``LOG_SAMPLE_ROUTES`` ("/healthz=0.01,/metrics=0")
+overrides ``LOG_SAMPLE_RATE`` per path prefix. Errors and slow requests
+(>= LOG_SLOW_MS) are always logged, the latter with a per-stage breakdown.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.serialization import dumps_str
+
+LOGGER_NAME = "qeo"
+
+_request_id: contextvars.ContextVar[str] = contextvars.ContextVar("qeo_request_id", default="")
+
+# Attributes every LogRecord has; anything else came in via ``extra=`` and is emitted as a field
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_TRACEBACK_FORMATTER = logging.Formatter()
+_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional["DroppingQueueHandler"] = None
+
+
+def get_logger(name: str = "") -> logging.Logger:
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+def set_request_id(rid: str) -> contextvars.Token:
+    return _request_id.set(rid)
+
+
+def reset_request_id(token: contextvars.Token) -> None:
+    _request_id.reset(token)
+
+
+def request_id() -> str:
+    return _request_id.get()
+
+
+class JSONFormatter(logging.Formatter):
+    """One compact JSON object per record: ts, lvl, logger, msg, rid, plus ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "lvl": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        rid = getattr(record, "rid", None)
+        if rid:
+            out["rid"] = rid
+        for k, v in record.__dict__.items():
+            if k not in _RESERVED and k != "rid" and not k.startswith("_"):
+                out[k] = v
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return dumps_str(out)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records are dropped (and counted) when the queue is full."""
+
+    def __init__(self, q: "queue.Queue[Any]"):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve everything that depends on the emitting thread/context (message args,
+        # traceback, request id) before the record crosses to the listener thread. The
+        # record is mutated in place: this is the only handler on a non-propagating logger.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc = _TRACEBACK_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+            record.exc_text = None
+        if not getattr(record, "rid", None):
+            record.rid = _request_id.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(stream: Any = None) -> logging.Logger:
+    """Install the queued JSON handler on the ``qeo`` logger (idempotent)."""
+    global _listener, _handler
+    logger = logging.getLogger(LOGGER_NAME)
+    with _lock:
+        if _listener is not None:
+            return logger
+        sink = logging.StreamHandler(stream or sys.stdout)
+        sink.setFormatter(JSONFormatter())
+        q: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, settings.LOG_QUEUE_MAX))
+        _handler = DroppingQueueHandler(q)
+        _listener = logging.handlers.QueueListener(q, sink, respect_handler_level=False)
+        _listener.start()
+        logger.handlers = [_handler]
+        logger.setLevel(getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO))
+        logger.propagate = False
+    return logger
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener, _handler
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        logging.getLogger(LOGGER_NAME).handlers = []
+        _listener = None
+        _handler = None
+
+
+def dropped_count() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+def _parse_sample_routes(spec: str) -> List[Tuple[str, float]]:
+    out: List[Tuple[str, float]] = []
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        prefix, rate = part.split("=", 1)
+        try:
+            out.append((prefix.strip(), float(rate)))
+        except ValueError:
+            continue
+    # Longest prefix wins
+    out.sort(key=lambda x: -len(x[0]))
+    return out
+
+
+_sample_cache: Tuple[str, List[Tuple[str, float]]] = ("", [])
+
+
+def sample_rate(path: str) -> float:
+    global _sample_cache
+    spec = settings.LOG_SAMPLE_ROUTES
+    if _sample_cache[0] != spec:
+        _sample_cache = (spec, _parse_sample_routes(spec))
+    for prefix, rate in _sample_cache[1]:
+        if path.startswith(prefix):
+            return rate
+    return settings.LOG_SAMPLE_RATE
+
+
+def should_log_access(path: str, status: int, dur_ms: float) -> bool:
+    """Errors and slow requests always; everything else per the route's sample rate."""
+    if status >= 500 or dur_ms >= settings.LOG_SLOW_MS:
+        return True
+    rate = sample_rate(path)
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+def log_request(
+    method: str,
+    path: str,
+    status: int,
+    dur_ms: float,
+    stages: Optional[Dict[str, Dict[str, float]]] = None,
+    error: Optional[str] = None,
+) -> None:
+    """Emit the access-log record for one request (sampled, see should_log_access)."""
+    logger = logging.getLogger(f"{LOGGER_NAME}.access")
+    fields: Dict[str, Any] = {"method": method, "path": path, "status": status, "dur_ms": int(dur_ms)}
+    if error is not None:
+        fields["error"] = error
+        logger.error("request failed", extra=fields)
+        return
+    if dur_ms >= settings.LOG_SLOW_MS:
+        if stages:
+            fields["stages"] = {k: round(v["ms"], 1) for k, v in stages.items()}
+        logger.warning("slow request", extra=fields)
+        return
+    if should_log_access(path, status, dur_ms):
+        logger.info("request", extra=fields)
@@ -7,7 +7,7 @@ from __future__ import annotations
 
 import time
 from typing import Any, Dict
-from prometheus_client import CollectorRegistry, CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from prometheus_client import CollectorRegistry, CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
 
 from app.core.config import settings
 
@@ -21,6 +21,21 @@ _h_llm_latency: Histogram | None = None
 _c_whatif_trials: Counter | None = None
 _h_whatif_trial_seconds: Histogram | None = None
 _c_whatif_filtered: Counter | None = None
+_c_cancellations: Counter | None = None
+_g_admission_queue: Gauge | None = None
+_h_admission_wait: Histogram | None = None
+_c_admission_rejected: Counter | None = None
+_h_stage: Histogram | None = None
+_c_coalesced: Counter | None = None
+_c_nl_cache: Counter | None = None
+_g_nl_cache_entries: Gauge | None = None
+_h_llm_ttft: Histogram | None = None
+_g_llm_breaker: Gauge | None = None
+_c_llm_short_circuit: Counter | None = None
+_g_llm_queue: Gauge | None = None
+_h_llm_queue_wait: Histogram | None = None
+_c_llm_fallback: Counter | None = None
+_c_nl_prefetch: Counter | None = None
 
 
 def _buckets() -> list[float]:
@@ -31,7 +46,10 @@ def _buckets() -> list[float]:
 
 
 def init_metrics() -> None:
-    global _registry, _c_requests, _h_latency, _h_db_explain, _c_db_errors, _h_llm_latency, _c_whatif_trials, _h_whatif_trial_seconds, _c_whatif_filtered
+    global _registry, _c_requests, _h_latency, _h_db_explain, _c_db_errors, _h_llm_latency, _c_whatif_trials, _h_whatif_trial_seconds, _c_whatif_filtered, _c_cancellations
+    global _g_admission_queue, _h_admission_wait, _c_admission_rejected, _h_stage, _c_coalesced
+    global _c_nl_cache, _g_nl_cache_entries, _h_llm_ttft, _g_llm_breaker, _c_llm_short_circuit
+    global _g_llm_queue, _h_llm_queue_wait, _c_llm_fallback, _c_nl_prefetch
     if not settings.METRICS_ENABLED:
         return
     if _registry is not None:
@@ -85,6 +103,99 @@ def init_metrics() -> None:
         "What-if suggestions filtered below min reduction threshold",
         registry=_registry,
     )
+    _c_cancellations = Counter(
+        f"{ns}_query_cancellations_total",
+        "In-flight DB statements cancelled",
+        labelnames=("reason",),
+        registry=_registry,
+    )
+    _g_admission_queue = Gauge(
+        f"{ns}_admission_queue_depth",
+        "Operations waiting for an admission slot",
+        labelnames=("klass",),
+        registry=_registry,
+    )
+    _h_admission_wait = Histogram(
+        f"{ns}_admission_wait_seconds",
+        "Time spent waiting for an admission slot",
+        labelnames=("klass",),
+        buckets=buckets,
+        registry=_registry,
+    )
+    _c_admission_rejected = Counter(
+        f"{ns}_admission_rejected_total",
+        "Operations shed by admission control",
+        labelnames=("klass", "reason"),
+        registry=_registry,
+    )
+    _h_stage = Histogram(
+        f"{ns}_stage_seconds",
+        "Per-stage pipeline latency (parse, explain, catalog, stats, advisor, whatif, llm, ...)",
+        labelnames=("stage",),
+        buckets=buckets,
+        registry=_registry,
+    )
+    _c_coalesced = Counter(
+        f"{ns}_coalesced_requests_total",
+        "Requests that shared an identical in-flight computation instead of running their own",
+        labelnames=("endpoint",),
+        registry=_registry,
+    )
+    _c_nl_cache = Counter(
+        f"{ns}_nl_cache_lookups_total",
+        "Explanation cache lookups by result (memory_hit, disk_hit, miss)",
+        labelnames=("result",),
+        registry=_registry,
+    )
+    _g_nl_cache_entries = Gauge(
+        f"{ns}_nl_cache_entries",
+        "Explanations held in the in-memory cache",
+        registry=_registry,
+    )
+    _h_llm_ttft = Histogram(
+        f"{ns}_llm_time_to_first_token_seconds",
+        "Time from LLM request to the first streamed token",
+        labelnames=("provider",),
+        buckets=buckets,
+        registry=_registry,
+    )
+    _g_llm_breaker = Gauge(
+        f"{ns}_llm_breaker_open",
+        "LLM circuit breaker state (0 closed, 1 open, 0.5 half-open)",
+        labelnames=("provider",),
+        registry=_registry,
+    )
+    _c_llm_short_circuit = Counter(
+        f"{ns}_llm_short_circuit_total",
+        "Explanations served by the rules provider because the breaker was open",
+        labelnames=("provider",),
+        registry=_registry,
+    )
+    _g_llm_queue = Gauge(
+        f"{ns}_llm_queue_depth",
+        "LLM calls waiting for a scheduler slot",
+        labelnames=("priority",),
+        registry=_registry,
+    )
+    _h_llm_queue_wait = Histogram(
+        f"{ns}_llm_queue_wait_seconds",
+        "Time LLM calls waited for a scheduler slot",
+        labelnames=("priority",),
+        buckets=buckets,
+        registry=_registry,
+    )
+    _c_llm_fallback = Counter(
+        f"{ns}_llm_fallback_total",
+        "Explanations served by the rules provider because the LLM queue was full or too slow",
+        labelnames=("priority", "reason"),
+        registry=_registry,
+    )
+    _c_nl_prefetch = Counter(
+        f"{ns}_nl_prefetch_total",
+        "Speculative explanations by result (queued, generated, cached, busy, duplicate, dropped_*, skipped, failed)",
+        labelnames=("result",),
+        registry=_registry,
+    )
 
 
 def observe_request(route: str, method: str, status: int, dur_s: float) -> None:
@@ -117,6 +228,48 @@ def observe_llm_latency(seconds: float) -> None:
     _h_llm_latency.observe(max(seconds, 0.0))
 
 
+def observe_llm_ttft(provider: str, seconds: float) -> None:
+    if not settings.METRICS_ENABLED or _registry is None:
+        return
+    _h_llm_ttft.labels(provider=provider).observe(max(seconds, 0.0))
+
+
+def set_llm_breaker_state(provider: str, state: str) -> None:
+    if not settings.METRICS_ENABLED or _registry is None:
+        return
+    _g_llm_breaker.labels(provider=provider).set({"closed": 0.0, "open": 1.0}.get(state, 0.5))
+
+
+def count_llm_short_circuit(provider: str) -> None:
+    if not settings.METRICS_ENABLED or _registry is None:
+        return
+    _c_llm_short_circuit.labels(provider=provider).inc()
+
+
+def set_llm_queue_depth(priority: str, depth: int) -> None:
+    if not settings.METRICS_ENABLED or _registry is None:
+        return
+    _g_llm_queue.labels(priority=priority).set(max(depth, 0))
+
+
+def observe_llm_queue_wait(priority: str, seconds: float) -> None:
+    if not settings.METRICS_ENABLED or _registry is None:
+        return
+    _h_llm_queue_wait.labels(priority=priority).observe(max(seconds, 0.0))
+
+
+def count_llm_fallback(priority: str, reason: str) -> None:
+    if not settings.METRICS_ENABLED or _registry is None:
+        return
+    _c_llm_fallback.labels(priority=priority, reason=reason).inc()
+
+
+def count_nl_prefetch(result: str) -> None:
+    if not settings.METRICS_ENABLED or _registry is None:
+        return
+    _c_nl_prefetch.labels(result=result).inc()
+
+
 def observe_whatif_trial(seconds: float) -> None:
     if not settings.METRICS_ENABLED or _registry is None:
         return
@@ -131,6 +284,54 @@ def count_whatif_filtered(n: int) -> None:
         _c_whatif_filtered.inc(n)
 
 
+def count_cancellation(reason: str) -> None:
+    if not settings.METRICS_ENABLED or _registry is None:
+        return
+    _c_cancellations.labels(reason=reason).inc()
+
+
+def set_admission_queue_depth(klass: str, depth: int) -> None:
+    if not settings.METRICS_ENABLED or _registry is None:
+        return
+    _g_admission_queue.labels(klass=klass).set(max(depth, 0))
+
+
+def observe_admission_wait(klass: str, seconds: float) -> None:
+    if not settings.METRICS_ENABLED or _registry is None:
+        return
+    _h_admission_wait.labels(klass=klass).observe(max(seconds, 0.0))
+
+
+def count_admission_rejected(klass: str, reason: str) -> None:
+    if not settings.METRICS_ENABLED or _registry is None:
+        return
+    _c_admission_rejected.labels(klass=klass, reason=reason).inc()
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    if not settings.METRICS_ENABLED or _registry is None:
+        return
+    _h_stage.labels(stage=stage).observe(max(seconds, 0.0))
+
+
+def count_coalesced(endpoint: str) -> None:
+    if not settings.METRICS_ENABLED or _registry is None:
+        return
+    _c_coalesced.labels(endpoint=endpoint).inc()
+
+
+def count_nl_cache_lookup(result: str) -> None:
+    if not settings.METRICS_ENABLED or _registry is None:
+        return
+    _c_nl_cache.labels(result=result).inc()
+
+
+def set_nl_cache_entries(n: int) -> None:
+    if not settings.METRICS_ENABLED or _registry is None:
+        return
+    _g_nl_cache_entries.set(max(n, 0))
+
+
 def metrics_exposition() -> tuple[bytes, str]:
     if not settings.METRICS_ENABLED or _registry is None:
         return (b"metrics disabled", CONTENT_TYPE_LATEST)
@@ -0,0 +1,187 @@
+"""
+Cache of natural-language explanations (LLM outputs).
+
+Entries are keyed by a hash of the full prompt and system prompt plus the
+provider and model that produced them, so a changed plan, audience, style or
+model is a different entry. Two tiers:
+
+- memory: LRU bounded to NL_CACHE_MAX_ENTRIES per process;
+- disk (optional, NL_CACHE_PATH): a SQLite file shared by all workers and kept
+  across restarts, pruned to NL_CACHE_DISK_MAX_ENTRIES least recently used.
+
+A disk hit is promoted into memory. Disk errors never fail a request; the
+lookup is counted as a miss. Lookups are exported as
+``qeo_nl_cache_lookups_total{result="memory_hit|disk_hit|miss"}``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.logs import get_logger
+from app.core.metrics import count_nl_cache_lookup, set_nl_cache_entries
+
+_log = get_logger("nl_cache")
+
+# Prune the disk tier after this many writes (pruning is a full index scan)
+_PRUNE_EVERY = 100
+
+
+def cache_key(prompt: str, system: Optional[str], provider: str, model: str) -> str:
+    h = hashlib.sha256()
+    for part in (provider, model, system or "", prompt):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class _DiskTier:
+    def __init__(self, path: str, max_entries: int):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS explanations (key TEXT PRIMARY KEY, value TEXT NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS explanations_used_at ON explanations (used_at)")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM explanations WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE explanations SET used_at = ? WHERE key = ?", (time.time(), key))
+        return row[0] if row else None
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO explanations (key, value, used_at) VALUES (?, ?, ?)", (key, value, time.time())
+            )
+            self._writes += 1
+            if self._writes % _PRUNE_EVERY == 0:
+                self._prune()
+
+    def _prune(self) -> None:
+        self._conn.execute(
+            "DELETE FROM explanations WHERE key IN "
+            "(SELECT key FROM explanations ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def count(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT count(*) FROM explanations").fetchone()[0])
+
+    def close(self) -> None:
+        with self._lock:
+            self._prune()
+            self._conn.close()
+
+
+class ExplanationCache:
+    """Two-tier LRU of LLM outputs; see module docstring."""
+
+    def __init__(self, max_entries: int = 1000, path: str = "", disk_max_entries: int = 10000):
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[str, str]" = OrderedDict()
+        self._disk: Optional[_DiskTier] = None
+        self.stats: Dict[str, int] = {"memory_hit": 0, "disk_hit": 0, "miss": 0}
+        if path:
+            try:
+                self._disk = _DiskTier(path, disk_max_entries)
+            except (sqlite3.Error, OSError) as e:
+                _log.warning("explanation cache: disk tier disabled", extra={"path": path, "error": str(e)})
+
+    def _count(self, result: str) -> None:
+        # Lookups run on many worker threads; ``+=`` on a dict item is not atomic
+        with self._lock:
+            self.stats[result] += 1
+        count_nl_cache_lookup(result)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._mem.get(key)
+            if value is not None:
+                self._mem.move_to_end(key)
+        if value is not None:
+            self._count("memory_hit")
+            return value
+        if self._disk is not None:
+            try:
+                value = self._disk.get(key)
+            except sqlite3.Error as e:
+                _log.warning("explanation cache: disk read failed", extra={"error": str(e)})
+                value = None
+            if value is not None:
+                self._remember(key, value)
+                self._count("disk_hit")
+                return value
+        self._count("miss")
+        return None
+
+    def put(self, key: str, value: str) -> None:
+        if not value:
+            return
+        self._remember(key, value)
+        if self._disk is not None:
+            try:
+                self._disk.put(key, value)
+            except sqlite3.Error as e:
+                _log.warning("explanation cache: disk write failed", extra={"error": str(e)})
+
+    def _remember(self, key: str, value: str) -> None:
+        with self._lock:
+            self._mem[key] = value
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+            size = len(self._mem)
+        set_nl_cache_entries(size)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._mem)
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+
+_cache: Optional[ExplanationCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[ExplanationCache]:
+    """The process cache, created on first use; None when NL_CACHE_ENABLED is false."""
+    global _cache
+    if not settings.NL_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExplanationCache(
+                max_entries=settings.NL_CACHE_MAX_ENTRIES,
+                path=settings.NL_CACHE_PATH,
+                disk_max_entries=settings.NL_CACHE_DISK_MAX_ENTRIES,
+            )
+        return _cache
+
+
+def reset() -> None:
+    """Close and forget the process cache (settings changes, tests, shutdown)."""
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+        _cache = None
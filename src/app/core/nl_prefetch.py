@@ -0,0 +1,249 @@
+"""
+Speculative explanations (opt-in, NL_PREFETCH_ENABLED).
+
+Users usually ask for ``nl=true`` right after /optimize or a plain /explain of
+the same statement. With prefetching on, those endpoints hand the plan they
+already have to a background worker that generates the default explanation
+(practitioner, concise, short) and stores it in the explanation cache
+(app.core.nl_cache) under the key the later request looks up, so that request
+is a cache hit. One that arrives while the speculative call is still running
+waits for it instead of starting a second generation.
+
+Background LLM use is bounded:
+
+- at most NL_PREFETCH_MAX_PENDING statements queued or running; more are dropped;
+- at most NL_PREFETCH_PER_MINUTE generations started per minute (token bucket);
+- calls go through the LLM scheduler at the lowest priority ("speculative",
+  NL_PREFETCH_MAX_CONCURRENT slots), and are skipped while interactive calls
+  are queued or when the scheduler sheds them;
+- nothing is generated for providers whose output is not cached (rules) or
+  when the explanation is already cached.
+
+Outcomes are counted in ``qeo_nl_prefetch_total{result}``.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core import cancel, deadline, llm_adapter, llm_scheduler, nl_cache, prompts
+from app.core.config import settings
+from app.core.llm_adapter import LLMProvider
+from app.core.logs import get_logger
+from app.core.metrics import count_nl_prefetch
+
+_log = get_logger("nl_prefetch")
+
+
+def explanation_setup(
+    sql: str,
+    plan: Any,
+    warnings: List[Dict[str, Any]],
+    metrics: Dict[str, Any],
+    audience: str = "practitioner",
+    style: str = "concise",
+    length: str = "short",
+) -> Tuple[LLMProvider, str, str, Optional[nl_cache.ExplanationCache], str]:
+    """Provider, provider name, prompt, cache and cache key for explaining ``plan``.
+
+    Shared with app.routers.explain so speculative entries land under the key
+    an ``nl=true`` request looks up.
+    """
+    llm = llm_adapter.get_llm()
+    provider = llm_adapter.provider_name(llm)
+    model = getattr(llm, "model", settings.LLM_MODEL)
+    # The plan is summarized into the model's prompt token budget
+    prompt = prompts.explain_template(
+        sql=sql,
+        plan=plan,
+        warnings=warnings,
+        metrics=metrics,
+        audience=audience,
+        style=style,
+        length=length,
+        model=model,
+    )
+    # Reuse a cached explanation for the same prompt and model (see app.core.nl_cache);
+    # rule-based explanations are cheaper to recompute than to cache
+    cache = None if llm.structured else nl_cache.get_cache()
+    key = nl_cache.cache_key(prompt, prompts.SYSTEM_PROMPT, provider, model)
+    return llm, provider, prompt, cache, key
+
+
+class Prefetcher:
+    """Bounded background queue of speculative explanations; see module docstring."""
+
+    def __init__(
+        self,
+        max_concurrent: int = 1,
+        max_pending: int = 16,
+        per_minute: int = 30,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_pending = max(1, int(max_pending))
+        self.per_minute = max(0, int(per_minute))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pending: set = set()
+        self._running: Dict[str, threading.Event] = {}
+        self._tokens = float(self.per_minute)
+        self._refilled_at = clock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_concurrent)), thread_name_prefix="nl-prefetch")
+
+    def _take_token(self) -> bool:
+        if not self.per_minute:
+            return True
+        now = self._clock()
+        self._tokens = min(float(self.per_minute), self._tokens + (now - self._refilled_at) * self.per_minute / 60.0)
+        self._refilled_at = now
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+    def submit(self, sql: str, plan: Any, warnings: List[Dict[str, Any]], metrics: Dict[str, Any]) -> bool:
+        """Queue a speculative explanation of ``plan``; False when it was dropped (duplicate or over a limit)."""
+        if not plan:
+            return False
+        with self._lock:
+            if sql in self._pending:
+                result = "duplicate"
+            elif len(self._pending) >= self.max_pending:
+                result = "dropped_full"
+            elif not self._take_token():
+                result = "dropped_rate"
+            else:
+                self._pending.add(sql)
+                result = "queued"
+        count_nl_prefetch(result)
+        if result != "queued":
+            return False
+        try:
+            self._executor.submit(self._run, sql, plan, warnings, metrics)
+        except RuntimeError:
+            # Shut down
+            with self._lock:
+                self._pending.discard(sql)
+            return False
+        return True
+
+    def _run(self, sql: str, plan: Any, warnings: List[Dict[str, Any]], metrics: Dict[str, Any]) -> None:
+        try:
+            with deadline.use(deadline.Deadline(settings.LLM_TIMEOUT_S * 1000)):
+                result = self._generate(sql, plan, warnings, metrics)
+        except Exception as e:
+            result = "failed"
+            _log.warning("speculative explanation failed", extra={"error": str(e)})
+        finally:
+            with self._lock:
+                self._pending.discard(sql)
+        count_nl_prefetch(result)
+
+    def _generate(self, sql: str, plan: Any, warnings: List[Dict[str, Any]], metrics: Dict[str, Any]) -> str:
+        llm, _provider, prompt, cache, key = explanation_setup(sql, plan, warnings, metrics)
+        if cache is None:
+            return "skipped"
+        if cache.get(key) is not None:
+            return "cached"
+        if settings.LLM_SCHEDULER_ENABLED and llm_scheduler.get_gate().snapshot()["interactive"]["queued"]:
+            # Users are waiting for the LLM: do not add to it
+            return "busy"
+        with llm_scheduler.scheduled(llm, priority="speculative") as used:
+            if used is not llm:
+                return "busy"
+            # Registered only once the slot is held: a request waiting on a call still queued
+            # behind interactive work would block for nothing
+            done = threading.Event()
+            with self._lock:
+                if key in self._running:
+                    return "duplicate"
+                self._running[key] = done
+            try:
+                if cache.get(key) is not None:
+                    return "cached"
+                try:
+                    text = used.explain_plan(
+                        prompt=prompt,
+                        system=prompts.SYSTEM_PROMPT,
+                        sql=sql,
+                        plan=plan,
+                        warnings=warnings,
+                        metrics=metrics,
+                    )
+                except llm_adapter.CircuitOpen:
+                    return "busy"
+                cache.put(key, text)
+                return "generated"
+            finally:
+                with self._lock:
+                    self._running.pop(key, None)
+                done.set()
+
+    def wait(self, key: str, timeout_s: float) -> bool:
+        """Wait up to ``timeout_s`` for a running speculative call for ``key``; True if one was running.
+
+        Polls the caller's cancel scope, so a disconnected client stops waiting.
+        """
+        with self._lock:
+            done = self._running.get(key)
+        if done is None:
+            return False
+        until = time.monotonic() + max(timeout_s, 0.0)
+        while not done.is_set():
+            cancel.checkpoint()
+            left = until - time.monotonic()
+            if left <= 0:
+                break
+            done.wait(min(left, settings.CANCEL_POLL_MS / 1000.0))
+        return True
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_prefetcher: Optional[Prefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher() -> Optional[Prefetcher]:
+    """The process prefetcher, created on first use; None when NL_PREFETCH_ENABLED is false."""
+    global _prefetcher
+    if not settings.NL_PREFETCH_ENABLED:
+        return None
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher(
+                max_concurrent=settings.NL_PREFETCH_MAX_CONCURRENT,
+                max_pending=settings.NL_PREFETCH_MAX_PENDING,
+                per_minute=settings.NL_PREFETCH_PER_MINUTE,
+            )
+        return _prefetcher
+
+
+def submit(sql: str, plan: Any, warnings: List[Dict[str, Any]], metrics: Dict[str, Any]) -> bool:
+    """Queue a speculative explanation when prefetching is enabled (never raises)."""
+    p = get_prefetcher()
+    if p is None:
+        return False
+    try:
+        return p.submit(sql, plan, warnings, metrics)
+    except Exception:
+        return False
+
+
+def wait(key: str, timeout_s: float) -> bool:
+    """Wait for a running speculative call for ``key`` (see Prefetcher.wait); False when none is running."""
+    p = _prefetcher
+    return p.wait(key, timeout_s) if p is not None else False
+
+
+def reset(wait: bool = False) -> None:
+    """Stop and forget the process prefetcher (settings changes, tests, shutdown)."""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is not None:
+            _prefetcher.shutdown(wait=wait)
+        _prefetcher = None
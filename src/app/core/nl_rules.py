@@ -0,0 +1,247 @@
+"""
+Deterministic plan explanations (the ``rules`` provider).
+
+Builds a structured explanation straight from the flattened plan
+(app.core.plan_model), the heuristic warnings and the metrics, without a model:
+
+    Overview   what the plan reads, how it joins, and what it does last
+    Hot spot   the node with the largest exclusive cost, with its condition
+    Issues     one line of advice per heuristic warning
+    Estimates  the worst row-estimate error (dba audience, ANALYZE plans)
+    Timing     planning and execution time of ANALYZE plans
+
+The audience adds a short glossary (beginner) or estimate details (dba); the
+length controls how many issues and nodes are listed. It is one pass over the
+plan arrays plus a small top-k, so typical plans are explained in tens of
+microseconds. It serves batch callers and is the fallback when the LLM is
+unavailable or too busy (see app.core.llm_scheduler).
+"""
+
+from __future__ import annotations
+
+import heapq
+from typing import Any, Dict, List, Optional
+
+from app.core.plan_model import NodeType, PlanTable, plan_table
+
+_SCANS = {
+    NodeType.SEQ_SCAN: "sequential scan",
+    NodeType.PARALLEL_SEQ_SCAN: "parallel sequential scan",
+    NodeType.INDEX_SCAN: "index scan",
+    NodeType.INDEX_ONLY_SCAN: "index-only scan",
+    NodeType.BITMAP_HEAP_SCAN: "bitmap scan",
+    NodeType.TID_SCAN: "TID scan",
+}
+_JOINS = {
+    NodeType.NESTED_LOOP: "nested loop",
+    NodeType.HASH_JOIN: "hash join",
+    NodeType.MERGE_JOIN: "merge join",
+}
+# Final steps, described in execution order (deepest first)
+_STEPS = {
+    NodeType.AGGREGATE: "aggregates the rows",
+    NodeType.GROUP: "groups the rows",
+    NodeType.WINDOW_AGG: "computes window functions",
+    NodeType.SORT: "sorts the result",
+    NodeType.INCREMENTAL_SORT: "sorts the result",
+    NodeType.UNIQUE: "removes duplicates",
+    NodeType.SET_OP: "combines the inputs",
+    NodeType.LIMIT: "returns only the first rows",
+    NodeType.MODIFY_TABLE: "writes the changes",
+    NodeType.LOCK_ROWS: "locks the rows",
+}
+_GLOSSARY = {
+    NodeType.SEQ_SCAN: "A sequential scan reads every row of a table.",
+    NodeType.INDEX_SCAN: "An index scan finds rows through an index and then reads them from the table.",
+    NodeType.INDEX_ONLY_SCAN: "An index-only scan answers from the index without reading the table.",
+    NodeType.BITMAP_HEAP_SCAN: "A bitmap scan collects matching rows from an index, then reads them in table order.",
+    NodeType.HASH_JOIN: "A hash join builds a hash table from one input and looks up each row of the other in it.",
+    NodeType.NESTED_LOOP: "A nested loop runs its inner side once for every row of its outer side.",
+    NodeType.MERGE_JOIN: "A merge join walks two sorted inputs side by side.",
+    NodeType.SORT: "A sort orders rows in memory, or on disk when they do not fit in work_mem.",
+}
+_ADVICE = {
+    "SEQ_SCAN_LARGE": "an index on the filtered columns would let PostgreSQL skip most of the table",
+    "NESTED_LOOP_SEQ_INNER": "the inner table is read once per outer row; index its join column",
+    "SORT_SPILL": "raise work_mem for this query or add an index that matches the ORDER BY",
+    "ESTIMATE_MISMATCH": "run ANALYZE (or add extended statistics) so the planner's row estimates improve",
+    "NO_INDEX_FILTER": "consider an index on the filtered columns",
+    "PARALLEL_OFF": "check max_parallel_workers_per_gather; parallel workers could share this work",
+}
+# Plain-int keys: the plan arrays hold ints, and one lookup per node classifies it
+_ROLES: Dict[int, tuple] = {
+    **{int(k): ("scan", v) for k, v in _SCANS.items()},
+    **{int(k): ("join", v) for k, v in _JOINS.items()},
+    **{int(k): ("step", v) for k, v in _STEPS.items()},
+}
+_PRIORITY = {code: n for n, code in enumerate(_ADVICE)}
+_CONDITION_KEYS = ("Index Cond", "Hash Cond", "Merge Cond", "Join Filter", "Filter", "Sort Key", "Group Key")
+_MAX_TABLES = 4
+# (issues, listed nodes) per length
+_LIMITS = {"short": (1, 0), "medium": (3, 0), "long": (10, 5)}
+
+
+def _count(n: int, noun: str) -> str:
+    return f"a {noun}" if n == 1 else f"{n} {noun}s"
+
+
+def _exclusive_costs(t: PlanTable) -> List[float]:
+    # One pass instead of PlanTable.exclusive_cost per node: subtract each child from its parent
+    total = t.total_cost
+    excl = [c if c == c else 0.0 for c in total]
+    parent = t.parent
+    for i in range(1, len(excl)):
+        c = total[i]
+        if c == c:
+            excl[parent[i]] -= c
+    return [c if c > 0.0 else 0.0 for c in excl]
+
+
+def _describe(t: PlanTable, i: int) -> str:
+    code = t.node_type[i]
+    kind = _SCANS.get(code) or _JOINS.get(code) or t.type_name(i).lower()
+    rel = t.relation[i]
+    if rel:
+        kind += f" on {rel}"
+    index = t.raw[i].get("Index Name")
+    if index:
+        kind += f" using {index}"
+    return kind
+
+
+def _condition(t: PlanTable, i: int) -> Optional[str]:
+    raw = t.raw[i]
+    for key in _CONDITION_KEYS:
+        value = raw.get(key)
+        if value:
+            if isinstance(value, list):
+                value = ", ".join(map(str, value))
+            return f"{key.lower()} {str(value)[:120]}"
+    return None
+
+
+def _overview(t: PlanTable) -> str:
+    tables: Dict[str, str] = {}
+    joins: Dict[str, int] = {}
+    steps: List[str] = []
+    role_of = _ROLES.get
+    relation = t.relation
+    for i, code in enumerate(t.node_type):
+        role = role_of(code)
+        if role is None:
+            continue
+        what, word = role
+        if what == "scan":
+            rel = relation[i]
+            if rel and rel not in tables:
+                index = t.raw[i].get("Index Name")
+                tables[rel] = f"{word} using {index}" if index else word
+        elif what == "join":
+            joins[word] = joins.get(word, 0) + 1
+        else:
+            steps.append(word)
+    parts = []
+    if tables:
+        names = [f"{rel} ({how})" for rel, how in list(tables.items())[:_MAX_TABLES]]
+        if len(tables) > _MAX_TABLES:
+            names.append(f"{len(tables) - _MAX_TABLES} more tables")
+        parts.append("reads " + (", ".join(names[:-1]) + " and " + names[-1] if len(names) > 1 else names[0]))
+    else:
+        parts.append(f"computes the result without reading a table (top node: {t.type_name(0)})")
+    if joins:
+        parts.append("joins them with " + " and ".join(_count(n, kind) for kind, n in joins.items()))
+    seen = set()
+    ordered = [s for s in reversed(steps) if not (s in seen or seen.add(s))]
+    if ordered:
+        parts.append("then " + (", ".join(ordered[:-1]) + " and " + ordered[-1] if len(ordered) > 1 else ordered[0]))
+    return "Overview: PostgreSQL " + ", ".join(parts) + "."
+
+
+def _hot_spot(t: PlanTable, excl: List[float], i: int, audience: str) -> Optional[str]:
+    total = t.cost(0)
+    if not total or excl[i] <= 0.0:
+        return None
+    line = f"Hot spot: the {_describe(t, i)} accounts for {excl[i] / total:.0%} of the estimated cost"
+    cond = _condition(t, i)
+    if cond:
+        line += f" ({cond})"
+    if audience == "dba":
+        est, actual = t.rows(i), t.rows(i, actual=True)
+        if est is not None:
+            line += f"; estimated {est:,.0f} rows" + (f", actual {actual:,.0f}" if actual is not None else "")
+    return line + "."
+
+
+def _estimates(t: PlanTable) -> Optional[str]:
+    worst, worst_i = 0.0, -1
+    for i, (est, actual) in enumerate(zip(t.plan_rows, t.actual_rows, strict=True)):
+        if est == est and actual == actual:
+            ratio = max(est, 1.0) / max(actual, 1.0)
+            ratio = max(ratio, 1.0 / ratio)
+            if ratio > worst:
+                worst, worst_i = ratio, i
+    if worst < 2.0:
+        return None
+    return (
+        f"Estimates: the {_describe(t, worst_i)} expected {t.plan_rows[worst_i]:,.0f} rows but got "
+        f"{t.actual_rows[worst_i]:,.0f} ({worst:,.0f}x off)."
+    )
+
+
+def explain(
+    plan: Any,
+    warnings: Optional[List[Dict[str, Any]]] = None,
+    metrics: Optional[Dict[str, Any]] = None,
+    sql: Optional[str] = None,
+    audience: str = "practitioner",
+    style: str = "concise",
+    length: str = "short",
+) -> str:
+    """Structured plain-text explanation of ``plan`` (see module docstring)."""
+    t = plan_table(plan) if plan else PlanTable()
+    max_issues, max_nodes = _LIMITS.get(length, _LIMITS["short"])
+    if style == "detailed":
+        max_nodes = max(max_nodes, 3)
+    lines: List[str] = []
+    if len(t):
+        lines.append(_overview(t))
+        if audience == "beginner":
+            present = set(t.node_type)
+            lines.extend(text for code, text in _GLOSSARY.items() if code in present)
+        excl = _exclusive_costs(t)
+        top = heapq.nlargest(max(max_nodes, 1), range(len(excl)), key=excl.__getitem__)
+        hot = _hot_spot(t, excl, top[0], audience)
+        if hot:
+            lines.append(hot)
+        if max_nodes and len(top) > 1:
+            total = t.cost(0) or 0.0
+            lines.append("Most expensive steps:")
+            lines.extend(
+                f"- {_describe(t, i)}: {excl[i] / total:.0%}" if total else f"- {_describe(t, i)}"
+                for i in top if excl[i] > 0.0
+            )
+    else:
+        words = (sql or "").split(None, 1)
+        lines.append("Overview: no execution plan was available" + (f" for the {words[0].upper()} statement." if words else "."))
+    # Most actionable first (the _ADVICE order), stable otherwise
+    issues = sorted((w for w in warnings or [] if isinstance(w, dict)), key=lambda w: _PRIORITY.get(w.get("code"), len(_PRIORITY)))
+    if issues:
+        lines.append("Issues:")
+        for w in issues[:max_issues]:
+            advice = _ADVICE.get(w.get("code", ""))
+            detail = w.get("detail") or w.get("code", "")
+            lines.append(f"- {detail}" + (f": {advice}." if advice else "."))
+        if len(issues) > max_issues:
+            lines.append(f"- {len(issues) - max_issues} more warning(s) omitted.")
+    elif len(t):
+        lines.append("Issues: the plan heuristics found nothing to flag.")
+    if len(t) and audience == "dba":
+        est = _estimates(t)
+        if est:
+            lines.append(est)
+    if metrics and length != "short":
+        exec_ms = metrics.get("execution_time_ms")
+        plan_ms = metrics.get("planning_time_ms")
+        if exec_ms:
+            lines.append(f"Timing: planned in {float(plan_ms or 0):.2f} ms, executed in {float(exec_ms):.2f} ms.")
+    return "\n".join(lines)
@@ -16,6 +16,8 @@ from __future__ import annotations
 from dataclasses import dataclass
 from app.core.config import settings
 from app.core import db as db_core
+from app.core.sql_analyzer import query_schema
+from app.core.tracing import traced
 from typing import Any, Dict, List, Optional, Tuple
 import re
 
@@ -255,6 +257,8 @@ def suggest_indexes(
 
     tables = ast_info.get("tables") or []
     table_names = [t.get("name") for t in tables if t.get("name")]
+    # Catalog lookups and DDL target the schema the statement names (stats are keyed by bare table name)
+    schema_name = query_schema(ast_info)
 
     # Build existing indexes map
     existing_by_table: Dict[str, List[Dict[str, Any]]] = {}
@@ -319,10 +323,18 @@ def suggest_indexes(
         if _existing_index_covers(existing, ordered_cols):
             continue
         # EPIC A: score, filter, width, reason
-        try:
-            col_stats = db_core.get_column_stats("public", norm)
-        except Exception:
-            col_stats = {}
+        # Callers that already loaded pg_stats (batch optimize) pass them in options
+        preloaded = options.get("column_stats")
+        if preloaded is not None:
+            col_stats = preloaded.get(norm) or {}
+        else:
+            # Bounded by the request deadline when one is passed; no budget left -> no pg_stats
+            deadline = options.get("deadline")
+            stats_ms = deadline.stage_ms(5000) if deadline is not None else 5000
+            try:
+                col_stats = db_core.get_column_stats(schema_name, norm, timeout_ms=stats_ms) if stats_ms else {}
+            except Exception:
+                col_stats = {}
         est_width = 0
         for c in ordered_cols:
             est_width += int((col_stats.get(c) or {}).get("avg_width") or 0)
@@ -355,8 +367,9 @@ def suggest_indexes(
             continue
 
         ix_name = _index_name(norm, ordered_cols)
+        target = norm if schema_name == "public" else f"{schema_name}.{norm}"
         stmt = (
-            f"CREATE INDEX CONCURRENTLY {ix_name} ON {norm} (" + ", ".join(ordered_cols) + ")"
+            f"CREATE INDEX CONCURRENTLY {ix_name} ON {target} (" + ", ".join(ordered_cols) + ")"
         )  # suggestion only; do not execute
         reason = (
             f"Boosts equality({len(eq_cols)}), range({len(rng_cols)}), order/group({len(order_cols)+len(group_cols)})"
@@ -365,7 +378,7 @@ def suggest_indexes(
         suggestions.append(
             Suggestion(
                 kind="index",
-                title=f"Index on {norm}({', '.join(ordered_cols)})",
+                title=f"Index on {target}({', '.join(ordered_cols)})",
                 rationale="Supports equality, range, and ordering for faster lookups and Top-N.",
                 impact=("high" if (len(eq_cols) >= 1 and order_cols) else "medium"),
                 confidence=(0.7 if order_cols else 0.6),
@@ -401,6 +414,7 @@ def summarize(suggestions: List[Suggestion]) -> Dict[str, Any]:
     }
 
 
+@traced("advisor")
 def analyze(
     sql: str,
     ast_info: Dict[str, Any],
@@ -1,18 +1,19 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
+from app.core.plan_model import PlanTable, plan_table
 
-def _walk(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
-    nodes: List[Dict[str, Any]] = []
-    root = plan.get("Plan", plan)
-    if not isinstance(root, dict):
-        return nodes
-    def rec(n: Dict[str, Any]):
-        nodes.append(n)
-        for ch in (n.get("Plans") or []):
-            if isinstance(ch, dict):
-                rec(ch)
-    rec(root)
-    return nodes
+
+def _rows(t: PlanTable, i: int) -> Optional[float]:
+    # Planned rows first, actual rows when planned is missing/zero
+    v = t.rows(i, actual=False) or t.rows(i, actual=True)
+    if v is not None and float(v).is_integer():
+        return int(v)
+    return v
+
+
+def _root_cost(t: PlanTable) -> float:
+    c = t.cost(0) if len(t) else None
+    return float(f"{(c or 0.0):.3f}")
 
 
 def diff_plans(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
@@ -21,21 +22,17 @@ def diff_plans(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
         { nodes: [ { beforeOp, afterOp, costBefore, costAfter, rowsBefore, rowsAfter } ] }
     """
-    b_nodes = _walk(before)
-    a_nodes = _walk(after)
-    n = min(len(b_nodes), len(a_nodes))
+    b = plan_table(before)
+    a = plan_table(after)
+    n = min(len(b), len(a))
     out: List[Dict[str, Any]] = []
     for i in range(n):
-        b = b_nodes[i]
-        a = a_nodes[i]
         out.append({
-            "beforeOp": b.get("Node Type"),
-            "afterOp": a.get("Node Type"),
-            "costBefore": float(f"{(before.get('Plan', before).get('Total Cost', 0.0)):.3f}") if i == 0 else None,
-            "costAfter": float(f"{(after.get('Plan', after).get('Total Cost', 0.0)):.3f}") if i == 0 else None,
-            "rowsBefore": b.get("Plan Rows") or b.get("Actual Rows"),
-            "rowsAfter": a.get("Plan Rows") or a.get("Actual Rows"),
+            "beforeOp": b.raw[i].get("Node Type"),
+            "afterOp": a.raw[i].get("Node Type"),
+            "costBefore": _root_cost(b) if i == 0 else None,
+            "costAfter": _root_cost(a) if i == 0 else None,
+            "rowsBefore": _rows(b, i),
+            "rowsAfter": _rows(a, i),
         })
     return {"nodes": out}
-
-
@@ -5,37 +5,22 @@ This module analyzes execution plans to identify potential performance issues
 and calculate basic metrics.
 """
 
-from typing import Dict, List, Tuple, Any, Optional
+from typing import Dict, List, Tuple, Any
 
-def _walk(node: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """
-    Walk a plan tree and return a flattened list of all nodes.
-    
-    Args:
-        node: Plan node dictionary
-    
-    Returns:
-        List of all nodes in the plan tree
-    """
-    nodes = [node]
-    
-    # Handle Plans array (parallel workers)
-    if "Plans" in node:
-        for child in node["Plans"]:
-            nodes.extend(_walk(child))
-    
-    return nodes
+from app.core.plan_model import NodeType, plan_table
+from app.core.tracing import traced
 
-def _get_node_type(node: Dict[str, Any]) -> str:
-    """Extract node type, handling version differences."""
-    return node.get("Node Type", node.get("node_type", "Unknown"))
+# Known node types whose names matter to the substring checks below ("Index Scan",
+# "Sort"); unknown (OTHER) nodes are always checked by name.
+_NAMED_CHECK_CODES = frozenset({
+    NodeType.INDEX_SCAN,
+    NodeType.BITMAP_INDEX_SCAN,
+    NodeType.SORT,
+    NodeType.INCREMENTAL_SORT,
+})
 
-def _get_rows(node: Dict[str, Any], actual: bool = False) -> Optional[float]:
-    """Extract row count, handling version differences."""
-    if actual:
-        return node.get("Actual Rows", node.get("actual_rows"))
-    return node.get("Plan Rows", node.get("plan_rows"))
 
+@traced("heuristics")
 def analyze(plan_root: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
     """
     Analyze a plan tree and return warnings and metrics.
@@ -47,62 +32,67 @@ def analyze(plan_root: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str,
         Tuple of (warnings, metrics) where warnings is a list of warning objects
         and metrics is a dictionary of numeric metrics
     """
-    # Normalize plan structure
-    plan = plan_root.get("Plan", plan_root)
-    
-    # Walk the tree to get all nodes
-    nodes = _walk(plan)
+    # Flattened pre-order node table (shared with plan_diff and explanations)
+    t = plan_table(plan_root)
+    n = len(t)
     
     warnings = []
     metrics = {
-        "planning_time_ms": plan_root.get("Planning Time", 0),
-        "execution_time_ms": plan_root.get("Execution Time", 0),
-        "node_count": len(nodes)
+        "planning_time_ms": t.planning_time_ms,
+        "execution_time_ms": t.execution_time_ms,
+        "node_count": n
     }
     
     # Track tables seen for NO_INDEX_FILTER analysis
     tables_with_seqscan = set()
     tables_with_indexscan = set()
     
-    for node in nodes:
-        node_type = _get_node_type(node)
+    raw = t.raw
+    seq_scan = NodeType.SEQ_SCAN
+    nested_loop = NodeType.NESTED_LOOP
+    total_rows = 0.0
+    has_parallel = False
+    
+    # NaN (missing) never compares equal to itself, so "x == x" is the presence test
+    for i, (code, plan_rows, actual_rows) in enumerate(zip(t.node_type, t.plan_rows, t.actual_rows, strict=True)):
+        has_plan = plan_rows == plan_rows
+        has_actual = actual_rows == actual_rows
+        node_type = t.type_name(i) if code in _NAMED_CHECK_CODES or not code else ""
         
         # SEQ_SCAN_LARGE: Sequential scan with high row count
-        if node_type == "Seq Scan":
-            plan_rows = _get_rows(node, actual=False)
-            actual_rows = _get_rows(node, actual=True)
-            rows = actual_rows if actual_rows is not None else plan_rows
+        if code == seq_scan:
+            rows = actual_rows if has_actual else (plan_rows if has_plan else 0)
             
             if rows and rows >= 100000:
                 warnings.append({
                     "code": "SEQ_SCAN_LARGE",
                     "level": "warn",
-                    "detail": f"Sequential scan on {node.get('Relation Name', 'table')} "
+                    "detail": f"Sequential scan on {raw[i].get('Relation Name', 'table')} "
                              f"with {rows:,.0f} rows"
                 })
             
             # Track for NO_INDEX_FILTER analysis
-            if "Filter" in node:
-                tables_with_seqscan.add(node.get("Relation Name"))
+            if "Filter" in raw[i]:
+                tables_with_seqscan.add(t.relation[i])
         
         # Track tables with index scans
         elif "Index Scan" in node_type:
-            tables_with_indexscan.add(node.get("Relation Name"))
+            tables_with_indexscan.add(t.relation[i])
         
         # NESTED_LOOP_SEQ_INNER: Nested Loop with sequential scan inner
-        if node_type == "Nested Loop" and "Plans" in node:
-            inner_plan = node["Plans"][1]  # Second plan is inner
-            if _get_node_type(inner_plan) == "Seq Scan":
+        if code == nested_loop:
+            kids = t.child_list(i)
+            if len(kids) > 1 and t.node_type[kids[1]] == seq_scan:  # Second plan is inner
                 warnings.append({
                     "code": "NESTED_LOOP_SEQ_INNER",
                     "level": "warn",
                     "detail": f"Nested loop joins with sequential scan inner side on "
-                             f"{inner_plan.get('Relation Name', 'table')}"
+                             f"{raw[kids[1]].get('Relation Name', 'table')}"
                 })
         
         # SORT_SPILL: Sort spilling to disk
         if "Sort" in node_type:
-            sort_method = node.get("Sort Method", "")
+            sort_method = raw[i].get("Sort Method", "")
             if "Disk" in sort_method or "External" in sort_method:
                 warnings.append({
                     "code": "SORT_SPILL",
@@ -111,18 +101,24 @@ def analyze(plan_root: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str,
                 })
         
         # ESTIMATE_MISMATCH: Actual vs planned rows mismatch
-        plan_rows = _get_rows(node, actual=False)
-        actual_rows = _get_rows(node, actual=True)
-        if plan_rows is not None and actual_rows is not None:
+        if has_plan and has_actual:
             error = abs(actual_rows - plan_rows) / (plan_rows + 1)
             if error >= 0.5:  # 50% or more error
                 warnings.append({
                     "code": "ESTIMATE_MISMATCH",
                     "level": "warn",
-                    "detail": f"Row estimate error in {node_type}: "
+                    "detail": f"Row estimate error in {t.type_name(i)}: "
                              f"Expected {plan_rows:,.0f}, got {actual_rows:,.0f} "
                              f"({error:.1%} error)"
                 })
+        
+        # Inputs for PARALLEL_OFF (actual rows preferred, planned otherwise)
+        if has_actual and actual_rows:
+            total_rows += actual_rows
+        elif has_plan:
+            total_rows += plan_rows
+        if code == NodeType.PARALLEL_SEQ_SCAN or (not code and "Parallel" in node_type):
+            has_parallel = True
     
     # NO_INDEX_FILTER: Tables with seq scan + filter but no index scans
     for table in tables_with_seqscan - tables_with_indexscan:
@@ -133,10 +129,6 @@ def analyze(plan_root: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str,
         })
     
     # PARALLEL_OFF: Large operation but no parallel nodes
-    total_rows = sum(_get_rows(n, actual=True) or _get_rows(n, actual=False) or 0 
-                    for n in nodes)
-    has_parallel = any("Parallel" in _get_node_type(n) for n in nodes)
-    
     if total_rows >= 100000 and not has_parallel:
         warnings.append({
             "code": "PARALLEL_OFF",
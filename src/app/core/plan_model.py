@@ -0,0 +1,340 @@
+"""
+Compact, typed representation of PostgreSQL execution plans.
+
+EXPLAIN (FORMAT JSON) plans are nested dicts keyed by display strings ("Node Type",
+"Plan Rows", ...). Analysis code used to walk that tree separately in each module.
+PlanTable flattens a plan once, in pre-order, into parallel typed arrays (parent
+index, node type code, costs, rows, loops, buffers) that heuristics, plan diff,
+explanations and metrics all share.
+
+Missing numeric values are stored as NaN and surfaced as None by the accessors.
+The source node dicts are kept by reference in ``raw`` for rarely used keys
+(Filter, Sort Method, ...), so building a table does not copy the plan.
+"""
+
+from __future__ import annotations
+
+import math
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from enum import IntEnum
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_NAN = float("nan")
+
+
+class NodeType(IntEnum):
+    """Common PostgreSQL plan node types; anything else maps to OTHER."""
+
+    OTHER = 0
+    SEQ_SCAN = 1
+    PARALLEL_SEQ_SCAN = 2
+    INDEX_SCAN = 3
+    INDEX_ONLY_SCAN = 4
+    BITMAP_HEAP_SCAN = 5
+    BITMAP_INDEX_SCAN = 6
+    NESTED_LOOP = 7
+    HASH_JOIN = 8
+    MERGE_JOIN = 9
+    HASH = 10
+    SORT = 11
+    INCREMENTAL_SORT = 12
+    AGGREGATE = 13
+    GROUP = 14
+    LIMIT = 15
+    MATERIALIZE = 16
+    MEMOIZE = 17
+    GATHER = 18
+    GATHER_MERGE = 19
+    APPEND = 20
+    MERGE_APPEND = 21
+    RESULT = 22
+    SUBQUERY_SCAN = 23
+    CTE_SCAN = 24
+    FUNCTION_SCAN = 25
+    VALUES_SCAN = 26
+    UNIQUE = 27
+    WINDOW_AGG = 28
+    SET_OP = 29
+    MODIFY_TABLE = 30
+    LOCK_ROWS = 31
+    TID_SCAN = 32
+
+
+_NAME_TO_TYPE: Dict[str, NodeType] = {
+    "Seq Scan": NodeType.SEQ_SCAN,
+    "Parallel Seq Scan": NodeType.PARALLEL_SEQ_SCAN,
+    "Index Scan": NodeType.INDEX_SCAN,
+    "Index Only Scan": NodeType.INDEX_ONLY_SCAN,
+    "Bitmap Heap Scan": NodeType.BITMAP_HEAP_SCAN,
+    "Bitmap Index Scan": NodeType.BITMAP_INDEX_SCAN,
+    "Nested Loop": NodeType.NESTED_LOOP,
+    "Hash Join": NodeType.HASH_JOIN,
+    "Merge Join": NodeType.MERGE_JOIN,
+    "Hash": NodeType.HASH,
+    "Sort": NodeType.SORT,
+    "Incremental Sort": NodeType.INCREMENTAL_SORT,
+    "Aggregate": NodeType.AGGREGATE,
+    "Group": NodeType.GROUP,
+    "Limit": NodeType.LIMIT,
+    "Materialize": NodeType.MATERIALIZE,
+    "Memoize": NodeType.MEMOIZE,
+    "Gather": NodeType.GATHER,
+    "Gather Merge": NodeType.GATHER_MERGE,
+    "Append": NodeType.APPEND,
+    "Merge Append": NodeType.MERGE_APPEND,
+    "Result": NodeType.RESULT,
+    "Subquery Scan": NodeType.SUBQUERY_SCAN,
+    "CTE Scan": NodeType.CTE_SCAN,
+    "Function Scan": NodeType.FUNCTION_SCAN,
+    "Values Scan": NodeType.VALUES_SCAN,
+    "Unique": NodeType.UNIQUE,
+    "WindowAgg": NodeType.WINDOW_AGG,
+    "SetOp": NodeType.SET_OP,
+    "ModifyTable": NodeType.MODIFY_TABLE,
+    "LockRows": NodeType.LOCK_ROWS,
+    "Tid Scan": NodeType.TID_SCAN,
+}
+_TYPE_TO_NAME: Dict[int, str] = {int(v): k for k, v in _NAME_TO_TYPE.items()}
+
+
+def _num(v: Any) -> float:
+    tp = type(v)
+    if tp is float:
+        return v
+    if tp is int:
+        return float(v)
+    if v is None or tp is bool:
+        return _NAN
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return _NAN
+
+
+def _int(v: Any) -> int:
+    if type(v) is int:
+        return v
+    try:
+        return int(v or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _opt(x: float) -> Optional[float]:
+    return None if math.isnan(x) else x
+
+
+class PlanTable:
+    """Flattened plan: node ``i`` is the i-th node in pre-order (0 is the root)."""
+
+    __slots__ = (
+        "parent",
+        "depth",
+        "first_child",
+        "next_sibling",
+        "node_type",
+        "startup_cost",
+        "total_cost",
+        "plan_rows",
+        "actual_rows",
+        "actual_loops",
+        "actual_total_time",
+        "shared_hit_blocks",
+        "shared_read_blocks",
+        "temp_read_blocks",
+        "temp_written_blocks",
+        "relation",
+        "raw",
+        "planning_time_ms",
+        "execution_time_ms",
+        "_other_names",
+    )
+
+    def __init__(self) -> None:
+        self.parent = array("i")
+        self.depth = array("i")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self.node_type = array("B")
+        self.startup_cost = array("d")
+        self.total_cost = array("d")
+        self.plan_rows = array("d")
+        self.actual_rows = array("d")
+        self.actual_loops = array("d")
+        self.actual_total_time = array("d")
+        self.shared_hit_blocks = array("q")
+        self.shared_read_blocks = array("q")
+        self.temp_read_blocks = array("q")
+        self.temp_written_blocks = array("q")
+        self.relation: List[Optional[str]] = []
+        self.raw: List[Dict[str, Any]] = []
+        self.planning_time_ms: Any = 0
+        self.execution_time_ms: Any = 0
+        self._other_names: Dict[int, str] = {}
+
+    @classmethod
+    def from_plan(cls, plan_root: Any) -> "PlanTable":
+        """Flatten ``{"Plan": {...}}`` (or a bare root node) without recursion."""
+        t = cls()
+        if not isinstance(plan_root, dict):
+            return t
+        t.planning_time_ms = plan_root.get("Planning Time", 0)
+        t.execution_time_ms = plan_root.get("Execution Time", 0)
+        root = plan_root.get("Plan", plan_root)
+        if not isinstance(root, dict):
+            return t
+
+        # Build into plain lists (cheap appends), convert to typed arrays once at the end
+        parent: List[int] = []
+        depth: List[int] = []
+        first_child: List[int] = []
+        next_sibling: List[int] = []
+        node_type: List[int] = []
+        startup_cost: List[float] = []
+        total_cost: List[float] = []
+        plan_rows: List[float] = []
+        actual_rows: List[float] = []
+        actual_loops: List[float] = []
+        actual_time: List[float] = []
+        hit: List[int] = []
+        read: List[int] = []
+        temp_read: List[int] = []
+        temp_written: List[int] = []
+        relation = t.relation
+        raw = t.raw
+        other = t._other_names
+        type_of = _NAME_TO_TYPE.get
+        intern = sys.intern
+        num = _num
+        ival = _int
+
+        # Stack of (node, parent index, depth); children pushed in reverse for pre-order
+        stack: List[Tuple[Dict[str, Any], int, int]] = [(root, -1, 0)]
+        last_child: Dict[int, int] = {}
+        while stack:
+            node, par, d = stack.pop()
+            i = len(raw)
+            get = node.get
+            name = get("Node Type") or get("node_type") or "Unknown"
+            code = type_of(name, 0)
+            if not code:
+                other[i] = intern(str(name))
+            parent.append(par)
+            depth.append(d)
+            first_child.append(-1)
+            next_sibling.append(-1)
+            node_type.append(code)
+            startup_cost.append(num(get("Startup Cost")))
+            total_cost.append(num(get("Total Cost")))
+            pr = get("Plan Rows")
+            plan_rows.append(num(pr if pr is not None else get("plan_rows")))
+            ar = get("Actual Rows")
+            actual_rows.append(num(ar if ar is not None else get("actual_rows")))
+            actual_loops.append(num(get("Actual Loops")))
+            actual_time.append(num(get("Actual Total Time")))
+            hit.append(ival(get("Shared Hit Blocks")))
+            read.append(ival(get("Shared Read Blocks")))
+            temp_read.append(ival(get("Temp Read Blocks")))
+            temp_written.append(ival(get("Temp Written Blocks")))
+            rel = get("Relation Name")
+            relation.append(intern(rel) if type(rel) is str else rel)
+            raw.append(node)
+            if par >= 0:
+                prev = last_child.get(par)
+                if prev is None:
+                    first_child[par] = i
+                else:
+                    next_sibling[prev] = i
+                last_child[par] = i
+            children = get("Plans")
+            if children:
+                for ch in reversed(children):
+                    if isinstance(ch, dict):
+                        stack.append((ch, i, d + 1))
+
+        t.parent = array("i", parent)
+        t.depth = array("i", depth)
+        t.first_child = array("i", first_child)
+        t.next_sibling = array("i", next_sibling)
+        t.node_type = array("B", node_type)
+        t.startup_cost = array("d", startup_cost)
+        t.total_cost = array("d", total_cost)
+        t.plan_rows = array("d", plan_rows)
+        t.actual_rows = array("d", actual_rows)
+        t.actual_loops = array("d", actual_loops)
+        t.actual_total_time = array("d", actual_time)
+        t.shared_hit_blocks = array("q", hit)
+        t.shared_read_blocks = array("q", read)
+        t.temp_read_blocks = array("q", temp_read)
+        t.temp_written_blocks = array("q", temp_written)
+        return t
+
+    # ---- accessors ----
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def type_name(self, i: int) -> str:
+        code = self.node_type[i]
+        if code:
+            return _TYPE_TO_NAME[code]
+        return self._other_names.get(i, "Unknown")
+
+    def rows(self, i: int, actual: bool = False) -> Optional[float]:
+        return _opt(self.actual_rows[i] if actual else self.plan_rows[i])
+
+    def cost(self, i: int) -> Optional[float]:
+        return _opt(self.total_cost[i])
+
+    def children(self, i: int) -> Iterator[int]:
+        c = self.first_child[i]
+        while c != -1:
+            yield c
+            c = self.next_sibling[c]
+
+    def child_list(self, i: int) -> List[int]:
+        return list(self.children(i))
+
+    def exclusive_cost(self, i: int) -> float:
+        """Total cost of node ``i`` minus its children's total costs (never negative)."""
+        own = self.total_cost[i]
+        if math.isnan(own):
+            return 0.0
+        for c in self.children(i):
+            ch = self.total_cost[c]
+            if not math.isnan(ch):
+                own -= ch
+        return max(own, 0.0)
+
+    def has_type(self, code: NodeType) -> bool:
+        return int(code) in self.node_type
+
+
+# Small identity-checked cache so one request's heuristics, diff and explanation
+# share a single build of the same plan object.
+_CACHE: "OrderedDict[int, Tuple[Any, PlanTable]]" = OrderedDict()
+_CACHE_MAX = 32
+_CACHE_LOCK = threading.Lock()
+
+
+def plan_table(plan_root: Any) -> PlanTable:
+    """Return the PlanTable for ``plan_root``, building it at most once per object.
+
+    Plans are treated as immutable once analyzed.
+    """
+    key = id(plan_root)
+    with _CACHE_LOCK:
+        hit = _CACHE.get(key)
+        if hit is not None and hit[0] is plan_root:
+            _CACHE.move_to_end(key)
+            return hit[1]
+    table = PlanTable.from_plan(plan_root)
+    with _CACHE_LOCK:
+        _CACHE[key] = (plan_root, table)
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > _CACHE_MAX:
+            _CACHE.popitem(last=False)
+    return table
@@ -0,0 +1,210 @@
+"""
+On-demand profiling of the live process.
+
+Two session modes, one session at a time per worker:
+
+- ``cpu``: a background thread samples every thread's Python stack
+  (``sys._current_frames``) every ``interval_ms`` and aggregates them as
+  collapsed stacks (``root;caller;leaf count``), the input format of
+  flamegraph.pl, speedscope and inferno. Samples are wall-clock: a thread
+  blocked in a psycopg2 call shows up under the Python frame that made it.
+  Threads parked in the usual idle spots (pool workers waiting for work, the
+  event loop's selector) are dropped unless ``include_idle`` is set.
+- ``alloc``: tracemalloc runs for the window and the top allocation sites of
+  memory still held at the end are reported.
+
+A session ends after ``seconds`` or, when ``route`` and ``requests`` are
+given, once that many requests to the route have completed (the middleware
+reports completions via ``note_request``).
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+MODES = ("cpu", "alloc")
+
+# (file basename, function) of leaf frames that mean "this thread is waiting for work"
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+_lock = threading.Lock()
+_active: Optional["ProfileSession"] = None
+
+
+class ProfilerBusy(Exception):
+    """Another profiling session is already running in this process."""
+
+
+def _label(code: Any) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfileSession:
+    def __init__(
+        self,
+        mode: str = "cpu",
+        seconds: float = 10.0,
+        route: Optional[str] = None,
+        requests: Optional[int] = None,
+        interval_ms: Optional[int] = None,
+        include_idle: bool = False,
+        top: int = 25,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        self.mode = mode
+        self.seconds = max(0.0, min(float(seconds), float(settings.PROFILING_MAX_SECONDS)))
+        self.route = route
+        self.max_requests = requests if route else None
+        self.interval_s = max(1, interval_ms or settings.PROFILING_INTERVAL_MS) / 1000.0
+        self.include_idle = include_idle
+        self.top = top
+        self.requests = 0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.started_at = 0.0
+        self.elapsed_s = 0.0
+        self._done = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started_tracemalloc = False
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+
+    # ---- lifecycle ----
+
+    def start(self) -> "ProfileSession":
+        self.started_at = time.monotonic()
+        if self.mode == "cpu":
+            self._thread = threading.Thread(target=self._run, name="qeo-profiler", daemon=True)
+            self._thread.start()
+        elif not tracemalloc.is_tracing():
+            tracemalloc.start(settings.PROFILING_TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        return self
+
+    def finished(self) -> bool:
+        return self._done.is_set() or time.monotonic() - self.started_at >= self.seconds
+
+    def stop(self) -> None:
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self.elapsed_s = time.monotonic() - self.started_at
+        if self._thread is not None:
+            self._thread.join()
+        if self.mode == "alloc" and tracemalloc.is_tracing():
+            self._snapshot = tracemalloc.take_snapshot().filter_traces(
+                (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"))
+            )
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+
+    def note_request(self, route: str, path: str) -> None:
+        if self.max_requests is None or self.route not in (route, path):
+            return
+        self.requests += 1
+        if self.requests >= self.max_requests:
+            self._done.set()
+
+    # ---- cpu sampling ----
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            self._sample(me)
+
+    def _sample(self, skip_ident: int) -> None:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip_ident:
+                continue
+            code = frame.f_code
+            if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                continue
+            labels: List[str] = []
+            f: Any = frame
+            while f is not None:
+                labels.append(_label(f.f_code))
+                f = f.f_back
+            labels.append(names.get(ident, f"thread-{ident}"))
+            labels.reverse()
+            self.stacks[";".join(labels)] += 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, one ``frame;frame;frame count`` line per distinct stack."""
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    # ---- reports ----
+
+    def allocations(self) -> List[Dict[str, Any]]:
+        if self._snapshot is None:
+            return []
+        out = []
+        for stat in self._snapshot.statistics("traceback")[: self.top]:
+            frames = list(stat.traceback)
+            out.append(
+                {
+                    "site": f"{frames[-1].filename}:{frames[-1].lineno}" if frames else "?",
+                    "sizeKb": round(stat.size / 1024.0, 1),
+                    "count": stat.count,
+                    "traceback": [f"{fr.filename}:{fr.lineno}" for fr in reversed(frames)],
+                }
+            )
+        return out
+
+    def summary(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "mode": self.mode,
+            "elapsedS": round(self.elapsed_s, 3),
+            "route": self.route,
+            "requests": self.requests,
+        }
+        if self.mode == "cpu":
+            out["samples"] = self.samples
+            out["intervalMs"] = int(self.interval_s * 1000)
+            out["topStacks"] = [{"stack": s, "count": n} for s, n in self.stacks.most_common(self.top)]
+        else:
+            out["totalKb"] = round(sum(s.size for s in self._snapshot.traces) / 1024.0, 1) if self._snapshot else 0.0
+            out["topAllocations"] = self.allocations()
+        return out
+
+
+def start(**kwargs: Any) -> ProfileSession:
+    """Start a session; raises ProfilerBusy if one is already running."""
+    global _active
+    with _lock:
+        if _active is not None:
+            raise ProfilerBusy("a profiling session is already running")
+        session = ProfileSession(**kwargs)
+        _active = session.start()
+    return session
+
+
+def finish(session: ProfileSession) -> None:
+    global _active
+    session.stop()
+    with _lock:
+        if _active is session:
+            _active = None
+
+
+def note_request(route: str, path: str) -> None:
+    """Called by the HTTP middleware for every completed request (no-op unless a session runs)."""
+    session = _active
+    if session is not None:
+        session.note_request(route, path)
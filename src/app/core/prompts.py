@@ -1,5 +1,166 @@
-"""LLM prompting templates and helpers for SQL explanation."""
+"""LLM prompting templates and helpers for SQL explanation.
+
+``explain_template`` compacts the plan into a token budget instead of pasting
+it: key metrics, the heuristic warnings and the hottest nodes by exclusive
+cost (``PlanTable.exclusive_cost``), added in that order while they fit. The
+budget depends on the model's context window (LLM_PROMPT_MAX_TOKENS overrides
+it), so prompts stay small and are never cut mid-token by a provider.
+"""
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.plan_model import plan_table
+
 SYSTEM_PROMPT = "You are an expert PostgreSQL database engineer explaining SQL queries."
-def explain_template(sql: str, ast=None, plan=None, warnings=None, metrics=None, audience="practitioner", style="concise", length="short", max_length=2000):
-    """Generate a simple prompt for explaining a SQL query."""
-    return f"Explain this SQL query in one sentence: {sql}"
+
+# Context windows (tokens) by model family; matched as a prefix of the model name
+_CONTEXT_TOKENS = {
+    "llama2": 4096,
+    "llama3": 8192,
+    "codellama": 16384,
+    "mistral": 8192,
+    "mixtral": 32768,
+    "qwen": 32768,
+    "gemma": 8192,
+    "phi": 2048,
+}
+_DEFAULT_CONTEXT_TOKENS = 2048
+# The prompt gets at most this share of the context window (the rest is system prompt and output)
+_PROMPT_SHARE = 4
+_MAX_DEFAULT_PROMPT_TOKENS = 1024
+# The SQL text may take at most half the budget; the plan summary needs the rest
+_SQL_SHARE = 2
+_MAX_HOT_NODES = 8
+_MAX_WARNINGS = 6
+_DETAIL_CHARS = 120
+_DETAIL_KEYS = ("Index Cond", "Hash Cond", "Merge Cond", "Join Filter", "Filter", "Sort Key", "Group Key")
+
+_AUDIENCE = {
+    "beginner": "Use simple terms and explain basic concepts.",
+    "practitioner": "Assume familiarity with SQL; give practical performance guidance.",
+    "dba": "Focus on plan choices, indexes and estimate errors.",
+}
+_LENGTH = {
+    "short": "Answer in two or three sentences.",
+    "medium": "Answer in one short paragraph.",
+    "long": "Answer in a few paragraphs.",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Conservative token count (about 3 characters per token) that holds for common tokenizers."""
+    return (len(text) + 2) // 3
+
+
+def token_budget(model: Optional[str] = None) -> int:
+    """Prompt token budget for ``model`` (LLM_PROMPT_MAX_TOKENS when set)."""
+    if settings.LLM_PROMPT_MAX_TOKENS > 0:
+        return settings.LLM_PROMPT_MAX_TOKENS
+    name = (model or settings.LLM_MODEL or "").lower()
+    context = _DEFAULT_CONTEXT_TOKENS
+    for family, tokens in _CONTEXT_TOKENS.items():
+        if name.startswith(family):
+            context = tokens
+            break
+    return min(context // _PROMPT_SHARE, _MAX_DEFAULT_PROMPT_TOKENS)
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    """Cut ``text`` to ``max_tokens`` at a whitespace boundary."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max(max_tokens * 3 - 16, 0)
+    cut = text.rfind(" ", 0, limit)
+    return text[: cut if cut > 0 else limit].rstrip() + " ...(truncated)"
+
+
+def _fmt(x: Optional[float]) -> str:
+    return "?" if x is None else f"{x:,.0f}"
+
+
+def hot_nodes(plan: Any, limit: int = _MAX_HOT_NODES) -> List[str]:
+    """One line per plan node, hottest first by exclusive cost, at most ``limit`` lines."""
+    t = plan_table(plan)
+    n = len(t)
+    if not n:
+        return []
+    total = t.cost(0) or 0.0
+    ranked = sorted(range(n), key=lambda i: (-t.exclusive_cost(i), i))[:limit]
+    lines = []
+    for i in ranked:
+        raw = t.raw[i]
+        name = t.type_name(i)
+        if t.relation[i]:
+            name += f" on {t.relation[i]}"
+        if raw.get("Index Name"):
+            name += f" using {raw['Index Name']}"
+        own = t.exclusive_cost(i)
+        parts = [f"{own / total:.0%} of cost" if total else f"cost {own:,.1f}", f"est rows {_fmt(t.rows(i))}"]
+        actual = t.rows(i, actual=True)
+        if actual is not None:
+            parts.append(f"actual rows {_fmt(actual)}")
+        for key in _DETAIL_KEYS:
+            value = raw.get(key)
+            if value:
+                if isinstance(value, list):
+                    value = ", ".join(map(str, value))
+                parts.append(f"{key}: {str(value)[:_DETAIL_CHARS]}")
+                break
+        lines.append(f"- {name}: " + "; ".join(parts))
+    return lines
+
+
+def _metrics_line(plan: Any, metrics: Optional[Dict[str, Any]]) -> Optional[str]:
+    t = plan_table(plan) if plan else None
+    parts = []
+    if t is not None and len(t):
+        parts.append(f"{len(t)} nodes, root {t.type_name(0)}, total cost {_fmt(t.cost(0))}")
+    if metrics:
+        if metrics.get("planning_time_ms"):
+            parts.append(f"planning {float(metrics['planning_time_ms']):.2f} ms")
+        if metrics.get("execution_time_ms"):
+            parts.append(f"execution {float(metrics['execution_time_ms']):.2f} ms")
+    return "Plan: " + ", ".join(parts) if parts else None
+
+
+def explain_template(sql: str, ast=None, plan=None, warnings=None, metrics=None, audience="practitioner", style="concise", length="short", max_tokens: Optional[int] = None, model: Optional[str] = None):
+    """Prompt explaining ``sql`` and a summary of its plan within ``max_tokens`` (default: ``token_budget(model)``)."""
+    budget = max_tokens or token_budget(model)
+    guidance = " ".join(
+        s for s in (
+            _AUDIENCE.get(audience, ""),
+            _LENGTH.get(length, ""),
+            "Be concise." if style == "concise" else "Be specific and technical.",
+        ) if s
+    )
+    head = f"Explain this SQL query and its execution plan for a {audience}.\n\nSQL:\n"
+    left = budget - estimate_tokens(head) - estimate_tokens(guidance) - 2
+    query = _clip(" ".join((sql or "").split()), max(left // _SQL_SHARE, 8))
+    left -= estimate_tokens(query)
+
+    sections: List[str] = [head + query]
+
+    def add(title: str, lines: List[str]) -> None:
+        # Whole lines only, in priority order, while they fit
+        nonlocal left
+        kept: List[str] = []
+        cost = estimate_tokens(title) + 1
+        for line in lines:
+            c = estimate_tokens(line) + 1
+            if cost + c > left:
+                break
+            kept.append(line)
+            cost += c
+        if kept:
+            sections.append("\n".join([title] + kept))
+            left -= cost
+
+    line = _metrics_line(plan, metrics)
+    if line:
+        add("", [line])
+    if warnings:
+        add("Warnings:", [f"- {w.get('code', '')}: {w.get('detail', '')}" for w in warnings[:_MAX_WARNINGS]])
+    if plan:
+        add("Most expensive nodes (exclusive cost):", hot_nodes(plan))
+    sections.append(guidance)
+    return "\n\n".join(s.strip("\n") for s in sections)
@@ -0,0 +1,258 @@
+"""
+Record/replay backend for ``app.core.db``.
+
+``DB_BACKEND=record``: intercepted db calls (EXPLAIN, EXPLAIN costs, HypoPG
+trial costs, catalog, table/column stats, ``run_sql``) run against Postgres as
+usual and their results are added to a bundle, written to ``REPLAY_BUNDLE`` at
+shutdown (or when a ``recording()`` block exits).
+
+``DB_BACKEND=replay``: the same calls are answered from the bundle and no
+connection is ever opened. A call that was not recorded raises ReplayMiss,
+which callers handle like any other database error (static analysis fallback).
+
+Entries are keyed by the arguments that determine the result (whitespace-
+normalized SQL, analyze flag, schema, table); timeouts are ignored. Per-table
+stats are stored per table so a replayed call may ask for any recorded subset.
+A db call made inside another intercepted call (the EXPLAIN inside a HypoPG
+trial) belongs to the outer result and is not recorded on its own.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import copy
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar, Union
+
+from app.core.config import settings
+from app.core.serialization import loads
+
+MODES = ("live", "record", "replay")
+BUNDLE_FORMAT = 1
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_nested: contextvars.ContextVar[bool] = contextvars.ContextVar("qeo_replay_nested", default=False)
+_state_lock = threading.Lock()
+
+
+class ReplayMiss(Exception):
+    """The replay bundle has no recorded result for this call."""
+
+
+class Bundle:
+    """Recorded db results: ``entries[kind][key] = value`` plus free-form ``meta``."""
+
+    def __init__(self, entries: Optional[Dict[str, Dict[str, Any]]] = None, meta: Optional[Dict[str, Any]] = None):
+        self.entries: Dict[str, Dict[str, Any]] = entries or {}
+        self.meta: Dict[str, Any] = meta or {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self.entries.values())
+
+    def has(self, kind: str, key: str) -> bool:
+        return key in self.entries.get(kind, {})
+
+    def get(self, kind: str, key: str) -> Any:
+        try:
+            return self.entries[kind][key]
+        except KeyError:
+            raise ReplayMiss(f"no recorded {kind} for {key[:120]!r}") from None
+
+    def put(self, kind: str, key: str, value: Any) -> None:
+        with self._lock:
+            self.entries.setdefault(kind, {})[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"format": BUNDLE_FORMAT, "meta": dict(self.meta), "entries": self.entries}
+
+    def save(self, path: str) -> None:
+        """Write the bundle as sorted, indented JSON (stable diffs when fixtures are re-recorded)."""
+        data = self.to_dict()
+        data["meta"].setdefault("recordedAt", time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()))
+        tmp = f"{path}.tmp"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, sort_keys=True, default=str)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Bundle":
+        with open(path, "rb") as f:
+            data = loads(f.read())
+        if data.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"unsupported replay bundle format: {data.get('format')!r}")
+        return cls(entries=data.get("entries") or {}, meta=data.get("meta") or {})
+
+
+_mode: str = settings.DB_BACKEND if settings.DB_BACKEND in MODES else "live"
+_path: str = settings.REPLAY_BUNDLE
+_bundle: Optional[Bundle] = None
+
+
+def mode() -> str:
+    return _mode
+
+
+def configure(new_mode: str, path: Optional[str] = None, bundle: Optional[Bundle] = None) -> None:
+    """Switch backend mode process-wide (worker threads included)."""
+    global _mode, _path, _bundle
+    if new_mode not in MODES:
+        raise ValueError(f"DB backend must be one of {', '.join(MODES)}")
+    with _state_lock:
+        _mode = new_mode
+        _path = path if path is not None else settings.REPLAY_BUNDLE
+        _bundle = bundle
+
+
+def bundle() -> Bundle:
+    """The active bundle, loaded from REPLAY_BUNDLE on first use."""
+    global _bundle
+    with _state_lock:
+        if _bundle is None:
+            if _path and os.path.exists(_path):
+                _bundle = Bundle.load(_path)
+            elif _mode == "replay":
+                raise ReplayMiss(f"replay bundle not found: {_path or '(REPLAY_BUNDLE unset)'}")
+            else:
+                _bundle = Bundle()
+        return _bundle
+
+
+def flush() -> None:
+    """Write the recording to its path (record mode only)."""
+    if _mode == "record" and _bundle is not None and _path:
+        _bundle.save(_path)
+
+
+@contextmanager
+def recording(path: Optional[str] = None, meta: Optional[Dict[str, Any]] = None) -> Iterator[Bundle]:
+    """Record db results for the duration of the block; saved to ``path`` on exit."""
+    prev = (_mode, _path, _bundle)
+    b = Bundle(meta=meta)
+    configure("record", path=path or "", bundle=b)
+    try:
+        yield b
+    finally:
+        if path:
+            b.save(path)
+        configure(prev[0], path=prev[1], bundle=prev[2])
+
+
+@contextmanager
+def replaying(source: Union[str, Bundle]) -> Iterator[Bundle]:
+    """Serve db calls from ``source`` (bundle or path) for the duration of the block."""
+    prev = (_mode, _path, _bundle)
+    b = Bundle.load(source) if isinstance(source, str) else source
+    configure("replay", path=source if isinstance(source, str) else "", bundle=b)
+    try:
+        yield b
+    finally:
+        configure(prev[0], path=prev[1], bundle=prev[2])
+
+
+def normalize_sql(sql: str) -> str:
+    return " ".join((sql or "").split())
+
+
+def _call(func: Callable[..., Any], args: Any, kwargs: Any) -> Any:
+    token = _nested.set(True)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _nested.reset(token)
+
+
+def recorded(
+    kind: str,
+    key: Callable[..., str],
+    encode: Optional[Callable[[Any], Any]] = None,
+    decode: Optional[Callable[[Any], Any]] = None,
+) -> Callable[[F], F]:
+    """Intercept a db function: ``key(**bound_args)`` names the recorded result.
+
+    ``encode``/``decode`` map the result to and from its stored form (e.g. to
+    share per-table entries, or restore tuples JSON turned into lists).
+    """
+
+    def deco(func: F) -> F:
+        sig = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _mode == "live" or _nested.get():
+                return func(*args, **kwargs)
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            k = key(**bound.arguments)
+            if _mode == "replay":
+                # Callers may annotate returned plans; never hand out the stored object
+                value = copy.deepcopy(bundle().get(kind, k))
+                return decode(value) if decode else value
+            value = _call(func, args, kwargs)
+            bundle().put(kind, k, encode(value) if encode else value)
+            return value
+
+        return wrapper  # type: ignore[return-value]
+
+    return deco
+
+
+def recorded_per_table(kind: str) -> Callable[[F], F]:
+    """Intercept ``func(tables, schema=...) -> {table: value}``, storing one entry per table.
+
+    Tables the live call did not return (missing relations) are recorded as
+    absent so replay returns the same subset.
+    """
+
+    def deco(func: F) -> F:
+        sig = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _mode == "live" or _nested.get():
+                return func(*args, **kwargs)
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            schema = bound.arguments.get("schema") or "public"
+            tables: List[str] = sorted({t for t in bound.arguments.get("tables") or [] if t and not t.startswith("(")})
+            b = bundle()
+            if _mode == "replay":
+                out: Dict[str, Any] = {}
+                for t in tables:
+                    entry = b.get(kind, f"{schema}.{t}")
+                    if entry.get("present"):
+                        out[t] = copy.deepcopy(entry["value"])
+                return out
+            result = _call(func, args, kwargs)
+            for t in tables:
+                present = t in result
+                b.put(kind, f"{schema}.{t}", {"present": present, "value": result.get(t) if present else None})
+            return result
+
+        return wrapper  # type: ignore[return-value]
+
+    return deco
+
+
+def table_entry(value: Any) -> Dict[str, Any]:
+    """Stored form of one table's result, shared by single-table and per-table recordings."""
+    return {"present": True, "value": value}
+
+
+def table_value(entry: Dict[str, Any]) -> Any:
+    return entry["value"] if entry.get("present") else {}
+
+
+def check_live() -> None:
+    """Refuse to open a connection in replay mode (call paths that are not recorded)."""
+    if _mode == "replay" and not _nested.get():
+        raise ReplayMiss("replay backend: no database connection for unrecorded calls")
@@ -0,0 +1,75 @@
+"""Fast JSON encoding/decoding for plan-heavy payloads.
+
+Uses orjson when installed (``pip install queryexpnopt[fast]``) and falls back
+to the stdlib json module otherwise. Plans are plain dict/list trees, so they
+are passed to the encoder as-is instead of being re-validated and re-walked by
+Pydantic on the way out.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+try:  # optional dependency
+    import orjson as _orjson
+except Exception:  # pragma: no cover - exercised when orjson is missing
+    _orjson = None
+
+
+def _default(obj: Any) -> Any:
+    # Pydantic models are expanded one level; nested plain containers are
+    # handled natively by the encoder.
+    if isinstance(obj, BaseModel):
+        return dict(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes."""
+    if _orjson is not None:
+        return _orjson.dumps(obj, default=_default, option=_orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from str/bytes."""
+    if _orjson is not None:
+        return _orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the fast encoder; used as the app default."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def fast_response(model: Any, status_code: int = 200) -> FastJSONResponse:
+    """Return a response model without FastAPI's validate-and-serialize pass.
+
+    Only the top-level fields are read (``dict(model)``); nested plans and
+    suggestion lists go straight to the encoder.
+    """
+    return FastJSONResponse(content=dict(model), status_code=status_code)
+
+
+def register_psycopg2_json() -> None:
+    """Make psycopg2 decode json/jsonb columns (e.g. EXPLAIN FORMAT JSON) with ``loads``."""
+    try:
+        import psycopg2.extras
+
+        psycopg2.extras.register_default_json(globally=True, loads=loads)
+        psycopg2.extras.register_default_jsonb(globally=True, loads=loads)
+    except Exception:
+        pass
@@ -0,0 +1,122 @@
+"""
+Single-flight coalescing of identical concurrent requests.
+
+Dashboards often fire the same /explain (with ``nl=true``) from many tabs at
+once. Instead of each request running its own EXPLAIN and LLM call, the first
+one (the leader) runs the pipeline and every identical request that arrives
+while it is in flight waits for and returns the leader's result.
+
+Requests are identical when their key matches: endpoint, SQL fingerprint
+(comments and whitespace normalized, literals kept), all other request options,
+and the process catalog version (``db.catalog_version``), so a request made
+after local DDL never joins a computation started before it. Nothing is cached:
+the entry is removed as soon as the leader finishes.
+
+Results are shared objects and must be treated as read-only. Waiters keep
+honouring their own cancel scope; if the leader was cancelled because its own
+client disconnected, the waiters retry (one of them becomes the new leader).
+Any other leader error is raised in every waiter.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from app.core import cancel, db
+from app.core.config import settings
+from app.core.metrics import count_coalesced
+from app.core.serialization import dumps
+
+T = TypeVar("T")
+
+_LINE_COMMENT = re.compile(r"--[^\n]*")
+_BLOCK_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+
+
+def fingerprint(sql: str) -> str:
+    """Stable digest of a statement's text, ignoring comments, whitespace and a trailing semicolon."""
+    text = _BLOCK_COMMENT.sub(" ", _LINE_COMMENT.sub(" ", sql or ""))
+    text = " ".join(text.split()).rstrip(";").rstrip()
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def request_key(endpoint: str, sql: str, options: Dict[str, Any]) -> Tuple[str, str, bytes, int]:
+    """Coalescing key for one request; ``options`` are all request fields except the SQL."""
+    return (endpoint, fingerprint(sql), dumps(dict(sorted(options.items()))), db.catalog_version())
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class Group:
+    """Keyed single-flight group for blocking calls made from worker threads."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.coalesced = 0
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key: Hashable, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run ``func(*args, **kwargs)``, or wait for the identical call already in flight."""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                else:
+                    self.coalesced += 1
+            if leader:
+                return self._lead(key, call, func, args, kwargs)
+            count_coalesced(self.name)
+            self._wait(call)
+            err = call.error
+            if isinstance(err, cancel.QueryCancelled) and err.reason == "client_disconnect":
+                continue
+            if err is not None:
+                raise err
+            return call.result
+
+    def _lead(self, key: Hashable, call: _Call, func: Callable[..., T], args: Any, kwargs: Any) -> T:
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    @staticmethod
+    def _wait(call: _Call) -> None:
+        poll_s = max(settings.CANCEL_POLL_MS, 1) / 1000.0
+        while not call.event.wait(poll_s):
+            # The waiter's own client may go away while the leader is still running
+            cancel.checkpoint()
+
+
+explain = Group("explain")
+optimize = Group("optimize")
+
+
+def run(group: Group, sql: str, options: Dict[str, Any], func: Callable[..., T], *args: Any) -> T:
+    """Coalesce ``func(*args)`` in ``group`` when SINGLEFLIGHT_ENABLED, else just call it."""
+    if not settings.SINGLEFLIGHT_ENABLED:
+        return func(*args)
+    return group.do(request_key(group.name, sql, options), func, *args)
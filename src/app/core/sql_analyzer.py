@@ -2,6 +2,8 @@ from typing import List, Dict, Any, Optional
 import re
 from sqlglot import parse_one, exp
 
+from app.core.tracing import traced
+
 DIALECT = "duckdb"
 
 def _sql(node: exp.Expression) -> str:
@@ -60,6 +62,18 @@ def _relation_name_alias(rel: exp.Expression):
     # Fallback
     return _sql(rel), None, raw
 
+def _relation_schema(rel: exp.Expression) -> Optional[str]:
+    # Schema qualifying a table reference ("bench_sf1" in bench_sf1.orders), None when unqualified
+    inner = rel.this if isinstance(rel, exp.Alias) else rel
+    return (inner.db or None) if isinstance(inner, exp.Table) else None
+
+def query_schema(ast_info: Dict[str, Any]) -> str:
+    """Schema whose catalog describes the statement: the first one its tables name, else ``public``."""
+    for t in ast_info.get("tables") or []:
+        if t.get("schema"):
+            return t["schema"]
+    return "public"
+
 def extract_tables(ast: exp.Expression):
     out = []
     if isinstance(ast, exp.Select):
@@ -70,15 +84,15 @@ def extract_tables(ast: exp.Expression):
             if hasattr(from_expr, "expressions") and from_expr.expressions:
                 for rel in from_expr.expressions:
                     name, alias, raw = _relation_name_alias(rel)
-                    out.append({"name": name, "alias": alias, "raw": raw})
+                    out.append({"name": name, "alias": alias, "raw": raw, "schema": _relation_schema(rel)})
             elif hasattr(from_expr, "this") and from_expr.this:
                 # Single table in FROM (this is the case for "FROM users")
                 name, alias, raw = _relation_name_alias(from_expr.this)
-                out.append({"name": name, "alias": alias, "raw": raw})
+                out.append({"name": name, "alias": alias, "raw": raw, "schema": _relation_schema(from_expr.this)})
             else:
                 # Fallback: try to extract from the FROM expression itself
                 name, alias, raw = _relation_name_alias(from_expr)
-                out.append({"name": name, "alias": alias, "raw": raw})
+                out.append({"name": name, "alias": alias, "raw": raw, "schema": _relation_schema(from_expr)})
         
         # JOIN clauses
         joins = ast.args.get("joins") or []
@@ -87,11 +101,11 @@ def extract_tables(ast: exp.Expression):
                 rel = join.this
                 if rel:
                     name, alias, raw = _relation_name_alias(rel)
-                    out.append({"name": name, "alias": alias, "raw": raw})
+                    out.append({"name": name, "alias": alias, "raw": raw, "schema": _relation_schema(rel)})
     else:
         # For non-SELECT queries, find the first table
         for t in ast.find_all(exp.Table):
-            out.append({"name": t.name, "alias": None, "raw": _sql(t)})
+            out.append({"name": t.name, "alias": None, "raw": _sql(t), "schema": t.db or None})
             break
     return out
 
@@ -172,6 +186,7 @@ def _has_restrictive_filter(filters: List[str]) -> bool:
         if re.search(r"=\s*\d", s): return True
     return False
 
+@traced("parse")
 def parse_sql(sql: str) -> Dict[str, Any]:
     try:
         ast = parse_one(sql)
@@ -0,0 +1,22 @@
+"""Helpers for streaming responses: newline-delimited JSON (NDJSON) and server-sent events (SSE)."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from app.core.serialization import dumps_str
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+# Disable proxy buffering (nginx) so events reach the client as they are produced
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def ndjson_line(obj: Any) -> str:
+    """Serialize one record as a compact JSON line terminated by a newline."""
+    return dumps_str(obj) + "\n"
+
+
+def sse_event(event: str, data: Any) -> str:
+    """One SSE frame: a named event whose data is a compact JSON document."""
+    return f"event: {event}\ndata: {dumps_str(data)}\n\n"
@@ -0,0 +1,149 @@
+"""
+Request-scoped stage spans.
+
+The HTTP middleware opens a Trace per request and publishes it in a context
+variable; pipeline code wraps stages in ``span("explain")`` etc. Each span
+
+- is appended to the current trace (if any, thread-safe: stages may run in
+  worker threads that inherit the request context),
+- is observed in the ``stage_seconds{stage}`` Prometheus histogram.
+
+At the end of the request the middleware returns the per-stage totals in a
+``Server-Timing`` header and, when TRACE_FILE is set, appends the full span
+list as one JSON line to that file.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import observe_stage
+from app.core.serialization import dumps
+
+_current: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("qeo_trace", default=None)
+_file_lock = threading.Lock()
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Span:
+    __slots__ = ("name", "start", "seconds", "thread")
+
+    def __init__(self, name: str, start: float):
+        self.name = name
+        self.start = start
+        self.seconds = 0.0
+        self.thread = threading.current_thread().name
+
+
+class Trace:
+    """Spans recorded for one request."""
+
+    def __init__(self, request_id: str = ""):
+        self.request_id = request_id
+        self.start = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def totals(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage {ms, count}, in order of first occurrence."""
+        out: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for s in spans:
+            t = out.setdefault(s.name, {"ms": 0.0, "count": 0})
+            t["ms"] += s.seconds * 1000.0
+            t["count"] += 1
+        return out
+
+    def server_timing(self, total_ms: Optional[float] = None) -> str:
+        parts = []
+        for name, t in self.totals().items():
+            item = f"{name};dur={t['ms']:.1f}"
+            if t["count"] > 1:
+                item += f';desc="x{int(t["count"])}"'
+            parts.append(item)
+        if total_ms is not None:
+            parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self, **extra: Any) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "rid": self.request_id,
+            **extra,
+            "spans": [
+                {
+                    "name": s.name,
+                    "start_ms": round((s.start - self.start) * 1000.0, 3),
+                    "dur_ms": round(s.seconds * 1000.0, 3),
+                    "thread": s.thread,
+                }
+                for s in spans
+            ],
+        }
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def trace_request(request_id: str = "") -> Iterator[Trace]:
+    """Open a Trace for the duration of the block and make it current."""
+    trace = Trace(request_id)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str) -> Iterator[Span]:
+    """Time one pipeline stage; ``span.seconds`` is set on exit."""
+    s = Span(name, time.perf_counter())
+    try:
+        yield s
+    finally:
+        s.seconds = time.perf_counter() - s.start
+        trace = _current.get()
+        if trace is not None:
+            trace.add(s)
+        observe_stage(name, s.seconds)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Decorator form of ``span`` for functions that are a whole stage."""
+
+    def deco(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return deco
+
+
+def write_trace_file(record: Dict[str, Any], path: Optional[str] = None) -> None:
+    """Append one trace record as a JSON line to TRACE_FILE (blocking; call off the event loop)."""
+    path = path or settings.TRACE_FILE
+    if not path:
+        return
+    line = dumps(record) + b"\n"
+    with _file_lock:
+        with open(path, "ab") as f:
+            f.write(line)
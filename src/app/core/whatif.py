@@ -6,13 +6,16 @@ only to measure planner cost deltas, and resets state after trials.
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+import contextvars
 import time
 import re
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from app.core.config import settings
-from app.core import db
+from app.core.deadline import Deadline
+from app.core.tracing import span, traced
+from app.core import db, admission
 from app.core.metrics import observe_whatif_trial, count_whatif_filtered
 
 
@@ -44,9 +47,19 @@ def _hypopg_available() -> bool:
         return False
 
 
-def evaluate(sql: str, suggestions: List[Dict[str, Any]], timeout_ms: int, force_enabled: bool | None = None) -> Dict[str, Any]:
+@traced("whatif")
+def evaluate(
+    sql: str,
+    suggestions: List[Dict[str, Any]],
+    timeout_ms: int,
+    force_enabled: bool | None = None,
+    deadline: Optional[Deadline] = None,
+) -> Dict[str, Any]:
     """Evaluate top-N index suggestions via HypoPG and return cost deltas.
 
+    With a request ``deadline``, the baseline, each trial and the trial batch
+    are bounded by the remaining budget; trials that no longer fit are skipped.
+
     Returns dict with:
       - ranking: "cost_based"|"heuristic"
       - whatIf: { enabled, available, trials, filteredByPct }
@@ -68,8 +81,17 @@ def evaluate(sql: str, suggestions: List[Dict[str, Any]], timeout_ms: int, force
             "suggestions": suggestions,
         }
 
+    # One admission slot covers the baseline EXPLAIN and the whole trial batch
+    with admission.slot("whatif"):
+        return _run_trials(sql, suggestions, timeout_ms, deadline)
+
+
+def _run_trials(sql: str, suggestions: List[Dict[str, Any]], timeout_ms: int, deadline: Optional[Deadline]) -> Dict[str, Any]:
+    def _budget(cap_ms: float) -> int:
+        return deadline.stage_ms(cap_ms) if deadline is not None else int(cap_ms)
+
     # Baseline cost
-    baseline = db.run_explain_costs(sql, timeout_ms=timeout_ms)
+    baseline = db.run_explain_costs(sql, timeout_ms=_budget(timeout_ms) or 1)
     base_cost = _plan_total_cost(baseline)
 
     # Select top-N index suggestions to trial
@@ -100,36 +122,39 @@ def evaluate(sql: str, suggestions: List[Dict[str, Any]], timeout_ms: int, force
     trials = 0
     results: Dict[str, Dict[str, float]] = {}
     start_global = time.time()
+    global_timeout_ms = _budget(settings.WHATIF_GLOBAL_TIMEOUT_MS)
     parallelism = max(1, int(settings.WHATIF_PARALLELISM))
 
     def _trial(cand: Dict[str, Any]) -> Tuple[str, float, float]:
+        with span("whatif_trial"):
+            return _trial_inner(cand)
+
+    def _trial_inner(cand: Dict[str, Any]) -> Tuple[str, float, float]:
         stmt_list = cand.get("statements") or []
         table, cols = ("", [])
         if stmt_list:
             table, cols = _parse_index_stmt(stmt_list[0])
-        if not table or not cols:
+        trial_ms = _budget(settings.WHATIF_TRIAL_TIMEOUT_MS)
+        if not trial_ms and deadline is not None:
+            deadline.skip("whatif_trial")
+        if not table or not cols or not trial_ms:
             return (cand.get("title") or "", base_cost, 0.0)
         try:
-            with db.get_conn() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(f"SET LOCAL statement_timeout = {int(settings.WHATIF_TRIAL_TIMEOUT_MS)}")
-                    cur.execute("SELECT hypopg_reset()")
-                    cur.execute("SELECT * FROM hypopg_create_index(%s)", (f"CREATE INDEX ON {table} ({', '.join(cols)})",))
-                    t0 = time.time()
-                    plan = db.run_explain_costs(sql, timeout_ms=int(settings.WHATIF_TRIAL_TIMEOUT_MS))
-                    observe_whatif_trial(time.time() - t0)
-                    cur.execute("SELECT hypopg_reset()")
-                    cost_after = _plan_total_cost(plan)
-                    return (cand.get("title") or "", cost_after, (time.time() - t0) * 1000.0)
+            t0 = time.time()
+            plan = db.run_hypothetical_costs(sql, table, cols, timeout_ms=int(trial_ms))
+            observe_whatif_trial(time.time() - t0)
+            cost_after = _plan_total_cost(plan)
+            return (cand.get("title") or "", cost_after, (time.time() - t0) * 1000.0)
         except Exception:
             return (cand.get("title") or "", base_cost, 0.0)
 
     with ThreadPoolExecutor(max_workers=parallelism) as ex:
-        futs = {ex.submit(_trial, c): c for c in candidates}
+        # Trials run in a copy of the request context so their spans land in the request trace
+        futs = {ex.submit(contextvars.copy_context().run, _trial, c): c for c in candidates}
         best_delta_pct = 0.0
         for fut in as_completed(futs):
             ttl_ms = (time.time() - start_global) * 1000.0
-            if ttl_ms > float(settings.WHATIF_GLOBAL_TIMEOUT_MS):
+            if ttl_ms > float(global_timeout_ms):
                 break
             title, cost_after, trial_ms = fut.result()
             trials += 1
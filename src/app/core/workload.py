@@ -1,58 +1,108 @@
-from typing import List, Dict, Any
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator
 from app.core import sql_analyzer, db, plan_heuristics
 from app.core.optimizer import analyze as analyze_one
 from app.core.config import settings
 
 
+class CandidateMerger:
+    """Incrementally merges index suggestions across queries.
+
+    Holds one entry per distinct index title, so memory is bounded by the number
+    of distinct candidates rather than by the number of statements.
+    """
+
+    def __init__(self) -> None:
+        self._seen: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, suggestions: Iterable[Dict[str, Any]]) -> None:
+        for s in suggestions:
+            if s.get("kind") != "index":
+                continue
+            key = s.get("title") or ""
+            cur = self._seen.get(key)
+            if not cur:
+                cur = {**s, "frequency": 0}
+                self._seen[key] = cur
+            cur["frequency"] += 1
+            # accumulate score if present
+            cur["score"] = float(f"{(float(cur.get('score') or 0.0) + float(s.get('score') or 0.0)):.3f}")
+
+    def top(self, top_k: int) -> List[Dict[str, Any]]:
+        out = list(self._seen.values())
+        out.sort(key=lambda x: (-float(x.get("score") or 0.0), -int(x.get("frequency") or 0), x.get("title") or ""))
+        return out[: top_k]
+
+
 def _merge_candidates(all_suggs: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
-    seen: Dict[str, Dict[str, Any]] = {}
-    for s in all_suggs:
-        if s.get("kind") != "index":
-            continue
-        key = s.get("title") or ""
-        cur = seen.get(key)
-        if not cur:
-            cur = {**s, "frequency": 0}
-            seen[key] = cur
-        cur["frequency"] += 1
-        # accumulate score if present
-        cur["score"] = float(f"{(float(cur.get('score') or 0.0) + float(s.get('score') or 0.0)):.3f}")
-    out = list(seen.values())
-    out.sort(key=lambda x: (-float(x.get("score") or 0.0), -int(x.get("frequency") or 0), x.get("title") or ""))
-    return out[: top_k]
+    merger = CandidateMerger()
+    merger.add(all_suggs)
+    return merger.top(top_k)
 
 
-def analyze_workload(sqls: List[str], top_k: int = 10, what_if: bool = False) -> Dict[str, Any]:
-    all_suggs: List[Dict[str, Any]] = []
-    per_query: List[Dict[str, Any]] = []
-    for sql in sqls:
-        info = sql_analyzer.parse_sql(sql)
-        if info.get("type") != "SELECT":
-            per_query.append({"sql": sql, "skipped": True})
-            continue
+def analyze_query(sql: str) -> Dict[str, Any]:
+    """Analyze a single workload statement and return its per-query entry."""
+    info = sql_analyzer.parse_sql(sql)
+    if info.get("type") != "SELECT":
+        return {"sql": sql, "skipped": True}
+    plan = None
+    warnings: List[Dict[str, Any]] = []
+    metrics: Dict[str, Any] = {}
+    try:
+        plan = db.run_explain(sql, analyze=False, timeout_ms=settings.OPT_TIMEOUT_MS_DEFAULT)
+        warnings, metrics = plan_heuristics.analyze(plan)
+    except Exception:
         plan = None
-        warnings: List[Dict[str, Any]] = []
-        metrics: Dict[str, Any] = {}
-        try:
-            plan = db.run_explain(sql, analyze=False, timeout_ms=settings.OPT_TIMEOUT_MS_DEFAULT)
-            warnings, metrics = plan_heuristics.analyze(plan)
-        except Exception:
-            plan = None
-        schema_info = db.fetch_schema()
-        try:
-            tables = [t.get("name") for t in (info.get("tables") or []) if t.get("name")]
-            stats = db.fetch_table_stats(tables, timeout_ms=settings.OPT_TIMEOUT_MS_DEFAULT)
-        except Exception:
-            stats = {}
-        options = {
-            "min_index_rows": settings.OPT_MIN_ROWS_FOR_INDEX,
-            "max_index_cols": settings.OPT_MAX_INDEX_COLS,
-        }
-        res = analyze_one(sql, info, plan, schema_info, stats, options)
-        suggs = res.get("suggestions", [])
-        all_suggs.extend(suggs)
-        per_query.append({"sql": sql, "suggestions": suggs})
-    merged = _merge_candidates(all_suggs, top_k)
-    return {"suggestions": merged, "perQuery": per_query}
+    schema = sql_analyzer.query_schema(info)
+    schema_info = db.fetch_schema(schema=schema)
+    try:
+        tables = [t.get("name") for t in (info.get("tables") or []) if t.get("name")]
+        stats = db.fetch_table_stats(tables, schema=schema, timeout_ms=settings.OPT_TIMEOUT_MS_DEFAULT)
+    except Exception:
+        stats = {}
+    options = {
+        "min_index_rows": settings.OPT_MIN_ROWS_FOR_INDEX,
+        "max_index_cols": settings.OPT_MAX_INDEX_COLS,
+    }
+    res = analyze_one(sql, info, plan, schema_info, stats, options)
+    return {"sql": sql, "suggestions": res.get("suggestions", [])}
+
 
+def iter_workload(sqls: Iterable[str], start: int = 0) -> Iterator[Dict[str, Any]]:
+    """Yield per-query entries in input order, beginning at index ``start``.
 
+    Used by the job runner to resume a checkpointed workload part-way through,
+    and by streaming callers that emit each entry as soon as it is ready.
+    """
+    for sql in islice(sqls, start, None):
+        yield analyze_query(sql)
+
+
+def stream_workload(sqls: Iterable[str], top_k: int = 10) -> Iterator[Dict[str, Any]]:
+    """Yield one event per statement, then a final event with merged suggestions.
+
+    Per-query entries are not retained after being yielded.
+    Events: {"event": "result", "index": i, ...entry} and
+    {"event": "done", "processed": n, "suggestions": [...]}.
+    """
+    merger = CandidateMerger()
+    n = 0
+    for i, entry in enumerate(iter_workload(sqls)):
+        merger.add(entry.get("suggestions") or [])
+        n = i + 1
+        yield {"event": "result", "index": i, **entry}
+    yield {"event": "done", "processed": n, "suggestions": merger.top(top_k)}
+
+
+def merge_per_query(per_query: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """Merge index suggestions across per-query entries into a ranked top-k list."""
+    merger = CandidateMerger()
+    for entry in per_query:
+        merger.add(entry.get("suggestions") or [])
+    return merger.top(top_k)
+
+
+def analyze_workload(sqls: List[str], top_k: int = 10, what_if: bool = False) -> Dict[str, Any]:
+    per_query = list(iter_workload(sqls))
+    merged = merge_per_query(per_query, top_k)
+    return {"suggestions": merged, "perQuery": per_query}
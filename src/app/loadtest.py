@@ -0,0 +1,320 @@
+"""HTTP load generator for the API (``qeo loadtest``).
+
+Replays a query corpus against a running server and reports, per endpoint,
+throughput, error rate, latency percentiles and a fixed-bucket histogram, so
+reports from different versions can be compared bucket for bucket.
+
+Two modes:
+
+- closed loop (``concurrency``): N workers each send the next request as soon
+  as the previous one completes; measures capacity.
+- open loop (``rps``): requests are started on a fixed schedule regardless of
+  how fast the server answers (bounded by ``max_inflight``); latency is
+  measured from the scheduled start, so queueing delay is not hidden
+  (coordinated omission).
+
+With ``llm_stats_url`` pointing at a mock Ollama server (app.mock_ollama) that
+the API uses as its LLM, the report also has the mock's request, error and
+rejection counts for the run, to relate explain latency to LLM pressure.
+
+Requires httpx (``pip install queryexpnopt[loadtest]``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+ENDPOINTS = {
+    "explain": "/api/v1/explain",
+    "optimize": "/api/v1/optimize",
+    "workload": "/api/v1/workload",
+}
+
+# Latency histogram upper bounds (ms); the last bucket is +Inf
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+DEFAULT_CORPUS = [
+    "SELECT * FROM orders WHERE user_id = 42 ORDER BY created_at DESC LIMIT 50",
+    "SELECT id, email FROM users WHERE status = 'active' ORDER BY created_at DESC LIMIT 20",
+    "SELECT o.id, u.email FROM orders o JOIN users u ON u.id = o.user_id WHERE o.status = 'paid' LIMIT 100",
+    "SELECT user_id, count(*) FROM orders GROUP BY user_id ORDER BY count(*) DESC LIMIT 10",
+    "SELECT * FROM orders WHERE created_at > now() - interval '1 day'",
+]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """``"explain=5,optimize=3,workload=1"`` -> normalized weights."""
+    weights: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        name, _, w = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"unknown endpoint {name!r}; expected one of {', '.join(ENDPOINTS)}")
+        weights[name] = float(w or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("endpoint mix is empty")
+    return {k: v / total for k, v in weights.items()}
+
+
+def _schedule(mix: Dict[str, float], slots: int = 100) -> List[str]:
+    """Deterministic interleaved endpoint sequence approximating the mix (smooth weighted round-robin)."""
+    current = {k: 0.0 for k in mix}
+    out: List[str] = []
+    for _ in range(slots):
+        for k, w in mix.items():
+            current[k] += w
+        pick = max(current, key=lambda k: current[k])
+        current[pick] -= 1.0
+        out.append(pick)
+    return out
+
+
+def _percentile(sorted_vals: List[float], pct: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, int(round(pct / 100.0 * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[k]
+
+
+class EndpointStats:
+    def __init__(self) -> None:
+        self.latencies_ms: List[float] = []
+        self.ok = 0
+        self.errors: Dict[str, int] = {}
+
+    def record(self, latency_ms: float, error: Optional[str]) -> None:
+        self.latencies_ms.append(latency_ms)
+        if error is None:
+            self.ok += 1
+        else:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def summary(self, duration_s: float) -> Dict[str, Any]:
+        lat = sorted(self.latencies_ms)
+        n = len(lat)
+        hist = [0] * (len(BUCKETS_MS) + 1)
+        for v in lat:
+            hist[bisect_left(BUCKETS_MS, v)] += 1
+        return {
+            "requests": n,
+            "ok": self.ok,
+            "errors": dict(sorted(self.errors.items())),
+            "errorRate": round((n - self.ok) / n, 4) if n else 0.0,
+            "throughputRps": round(n / duration_s, 2) if duration_s > 0 else 0.0,
+            "latencyMs": {
+                "p50": round(_percentile(lat, 50), 2),
+                "p90": round(_percentile(lat, 90), 2),
+                "p95": round(_percentile(lat, 95), 2),
+                "p99": round(_percentile(lat, 99), 2),
+                "max": round(lat[-1], 2) if lat else 0.0,
+                "mean": round(sum(lat) / n, 2) if n else 0.0,
+            },
+            "histogram": {
+                "boundsMs": list(BUCKETS_MS) + ["+Inf"],
+                "counts": hist,
+            },
+        }
+
+
+class LoadTest:
+    """One load-test run; see module docstring for the two modes."""
+
+    def __init__(
+        self,
+        base_url: str,
+        corpus: Optional[List[str]] = None,
+        mix: Optional[Dict[str, float]] = None,
+        duration_s: float = 30.0,
+        warmup_s: float = 0.0,
+        concurrency: Optional[int] = None,
+        rps: Optional[float] = None,
+        max_inflight: int = 256,
+        timeout_s: float = 60.0,
+        nl: bool = False,
+        workload_size: int = 10,
+        transport: Any = None,
+        llm_stats_url: Optional[str] = None,
+    ):
+        if not concurrency and not rps:
+            concurrency = 8
+        self.base_url = base_url.rstrip("/")
+        self.corpus = list(corpus or DEFAULT_CORPUS)
+        self.mix = mix or {"explain": 0.5, "optimize": 0.5}
+        self.duration_s = float(duration_s)
+        self.warmup_s = float(warmup_s)
+        self.concurrency = int(concurrency) if concurrency else None
+        self.rps = float(rps) if rps else None
+        self.max_inflight = max(1, int(max_inflight))
+        self.timeout_s = timeout_s
+        self.nl = nl
+        self.workload_size = max(1, int(workload_size))
+        self.transport = transport
+        self.llm_stats_url = llm_stats_url.rstrip("/") if llm_stats_url else None
+        self.stats: Dict[str, EndpointStats] = {k: EndpointStats() for k in self.mix}
+        self.dropped = 0
+        self._sequence = itertools.cycle(_schedule(self.mix))
+        self._sql = itertools.cycle(self.corpus)
+        self._measure_from = 0.0
+
+    def _next_request(self) -> Tuple[str, Dict[str, Any]]:
+        endpoint = next(self._sequence)
+        if endpoint == "workload":
+            return endpoint, {"sqls": [next(self._sql) for _ in range(self.workload_size)]}
+        body: Dict[str, Any] = {"sql": next(self._sql)}
+        if endpoint == "explain" and self.nl:
+            body["nl"] = True
+        return endpoint, body
+
+    async def _one(self, client: Any, started: float) -> None:
+        endpoint, body = self._next_request()
+        error: Optional[str] = None
+        try:
+            r = await client.post(ENDPOINTS[endpoint], json=body)
+            if r.status_code >= 400:
+                error = f"http_{r.status_code}"
+            elif endpoint in ("explain", "optimize") and not r.json().get("ok", True):
+                # Application-level failure reported in a 200 body
+                error = "not_ok"
+        except Exception as e:  # timeouts, connection resets
+            error = type(e).__name__
+        done = time.perf_counter()
+        if started >= self._measure_from:
+            self.stats[endpoint].record((done - started) * 1000.0, error)
+
+    async def _closed_loop(self, client: Any, end: float) -> None:
+        async def worker() -> None:
+            while time.perf_counter() < end:
+                await self._one(client, time.perf_counter())
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency or 1)))
+
+    async def _open_loop(self, client: Any, end: float) -> None:
+        interval = 1.0 / float(self.rps or 1.0)
+        inflight: set = set()
+        next_at = time.perf_counter()
+        while next_at < end:
+            now = time.perf_counter()
+            if next_at > now:
+                await asyncio.sleep(next_at - now)
+            if len(inflight) >= self.max_inflight:
+                # Client-side saturation: count the miss instead of queueing unboundedly
+                self.dropped += 1
+            else:
+                task = asyncio.ensure_future(self._one(client, next_at))
+                inflight.add(task)
+                task.add_done_callback(inflight.discard)
+            next_at += interval
+        if inflight:
+            await asyncio.gather(*inflight)
+
+    async def server_info(self, client: Any) -> Dict[str, Any]:
+        try:
+            r = await client.get("/")
+            return r.json() if r.status_code == 200 else {}
+        except Exception:
+            return {}
+
+    async def llm_stats(self) -> Optional[Dict[str, Any]]:
+        if not self.llm_stats_url:
+            return None
+        import httpx
+
+        try:
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                r = await client.get(f"{self.llm_stats_url}/mock/stats")
+                return r.json() if r.status_code == 200 else None
+        except Exception:
+            return None
+
+    async def run(self) -> Dict[str, Any]:
+        try:
+            import httpx
+        except ImportError as e:  # pragma: no cover - depends on optional dependency
+            raise RuntimeError("qeo loadtest requires httpx: pip install 'queryexpnopt[loadtest]'") from e
+
+        limits = httpx.Limits(max_connections=max(self.concurrency or 0, self.max_inflight), max_keepalive_connections=64)
+        async with httpx.AsyncClient(
+            base_url=self.base_url, timeout=self.timeout_s, limits=limits, transport=self.transport
+        ) as client:
+            info = await self.server_info(client)
+            llm_before = await self.llm_stats()
+            start = time.perf_counter()
+            self._measure_from = start + self.warmup_s
+            end = self._measure_from + self.duration_s
+            if self.rps:
+                await self._open_loop(client, end)
+            else:
+                await self._closed_loop(client, end)
+            measured_s = max(1e-9, min(time.perf_counter(), end) - self._measure_from)
+        report = self.report(info, measured_s)
+        llm_after = await self.llm_stats()
+        if llm_after is not None:
+            report["llm"] = _llm_delta(llm_before or {}, llm_after)
+        return report
+
+    def report(self, server: Dict[str, Any], measured_s: float) -> Dict[str, Any]:
+        total = EndpointStats()
+        for s in self.stats.values():
+            total.latencies_ms.extend(s.latencies_ms)
+            total.ok += s.ok
+            for k, v in s.errors.items():
+                total.errors[k] = total.errors.get(k, 0) + v
+        return {
+            "meta": {
+                "target": self.base_url,
+                "serverVersion": server.get("version"),
+                "mode": "open" if self.rps else "closed",
+                "rps": self.rps,
+                "concurrency": self.concurrency if not self.rps else None,
+                "durationS": self.duration_s,
+                "warmupS": self.warmup_s,
+                "mix": {k: round(v, 3) for k, v in self.mix.items()},
+                "nl": self.nl,
+                "corpusSize": len(self.corpus),
+                "droppedClientSide": self.dropped,
+                "startedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            },
+            "endpoints": {k: s.summary(measured_s) for k, s in self.stats.items()},
+            "total": total.summary(measured_s),
+        }
+
+
+def _llm_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Mock LLM counters for the run (warmup included), plus its peak concurrency and configuration."""
+    out: Dict[str, Any] = {k: after.get(k, 0) - before.get(k, 0) for k in ("requests", "completed", "errors", "rejected")}
+    out["peakActive"] = after.get("peakActive")
+    out["config"] = after.get("config")
+    return out
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Per-endpoint deltas of throughput, error rate and p50/p99 between two reports."""
+    rows: List[Dict[str, Any]] = []
+    for name, cur in {**current.get("endpoints", {}), "total": current.get("total", {})}.items():
+        prev = previous.get("total") if name == "total" else previous.get("endpoints", {}).get(name)
+        if not prev:
+            continue
+        row: Dict[str, Any] = {"endpoint": name}
+        for label, get in (
+            ("throughputRps", lambda d: d.get("throughputRps", 0.0)),
+            ("errorRate", lambda d: d.get("errorRate", 0.0)),
+            ("p50Ms", lambda d: d.get("latencyMs", {}).get("p50", 0.0)),
+            ("p99Ms", lambda d: d.get("latencyMs", {}).get("p99", 0.0)),
+        ):
+            old, new = float(get(prev)), float(get(cur))
+            row[label] = {"previous": old, "current": new, "pct": round((new - old) / old * 100.0, 1) if old else None}
+        rows.append(row)
+    return rows
+
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
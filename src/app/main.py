@@ -4,18 +4,47 @@ FastAPI application entry point.
 Mounts routers and provides minimal health route.
 """
 
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 import time
+import uuid
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routers import health, lint, explain, optimize, schema
+from app.routers import admin, health, lint, explain, optimize, schema
 from app.routers import workload
 from app.core.metrics import init_metrics, observe_request, metrics_exposition
+from app.core import jobs, llm_adapter, logs, nl_cache, nl_prefetch, profiler, replay, tracing
+from app.core.admission import AdmissionRejected
+from app.core.serialization import FastJSONResponse
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    logs.setup_logging()
+    # Resume checkpointed workload jobs left unfinished by a previous process
+    try:
+        jobs.get_manager()
+    except Exception:
+        pass
+    yield
+    jobs.shutdown_manager()
+    # DB_BACKEND=record: write captured db results to REPLAY_BUNDLE
+    replay.flush()
+    # Speculative explanations first: they write to the cache
+    nl_prefetch.reset()
+    nl_cache.reset()
+    await llm_adapter.reset_providers()
+    logs.shutdown_logging()
+
 
 app = FastAPI(
     title="SQL Query Explanation & Optimization Engine",
     description="A local, offline-capable tool for SQL analysis, explanation, and optimization",
     version="0.7.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # CORS middleware for development
@@ -34,7 +63,18 @@ app.add_middleware(
 @app.middleware("http")
 async def logging_middleware(request: Request, call_next):
     start = time.time()
-    rid = request.headers.get("x-request-id", str(int(start * 1000000)))
+    rid = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = logs.set_request_id(rid)
+    try:
+        if not settings.TRACING_ENABLED:
+            return await _handle(request, call_next, rid, start, None)
+        with tracing.trace_request(rid) as trace:
+            return await _handle(request, call_next, rid, start, trace)
+    finally:
+        logs.reset_request_id(token)
+
+
+async def _handle(request: Request, call_next, rid: str, start: float, trace):
     try:
         response = await call_next(request)
         duration_ms = int((time.time() - start) * 1000)
@@ -46,31 +86,36 @@ async def logging_middleware(request: Request, call_next):
             observe_request(route_tmpl, request.method, response.status_code, duration_ms / 1000.0)
         except Exception:
             pass
-        print(
-            {
-                "lvl": "info",
-                "rid": rid,
-                "method": request.method,
-                "path": request.url.path,
-                "status": response.status_code,
-                "dur_ms": duration_ms,
-            }
+        response.headers["X-Request-ID"] = rid
+        profiler.note_request(route_tmpl, request.url.path)
+        if trace is not None:
+            response.headers["Server-Timing"] = trace.server_timing(total_ms=(time.time() - start) * 1000.0)
+            if settings.TRACE_FILE:
+                record = trace.to_dict(route=route_tmpl, path=request.url.path, method=request.method, status=response.status_code, total_ms=duration_ms)
+                # File I/O off the event loop; the response does not wait for it
+                asyncio.get_running_loop().run_in_executor(None, tracing.write_trace_file, record)
+        logs.log_request(
+            request.method,
+            request.url.path,
+            response.status_code,
+            duration_ms,
+            stages=trace.totals() if trace is not None else None,
         )
         return response
     except Exception as e:
         duration_ms = int((time.time() - start) * 1000)
-        print(
-            {
-                "lvl": "error",
-                "rid": rid,
-                "method": request.method,
-                "path": request.url.path,
-                "error": str(e),
-                "dur_ms": duration_ms,
-            }
-        )
+        logs.log_request(request.method, request.url.path, 500, duration_ms, error=str(e))
         raise
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(_request: Request, exc: AdmissionRejected):
+    # Load shedding: 429 when the wait queue is full, 503 when the wait timed out
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after_s)},
+    )
+
 # Initialize metrics once on startup
 init_metrics()
 
@@ -89,6 +134,7 @@ app.include_router(explain.router, prefix="/api/v1", tags=["explain"])
 app.include_router(optimize.router, prefix="/api/v1", tags=["optimize"])
 app.include_router(schema.router, prefix="/api/v1", tags=["schema"])
 app.include_router(workload.router, prefix="/api/v1", tags=["workload"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
 
 
 @app.get("/")
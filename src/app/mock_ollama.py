@@ -0,0 +1,270 @@
+"""Stand-in Ollama server for offline LLM load testing (``qeo mock-ollama``).
+
+Implements the two endpoints the Ollama provider uses, ``POST /api/generate``
+(streaming NDJSON and non-streaming) and ``GET /api/version``, on the standard
+library's threading HTTP server, with knobs for the behaviour that matters
+under load:
+
+- latency: time to the first token, drawn from a fixed, uniform, exponential
+  or lognormal distribution around ``latency_ms``
+- token rate: generated tokens per second after the first one
+- error rate: fraction of generations answered with HTTP 500 and an
+  ``{"error": ...}`` body, like a crashing model runner
+- concurrency cap: generations running at once; up to ``max_queue`` more wait
+  for a slot and the rest get HTTP 503, like Ollama's OLLAMA_NUM_PARALLEL and
+  OLLAMA_MAX_QUEUE
+
+``GET /mock/stats`` returns request, error, rejection and peak-concurrency
+counters (``qeo loadtest --mock-llm`` adds them to its report).
+
+Point the API at it with ``LLM_PROVIDER=ollama OLLAMA_HOST=http://127.0.0.1:<port>``.
+Responses are canned text; only timing and failure behaviour are modelled.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+VERSION = "0.0.0-mock"
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+_WORDS = (
+    "The planner reads the largest table with a sequential scan and filters most rows afterwards. "
+    "An index on the filtered column would let it skip them. The hash join is cheap compared to the scan, "
+    "and the final sort only handles the rows that survive the filter."
+).split()
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 200.0
+    latency_dist: str = "lognormal"  # one of LATENCY_DISTRIBUTIONS
+    # Spread: sigma of log(latency) for lognormal, +/- fraction of latency_ms for uniform
+    latency_spread: float = 0.5
+    tokens_per_s: float = 50.0  # 0 = all tokens at once
+    response_tokens: int = 60
+    error_rate: float = 0.0
+    max_concurrent: int = 4  # 0 = unlimited
+    max_queue: int = 64
+    model: str = "mock"
+    seed: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        if self.latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"unknown latency distribution {self.latency_dist!r}; expected one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+        if not 0.0 <= self.error_rate <= 1.0:
+            raise ValueError("error_rate must be between 0 and 1")
+
+
+class _State:
+    """Counters and the concurrency slots shared by all handler threads."""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.rng = random.Random(config.seed)
+        self.slots = threading.BoundedSemaphore(config.max_concurrent) if config.max_concurrent > 0 else None
+        self.waiting = 0
+        self.active = 0
+        self.peak_active = 0
+        self.requests = 0
+        self.completed = 0
+        self.errors = 0
+        self.rejected = 0
+
+    def first_token_s(self) -> float:
+        c = self.config
+        with self.lock:
+            if c.latency_dist == "uniform":
+                ms = c.latency_ms * self.rng.uniform(1.0 - c.latency_spread, 1.0 + c.latency_spread)
+            elif c.latency_dist == "exponential":
+                ms = self.rng.expovariate(1.0 / c.latency_ms) if c.latency_ms > 0 else 0.0
+            elif c.latency_dist == "lognormal":
+                # latency_ms is the median
+                ms = c.latency_ms * math.exp(self.rng.gauss(0.0, c.latency_spread))
+            else:
+                ms = c.latency_ms
+        return max(0.0, ms) / 1000.0
+
+    def fails(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.config.error_rate
+
+    def acquire(self) -> bool:
+        """Take a generation slot, waiting in the bounded queue; False when the queue is full."""
+        with self.lock:
+            self.requests += 1
+            if self.slots is not None and self.waiting >= self.config.max_queue and self.active >= self.config.max_concurrent:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+        if self.slots is not None:
+            self.slots.acquire()
+        with self.lock:
+            self.waiting -= 1
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+        return True
+
+    def release(self, ok: bool) -> None:
+        with self.lock:
+            self.active -= 1
+            if ok:
+                self.completed += 1
+            else:
+                self.errors += 1
+        if self.slots is not None:
+            self.slots.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "completed": self.completed,
+                "errors": self.errors,
+                "rejected": self.rejected,
+                "active": self.active,
+                "waiting": self.waiting,
+                "peakActive": self.peak_active,
+                "config": asdict(self.config),
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "MockOllamaServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - stdlib signature
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:  # noqa: N802 - stdlib naming
+        if self.path == "/api/version":
+            self._send_json(200, {"version": VERSION})
+        elif self.path == "/mock/stats":
+            self._send_json(200, self.server.state.snapshot())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:  # noqa: N802 - stdlib naming
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            body = json.loads(raw or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON body"})
+            return
+        state = self.server.state
+        if not state.acquire():
+            self._send_json(503, {"error": "server busy, please try again. maximum pending requests exceeded"})
+            return
+        ok = False
+        try:
+            ok = self._generate(state, body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client gave up (timeout or cancelled request)
+            pass
+        finally:
+            state.release(ok)
+
+    def _generate(self, state: _State, body: Dict[str, Any]) -> bool:
+        c = state.config
+        model = body.get("model") or c.model
+        start = time.perf_counter()
+        time.sleep(state.first_token_s())
+        if state.fails():
+            self._send_json(500, {"error": "mock model runner failed"})
+            return False
+        tokens = [(" " if i else "") + _WORDS[i % len(_WORDS)] for i in range(max(1, c.response_tokens))]
+        interval = 1.0 / c.tokens_per_s if c.tokens_per_s > 0 else 0.0
+        if not body.get("stream", True):
+            time.sleep(interval * (len(tokens) - 1))
+            self._send_json(200, self._chunk(model, "".join(tokens), True, start, len(tokens)))
+            return True
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i and interval:
+                time.sleep(interval)
+            self._write_chunk(self._chunk(model, token, False, start, i + 1))
+        self._write_chunk(self._chunk(model, "", True, start, len(tokens)))
+        self.wfile.write(b"0\r\n\r\n")
+        return True
+
+    @staticmethod
+    def _chunk(model: str, text: str, done: bool, start: float, count: int) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "model": model,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "response": text,
+            "done": done,
+        }
+        if done:
+            out["total_duration"] = int((time.perf_counter() - start) * 1e9)
+            out["eval_count"] = count
+        return out
+
+    def _write_chunk(self, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    """Threading HTTP server with the mock state; ``port=0`` picks a free port."""
+
+    daemon_threads = True
+    # Enough backlog that connection bursts reach the queue/503 logic instead of being refused
+    request_queue_size = 256
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, config: Optional[MockConfig] = None):
+        super().__init__((host, port), _Handler)
+        self.state = _State(config or MockConfig())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats(self) -> Dict[str, Any]:
+        return self.state.snapshot()
+
+    def start(self) -> "MockOllamaServer":
+        """Serve from a background daemon thread (tests, in-process load runs)."""
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def __enter__(self) -> "MockOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
@@ -5,9 +5,11 @@ This provider is useful for testing and development when a real LLM
 is not needed or available.
 """
 
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, AsyncIterator, Iterator, List
 import os
+import re
 from app.core.llm_adapter import LLMProvider
+from app.core.plan_model import plan_table
 
 _TEMPLATES: Dict[str, str] | None = None
 
@@ -33,24 +35,16 @@ def _load_templates() -> Dict[str, str]:
     return tmpl
 
 def _walk_plan_nodes(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
-    nodes: List[Dict[str, Any]] = []
-    if not isinstance(plan, dict):
-        return nodes
-    root = plan.get("Plan", plan)
-    def _rec(n: Dict[str, Any]):
-        nodes.append(n)
-        for ch in (n.get("Plans") or []):
-            if isinstance(ch, dict):
-                _rec(ch)
-    if isinstance(root, dict):
-        _rec(root)
-    return nodes
+    # Pre-order node dicts from the shared flattened plan model
+    return list(plan_table(plan).raw)
 
 class DummyLLMProvider(LLMProvider):
     """
     Dummy LLM provider that returns fixed responses based on input length.
     Useful for testing and development.
     """
+
+    local = True
     
     def complete(self, prompt: str, system: Optional[str] = None) -> str:
         """
@@ -83,6 +77,19 @@ class DummyLLMProvider(LLMProvider):
             return "Mixed scans and joins observed; consider indexing join/filter columns for frequent queries."
         return "Complex plan with multiple joins and sorts; adding appropriate indexes and pushing down filters may help."
 
+    def stream(self, prompt: str, system: Optional[str] = None) -> Iterator[str]:
+        """Yield the deterministic response word by word (exercises streaming clients)."""
+        for piece in re.findall(r"\S+\s*", self.complete(prompt, system=system)):
+            yield piece
+
+    async def acomplete(self, prompt: str, system: Optional[str] = None) -> str:
+        # Pure CPU and fast: no need for a worker thread
+        return self.complete(prompt, system=system)
+
+    async def astream(self, prompt: str, system: Optional[str] = None) -> AsyncIterator[str]:
+        for piece in self.stream(prompt, system=system):
+            yield piece
+
     def is_available(self) -> bool:  # compat for structure tests
         return True
 
@@ -3,113 +3,342 @@ Ollama LLM provider implementation.
 
 This provider uses the Ollama HTTP API to generate completions using
 locally running models.
+
+The provider is a long-lived singleton (see app.core.llm_adapter): blocking
+calls share one ``requests.Session`` and async calls one ``httpx.AsyncClient``
+(when httpx is installed), so connections to Ollama are kept alive. Failed
+attempts are retried with exponential backoff and jitter, but never past the
+request deadline; a call that fails for good is reported to the provider's
+circuit breaker. Each call claims the breaker (and its half-open trial slot)
+before contacting Ollama and raises CircuitOpen when refused.
 """
 
+import asyncio
 import os
 import json
-from typing import Optional, Dict, Any
+import random
+import time
+import weakref
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple
 import requests
 from requests.exceptions import RequestException
 
 from app.core.config import settings
-from app.core.llm_adapter import LLMProvider
+from app.core.llm_adapter import LLMProvider, breaker
+from app.core.logs import get_logger, request_id
+from app.core import deadline
+
+_log = get_logger("llm.ollama")
+
+
+class OllamaError(Exception):
+    """Error reported by Ollama in a response body (e.g. unknown model); not retried."""
+
+
+def _status_retryable(status: int) -> bool:
+    return status >= 500 or status == 429
+
+
+def _retryable(e: BaseException) -> bool:
+    """Transport failures, timeouts and 5xx/429 are retried; everything else fails at once."""
+    if isinstance(e, requests.HTTPError):
+        return e.response is None or _status_retryable(e.response.status_code)
+    if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+        return True
+    try:
+        import httpx
+    except ImportError:  # pragma: no cover - depends on optional dependency
+        return False
+    if isinstance(e, httpx.HTTPStatusError):
+        return _status_retryable(e.response.status_code)
+    return isinstance(e, httpx.TransportError)
+
 
 class OllamaLLMProvider(LLMProvider):
     """
     LLM provider that uses local Ollama server for completions.
-    
+
     Configuration via environment variables:
     - OLLAMA_HOST: Ollama server URL (default: http://127.0.0.1:11434)
     - LLM_MODEL: Model to use (default: llama2:13b-instruct)
-    - LLM_TIMEOUT_S: Request timeout in seconds (default: 30)
+    - LLM_TIMEOUT_S: Per-attempt timeout in seconds (default: 30)
+    - LLM_MAX_RETRIES / LLM_RETRY_BACKOFF_MS: Retries after a failed attempt
     """
-    
+
     def __init__(self):
         """Initialize provider with configuration from settings."""
         self.host = settings.OLLAMA_HOST.rstrip("/")
         self.model = settings.LLM_MODEL
-        self.timeout = 60  # Default timeout
-        self.max_retries = 2  # Number of retries on timeout
-        self.retry_timeout = 45  # Shorter timeout for retries
-    
+        self.timeout = float(settings.LLM_TIMEOUT_S)
+        self.max_retries = max(0, settings.LLM_MAX_RETRIES)
+        self.backoff_ms = max(0, settings.LLM_RETRY_BACKOFF_MS)
+        # Shared by all worker threads; keeps connections to Ollama alive between requests
+        self._session = requests.Session()
+        # httpx clients are bound to the loop that opened them: one per loop, dropped with it
+        self._aclients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+
+    def _request(self, prompt: str, system: Optional[str], stream: bool) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """Headers and /api/generate payload for one completion."""
+        headers = {'Content-Type': 'application/json'}
+        rid = request_id()
+        if rid:
+            headers['X-Request-ID'] = rid
+        # Prompts are sized by app.core.prompts to the model's token budget; truncating here would cut mid-token
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream
+        }
+
+        # Add system context if provided
+        if system:
+            payload["system"] = system
+        return headers, payload
+
+    def _attempt_timeout(self) -> float:
+        """Timeout for the next attempt, bounded by the request deadline (0 = no budget left)."""
+        return deadline.stage_ms(self.timeout * 1000) / 1000.0
+
+    def _backoff(self, attempt: int) -> Optional[float]:
+        """Sleep before the attempt after ``attempt``; None when no retry is left or it would outlive the deadline."""
+        if attempt > self.max_retries:
+            return None
+        delay = random.uniform(0.0, self.backoff_ms / 1000.0 * (2 ** (attempt - 1)))
+        d = deadline.current()
+        if d is not None and d.remaining_ms() <= delay * 1000 + settings.DEADLINE_MIN_STAGE_MS:
+            return None
+        return delay
+
+    def _failed(self, attempts: int, last_error: Optional[BaseException]) -> Exception:
+        """Error for a call that gave up after ``attempts`` backend attempts."""
+        if attempts:
+            # A deadline that ran out before the first attempt says nothing about Ollama's health
+            breaker("ollama").record_failure()
+        return Exception(f"Ollama request failed after {attempts} attempt(s). Last error: {str(last_error)}")
+
+    @staticmethod
+    def _check(result: Dict[str, Any]) -> Dict[str, Any]:
+        if "error" in result:
+            raise OllamaError(f"Ollama error: {result['error']}")
+        return result
+
     def complete(self, prompt: str, system: Optional[str] = None) -> str:
         """
         Generate completion using Ollama's HTTP API.
-        
+
         Args:
             prompt: The prompt to complete
             system: Optional system context/instruction
-        
+
         Returns:
             Generated completion text
-            
+
         Raises:
             Exception: If completion fails
         """
-        import time
         start_time = time.time()
         last_error = None
-        
-        # Prepare headers and payload
-        headers = {'Content-Type': 'application/json'}
-        payload = {
-            "model": self.model,
-            "prompt": prompt[:1000],  # Limit prompt size
-            "stream": False
-        }
-        
-        # Add system context if provided
-        if system:
-            payload["system"] = system[:500]  # Limit system prompt size
-        
-        # Try with initial timeout, then retry with shorter timeouts
-        timeouts = [self.timeout] + [self.retry_timeout] * self.max_retries
-        
-        for attempt, timeout in enumerate(timeouts, 1):
+        headers, payload = self._request(prompt, system, stream=False)
+
+        with breaker("ollama").call():
+            attempt = 0
+            while True:
+                attempt += 1
+                timeout = self._attempt_timeout()
+                if not timeout:
+                    last_error = last_error or TimeoutError("request deadline exhausted")
+                    attempt -= 1
+                    break
+                try:
+                    _log.debug("ollama request", extra={"attempt": attempt, "timeout_s": timeout, "host": self.host, "model": self.model})
+                    response = self._session.post(f"{self.host}/api/generate", headers=headers, json=payload, timeout=timeout)
+                    response.raise_for_status()
+                    result = self._check(response.json())
+                    breaker("ollama").record_success()
+                    _log.info(
+                        "ollama completed",
+                        extra={"dur_ms": int((time.time() - start_time) * 1000), "model_ms": int(result.get("total_duration", 0) / 1e6), "attempt": attempt},
+                    )
+                    return result.get("response", "").strip()
+                except Exception as e:
+                    last_error = e
+                    delay = self._backoff(attempt) if _retryable(e) else None
+                    _log.warning("ollama attempt failed", extra={"attempt": attempt, "error": str(e), "retry": delay is not None})
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+
+            raise self._failed(attempt, last_error)
+
+    def stream(self, prompt: str, system: Optional[str] = None) -> Iterator[str]:
+        """
+        Stream a completion from Ollama (``stream: true``), yielding text as it is generated.
+
+        Failures before the first token are retried like ``complete``; once
+        text has been yielded, an error ends the stream with an exception. The
+        timeout bounds the wait for each chunk, not the whole generation.
+        """
+        start_time = time.time()
+        last_error = None
+        headers, payload = self._request(prompt, system, stream=True)
+
+        with breaker("ollama").call():
+            attempt = 0
+            while True:
+                attempt += 1
+                timeout = self._attempt_timeout()
+                if not timeout:
+                    last_error = last_error or TimeoutError("request deadline exhausted")
+                    attempt -= 1
+                    break
+                yielded = False
+                try:
+                    response = self._session.post(f"{self.host}/api/generate", headers=headers, json=payload, timeout=timeout, stream=True)
+                    try:
+                        response.raise_for_status()
+                        for line in response.iter_lines():
+                            if not line:
+                                continue
+                            chunk = self._check(json.loads(line))
+                            text = chunk.get("response") or ""
+                            if not yielded:
+                                # Match complete(), which strips the response
+                                text = text.lstrip()
+                            if text:
+                                yielded = True
+                                yield text
+                            if chunk.get("done"):
+                                break
+                    finally:
+                        response.close()
+                    breaker("ollama").record_success()
+                    _log.info("ollama stream completed", extra={"dur_ms": int((time.time() - start_time) * 1000), "attempt": attempt})
+                    return
+                except Exception as e:
+                    last_error = e
+                    if yielded:
+                        breaker("ollama").record_failure()
+                        raise
+                    delay = self._backoff(attempt) if _retryable(e) else None
+                    _log.warning("ollama stream attempt failed", extra={"attempt": attempt, "error": str(e), "retry": delay is not None})
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+
+            raise self._failed(attempt, last_error)
+
+    def _async_client(self) -> Any:
+        """Keep-alive httpx client for the running event loop; None without httpx."""
+        try:
+            import httpx
+        except ImportError:  # pragma: no cover - depends on optional dependency
+            return None
+        loop = asyncio.get_running_loop()
+        client = self._aclients.get(loop)
+        if client is None:
+            client = self._aclients[loop] = httpx.AsyncClient(base_url=self.host)
+        return client
+
+    async def acomplete(self, prompt: str, system: Optional[str] = None) -> str:
+        """Non-blocking ``complete`` over httpx (falls back to a worker thread without httpx)."""
+        client = self._async_client()
+        if client is None:
+            return await super().acomplete(prompt, system=system)
+        last_error = None
+        headers, payload = self._request(prompt, system, stream=False)
+        with breaker("ollama").call():
+            attempt = 0
+            while True:
+                attempt += 1
+                timeout = self._attempt_timeout()
+                if not timeout:
+                    last_error = last_error or TimeoutError("request deadline exhausted")
+                    attempt -= 1
+                    break
+                try:
+                    response = await client.post("/api/generate", headers=headers, json=payload, timeout=timeout)
+                    response.raise_for_status()
+                    result = self._check(response.json())
+                    breaker("ollama").record_success()
+                    return result.get("response", "").strip()
+                except Exception as e:
+                    last_error = e
+                    delay = self._backoff(attempt) if _retryable(e) else None
+                    _log.warning("ollama attempt failed", extra={"attempt": attempt, "error": str(e), "retry": delay is not None})
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+            raise self._failed(attempt, last_error)
+
+    async def astream(self, prompt: str, system: Optional[str] = None) -> AsyncIterator[str]:
+        """Non-blocking ``stream`` over httpx (same retry rules as ``stream``)."""
+        client = self._async_client()
+        if client is None:
+            async for piece in super().astream(prompt, system=system):
+                yield piece
+            return
+        last_error = None
+        headers, payload = self._request(prompt, system, stream=True)
+        with breaker("ollama").call():
+            attempt = 0
+            while True:
+                attempt += 1
+                timeout = self._attempt_timeout()
+                if not timeout:
+                    last_error = last_error or TimeoutError("request deadline exhausted")
+                    attempt -= 1
+                    break
+                yielded = False
+                try:
+                    async with client.stream("POST", "/api/generate", headers=headers, json=payload, timeout=timeout) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            chunk = self._check(json.loads(line))
+                            text = chunk.get("response") or ""
+                            if not yielded:
+                                text = text.lstrip()
+                            if text:
+                                yielded = True
+                                yield text
+                            if chunk.get("done"):
+                                break
+                    breaker("ollama").record_success()
+                    return
+                except Exception as e:
+                    last_error = e
+                    if yielded:
+                        breaker("ollama").record_failure()
+                        raise
+                    delay = self._backoff(attempt) if _retryable(e) else None
+                    _log.warning("ollama stream attempt failed", extra={"attempt": attempt, "error": str(e), "retry": delay is not None})
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+            raise self._failed(attempt, last_error)
+
+    async def aclose(self) -> None:
+        """Close the HTTP session and the async client of every loop, each on its own loop."""
+        self._session.close()
+        current = asyncio.get_running_loop()
+        clients = list(self._aclients.items())
+        self._aclients.clear()
+        for loop, client in clients:
             try:
-                print(f"Attempt {attempt}/{len(timeouts)} with {timeout}s timeout")
-                print(f"Making request to {self.host}/api/generate")
-                print(f"Model: {self.model}")
-                
-                # Make request
-                response = requests.post(
-                    f"{self.host}/api/generate",
-                    headers=headers,
-                    json=payload,
-                    timeout=timeout
-                )
-                
-                # Check for errors
-                response.raise_for_status()
-                
-                # Parse response
-                result = response.json()
-                if "error" in result:
-                    raise Exception(f"Ollama error: {result['error']}")
-                
-                # Log timing information
-                end_time = time.time()
-                duration = end_time - start_time
-                print(f"Request completed in {duration:.2f}s")
-                print(f"Model metrics: {result.get('total_duration', 0) / 1e9:.2f}s total")
-                
-                return result.get("response", "").strip()
-                
-            except Exception as e:
-                last_error = e
-                print(f"Attempt {attempt} failed: {str(e)}")
-                if attempt < len(timeouts):
-                    print("Retrying with shorter timeout...")
-                    continue
-                break
-        
-        # If all attempts failed, raise the last error
-        raise Exception(f"All {len(timeouts)} attempts failed. Last error: {str(last_error)}")
+                if loop is current:
+                    await client.aclose()
+                elif loop.is_running():
+                    await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), loop))
+                # Clients of loops no longer running cannot be closed from here; they go with their loop
+            except RuntimeError:
+                # The loop closed while we were scheduling on it
+                pass
 
     def generate(self, prompt: str) -> str:
         """Alternate generate API is not implemented for Ollama provider."""
         raise NotImplementedError("generate() is not implemented for Ollama; use complete().")
-    
+
     @classmethod
     def is_available(cls) -> bool:
         if os.getenv("RUN_OLLAMA_TESTS") != "1":
@@ -13,6 +13,10 @@ from requests.exceptions import RequestException
 
 from app.core.config import settings
 from app.core.llm_adapter import LLMProvider
+from app.core.logs import get_logger, request_id
+
+_log = get_logger("llm.ollama")
+
 
 class OllamaLLMProvider(LLMProvider):
     """
@@ -52,6 +56,9 @@ class OllamaLLMProvider(LLMProvider):
         
         # Prepare headers and payload
         headers = {'Content-Type': 'application/json'}
+        rid = request_id()
+        if rid:
+            headers['X-Request-ID'] = rid
         payload = {
             "model": self.model,
             "prompt": prompt[:1000],  # Limit prompt size
@@ -67,9 +74,10 @@ class OllamaLLMProvider(LLMProvider):
         
         for attempt, timeout in enumerate(timeouts, 1):
             try:
-                print(f"Attempt {attempt}/{len(timeouts)} with {timeout}s timeout")
-                print(f"Making request to {self.host}/api/generate")
-                print(f"Model: {self.model}")
+                _log.debug(
+                    "ollama request",
+                    extra={"attempt": attempt, "attempts": len(timeouts), "timeout_s": timeout, "host": self.host, "model": self.model},
+                )
                 
                 # Make request
                 response = requests.post(
@@ -90,16 +98,17 @@ class OllamaLLMProvider(LLMProvider):
                 # Log timing information
                 end_time = time.time()
                 duration = end_time - start_time
-                print(f"Request completed in {duration:.2f}s")
-                print(f"Model metrics: {result.get('total_duration', 0) / 1e9:.2f}s total")
+                _log.info(
+                    "ollama completed",
+                    extra={"dur_ms": int(duration * 1000), "model_ms": int(result.get("total_duration", 0) / 1e6), "attempt": attempt},
+                )
                 
                 return result.get("response", "").strip()
                 
             except Exception as e:
                 last_error = e
-                print(f"Attempt {attempt} failed: {str(e)}")
+                _log.warning("ollama attempt failed", extra={"attempt": attempt, "error": str(e), "retry": attempt < len(timeouts)})
                 if attempt < len(timeouts):
-                    print("Retrying with shorter timeout...")
                     continue
                 break
         
@@ -0,0 +1,50 @@
+"""
+Rule-based explanation provider.
+
+Explains plans with the deterministic engine in app.core.nl_rules instead of a
+model: no network, no GPU, microseconds per explanation. Used for batch callers
+and as the fallback while the configured LLM is unavailable or too busy; can
+also be selected directly with LLM_PROVIDER=rules.
+"""
+
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.core import nl_rules
+from app.core.llm_adapter import LLMProvider
+
+# Warning lines as written by app.core.prompts.explain_template ("- CODE: detail")
+_WARNING_LINE = re.compile(r"^- ([A-Z][A-Z_]+): (.*)$", re.MULTILINE)
+
+
+class RulesLLMProvider(LLMProvider):
+    """Deterministic explanations from the plan, warnings and metrics."""
+
+    model = "rules"
+    local = True
+    structured = True
+
+    def explain_plan(self, prompt: str, system: Optional[str] = None, **context: Any) -> str:
+        return nl_rules.explain(
+            context.get("plan"),
+            warnings=context.get("warnings"),
+            metrics=context.get("metrics"),
+            sql=context.get("sql"),
+            audience=context.get("audience", "practitioner"),
+            style=context.get("style", "concise"),
+            length=context.get("length", "short"),
+        )
+
+    async def astream_plan(self, prompt: str, system: Optional[str] = None, **context: Any) -> AsyncIterator[str]:
+        yield self.explain_plan(prompt, system=system, **context)
+
+    def complete(self, prompt: str, system: Optional[str] = None) -> str:
+        """Without the structured plan, explain from the warnings listed in the prompt."""
+        warnings: List[Dict[str, str]] = [{"code": c, "detail": d} for c, d in _WARNING_LINE.findall(prompt)]
+        return nl_rules.explain(None, warnings=warnings, length="medium")
+
+    async def acomplete(self, prompt: str, system: Optional[str] = None) -> str:
+        return self.complete(prompt, system=system)
+
+    def is_available(self) -> bool:
+        return True
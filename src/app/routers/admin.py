@@ -0,0 +1,82 @@
+"""
+Admin router: on-demand profiling of this worker.
+
+Disabled (404) unless PROFILING_ENABLED. Callers must send PROFILING_ADMIN_TOKEN
+in ``X-Admin-Token``; without a configured token every call is refused (behind a
+reverse proxy the client address cannot tell local callers from remote ones).
+"""
+
+import asyncio
+import hmac
+import time
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from pydantic import BaseModel, Field
+
+from app.core import profiler
+from app.core.config import settings
+
+router = APIRouter()
+
+class ProfileRequest(BaseModel):
+    mode: str = Field("cpu", description="cpu (sampled stacks) or alloc (tracemalloc top allocation sites)")
+    seconds: float = Field(10.0, ge=0, description="Window length; capped at PROFILING_MAX_SECONDS")
+    route: Optional[str] = Field(None, description="Route template or path whose completed requests end the window")
+    requests: Optional[int] = Field(None, ge=1, description="Stop after this many requests to `route`")
+    interval_ms: Optional[int] = Field(None, ge=1, le=1000, description="Sampling interval (cpu mode)")
+    include_idle: bool = Field(False, description="Keep samples of threads parked waiting for work")
+    format: str = Field("collapsed", description="cpu mode: collapsed (flamegraph input) or json")
+    top: int = Field(25, ge=1, le=500, description="Top stacks / allocation sites in JSON output")
+
+
+def _authorize(request: Request) -> None:
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = settings.PROFILING_ADMIN_TOKEN
+    if not token:
+        raise HTTPException(status_code=403, detail="admin endpoints require PROFILING_ADMIN_TOKEN to be set")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), token):
+        raise HTTPException(status_code=403, detail="admin token required")
+
+
+@router.post("/profile")
+async def profile(req: ProfileRequest, request: Request):
+    _authorize(request)
+    if req.mode == "cpu" and req.format not in ("collapsed", "json"):
+        raise HTTPException(status_code=400, detail="format must be collapsed or json")
+    try:
+        session = profiler.start(
+            mode=req.mode,
+            seconds=req.seconds,
+            route=req.route,
+            requests=req.requests,
+            interval_ms=req.interval_ms,
+            include_idle=req.include_idle,
+            top=req.top,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    try:
+        # Wait on the event loop (not a worker thread) so profiled requests keep flowing
+        while not session.finished():
+            if await request.is_disconnected():
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await asyncio.get_running_loop().run_in_executor(None, profiler.finish, session)
+
+    if req.mode == "cpu" and req.format == "collapsed":
+        name = f"qeo-profile-{int(time.time())}.folded"
+        return Response(
+            content=session.collapsed(),
+            media_type="text/plain; charset=utf-8",
+            headers={
+                "Content-Disposition": f'attachment; filename="{name}"',
+                "X-Profile-Samples": str(session.samples),
+                "X-Profile-Requests": str(session.requests),
+            },
+        )
+    return session.summary()
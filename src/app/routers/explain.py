@@ -5,24 +5,24 @@ Provides query execution plan analysis with optional ANALYZE support
 and natural language explanations.
 """
 
-import os
-from typing import Optional, Literal
-from functools import lru_cache
+import time
+from typing import AsyncIterator, Optional, Literal
 from datetime import datetime, timedelta
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, conint
 
-from app.core import db, plan_heuristics, prompts, llm_adapter
+from app.core import db, plan_heuristics, prompts, llm_adapter, llm_scheduler, cancel, admission, singleflight, nl_prefetch
 from app.core.config import settings
+from app.core.serialization import fast_response
+from app.core.streaming import SSE_HEADERS, SSE_MEDIA_TYPE, sse_event
+from app.core import tracing
+from app.core.metrics import observe_llm_latency, observe_llm_ttft
+from app.core import deadline as deadline_ctx
+from app.core.deadline import Deadline
 
 router = APIRouter()
 
-# Optional in-memory cache for explanations (disabled in production)
-if settings.APP_ENV != "production":
-    explanation_cache = lru_cache(maxsize=100)(lambda *args: args[-1])
-else:
-    explanation_cache = lambda *args: args[-1]  # No-op cache
-
 class ExplainRequest(BaseModel):
     """Request model for EXPLAIN endpoint."""
     sql: str = Field(..., description="SQL query to analyze")
@@ -45,6 +45,10 @@ class ExplainRequest(BaseModel):
         description="Explanation length"
     )
     plan: Optional[dict] = Field(None, description="Optional precomputed plan to use instead of running EXPLAIN")
+    deadline_ms: Optional[conint(ge=1, le=600000)] = Field(
+        None,
+        description="End-to-end budget (ms) for EXPLAIN and explanation; defaults to timeout_ms plus LLM_TIMEOUT_S when nl=true"
+    )
 
 class ExplainResponse(BaseModel):
     """Response model for EXPLAIN endpoint."""
@@ -80,10 +84,14 @@ class ExplainResponse(BaseModel):
         }
     }
 )
-async def explain_query(req: ExplainRequest) -> ExplainResponse:
+async def explain_query(req: ExplainRequest, http_request: Request) -> ExplainResponse:
     """
     Analyze a SQL query's execution plan and optionally explain it in natural language.
     
+    The blocking work runs in a worker thread; if the client disconnects, the
+    in-flight EXPLAIN (ANALYZE) is cancelled on the server instead of running
+    until statement_timeout.
+    
     Args:
         req: ExplainRequest with SQL query and options
     
@@ -94,99 +102,219 @@ async def explain_query(req: ExplainRequest) -> ExplainResponse:
         HTTPException: If query analysis fails
     """
     try:
-        # Use provided plan if present; otherwise attempt EXPLAIN
-        plan_error = None
-        if req.plan:
-            plan = req.plan
-        else:
+        response = await cancel.run_cancellable(http_request, _run_explain_coalesced, req, query_timeout_ms=req.timeout_ms)
+    except cancel.QueryCancelled as e:
+        raise HTTPException(status_code=cancel.status_code(e), detail=str(e))
+    return fast_response(response)
+
+
+@router.post(
+    "/explain/stream",
+    summary="Explain a SQL query plan and stream the NL explanation as server-sent events",
+    description=(
+        "Runs EXPLAIN like /explain, then streams the explanation as it is generated. Events: "
+        "`plan` (plan, warnings, metrics, message), `token` ({text}) per generated piece, then "
+        "`done` ({explanation, explain_provider, cached}) or `error` ({message})."
+    ),
+    response_class=StreamingResponse,
+    responses={200: {"content": {SSE_MEDIA_TYPE: {}}}},
+)
+async def explain_stream(req: ExplainRequest, http_request: Request) -> StreamingResponse:
+    # The plan stage is cancellable like /explain; the explanation is always generated (nl is implied)
+    req = req.model_copy(update={"nl": True})
+    try:
+        response = await cancel.run_cancellable(http_request, _run_plan, req, query_timeout_ms=req.timeout_ms)
+    except cancel.QueryCancelled as e:
+        raise HTTPException(status_code=cancel.status_code(e), detail=str(e))
+    return StreamingResponse(_explanation_events(req, response), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+
+def _run_plan(req: ExplainRequest) -> ExplainResponse:
+    deadline = Deadline(req.deadline_ms or req.timeout_ms)
+    with deadline_ctx.use(deadline):
+        return _plan_response(req, deadline)
+
+
+async def _explanation_events(req: ExplainRequest, response: ExplainResponse) -> AsyncIterator[str]:
+    """SSE frames for one streamed explanation; generated on the event loop via ``llm.astream_plan``."""
+    yield sse_event("plan", {"plan": response.plan, "warnings": response.warnings, "metrics": response.metrics, "message": response.message})
+    try:
+        llm, provider, prompt, cache, key = _explanation_setup(req, response)
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            yield sse_event("token", {"text": cached})
+            yield sse_event("done", {"explanation": cached, "explain_provider": provider, "cached": True})
+            return
+        parts = []
+        async with llm_scheduler.ascheduled(llm) as used:
+            if used is not llm:
+                # Queue full or too slow: rule-based explanation, not cached under the LLM's key
+                provider, cache = llm_adapter.provider_name(used), None
+            context = _plan_context(req, response)
+            start = time.perf_counter()
             try:
-                # Handle TEMP table creation within the same session
-                sql_lc = (req.sql or "").strip().lower()
-                if sql_lc.startswith("create temporary table") or sql_lc.startswith("create temp table"):
-                    # Execute DDL; no plan
-                    db.run_sql(req.sql, timeout_ms=req.timeout_ms)
-                    plan = {}
-                else:
-                    plan = db.run_explain(
-                        sql=req.sql,
-                        analyze=req.analyze,
-                        timeout_ms=req.timeout_ms
-                    )
-            except Exception as ex:
-                # If NL explanation requested, soft-fail plan but continue
-                if req.nl:
-                    plan = {}
-                    plan_error = str(ex)
-                else:
-                    # For invalid SQL or timeouts, return HTTP 400 with normalized message
-                    detail = str(ex)
-                    if "timeout" in detail.lower():
-                        detail = f"Timeout: {detail}"
-                    raise HTTPException(status_code=400, detail=detail)
-        # Analyze plan for warnings and metrics (soft)
-        try:
-            warnings, metrics = plan_heuristics.analyze(plan)
-        except Exception:
-            warnings, metrics = [], {}
-        # Base response without explanation
-        base_message = "stub: explain ok"
-        if plan_error:
-            base_message = f"stub: explain ok (plan unavailable: {plan_error})"
-        response = ExplainResponse(
-            ok=True,
-            plan=plan,
-            warnings=warnings,
-            metrics=metrics,
-            message=base_message,
-        )
+                async for piece in used.astream_plan(prompt, system=prompts.SYSTEM_PROMPT, **context):
+                    if not parts:
+                        observe_llm_ttft(provider, time.perf_counter() - start)
+                    parts.append(piece)
+                    yield sse_event("token", {"text": piece})
+            except llm_adapter.CircuitOpen:
+                # Refused before any text: another caller holds the breaker's half-open trial
+                used = llm_adapter.fallback_provider()
+                provider, cache = llm_adapter.provider_name(used), None
+                parts = [used.explain_plan(prompt, system=prompts.SYSTEM_PROMPT, **context)]
+                yield sse_event("token", {"text": parts[0]})
+        observe_llm_latency(time.perf_counter() - start)
+    except Exception as e:
+        # Headers are already sent: report the failure in-band
+        yield sse_event("error", {"message": f"explanation failed: {e}"})
+        return
+    explanation = "".join(parts).strip()
+    if cache is not None:
+        cache.put(key, explanation)
+    yield sse_event("done", {"explanation": explanation, "explain_provider": provider, "cached": False})
+
+
+def _run_explain_coalesced(req: ExplainRequest) -> ExplainResponse:
+    # Identical concurrent requests (e.g. the same dashboard open in many tabs) share one EXPLAIN and LLM call
+    return singleflight.run(singleflight.explain, req.sql, req.model_dump(exclude={"sql"}), _run_explain, req)
+
+
+def _run_explain(req: ExplainRequest) -> ExplainResponse:
+    budget_ms = req.deadline_ms or (req.timeout_ms + (settings.LLM_TIMEOUT_S * 1000 if req.nl else 0))
+    deadline = Deadline(budget_ms)
+    with deadline_ctx.use(deadline):
+        return _explain(req, deadline)
+
+
+def _explain(req: ExplainRequest, deadline: Deadline) -> ExplainResponse:
+    try:
+        response = _plan_response(req, deadline)
         
-        # Generate explanation if requested
-        if req.nl:
+        # Generate explanation if requested and the budget still allows it
+        if req.nl and not deadline.stage_ms():
+            deadline.skip("llm")
+            response.message = "Plan analysis succeeded but explanation skipped: request deadline exhausted"
+        elif req.nl:
             try:
-                # Try to get cached explanation
-                cache_key = (
-                    req.sql, req.analyze, req.audience,
-                    req.style, req.length
-                )
-                
-                explanation = explanation_cache(
-                    cache_key,
-                    prompts.explain_template(
-                        sql=req.sql,
-                        plan=plan,
-                        warnings=warnings,
-                        metrics=metrics,
-                        audience=req.audience,
-                        style=req.style,
-                        length=req.length
-                    )
-                )
-                
-                # Get LLM provider and generate explanation
-                llm = llm_adapter.get_llm()
-                response.explanation = llm.complete(
-                    prompt=explanation,
-                    system=prompts.SYSTEM_PROMPT
-                )
-                # Report the actual provider used, not just the configured default
-                try:
-                    cls_name = type(llm).__name__.lower()
-                    if "dummy" in cls_name:
-                        response.explain_provider = "dummy"
-                    elif "ollama" in cls_name:
-                        response.explain_provider = "ollama"
-                    else:
-                        response.explain_provider = os.getenv("LLM_PROVIDER", getattr(settings, "LLM_PROVIDER", "dummy"))
-                except Exception:
-                    response.explain_provider = os.getenv("LLM_PROVIDER", getattr(settings, "LLM_PROVIDER", "dummy"))
+                llm, provider, prompt, cache, key = _explanation_setup(req, response)
+                cached = cache.get(key) if cache is not None else None
+                if cached is None and cache is not None and nl_prefetch.wait(key, deadline.remaining_ms() / 1000.0):
+                    # A speculative call for this plan was already generating it
+                    cached = cache.get(key)
+                if cached is not None:
+                    response.explanation = cached
+                else:
+                    # Waits for an LLM slot; a full or slow queue yields the rules provider instead
+                    context = _plan_context(req, response)
+                    with llm_scheduler.scheduled(llm, abort=cancel.checkpoint) as used:
+                        with tracing.span("llm") as llm_span:
+                            try:
+                                response.explanation = used.explain_plan(
+                                    prompt=prompt,
+                                    system=prompts.SYSTEM_PROMPT,
+                                    **context
+                                )
+                            except llm_adapter.CircuitOpen:
+                                # Another caller holds the breaker's half-open trial: explain from the rules
+                                used = llm_adapter.fallback_provider()
+                                response.explanation = used.explain_plan(prompt=prompt, system=prompts.SYSTEM_PROMPT, **context)
+                    observe_llm_latency(llm_span.seconds)
+                    if used is not llm:
+                        provider = llm_adapter.provider_name(used)
+                    elif cache is not None:
+                        cache.put(key, response.explanation)
+                response.explain_provider = provider
                 
+            except cancel.QueryCancelled:
+                raise
             except Exception as e:
                 # Don't fail the endpoint on LLM errors
                 response.message = f"Plan analysis succeeded but explanation failed: {str(e)}"
                 response.explanation = None
+        elif response.plan and not req.analyze:
+            # Opt-in: warm the cache for a likely follow-up nl=true request (ANALYZE plans differ run to run)
+            nl_prefetch.submit(req.sql, response.plan, response.warnings, response.metrics)
         
         return response
         
+    except (cancel.QueryCancelled, admission.AdmissionRejected):
+        raise
     except Exception as e:
         # Unexpected errors
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _plan_response(req: ExplainRequest, deadline: Deadline) -> ExplainResponse:
+    """Plan, warnings and metrics; with ``nl`` a failed EXPLAIN is reported in ``message`` instead of raising."""
+    # Use provided plan if present; otherwise attempt EXPLAIN
+    plan_error = None
+    if req.plan:
+        plan = req.plan
+    else:
+        try:
+            # Handle TEMP table creation within the same session
+            sql_lc = (req.sql or "").strip().lower()
+            if sql_lc.startswith("create temporary table") or sql_lc.startswith("create temp table"):
+                # Execute DDL; no plan
+                db.run_sql(req.sql, timeout_ms=req.timeout_ms)
+                plan = {}
+            else:
+                plan = db.run_explain(
+                    sql=req.sql,
+                    analyze=req.analyze,
+                    timeout_ms=max(deadline.stage_ms(req.timeout_ms), 1)
+                )
+        except admission.AdmissionRejected:
+            # Shed requests are not soft-failed; they surface as 429/503
+            raise
+        except Exception as ex:
+            # If NL explanation requested, soft-fail plan but continue
+            if req.nl:
+                plan = {}
+                plan_error = str(ex)
+            else:
+                # For invalid SQL or timeouts, return HTTP 400 with normalized message
+                detail = str(ex)
+                if "timeout" in detail.lower():
+                    detail = f"Timeout: {detail}"
+                raise HTTPException(status_code=400, detail=detail)
+    cancel.checkpoint()
+    # Analyze plan for warnings and metrics (soft)
+    try:
+        warnings, metrics = plan_heuristics.analyze(plan)
+    except Exception:
+        warnings, metrics = [], {}
+    # Base response without explanation
+    base_message = "stub: explain ok"
+    if plan_error:
+        base_message = f"stub: explain ok (plan unavailable: {plan_error})"
+    # Plans can have thousands of nodes: skip re-validation and serialize directly
+    return ExplainResponse.model_construct(
+        ok=True,
+        plan=plan,
+        warnings=warnings,
+        metrics=metrics,
+        message=base_message,
+    )
+
+
+def _explanation_setup(req: ExplainRequest, response: ExplainResponse):
+    """Provider, prompt and cache key for explaining ``response``'s plan (see nl_prefetch.explanation_setup)."""
+    return nl_prefetch.explanation_setup(
+        req.sql, response.plan, response.warnings, response.metrics,
+        audience=req.audience, style=req.style, length=req.length,
+    )
+
+
+def _plan_context(req: ExplainRequest, response: ExplainResponse) -> dict:
+    """Structured inputs for providers that explain from the plan itself (see LLMProvider.explain_plan)."""
+    return {
+        "sql": req.sql,
+        "plan": response.plan,
+        "warnings": response.warnings,
+        "metrics": response.metrics,
+        "audience": req.audience,
+        "style": req.style,
+        "length": req.length,
+    }
@@ -4,19 +4,29 @@ SQL optimization router.
 Provides deterministic rewrite and index suggestions for a given SQL query.
 """
 
-from typing import List, Optional, Literal, Dict, Any
-from fastapi import APIRouter, HTTPException
+import contextvars
+from typing import AsyncIterator, Iterator, List, Optional, Literal, Dict, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, conint
 
-from app.core import db, sql_analyzer, plan_heuristics
+from app.core import db, sql_analyzer, plan_heuristics, cancel, admission, singleflight, nl_prefetch
 from app.core.config import settings
 from app.core.optimizer import analyze as optimizer_analyze
 from app.core import whatif
 from app.core import plan_diff
+from app.core.streaming import NDJSON_MEDIA_TYPE, ndjson_line
+from app.core.serialization import fast_response
+from app.core import deadline as deadline_ctx
+from app.core.deadline import Deadline
 
 
 router = APIRouter()
 
+# Default cap for schema/stats catalog reads (further bounded by the request deadline)
+CATALOG_TIMEOUT_MS = 5000
+
 
 class OptimizeRequest(BaseModel):
     sql: str = Field(..., description="SQL to analyze")
@@ -27,6 +37,9 @@ class OptimizeRequest(BaseModel):
     )
     top_k: conint(ge=1, le=50) = Field(10, description="Max suggestions to return")
     diff: bool = Field(False, description="Include plan diff for top index suggestion when what-if ran")
+    deadline_ms: Optional[conint(ge=1, le=600000)] = Field(
+        None, description="End-to-end budget for all stages (ms); defaults to timeout_ms"
+    )
 
 
 class OptimizeResponse(BaseModel):
@@ -81,120 +94,332 @@ class OptimizeResponse(BaseModel):
         }
     }
 )
-async def optimize_sql(request: OptimizeRequest) -> OptimizeResponse:
+async def optimize_sql(request: OptimizeRequest, http_request: Request) -> OptimizeResponse:
+    # Runs off the event loop so a client disconnect can cancel the in-flight EXPLAIN
     try:
-        # Apply defaults
-        if request.timeout_ms is None:
-            request.timeout_ms = settings.OPT_TIMEOUT_MS_DEFAULT
-
-        # Parse SQL statically
-        ast_info = sql_analyzer.parse_sql(request.sql)
-        if ast_info.get("type") != "SELECT":
-            return OptimizeResponse(
-                ok=False,
-                message="Only SELECT statements are supported for optimization",
-            )
-
-        # Identify tables involved
-        tables = [t.get("name") for t in (ast_info.get("tables") or []) if t.get("name")]
-
-        # Optionally run EXPLAIN
-        plan = None
-        plan_warnings: List[Dict[str, Any]] = []
-        plan_metrics: Dict[str, Any] = {}
-        plan_source = "none"
+        result = await cancel.run_cancellable(http_request, _run_optimize_coalesced, request, query_timeout_ms=request.timeout_ms)
+        return fast_response(result)
+    except cancel.QueryCancelled as e:
+        raise HTTPException(status_code=cancel.status_code(e), detail=str(e))
+    except admission.AdmissionRejected:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _run_optimize_coalesced(request: OptimizeRequest) -> OptimizeResponse:
+    return singleflight.run(singleflight.optimize, request.sql, request.model_dump(exclude={"sql"}), _run_optimize_endpoint, request)
+
+
+def _run_optimize_endpoint(request: OptimizeRequest) -> OptimizeResponse:
+    # Single-statement /optimize is usually followed by an explanation; batch and workload runs are not
+    return run_optimize(request, prefetch_nl=True)
+
+
+def run_optimize(
+    request: OptimizeRequest,
+    schema_info: Optional[Dict[str, Any]] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    column_stats: Optional[Dict[str, Dict[str, Any]]] = None,
+    deadline: Optional[Deadline] = None,
+    prefetch_nl: bool = False,
+) -> OptimizeResponse:
+    """Run the optimize pipeline for one statement.
+
+    Catalog data (schema, table stats, per-table column stats) may be passed in
+    by callers that loaded it once for many statements; anything omitted is
+    fetched here. Every stage is bounded by one end-to-end Deadline
+    (request.deadline_ms, else timeout_ms); stages that no longer fit are
+    skipped and listed in dataSources["skipped"]. With ``prefetch_nl`` the
+    plan is handed to app.core.nl_prefetch (when enabled). Raises on
+    unexpected errors.
+    """
+    # Apply defaults
+    if request.timeout_ms is None:
+        request.timeout_ms = settings.OPT_TIMEOUT_MS_DEFAULT
+    if deadline is None:
+        deadline = Deadline(request.deadline_ms or request.timeout_ms)
+    with deadline_ctx.use(deadline):
+        return _optimize(request, deadline, schema_info, stats, column_stats, prefetch_nl)
+
+
+def _optimize(
+    request: OptimizeRequest,
+    deadline: Deadline,
+    schema_info: Optional[Dict[str, Any]],
+    stats: Optional[Dict[str, Any]],
+    column_stats: Optional[Dict[str, Dict[str, Any]]],
+    prefetch_nl: bool = False,
+) -> OptimizeResponse:
+    # Parse SQL statically
+    ast_info = sql_analyzer.parse_sql(request.sql)
+    if ast_info.get("type") != "SELECT":
+        return OptimizeResponse(
+            ok=False,
+            message="Only SELECT statements are supported for optimization",
+        )
+
+    # Identify tables involved, and the schema they live in (catalog lookups are per schema)
+    tables = [t.get("name") for t in (ast_info.get("tables") or []) if t.get("name")]
+    schema_name = sql_analyzer.query_schema(ast_info)
+
+    # Optionally run EXPLAIN
+    plan = None
+    plan_warnings: List[Dict[str, Any]] = []
+    plan_metrics: Dict[str, Any] = {}
+    plan_source = "none"
+    explain_ms = deadline.stage_ms(request.timeout_ms)
+    if explain_ms:
         try:
-            plan = db.run_explain(request.sql, analyze=request.analyze, timeout_ms=request.timeout_ms)
+            plan = db.run_explain(request.sql, analyze=request.analyze, timeout_ms=explain_ms)
             plan_warnings, plan_metrics = plan_heuristics.analyze(plan)
             plan_source = "explain_analyze" if request.analyze else "explain"
+            if prefetch_nl and not request.analyze:
+                # Opt-in: start the explanation a follow-up /explain nl=true would ask for
+                nl_prefetch.submit(request.sql, plan, plan_warnings, plan_metrics)
+        except admission.AdmissionRejected:
+            raise
         except Exception:
             # Soft-fail: still continue with rewrites
             plan = None
             plan_source = "none"
+    else:
+        deadline.skip("explain")
+    cancel.checkpoint()
 
-        # Fetch schema and lightweight stats
-        schema_info = db.fetch_schema()
-        stats = {}
-        stats_used = False
+    # Fetch schema and lightweight stats within what is left of the budget
+    if schema_info is None:
+        schema_ms = deadline.stage_ms(CATALOG_TIMEOUT_MS)
         try:
-            stats = db.fetch_table_stats(tables)
-            stats_used = True
+            schema_info = db.fetch_schema(schema=schema_name, timeout_ms=schema_ms) if schema_ms else None
+        except admission.AdmissionRejected:
+            raise
+        except Exception:
+            # Soft-fail like stats: a catalog timeout under a tight deadline skips the stage
+            cancel.checkpoint()
+            schema_info = None
+        if schema_info is None:
+            deadline.skip("schema")
+            schema_info = {"tables": []}
+    stats_used = stats is not None and "stats" not in deadline.skipped
+    if stats is None:
+        stats_ms = deadline.stage_ms(CATALOG_TIMEOUT_MS)
+        if not stats_ms:
+            deadline.skip("stats")
+        try:
+            stats = db.fetch_table_stats(tables, schema=schema_name, timeout_ms=stats_ms) if stats_ms else {}
+            stats_used = bool(stats_ms)
         except Exception:
             stats = {}
             stats_used = False
 
-        # Optimizer options (could be extended from config)
-        options = {
-            "min_index_rows": settings.OPT_MIN_ROWS_FOR_INDEX,
-            "max_index_cols": settings.OPT_MAX_INDEX_COLS,
-        }
+    # Optimizer options (could be extended from config)
+    options: Dict[str, Any] = {
+        "min_index_rows": settings.OPT_MIN_ROWS_FOR_INDEX,
+        "max_index_cols": settings.OPT_MAX_INDEX_COLS,
+    }
+    if column_stats is not None:
+        options["column_stats"] = column_stats
+    # Bounds per-table pg_stats lookups inside the index advisor
+    options["deadline"] = deadline
 
-        result = optimizer_analyze(
-            sql=request.sql,
-            ast_info=ast_info,
-            plan=plan,
-            schema=schema_info,
-            stats=stats,
-            options=options,
-        )
+    result = optimizer_analyze(
+        sql=request.sql,
+        ast_info=ast_info,
+        plan=plan,
+        schema=schema_info,
+        stats=stats,
+        options=options,
+    )
 
-        server_top_k = min(int(request.top_k or settings.OPT_TOP_K), settings.OPT_TOP_K)
-        suggestions = result.get("suggestions", [])[: server_top_k]
-        summary = result.get("summary", {})
-
-        # Optional what-if (HypoPG) ranking/evaluation
-        ranking = "heuristic"
-        whatif_info: Dict[str, Any] = {"enabled": False, "available": False, "trials": 0, "filteredByPct": 0}
-        if settings.WHATIF_ENABLED:
-            try:
-                wi = whatif.evaluate(request.sql, suggestions, timeout_ms=request.timeout_ms)
-                ranking = wi.get("ranking", ranking)
-                whatif_info = wi.get("whatIf", whatif_info)
-                suggestions = wi.get("suggestions", suggestions)
-            except Exception:
-                # Graceful fallback
-                ranking = "heuristic"
-                whatif_info = {"enabled": True, "available": False, "trials": 0, "filteredByPct": 0}
-
-        # Optional Plan Diff for top index suggestion
-        resp_plan_diff: Optional[Dict[str, Any]] = None
-        if request.diff and (whatif_info.get("enabled") and whatif_info.get("available")):
-            try:
-                # Baseline costed plan
-                baseline = db.run_explain_costs(request.sql, timeout_ms=request.timeout_ms)
-                # Pick top index suggestion
-                top_index = next((s for s in suggestions if s.get("kind") == "index"), None)
-                if top_index:
-                    # Parse table and cols from statements
-                    from app.core.whatif import _parse_index_stmt  # type: ignore
-                    stmt_list = top_index.get("statements") or []
-                    if stmt_list:
-                        table, cols = _parse_index_stmt(stmt_list[0])
-                        if table and cols:
-                            with db.get_conn() as conn:
-                                with conn.cursor() as cur:
-                                    cur.execute("SELECT hypopg_reset()")
-                                    cur.execute("SELECT * FROM hypopg_create_index(%s)", (f"CREATE INDEX ON {table} ({', '.join(cols)})",))
-                                    after = db.run_explain_costs(request.sql, timeout_ms=request.timeout_ms)
-                                    cur.execute("SELECT hypopg_reset()")
-                                    resp_plan_diff = plan_diff.diff_plans(baseline, after)
-            except Exception:
-                resp_plan_diff = None
+    server_top_k = min(int(request.top_k or settings.OPT_TOP_K), settings.OPT_TOP_K)
+    suggestions = result.get("suggestions", [])[: server_top_k]
+    summary = result.get("summary", {})
 
-        return OptimizeResponse(
-            ok=True,
-            message="stub: optimize ok",
-            suggestions=suggestions,
-            summary=summary,
-            ranking=ranking,
-            whatIf=whatif_info,
-            plan_warnings=plan_warnings,
-            plan_metrics=plan_metrics,
-            advisorsRan=["rewrite", "index"],
-            dataSources={"plan": plan_source, "stats": stats_used},
-            actualTopK=len(suggestions),
-            planDiff=resp_plan_diff,
-        )
+    cancel.checkpoint()
+    # Optional what-if (HypoPG) ranking/evaluation
+    ranking = "heuristic"
+    whatif_info: Dict[str, Any] = {"enabled": False, "available": False, "trials": 0, "filteredByPct": 0}
+    if settings.WHATIF_ENABLED and not deadline.stage_ms(min_ms=settings.DEADLINE_MIN_WHATIF_MS):
+        deadline.skip("whatif")
+        whatif_info = {"enabled": True, "available": False, "trials": 0, "filteredByPct": 0}
+    elif settings.WHATIF_ENABLED:
+        try:
+            wi = whatif.evaluate(request.sql, suggestions, timeout_ms=request.timeout_ms, deadline=deadline)
+            ranking = wi.get("ranking", ranking)
+            whatif_info = wi.get("whatIf", whatif_info)
+            suggestions = wi.get("suggestions", suggestions)
+        except admission.AdmissionRejected:
+            raise
+        except Exception:
+            # Graceful fallback
+            ranking = "heuristic"
+            whatif_info = {"enabled": True, "available": False, "trials": 0, "filteredByPct": 0}
+
+    cancel.checkpoint()
+    # Optional Plan Diff for top index suggestion
+    resp_plan_diff: Optional[Dict[str, Any]] = None
+    diff_ms = deadline.stage_ms(request.timeout_ms) if request.diff else 0
+    if request.diff and not diff_ms:
+        deadline.skip("diff")
+    if diff_ms and (whatif_info.get("enabled") and whatif_info.get("available")):
+        try:
+            # Baseline costed plan
+            baseline = db.run_explain_costs(request.sql, timeout_ms=diff_ms)
+            # Pick top index suggestion
+            top_index = next((s for s in suggestions if s.get("kind") == "index"), None)
+            if top_index:
+                # Parse table and cols from statements
+                from app.core.whatif import _parse_index_stmt  # type: ignore
+                stmt_list = top_index.get("statements") or []
+                if stmt_list:
+                    table, cols = _parse_index_stmt(stmt_list[0])
+                    if table and cols:
+                        after = db.run_hypothetical_costs(request.sql, table, cols, timeout_ms=deadline.stage_ms(diff_ms) or 1)
+                        resp_plan_diff = plan_diff.diff_plans(baseline, after)
+        except Exception:
+            resp_plan_diff = None
+
+    data_sources: Dict[str, Any] = {"plan": plan_source, "stats": stats_used}
+    if deadline.skipped:
+        data_sources["skipped"] = list(deadline.skipped)
+
+    # Constructed without re-validation; plan metrics/diffs are passed through as-is
+    return OptimizeResponse.model_construct(
+        ok=True,
+        message="stub: optimize ok",
+        suggestions=suggestions,
+        summary=summary,
+        ranking=ranking,
+        whatIf=whatif_info,
+        plan_warnings=plan_warnings,
+        plan_metrics=plan_metrics,
+        advisorsRan=["rewrite", "index"],
+        dataSources=data_sources,
+        actualTopK=len(suggestions),
+        planDiff=resp_plan_diff,
+    )
 
+
+class OptimizeBatchRequest(BaseModel):
+    sqls: List[str] = Field(
+        ..., min_length=1, max_length=settings.BATCH_MAX_STATEMENTS, description="SQL statements to analyze"
+    )
+    analyze: bool = Field(False, description="Use EXPLAIN ANALYZE if true")
+    timeout_ms: conint(ge=1, le=600000) = Field(10000, description="Per-statement timeout (ms)")
+    top_k: conint(ge=1, le=50) = Field(10, description="Max suggestions per statement")
+    diff: bool = Field(False, description="Include plan diff for top index suggestion when what-if ran")
+    stream: bool = Field(False, description="Stream results as NDJSON in completion order")
+
+
+class OptimizeBatchItem(OptimizeResponse):
+    index: int = 0
+    sql: str = ""
+
+
+class OptimizeBatchResponse(BaseModel):
+    ok: bool = True
+    results: List[OptimizeBatchItem] = Field(default_factory=list)
+
+
+def _load_batch_catalog(sqls: List[str], timeout_ms: int) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """Fetch schema, table stats and column stats once per schema for all referenced tables.
+
+    Returns the catalogs keyed by schema and the schema of each statement (see sql_analyzer.query_schema).
+    When table stats cannot be loaded the catalog holds empty stats and ``stats_skipped``.
+    """
+    by_schema: Dict[str, set[str]] = {}
+    schemas: List[str] = []
+    for sql in sqls:
+        try:
+            info = sql_analyzer.parse_sql(sql)
+        except Exception:
+            schemas.append("public")
+            continue
+        schema = sql_analyzer.query_schema(info)
+        schemas.append(schema)
+        by_schema.setdefault(schema, set()).update(t.get("name") for t in (info.get("tables") or []) if t.get("name"))
+    catalogs: Dict[str, Dict[str, Any]] = {}
+    for schema, tables in sorted(by_schema.items()):
+        table_list = sorted(tables)
+        catalog: Dict[str, Any] = {"schema_info": None, "stats": None, "column_stats": None, "stats_skipped": False}
+        try:
+            catalog["schema_info"] = db.fetch_schema(schema=schema, timeout_ms=timeout_ms)
+        except Exception:
+            # Soft-fail like stats: the streamed response may already have started
+            catalog["schema_info"] = {"tables": []}
+        try:
+            catalog["stats"] = db.fetch_table_stats(table_list, schema=schema, timeout_ms=timeout_ms)
+        except Exception:
+            # Empty, not None: each statement would otherwise retry the same failing lookup
+            catalog["stats"] = {}
+            catalog["stats_skipped"] = True
+        try:
+            catalog["column_stats"] = db.get_column_stats_many(table_list, schema=schema, timeout_ms=timeout_ms)
+        except Exception:
+            catalog["column_stats"] = {}
+        catalogs[schema] = catalog
+    return catalogs, schemas
+
+
+def iter_optimize_batch(req: OptimizeBatchRequest) -> Iterator[OptimizeBatchItem]:
+    """Yield per-statement results as they complete (not in input order)."""
+    catalogs, schemas = _load_batch_catalog(req.sqls, int(req.timeout_ms))
+
+    def _one(i: int, sql: str) -> OptimizeBatchItem:
+        # Picked up after the request was cancelled: do not start it
+        cancel.checkpoint()
+        single = OptimizeRequest(sql=sql, analyze=req.analyze, timeout_ms=req.timeout_ms, top_k=req.top_k, diff=req.diff)
+        catalog = dict(catalogs.get(schemas[i], {}))
+        budget = Deadline(single.timeout_ms)
+        if catalog.pop("stats_skipped", False):
+            budget.skip("stats")
+        try:
+            res = run_optimize(single, deadline=budget, **catalog)
+        except Exception as e:
+            # A per-statement failure is reported inline unless the whole request was cancelled
+            cancel.checkpoint()
+            res = OptimizeResponse(ok=False, message=str(e))
+        return OptimizeBatchItem.model_construct(index=i, sql=sql, **dict(res))
+
+    workers = max(1, min(int(settings.BATCH_PARALLELISM), len(req.sqls)))
+    if db.uses_shared_conn():
+        # Statements would interleave transactions and HypoPG indexes in the one shared session
+        workers = 1
+    ex = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qeo-batch")
+    try:
+        # Each task runs in a copy of the caller's context so it shares the request's cancel scope
+        futs = [ex.submit(contextvars.copy_context().run, _one, i, sql) for i, sql in enumerate(req.sqls)]
+        for fut in as_completed(futs):
+            yield fut.result()
+    finally:
+        # Closed early (client gone, request cancelled): statements not started yet are dropped
+        ex.shutdown(wait=True, cancel_futures=True)
+
+
+@router.post(
+    "/optimize/batch",
+    response_model=OptimizeBatchResponse,
+    summary="Optimize many statements with shared catalog and stats loading",
+    description="Loads schema and stats once for the union of referenced tables and processes statements concurrently. "
+    "Each result has the OptimizeResponse shape plus index/sql. With stream=true, results are sent as NDJSON as each finishes.",
+)
+async def optimize_batch(req: OptimizeBatchRequest, http_request: Request):
+    if req.stream:
+        async def _lines() -> AsyncIterator[str]:
+            # Same cancel scope as the buffered path: a disconnect cancels running statements
+            async for item in cancel.iter_cancellable(http_request, iter_optimize_batch, req, query_timeout_ms=req.timeout_ms):
+                yield ndjson_line(dict(item))
+
+        return StreamingResponse(_lines(), media_type=NDJSON_MEDIA_TYPE)
+    try:
+        results = await cancel.run_cancellable(
+            http_request,
+            lambda: sorted(iter_optimize_batch(req), key=lambda r: r.index),
+            query_timeout_ms=req.timeout_ms,
+        )
+    except cancel.QueryCancelled as e:
+        raise HTTPException(status_code=cancel.status_code(e), detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return fast_response(OptimizeBatchResponse.model_construct(ok=True, results=results))
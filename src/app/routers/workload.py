@@ -1,8 +1,12 @@
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter
+import asyncio
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, conint
 
-from app.core.workload import analyze_workload
+from app.core.workload import analyze_workload, stream_workload
+from app.core import jobs
+from app.core.streaming import NDJSON_MEDIA_TYPE, ndjson_line
 
 
 router = APIRouter()
@@ -12,6 +16,7 @@ class WorkloadRequest(BaseModel):
     sqls: List[str] = Field(..., description="List of SQL statements")
     top_k: conint(ge=1, le=50) = 10
     what_if: bool = False
+    stream: bool = Field(False, description="Stream per-query results as NDJSON, merged suggestions last")
 
 
 class WorkloadResponse(BaseModel):
@@ -20,9 +25,88 @@ class WorkloadResponse(BaseModel):
     perQuery: List[Dict[str, Any]] = Field(default_factory=list)
 
 
+class WorkloadJobResponse(BaseModel):
+    ok: bool = True
+    id: str
+    status: str
+    progress: Dict[str, Any] = Field(default_factory=dict)
+    createdAt: float = 0.0
+    startedAt: Optional[float] = None
+    finishedAt: Optional[float] = None
+    error: Optional[str] = None
+    suggestions: List[Dict[str, Any]] = Field(default_factory=list)
+    perQuery: List[Dict[str, Any]] = Field(default_factory=list)
+
+
 @router.post("/workload", response_model=WorkloadResponse)
-async def workload(req: WorkloadRequest) -> WorkloadResponse:
+async def workload(req: WorkloadRequest):
+    if req.stream:
+        lines = (ndjson_line(ev) for ev in stream_workload(req.sqls, top_k=int(req.top_k)))
+        return StreamingResponse(lines, media_type=NDJSON_MEDIA_TYPE)
     res = analyze_workload(req.sqls, top_k=int(req.top_k), what_if=bool(req.what_if))
     return WorkloadResponse(ok=True, suggestions=res.get("suggestions", []), perQuery=res.get("perQuery", []))
 
 
+@router.post("/workload/jobs", response_model=WorkloadJobResponse, status_code=202)
+async def submit_workload_job(req: WorkloadRequest) -> WorkloadJobResponse:
+    """Queue a workload for background analysis and return its job id."""
+    try:
+        job = jobs.get_manager().submit(req.sqls, top_k=int(req.top_k), what_if=bool(req.what_if))
+    except jobs.JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return WorkloadJobResponse(**job.summary())
+
+
+@router.get("/workload/jobs", response_model=List[WorkloadJobResponse])
+async def list_workload_jobs() -> List[WorkloadJobResponse]:
+    return [WorkloadJobResponse(**j.summary()) for j in jobs.get_manager().list()]
+
+
+@router.get("/workload/jobs/{job_id}", response_model=WorkloadJobResponse)
+async def get_workload_job(
+    job_id: str,
+    include_results: bool = True,
+    offset: conint(ge=0) = 0,
+    limit: conint(ge=1, le=10000) = 1000,
+) -> WorkloadJobResponse:
+    """Job status and progress; perQuery holds partial results while running."""
+    manager = jobs.get_manager()
+    job = manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    out = WorkloadJobResponse(**job.summary())
+    if include_results:
+        out.perQuery = manager.results_since(job_id, int(offset))[: int(limit)]
+        out.suggestions = list(job.suggestions)
+    return out
+
+
+@router.get("/workload/jobs/{job_id}/stream")
+async def stream_workload_job(job_id: str, poll_ms: conint(ge=50, le=10000) = 500) -> StreamingResponse:
+    """Stream job events as NDJSON until the job reaches a terminal status.
+
+    Emits {"event": "result", ...} per finished statement, periodic
+    {"event": "progress", ...} lines, and a final {"event": "done", ...} line
+    carrying the merged suggestions.
+    """
+    manager = jobs.get_manager()
+    if manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+
+    async def _events():
+        sent = 0
+        while True:
+            job = manager.get(job_id)
+            if job is None:
+                return
+            terminal = job.status in jobs.TERMINAL_STATUSES
+            for entry in manager.results_since(job_id, sent):
+                yield ndjson_line({"event": "result", "index": sent, **entry})
+                sent += 1
+            if terminal:
+                yield ndjson_line({"event": "done", **job.summary(), "suggestions": job.suggestions})
+                return
+            yield ndjson_line({"event": "progress", **job.summary()})
+            await asyncio.sleep(int(poll_ms) / 1000.0)
+
+    return StreamingResponse(_events(), media_type=NDJSON_MEDIA_TYPE)
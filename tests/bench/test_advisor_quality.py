@@ -0,0 +1,37 @@
+from scripts.bench import advisor_quality as aq
+
+
+def test_index_name_and_database_url_helpers():
+    assert aq.index_name("CREATE INDEX CONCURRENTLY idx_orders_user_id ON orders (user_id)") == "idx_orders_user_id"
+    assert aq.index_name("CREATE UNIQUE INDEX IF NOT EXISTS ix ON public.t (a, b)") == "ix"
+    assert aq.index_name("ALTER TABLE t ADD COLUMN x int") is None
+    url = "postgresql://u:p@db:5433/queryexpnopt?sslmode=disable"
+    assert aq.database_name(url) == "queryexpnopt"
+    assert aq.with_database(url, "scratch") == "postgresql://u:p@db:5433/scratch?sslmode=disable"
+
+
+def test_spearman_handles_ties_and_degenerate_input():
+    assert aq.spearman([1, 2, 3, 4], [10, 20, 30, 40]) == 1.0
+    assert aq.spearman([1, 2, 3, 4], [4, 3, 2, 1]) == -1.0
+    assert aq.spearman([1, 1, 2], [5, 5, 9]) == 1.0
+    assert aq.spearman([1, 2], [1, 2]) is None
+    assert aq.spearman([1, 2, 3], [7, 7, 7]) is None
+
+
+def test_summarize_counts_helped_suggestions_and_correlation():
+    def row(pred, warm_pct, speedup):
+        return {"predicted": {"costDeltaPct": pred}, "actual": {"warmPct": warm_pct, "speedup": speedup}}
+
+    rows = [row(90.0, 95.0, 20.0), row(50.0, 40.0, 1.7), row(5.0, -2.0, 0.98), {"predicted": {}, "error": "boom"}]
+    s = aq.summarize(rows)
+    assert s["suggestions"] == 4
+    assert s["measured"] == 3
+    assert s["helped"] == 2
+    assert s["medianSpeedup"] == 1.7
+    assert s["predictedVsActualSpearman"] == 1.0
+
+
+def test_requires_opt_in(monkeypatch, capsys):
+    monkeypatch.delenv("RUN_DB_TESTS", raising=False)
+    assert aq.main([]) == 2
+    assert "RUN_DB_TESTS=1" in capsys.readouterr().out
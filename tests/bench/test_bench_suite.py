@@ -0,0 +1,35 @@
+import json
+
+from scripts.bench import suite
+
+
+def test_suite_reports_percentiles_and_allocations(tmp_path):
+    out = tmp_path / "suite.json"
+    code = suite.main(
+        ["--quick", "--only", "lint,heuristics,fetch_table_stats", "--min-time", "0", "--min-iter", "3", "--quiet", "--out", str(out)]
+    )
+    assert code == 0
+    report = json.loads(out.read_text(encoding="utf-8"))
+    assert report["meta"]["backend"] == "synthetic"
+    rows = report["results"]
+    assert {r["bench"] for r in rows} == {"lint", "heuristics", "fetch_table_stats"}
+    for r in rows:
+        assert r["iterations"] >= 3
+        assert 0 < r["p50_us"] <= r["p95_us"] <= r["p99_us"]
+        assert r["peak_kb"] >= 0
+
+
+def test_compare_flags_regressions_beyond_threshold_and_noise_floor():
+    baseline = {"results": [
+        {"bench": "parse", "size": "joins=0", "p50_us": 100.0, "peak_kb": 10.0},
+        {"bench": "lint", "size": "joins=0", "p50_us": 2.0, "peak_kb": 1.0},
+    ]}
+    current = {"results": [
+        {"bench": "parse", "size": "joins=0", "p50_us": 130.0, "peak_kb": 80.0},
+        # +100% but only 2 us: below the absolute floor
+        {"bench": "lint", "size": "joins=0", "p50_us": 4.0, "peak_kb": 1.0},
+        {"bench": "workload", "size": "queries=10", "p50_us": 1e6, "peak_kb": 1.0},
+    ]}
+    regs = suite.compare(current, baseline, threshold_pct=15.0)
+    assert [(r["bench"], r["metric"]) for r in regs] == [("parse", "p50_us"), ("parse", "peak_kb")]
+    assert suite.compare(current, baseline, threshold_pct=1000.0) == []
@@ -0,0 +1,69 @@
+from collections import Counter
+
+import pytest
+
+from scripts.bench import datagen
+
+
+def test_row_counts_scale_and_generation_is_deterministic():
+    gen = datagen.Generator(scale=0.05, seed=7, extra_tables=2)
+    assert gen.row_count("orders") == 5000
+    assert gen.row_count("order_items") == 3 * gen.row_count("orders")
+    assert gen.tables()[-2:] == ["dim_0", "dim_1"]
+    first = list(gen.rows("orders"))
+    again = list(datagen.Generator(scale=0.05, seed=7).rows("orders"))
+    assert first == again
+    assert len(first) == 5000
+    assert list(datagen.Generator(scale=0.05, seed=8).rows("orders")) != first
+
+
+def test_user_ids_are_skewed_and_ship_country_correlated():
+    gen = datagen.Generator(scale=0.1, seed=1, skew=1.1, correlation=0.9)
+    orders = list(gen.rows("orders"))
+    users = {u[0]: u[2] for u in gen.rows("users")}
+    top_user, top_count = Counter(o[1] for o in orders).most_common(1)[0]
+    assert top_user == gen.hot_user_ids(1)[0]
+    assert top_count > 10 * len(orders) / len(users)
+    same = sum(1 for o in orders if users[o[1]] == o[4])
+    assert same / len(orders) > 0.85
+    # created_at follows id
+    assert [o[5] for o in orders] == sorted(o[5] for o in orders)
+
+
+def test_csv_output_and_corpus(tmp_path):
+    code = datagen.main(["--scale", "0.01", "--extra-tables", "1", "--csv-dir", str(tmp_path / "sf"),
+                         "--corpus", str(tmp_path / "q.sql"), "--queries", "24", "--schema", "bench_t"])
+    assert code == 0
+    items = (tmp_path / "sf" / "order_items.tsv").read_text(encoding="utf-8").splitlines()
+    assert len(items) == 3000
+    assert items[0].split("\t")[:2] == ["1", "1"]
+    assert "CREATE TABLE bench_t.dim_0" in (tmp_path / "sf" / "schema.sql").read_text(encoding="utf-8")
+    queries = (tmp_path / "q.sql").read_text(encoding="utf-8").splitlines()
+    assert len(queries) == 24
+    assert all("bench_t." in q for q in queries)
+
+
+def test_copy_stream_reads_in_chunks():
+    stream = datagen.CopyStream(iter(["a\t1\n", "b\t2\n", "c\t3\n"]), batch=2)
+    parts = []
+    while chunk := stream.read(5):
+        parts.append(chunk)
+    assert "".join(parts) == "a\t1\nb\t2\nc\t3\n"
+    assert stream.rows == 3
+
+
+def test_refuses_to_drop_public_or_foreign_schemas(tmp_path):
+    gen = datagen.Generator(scale=0.01)
+    for bad in ("public", "pg_catalog", "information_schema", "bench; DROP"):
+        with pytest.raises(ValueError):
+            gen.ddl(bad)
+    assert datagen.main(["--scale", "0.01", "--schema", "public", "--csv-dir", str(tmp_path)]) == 2
+
+    class Cursor:
+        def execute(self, sql, params):
+            self.params = params
+
+        def fetchall(self):
+            return [("orders",), ("dim_3",), ("customers",)]
+
+    assert datagen.foreign_tables(Cursor(), "bench_sf1") == ["customers"]
@@ -0,0 +1,109 @@
+"""
+Tests for admission control / load shedding (no database required).
+"""
+
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import admission
+from app.core.admission import AdmissionGate, AdmissionRejected
+from app.main import app
+
+
+def _gate(**kw):
+    opts = dict(max_concurrent=1, class_limits={"explain": 4, "analyze": 4, "whatif": 4}, queue_max=8, max_wait_ms=2000)
+    opts.update(kw)
+    return AdmissionGate(**opts)
+
+
+def _wait_queued(gate, klass, n=1):
+    for _ in range(200):
+        if gate.snapshot()[klass]["queued"] >= n:
+            return
+        time.sleep(0.005)
+    raise AssertionError("waiter did not queue")
+
+
+def test_cheap_explain_is_admitted_before_queued_whatif():
+    gate = _gate()
+    order = []
+
+    def run(klass):
+        with gate.slot(klass):
+            order.append(klass)
+
+    gate.acquire("analyze")
+    t_whatif = threading.Thread(target=run, args=("whatif",))
+    t_whatif.start()
+    _wait_queued(gate, "whatif")
+    t_explain = threading.Thread(target=run, args=("explain",))
+    t_explain.start()
+    _wait_queued(gate, "explain")
+    gate.release("analyze")
+    t_whatif.join(2)
+    t_explain.join(2)
+    assert order == ["explain", "whatif"]
+
+
+def test_class_cap_does_not_block_other_classes():
+    gate = _gate(max_concurrent=4, class_limits={"explain": 4, "analyze": 1, "whatif": 1})
+    gate.acquire("analyze")
+    with pytest.raises(AdmissionRejected):
+        gate.acquire("analyze", max_wait_ms=10)
+    gate.acquire("explain")  # not blocked by the saturated analyze class
+    assert gate.snapshot()["explain"]["running"] == 1
+
+
+def test_full_queue_is_rejected_with_429():
+    gate = _gate(queue_max=0)
+    gate.acquire("explain")
+    with pytest.raises(AdmissionRejected) as ei:
+        gate.acquire("explain")
+    assert ei.value.status_code == 429
+    assert gate.snapshot()["explain"]["queued"] == 0
+
+
+def test_wait_timeout_is_rejected_with_503_and_slot_is_not_leaked():
+    gate = _gate()
+    gate.acquire("explain")
+    with pytest.raises(AdmissionRejected) as ei:
+        gate.acquire("analyze", max_wait_ms=20)
+    assert ei.value.status_code == 503
+    gate.release("explain")
+    gate.acquire("analyze", max_wait_ms=20)
+    assert gate.snapshot()["analyze"] == {"running": 1, "queued": 0, "limit": 4}
+
+
+def test_abort_leaves_queue():
+    gate = _gate()
+    gate.acquire("explain")
+
+    def abort():
+        raise RuntimeError("client gone")
+
+    with pytest.raises(RuntimeError):
+        gate.acquire("explain", abort=abort)
+    assert gate.snapshot()["explain"]["queued"] == 0
+
+
+@pytest.fixture
+def tiny_gate(monkeypatch):
+    monkeypatch.setattr(admission.settings, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission.settings, "ADMISSION_MAX_CONCURRENT", 1)
+    monkeypatch.setattr(admission.settings, "ADMISSION_QUEUE_MAX", 0)
+    admission.reset_gate()
+    gate = admission.get_gate()
+    yield gate
+    admission.reset_gate()
+
+
+def test_explain_endpoint_sheds_with_429(tiny_gate):
+    tiny_gate.acquire("whatif")  # database busy with a what-if batch
+    client = TestClient(app)
+    r = client.post("/api/v1/explain", json={"sql": "SELECT 1", "analyze": True})
+    assert r.status_code == 429
+    assert r.headers.get("retry-after") == "1"
+    assert "busy" in r.json()["detail"].lower()
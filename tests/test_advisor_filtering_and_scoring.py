@@ -84,3 +84,23 @@ def test_score_and_reason_present(monkeypatch):
     assert titles[0].startswith("Replace SELECT *") or titles[0].startswith("Align ORDER BY")
 
 
+
+
+def test_schema_qualified_statement_reads_that_schemas_stats(monkeypatch):
+    from app.core import db as db_core
+    from app.core.sql_analyzer import parse_sql
+
+    sql = "SELECT * FROM bench_sf1.orders WHERE user_id = 1 ORDER BY created_at DESC LIMIT 5"
+    seen = []
+
+    def fake_col_stats(schema, table, timeout_ms=5000):
+        seen.append((schema, table))
+        return {"user_id": {"avg_width": 8}, "created_at": {"avg_width": 8}}
+
+    monkeypatch.setattr(db_core, "get_column_stats", fake_col_stats)
+    stats = {"orders": {"rows": 100000, "indexes": []}}
+    out = analyze(sql, parse_sql(sql), None, _schema(), stats, {"min_index_rows": 10000, "max_index_cols": 3})
+    idx = [s for s in out["suggestions"] if s["kind"] == "index"]
+    assert seen == [("bench_sf1", "orders")]
+    # The DDL (and what-if trial) targets the same schema, not public.orders
+    assert idx and " ON bench_sf1.orders (user_id, created_at)" in idx[0]["statements"][0]
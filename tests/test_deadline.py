@@ -0,0 +1,105 @@
+"""
+Tests for the end-to-end request deadline (no database required).
+"""
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import db, whatif
+from app.core.deadline import Deadline
+from app.main import app
+from app.routers.optimize import OptimizeRequest, run_optimize
+
+SQL = "SELECT * FROM orders WHERE user_id = 42 ORDER BY created_at DESC LIMIT 10"
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    seen = {"explain_ms": None, "schema_ms": None, "stats_ms": None}
+
+    def _slow_explain(sql, analyze=False, timeout_ms=10000):
+        seen["explain_ms"] = timeout_ms
+        time.sleep(timeout_ms / 1000.0)
+        raise Exception("canceling statement due to statement timeout")
+
+    def _schema(schema="public", table=None, timeout_ms=None):
+        seen["schema_ms"] = timeout_ms
+        return {"schema": "public", "tables": []}
+
+    def _stats(tables, schema="public", timeout_ms=5000):
+        seen["stats_ms"] = timeout_ms
+        return {"orders": {"rows": 50000, "indexes": []}}
+
+    monkeypatch.setattr(db, "run_explain", _slow_explain)
+    monkeypatch.setattr(db, "fetch_schema", _schema)
+    monkeypatch.setattr(db, "fetch_table_stats", _stats)
+    monkeypatch.setattr(db, "get_column_stats", lambda *a, **k: {})
+    return seen
+
+
+def test_stage_budget_is_capped_and_zero_when_spent():
+    d = Deadline(10000)
+    assert d.stage_ms(5000) == 5000
+    assert 9000 < d.stage_ms() <= 10000
+    spent = Deadline(0)
+    assert spent.expired
+    assert spent.stage_ms(5000) == 0
+
+
+def test_stages_share_one_budget(calls):
+    req = OptimizeRequest(sql=SQL, timeout_ms=10000, deadline_ms=300)
+    res = run_optimize(req)
+    assert calls["explain_ms"] <= 300
+    # The slow EXPLAIN used the whole budget: catalog reads were skipped, not given fresh 5 s timeouts
+    assert calls["schema_ms"] is None and calls["stats_ms"] is None
+    assert res.dataSources["skipped"] == ["schema", "stats"]
+    assert res.dataSources["stats"] is False
+    # Rewrites still run on the static analysis
+    assert res.ok
+
+
+def test_catalog_reads_get_remaining_budget(calls, monkeypatch):
+    monkeypatch.setattr(db, "run_explain", lambda *a, **k: {"Plan": {"Node Type": "Result"}})
+    res = run_optimize(OptimizeRequest(sql=SQL, timeout_ms=10000, deadline_ms=3000))
+    assert 0 < calls["schema_ms"] <= 3000
+    assert 0 < calls["stats_ms"] <= 3000
+    assert "skipped" not in res.dataSources
+
+
+def test_schema_timeout_skips_the_stage(calls, monkeypatch):
+    monkeypatch.setattr(db, "run_explain", lambda *a, **k: {"Plan": {"Node Type": "Result"}})
+
+    def _schema_timeout(*args, **kwargs):
+        raise Exception("canceling statement due to statement timeout")
+
+    monkeypatch.setattr(db, "fetch_schema", _schema_timeout)
+    res = run_optimize(OptimizeRequest(sql=SQL, timeout_ms=10000, deadline_ms=3000))
+    assert res.ok
+    assert res.dataSources["skipped"] == ["schema"]
+    assert res.dataSources["stats"] is True
+
+
+def test_whatif_is_skipped_without_budget(calls, monkeypatch):
+    monkeypatch.setattr(whatif.settings, "WHATIF_ENABLED", True)
+
+    def _no_whatif(*a, **k):
+        raise AssertionError("what-if should have been skipped")
+
+    monkeypatch.setattr(whatif, "evaluate", _no_whatif)
+    res = run_optimize(OptimizeRequest(sql=SQL, timeout_ms=10000, deadline_ms=300))
+    assert "whatif" in res.dataSources["skipped"]
+    assert res.ranking == "heuristic"
+
+
+def test_explain_skips_llm_when_deadline_exhausted():
+    client = TestClient(app)
+    r = client.post(
+        "/api/v1/explain",
+        json={"sql": "SELECT 1", "plan": {"Plan": {"Node Type": "Result"}}, "nl": True, "deadline_ms": 1},
+    )
+    assert r.status_code == 200
+    body = r.json()
+    assert body["explanation"] is None
+    assert "deadline" in body["message"]
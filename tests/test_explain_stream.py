@@ -0,0 +1,110 @@
+"""
+Tests for SSE streaming of explanations (no database or LLM server required).
+"""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import llm_adapter, nl_cache
+from app.main import app
+from app.providers import provider_ollama
+
+BODY = {"sql": "SELECT 1", "plan": {"Plan": {"Node Type": "Result"}}}
+
+
+def _events(text):
+    out = []
+    for frame in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    nl_cache.reset()
+    yield
+    nl_cache.reset()
+
+
+def test_stream_sends_plan_tokens_then_done_matching_non_streaming():
+    client = TestClient(app)
+    r = client.post("/api/v1/explain/stream", json=BODY)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = _events(r.text)
+    assert events[0][0] == "plan" and events[0][1]["plan"] == BODY["plan"]
+    tokens = [d["text"] for e, d in events if e == "token"]
+    assert len(tokens) > 1
+    kind, done = events[-1]
+    assert kind == "done" and done["cached"] is False and done["explain_provider"] == "dummy"
+    assert done["explanation"] == "".join(tokens).strip()
+    nl_cache.reset()
+    plain = client.post("/api/v1/explain", json={**BODY, "nl": True}).json()
+    assert plain["explanation"] == done["explanation"]
+
+
+def test_second_stream_is_served_from_the_cache():
+    client = TestClient(app)
+    client.post("/api/v1/explain/stream", json=BODY)
+    events = _events(client.post("/api/v1/explain/stream", json=BODY).text)
+    assert [e for e, _ in events] == ["plan", "token", "done"]
+    assert events[-1][1]["cached"] is True
+
+
+class _FailingLLM(llm_adapter.LLMProvider):
+    def complete(self, prompt, system=None):
+        raise RuntimeError("unused")
+
+    def stream(self, prompt, system=None):
+        yield "Partial "
+        raise RuntimeError("connection reset")
+
+    async def astream(self, prompt, system=None):
+        for piece in self.stream(prompt, system=system):
+            yield piece
+
+
+def test_failure_mid_stream_is_reported_in_band_and_not_cached(monkeypatch):
+    monkeypatch.setattr(llm_adapter, "get_llm", lambda: _FailingLLM())
+    events = _events(TestClient(app).post("/api/v1/explain/stream", json=BODY).text)
+    assert [e for e, _ in events] == ["plan", "token", "error"]
+    assert "connection reset" in events[-1][1]["message"]
+    assert len(nl_cache.get_cache()) == 0
+
+
+class _FakeResponse:
+    def __init__(self, lines, status=200):
+        self._lines = lines
+        self.status_code = status
+        self.closed = False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise provider_ollama.requests.HTTPError(f"HTTP {self.status_code}", response=self)
+
+    def iter_lines(self):
+        yield from self._lines
+
+    def close(self):
+        self.closed = True
+
+
+def test_ollama_stream_parses_chunks_and_retries_before_first_token(monkeypatch):
+    chunks = [json.dumps({"response": "  Seq", "done": False}).encode(), b"",
+              json.dumps({"response": " scan", "done": False}).encode(),
+              json.dumps({"response": "", "done": True}).encode()]
+    responses = [_FakeResponse([], status=503), _FakeResponse(chunks)]
+    sent = []
+
+    def fake_post(url, headers=None, json=None, timeout=None, stream=False):
+        sent.append(json)
+        return responses.pop(0)
+
+    monkeypatch.setattr(provider_ollama.time, "sleep", lambda s: None)
+    llm = provider_ollama.OllamaLLMProvider()
+    monkeypatch.setattr(llm._session, "post", fake_post)
+    assert list(llm.stream("explain", system="sys")) == ["Seq", " scan"]
+    assert len(sent) == 2 and sent[0]["stream"] is True and sent[0]["system"] == "sys"
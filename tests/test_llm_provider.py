@@ -0,0 +1,229 @@
+"""
+Tests for provider singletons, the LLM circuit breaker and Ollama retries (no LLM server required).
+"""
+
+import asyncio
+import json
+import threading
+
+import httpx
+import pytest
+import requests
+
+from app.core import deadline, llm_adapter
+from app.core.llm_adapter import CircuitBreaker
+from app.providers import provider_ollama
+from app.providers.provider_dummy import DummyLLMProvider
+from app.providers.provider_ollama import OllamaLLMProvider
+from app.providers.provider_rules import RulesLLMProvider
+
+
+@pytest.fixture(autouse=True)
+def _fresh_providers(monkeypatch):
+    monkeypatch.setattr(provider_ollama.time, "sleep", lambda s: None)
+    asyncio.run(llm_adapter.reset_providers())
+    yield
+    asyncio.run(llm_adapter.reset_providers())
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_after_threshold_and_half_opens_after_cooldown():
+    clock = _Clock()
+    b = CircuitBreaker("t", failure_threshold=2, cooldown_s=10, clock=clock)
+    b.record_failure()
+    assert b.state == b.CLOSED and b.allow()
+    b.record_failure()
+    assert b.state == b.OPEN and not b.allow()
+    clock.now += 10
+    assert b.allow() and b.state == b.HALF_OPEN
+    # Only one trial call at a time while half-open
+    assert not b.allow()
+    b.record_failure()
+    assert b.state == b.OPEN and not b.allow()
+    clock.now += 10
+    assert b.allow()
+    b.record_success()
+    assert b.state == b.CLOSED and b.allow() and b.allow()
+
+
+def test_success_resets_consecutive_failures():
+    b = CircuitBreaker("t", failure_threshold=2, cooldown_s=10, clock=_Clock())
+    b.record_failure()
+    b.record_success()
+    b.record_failure()
+    assert b.state == b.CLOSED
+
+
+def test_get_llm_returns_cached_singletons(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "ollama")
+    first = llm_adapter.get_llm()
+    assert isinstance(first, OllamaLLMProvider)
+    assert llm_adapter.get_llm() is first
+
+
+def test_get_llm_fails_fast_to_rules_while_breaker_is_open(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "ollama")
+    b = llm_adapter.breaker("ollama")
+    for _ in range(b.failure_threshold):
+        b.record_failure()
+    assert isinstance(llm_adapter.get_llm(), RulesLLMProvider)
+
+
+def test_get_llm_leaves_the_half_open_trial_to_the_provider_call(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "ollama")
+    b = llm_adapter.breaker("ollama")
+    b.cooldown_s = 0.0
+    for _ in range(b.failure_threshold):
+        b.record_failure()
+    # Routing (and cache hits after it) never contacts the backend, so it must not use up the trial
+    assert isinstance(llm_adapter.get_llm(), OllamaLLMProvider)
+    assert isinstance(llm_adapter.get_llm(), OllamaLLMProvider)
+    assert b.state == CircuitBreaker.HALF_OPEN and not b._trial_in_flight
+    llm = OllamaLLMProvider()
+    with b.call():
+        # The trial is taken: other calls are refused until it reports back
+        with pytest.raises(llm_adapter.CircuitOpen):
+            llm.complete("explain")
+        assert isinstance(llm_adapter.get_llm(), RulesLLMProvider)
+    # Ended without a verdict: the trial is free again
+    assert b.allow()
+
+
+class _Response:
+    def __init__(self, status=200, body=None):
+        self.status_code = status
+        self._body = body or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}", response=self)
+
+    def json(self):
+        return self._body
+
+
+def _fake_session(llm, monkeypatch, responses):
+    calls = []
+
+    def post(url, headers=None, json=None, timeout=None, **kw):
+        calls.append(timeout)
+        r = responses.pop(0)
+        if isinstance(r, Exception):
+            raise r
+        return r
+
+    monkeypatch.setattr(llm._session, "post", post)
+    return calls
+
+
+def test_complete_retries_transient_errors_then_succeeds(monkeypatch):
+    llm = OllamaLLMProvider()
+    calls = _fake_session(llm, monkeypatch, [
+        requests.ConnectionError("refused"), _Response(503), _Response(body={"response": " ok "}),
+    ])
+    assert llm.complete("explain") == "ok"
+    assert len(calls) == 3
+    assert llm_adapter.breaker("ollama").state == CircuitBreaker.CLOSED
+
+
+def test_complete_does_not_retry_client_errors_and_records_one_failure(monkeypatch):
+    llm = OllamaLLMProvider()
+    calls = _fake_session(llm, monkeypatch, [_Response(body={"error": "model not found"})])
+    with pytest.raises(Exception, match="failed after 1 attempt"):
+        llm.complete("explain")
+    assert len(calls) == 1
+    assert llm_adapter.breaker("ollama")._failures == 1
+
+
+def test_complete_timeout_and_retries_are_bounded_by_the_deadline(monkeypatch):
+    llm = OllamaLLMProvider()
+    calls = _fake_session(llm, monkeypatch, [requests.Timeout("slow")] * 5)
+    with deadline.use(deadline.Deadline(1500)):
+        with pytest.raises(Exception, match="failed"):
+            llm.complete("explain")
+    assert len(calls) <= llm.max_retries + 1
+    assert all(t <= 1.5 for t in calls)
+
+
+def test_exhausted_deadline_before_the_first_attempt_is_not_a_backend_failure(monkeypatch):
+    llm = OllamaLLMProvider()
+    calls = _fake_session(llm, monkeypatch, [])
+    b = llm_adapter.breaker("ollama")
+    b.cooldown_s = 0.0
+    for _ in range(b.failure_threshold):
+        b.record_failure()
+    with deadline.use(deadline.Deadline(0)):
+        for _ in range(b.failure_threshold + 1):
+            with pytest.raises(Exception, match="after 0 attempt"):
+                llm.complete("explain")
+    assert calls == []
+    assert b.state == CircuitBreaker.HALF_OPEN and not b._trial_in_flight
+
+
+def test_acomplete_uses_a_keep_alive_async_client(monkeypatch):
+    llm = OllamaLLMProvider()
+    seen = []
+
+    def handler(request):
+        seen.append(json.loads(request.content))
+        if len(seen) == 1:
+            return httpx.Response(502)
+        return httpx.Response(200, json={"response": "async ok"})
+
+    async def run():
+        client = httpx.AsyncClient(base_url=llm.host, transport=httpx.MockTransport(handler))
+        llm._aclients[asyncio.get_running_loop()] = client
+        try:
+            first = await llm.acomplete("explain", system="sys")
+            second = await llm.acomplete("again")
+            assert llm._async_client() is client
+            return first, second
+        finally:
+            await llm.aclose()
+
+    assert asyncio.run(run()) == ("async ok", "async ok")
+    assert [p["prompt"] for p in seen] == ["explain", "explain", "again"]
+    assert seen[0]["system"] == "sys" and seen[0]["stream"] is False
+
+
+async def _get_client(llm):
+    return llm._async_client()
+
+
+def test_aclose_closes_the_client_of_every_loop_on_its_own_loop():
+    llm = OllamaLLMProvider()
+    other = asyncio.new_event_loop()
+    runner = threading.Thread(target=other.run_forever)
+    runner.start()
+    try:
+        elsewhere = asyncio.run_coroutine_threadsafe(_get_client(llm), other).result(5)
+
+        async def run():
+            here = llm._async_client()
+            assert here is not elsewhere and len(llm._aclients) == 2
+            await llm.aclose()
+            return here
+
+        here = asyncio.run(run())
+        assert here.is_closed and elsewhere.is_closed
+        assert len(llm._aclients) == 0
+    finally:
+        other.call_soon_threadsafe(other.stop)
+        runner.join()
+        other.close()
+
+
+def test_dummy_astream_yields_words():
+    async def run():
+        return [p async for p in DummyLLMProvider().astream("short prompt")]
+
+    pieces = asyncio.run(run())
+    assert len(pieces) > 1
+    assert "".join(pieces) == DummyLLMProvider().complete("short prompt")
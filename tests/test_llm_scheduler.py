@@ -0,0 +1,169 @@
+"""
+Tests for the in-process LLM scheduler (no database or LLM server required).
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import deadline, llm_adapter, llm_scheduler, nl_cache
+from app.core.config import settings
+from app.core.llm_scheduler import LLMGate
+from app.main import app
+
+
+@pytest.fixture(autouse=True)
+def _fresh_scheduler(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_SCHEDULER_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENT", 1)
+    monkeypatch.setattr(settings, "LLM_QUEUE_MAX", 4)
+    monkeypatch.setattr(settings, "LLM_QUEUE_MAX_WAIT_MS", 100)
+    llm_scheduler.reset_gate()
+    nl_cache.reset()
+    yield
+    llm_scheduler.reset_gate()
+    nl_cache.reset()
+
+
+class _SlowOllama(llm_adapter.LLMProvider):
+    model = "slow"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def complete(self, prompt, system=None):
+        time.sleep(self.delay)
+        return "from the model"
+
+
+def test_interactive_callers_are_served_before_batch():
+    gate = LLMGate(max_concurrent=1, class_limits={"interactive": 1, "batch": 1}, queue_max=4, max_wait_ms=2000)
+    gate.acquire("interactive")
+    order = []
+
+    def wait(priority):
+        gate.acquire(priority)
+        order.append(priority)
+        gate.release(priority)
+
+    batch = threading.Thread(target=wait, args=("batch",))
+    batch.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=wait, args=("interactive",))
+    interactive.start()
+    time.sleep(0.05)
+    gate.release("interactive")
+    batch.join()
+    interactive.join()
+    assert order == ["interactive", "batch"]
+
+
+def test_full_or_slow_queue_falls_back_to_the_rules_provider():
+    llm = _SlowOllama()
+    gate = llm_scheduler.get_gate()
+    gate.acquire("interactive")
+    try:
+        t0 = time.monotonic()
+        with llm_scheduler.scheduled(llm) as used:
+            assert used is llm_adapter.fallback_provider()
+        assert time.monotonic() - t0 < 1.0
+    finally:
+        gate.release("interactive")
+    with llm_scheduler.scheduled(llm) as used:
+        assert used is llm
+        assert gate.snapshot()["interactive"]["running"] == 1
+    assert gate.snapshot()["interactive"]["running"] == 0
+
+
+def test_queue_wait_is_bounded_by_half_the_remaining_deadline(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_QUEUE_MAX_WAIT_MS", 60000)
+    with deadline.use(deadline.Deadline(200)):
+        assert 0 < llm_scheduler._max_wait_ms() <= 100
+
+
+def test_fallback_provider_is_not_queued():
+    gate = llm_scheduler.get_gate()
+    gate.acquire("interactive")
+    try:
+        dummy = llm_adapter.fallback_provider()
+        with llm_scheduler.scheduled(dummy) as used:
+            assert used is dummy
+    finally:
+        gate.release("interactive")
+
+
+def test_batch_callers_get_rules_unless_configured(monkeypatch):
+    llm = _SlowOllama()
+    with llm_scheduler.scheduled(llm, priority="batch") as used:
+        assert used is llm_adapter.fallback_provider()
+    monkeypatch.setattr(settings, "LLM_BATCH_PROVIDER", "llm")
+    with llm_scheduler.scheduled(llm, priority="batch") as used:
+        assert used is llm
+
+
+def test_async_scheduling_sheds_and_releases():
+    llm = _SlowOllama()
+    gate = llm_scheduler.get_gate()
+
+    async def run():
+        async with llm_scheduler.ascheduled(llm) as used:
+            assert used is llm
+            async with llm_scheduler.ascheduled(llm) as second:
+                assert second is llm_adapter.fallback_provider()
+        return gate.snapshot()["interactive"]
+
+    assert asyncio.run(run()) == {"running": 0, "queued": 0, "limit": 1}
+
+
+def test_async_waiters_queue_on_the_loop_and_leave_when_cancelled(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_QUEUE_MAX_WAIT_MS", 5000)
+    llm = _SlowOllama()
+    gate = llm_scheduler.get_gate()
+    monkeypatch.setattr(gate, "acquire", lambda *a, **k: pytest.fail("async waiters must not block a thread"))
+
+    async def wait_for_slot(admitted):
+        async with llm_scheduler.ascheduled(llm) as used:
+            admitted.append(used)
+
+    async def run():
+        admitted = []
+        await gate.aacquire("interactive")
+        threads = threading.active_count()
+        waiters = [asyncio.create_task(wait_for_slot(admitted)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert gate.snapshot()["interactive"]["queued"] == 3
+        assert threading.active_count() == threads
+        # A client that goes away leaves the queue at once
+        waiters[0].cancel()
+        await asyncio.sleep(0.01)
+        assert gate.snapshot()["interactive"]["queued"] == 2
+        gate.release("interactive")
+        await asyncio.gather(*waiters[1:])
+        return admitted
+
+    assert asyncio.run(run()) == [llm, llm]
+    assert gate.snapshot()["interactive"] == {"running": 0, "queued": 0, "limit": 1}
+
+
+def test_busy_llm_serves_a_rules_explanation_and_does_not_cache_it(monkeypatch):
+    llm = _SlowOllama(delay=0.5)
+    monkeypatch.setattr(llm_adapter, "get_llm", lambda: llm)
+    client = TestClient(app)
+    results = {}
+
+    def call(sql):
+        body = {"sql": sql, "nl": True, "plan": {"Plan": {"Node Type": "Result"}}}
+        results[sql] = client.post("/api/v1/explain", json=body).json()
+
+    threads = [threading.Thread(target=call, args=(f"SELECT {i}",)) for i in range(2)]
+    for t in threads:
+        t.start()
+        time.sleep(0.1)
+    for t in threads:
+        t.join()
+    providers = sorted(r["explain_provider"] for r in results.values())
+    assert providers == ["ollama", "rules"]
+    assert len(nl_cache.get_cache()) == 1
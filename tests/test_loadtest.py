@@ -0,0 +1,60 @@
+"""
+Tests for the load-test harness, run in-process against the app (no database required).
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app import loadtest
+from app.core import db
+from app.main import app
+
+
+@pytest.fixture(autouse=True)
+def no_db(monkeypatch):
+    def _no_explain(*args, **kwargs):
+        raise Exception("no db")
+
+    monkeypatch.setattr(db, "run_explain", _no_explain)
+    monkeypatch.setattr(db, "fetch_schema", lambda *a, **k: {"schema": "public", "tables": []})
+    monkeypatch.setattr(db, "fetch_table_stats", lambda *a, **k: {"orders": {"rows": 50000, "indexes": []}})
+    monkeypatch.setattr(db, "get_column_stats", lambda *a, **k: {})
+
+
+def _run(**kwargs):
+    lt = loadtest.LoadTest("http://testserver", transport=httpx.ASGITransport(app=app), **kwargs)
+    return asyncio.run(lt.run())
+
+
+def test_mix_schedule_interleaves_by_weight():
+    mix = loadtest.parse_mix("explain=3,optimize=1")
+    seq = loadtest._schedule(mix, slots=8)
+    assert seq.count("explain") == 6 and seq.count("optimize") == 2
+    assert "explain,explain,explain,explain" not in ",".join(seq)
+    with pytest.raises(ValueError):
+        loadtest.parse_mix("lint=1")
+
+
+def test_closed_loop_reports_per_endpoint_stats():
+    report = _run(mix=loadtest.parse_mix("optimize=1,workload=1"), duration_s=0.5, concurrency=4, workload_size=2)
+    assert report["meta"]["mode"] == "closed" and report["meta"]["serverVersion"]
+    for name in ("optimize", "workload"):
+        s = report["endpoints"][name]
+        assert s["requests"] > 0 and s["errorRate"] == 0.0
+        assert s["latencyMs"]["p50"] <= s["latencyMs"]["p99"] <= s["latencyMs"]["max"]
+        assert sum(s["histogram"]["counts"]) == s["requests"]
+    assert report["total"]["requests"] == sum(s["requests"] for s in report["endpoints"].values())
+
+
+def test_open_loop_counts_errors_and_compares_reports(monkeypatch):
+    report = _run(mix={"explain": 1.0}, duration_s=0.3, rps=40)
+    assert report["meta"]["mode"] == "open"
+    # ~12 scheduled requests in 0.3 s
+    assert 6 <= report["endpoints"]["explain"]["requests"] <= 16
+    worse = _run(mix={"explain": 1.0}, duration_s=0.3, rps=40, corpus=["   "])
+    assert worse["endpoints"]["explain"]["errorRate"] == 1.0
+    deltas = loadtest.compare(worse, report)
+    assert [d["endpoint"] for d in deltas] == ["explain", "total"]
+    assert deltas[0]["errorRate"]["current"] == 1.0
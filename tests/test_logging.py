@@ -0,0 +1,99 @@
+"""
+Tests for queued structured logging and access-log sampling (no database required).
+"""
+
+import contextvars
+import io
+import json
+import logging
+import queue
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import logs
+from app.main import app
+
+
+@pytest.fixture
+def captured():
+    logs.shutdown_logging()
+    stream = io.StringIO()
+    logs.setup_logging(stream=stream)
+
+    def lines():
+        logs.shutdown_logging()
+        return [json.loads(x) for x in stream.getvalue().splitlines()]
+
+    yield lines
+    logs.shutdown_logging()
+
+
+def test_records_are_json_with_request_id_from_worker_threads(captured):
+    token = logs.set_request_id("req-7")
+    try:
+        logs.get_logger("test").info("main %s", "thread", extra={"table": "orders"})
+
+        def worker():
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logs.get_logger("test").exception("worker failed")
+
+        t = threading.Thread(target=contextvars.copy_context().run, args=(worker,))
+        t.start()
+        t.join()
+    finally:
+        logs.reset_request_id(token)
+    first, second = captured()
+    assert first["msg"] == "main thread" and first["rid"] == "req-7" and first["table"] == "orders"
+    assert first["lvl"] == "info" and first["logger"] == "qeo.test"
+    assert second["rid"] == "req-7" and "ValueError: boom" in second["exc"]
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = logs.DroppingQueueHandler(queue.Queue(maxsize=2))
+    logger = logging.getLogger("qeo_test_dropping")
+    logger.propagate = False
+    logger.handlers = [handler]
+    start = time.perf_counter()
+    for i in range(100):
+        logger.warning("record %d", i)
+    assert time.perf_counter() - start < 1.0
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 98
+
+
+def test_sampling_per_route(monkeypatch):
+    monkeypatch.setattr(logs.settings, "LOG_SAMPLE_ROUTES", "/metrics=0,/api/v1/lint=0.5")
+    monkeypatch.setattr(logs.settings, "LOG_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(logs.settings, "LOG_SLOW_MS", 1000)
+    assert logs.sample_rate("/api/v1/lint") == 0.5
+    assert not any(logs.should_log_access("/metrics", 200, 5) for _ in range(50))
+    assert logs.should_log_access("/api/v1/optimize", 200, 5)
+    # Errors and slow requests are logged regardless of the route's rate
+    assert logs.should_log_access("/metrics", 503, 5)
+    assert logs.should_log_access("/metrics", 200, 1500)
+
+
+def test_slow_request_includes_stage_breakdown(captured, monkeypatch):
+    monkeypatch.setattr(logs.settings, "LOG_SLOW_MS", 100)
+    stages = {"explain": {"ms": 180.04, "count": 1}, "advisor": {"ms": 3.2, "count": 1}}
+    logs.log_request("POST", "/api/v1/optimize", 200, 250, stages=stages)
+    logs.log_request("POST", "/api/v1/optimize", 200, 20, stages=stages)
+    slow, fast = captured()
+    assert slow["msg"] == "slow request" and slow["lvl"] == "warning"
+    assert slow["stages"] == {"explain": 180.0, "advisor": 3.2}
+    assert fast["msg"] == "request" and "stages" not in fast
+
+
+def test_middleware_echoes_request_id(captured, monkeypatch):
+    monkeypatch.setattr(logs.settings, "LOG_SAMPLE_ROUTES", "")
+    client = TestClient(app)
+    r = client.post("/api/v1/lint", json={"sql": "SELECT 1"}, headers={"x-request-id": "abc123"})
+    assert r.headers["x-request-id"] == "abc123"
+    assert client.post("/api/v1/lint", json={"sql": "SELECT 1"}).headers["x-request-id"]
+    access = [x for x in captured() if x["logger"] == "qeo.access"]
+    assert access[0]["rid"] == "abc123" and access[0]["path"] == "/api/v1/lint"
@@ -0,0 +1,107 @@
+"""
+Tests for the mock Ollama server and its use by the provider and the load-test harness.
+"""
+
+import asyncio
+import threading
+
+import httpx
+import pytest
+import requests
+
+from app import loadtest
+from app.core import db, llm_adapter, llm_scheduler, nl_cache
+from app.core.config import settings
+from app.main import app
+from app.mock_ollama import MockConfig, MockOllamaServer
+from app.providers.provider_ollama import OllamaLLMProvider
+
+
+def _server(**kw):
+    return MockOllamaServer(config=MockConfig(**{"latency_dist": "fixed", "latency_ms": 0, "tokens_per_s": 0, "seed": 1, **kw}))
+
+
+@pytest.fixture(autouse=True)
+def _fresh_llm():
+    asyncio.run(llm_adapter.reset_providers())
+    llm_scheduler.reset_gate()
+    nl_cache.reset()
+    yield
+    asyncio.run(llm_adapter.reset_providers())
+    llm_scheduler.reset_gate()
+    nl_cache.reset()
+
+
+def test_version_and_non_streaming_generate():
+    with _server(response_tokens=5) as mock:
+        assert requests.get(f"{mock.url}/api/version").json()["version"]
+        body = requests.post(f"{mock.url}/api/generate", json={"model": "m", "prompt": "p", "stream": False}).json()
+        assert body["done"] and body["model"] == "m" and body["eval_count"] == 5
+        assert len(body["response"].split()) == 5
+        assert mock.stats()["completed"] == 1
+
+
+def test_provider_streams_and_completes_against_the_mock(monkeypatch):
+    with _server(response_tokens=8, tokens_per_s=400) as mock:
+        monkeypatch.setattr(settings, "OLLAMA_HOST", mock.url)
+        llm = OllamaLLMProvider()
+        pieces = list(llm.stream("explain"))
+        assert len(pieces) == 8
+        assert "".join(pieces) == llm.complete("explain")
+
+        async def run():
+            try:
+                return [p async for p in llm.astream("explain")]
+            finally:
+                await llm.aclose()
+
+        assert asyncio.run(run()) == pieces
+
+
+def test_error_rate_is_retried_then_reported(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 2)
+    monkeypatch.setattr(settings, "LLM_RETRY_BACKOFF_MS", 0)
+    with _server(error_rate=1.0) as mock:
+        monkeypatch.setattr(settings, "OLLAMA_HOST", mock.url)
+        llm = OllamaLLMProvider()
+        with pytest.raises(Exception, match="failed after 3 attempt"):
+            llm.complete("explain")
+        assert mock.stats()["errors"] == 3
+
+
+def test_concurrency_cap_queues_then_rejects():
+    with _server(latency_ms=200, max_concurrent=1, max_queue=1) as mock:
+        statuses = []
+
+        def call():
+            r = requests.post(f"{mock.url}/api/generate", json={"prompt": "p", "stream": False})
+            statuses.append(r.status_code)
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats = mock.stats()
+    assert sorted(statuses) == [200, 200, 503]
+    assert stats["peakActive"] == 1 and stats["rejected"] == 1
+
+
+def test_loadtest_measures_nl_explain_under_llm_latency(monkeypatch):
+    def _no_explain(*args, **kwargs):
+        raise Exception("no db")
+
+    monkeypatch.setattr(db, "run_explain", _no_explain)
+    monkeypatch.setenv("LLM_PROVIDER", "ollama")
+    with _server(latency_ms=50, max_concurrent=2) as mock:
+        monkeypatch.setattr(settings, "OLLAMA_HOST", mock.url)
+        lt = loadtest.LoadTest(
+            "http://testserver", transport=httpx.ASGITransport(app=app), mix={"explain": 1.0},
+            duration_s=0.5, concurrency=4, nl=True, llm_stats_url=mock.url,
+        )
+        report = asyncio.run(lt.run())
+    llm = report["llm"]
+    assert llm["requests"] >= 1 and llm["errors"] == 0 and llm["peakActive"] <= 2
+    assert llm["config"]["latency_ms"] == 50
+    # The first explanation of each statement waits for the mock model
+    assert report["endpoints"]["explain"]["latencyMs"]["max"] >= 50
@@ -0,0 +1,115 @@
+"""
+Tests for the explanation cache (no database or LLM server required).
+"""
+
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import llm_adapter, nl_cache
+from app.core.nl_cache import ExplanationCache, cache_key
+from app.main import app
+
+
+def test_key_depends_on_prompt_system_provider_and_model():
+    k = cache_key("explain this plan", "system", "ollama", "llama2")
+    assert k == cache_key("explain this plan", "system", "ollama", "llama2")
+    assert k != cache_key("explain this plan", "system", "ollama", "llama3")
+    assert k != cache_key("explain this plan", "system", "dummy", "llama2")
+    assert k != cache_key("explain this plan", None, "ollama", "llama2")
+    assert k != cache_key("explain that plan", "system", "ollama", "llama2")
+
+
+def test_memory_tier_is_lru_bounded():
+    cache = ExplanationCache(max_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"  # a is now most recently used
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    assert len(cache) == 2
+    assert cache.stats == {"memory_hit": 3, "disk_hit": 0, "miss": 1}
+    cache.put("d", "")  # empty outputs are not cached
+    assert cache.get("d") is None
+
+
+def test_counters_are_exact_under_concurrent_lookups():
+    cache = ExplanationCache(max_entries=2)
+    cache.put("a", "A")
+
+    def lookups():
+        for _ in range(2000):
+            cache.get("a")
+            cache.get("missing")
+
+    threads = [threading.Thread(target=lookups) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.stats == {"memory_hit": 16000, "disk_hit": 0, "miss": 16000}
+
+
+def test_disk_tier_survives_restart_and_is_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(nl_cache, "_PRUNE_EVERY", 1)
+    path = str(tmp_path / "nl" / "cache.sqlite")
+    first = ExplanationCache(max_entries=10, path=path, disk_max_entries=3)
+    for i in range(5):
+        first.put(f"k{i}", f"v{i}")
+    first.close()
+
+    second = ExplanationCache(max_entries=10, path=path, disk_max_entries=3)
+    assert second.get("k4") == "v4"
+    assert second.get("k0") is None
+    assert second.stats["disk_hit"] == 1
+    # Promoted into memory
+    assert second.get("k4") == "v4"
+    assert second.stats["memory_hit"] == 1
+    second.close()
+
+
+class _CountingLLM(llm_adapter.LLMProvider):
+    model = "counting-1"
+
+    def __init__(self):
+        self.calls = 0
+
+    def complete(self, prompt, system=None):
+        self.calls += 1
+        return f"explanation #{self.calls}"
+
+
+@pytest.fixture
+def counting_llm(monkeypatch):
+    llm = _CountingLLM()
+    monkeypatch.setattr(llm_adapter, "get_llm", lambda: llm)
+    nl_cache.reset()
+    yield llm
+    nl_cache.reset()
+
+
+def _explain(client, sql="SELECT 1"):
+    body = {"sql": sql, "plan": {"Plan": {"Node Type": "Result"}}, "nl": True}
+    r = client.post("/api/v1/explain", json=body)
+    assert r.status_code == 200
+    return r.json()["explanation"]
+
+
+def test_repeated_explanations_call_the_llm_once(counting_llm):
+    client = TestClient(app)
+    assert _explain(client) == "explanation #1"
+    assert _explain(client) == "explanation #1"
+    assert counting_llm.calls == 1
+    # A different statement is a different prompt
+    assert _explain(client, sql="SELECT 2") == "explanation #2"
+    assert counting_llm.calls == 2
+
+
+def test_disabled_cache_calls_the_llm_every_time(counting_llm, monkeypatch):
+    monkeypatch.setattr(nl_cache.settings, "NL_CACHE_ENABLED", False)
+    client = TestClient(app)
+    _explain(client)
+    _explain(client)
+    assert counting_llm.calls == 2
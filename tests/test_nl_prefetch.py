@@ -0,0 +1,198 @@
+"""
+Tests for speculative explanations (no database or LLM server required).
+"""
+
+import contextvars
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import cancel, db, llm_adapter, llm_scheduler, nl_cache, nl_prefetch
+from app.core.admission import AdmissionRejected
+from app.core.config import settings
+from app.core.nl_prefetch import Prefetcher
+from app.main import app
+
+PLAN = {"Plan": {"Node Type": "Seq Scan", "Relation Name": "orders", "Total Cost": 100.0, "Plan Rows": 1000}}
+SQL = "SELECT * FROM orders WHERE user_id = 42"
+
+
+class _GatedLLM(llm_adapter.LLMProvider):
+    """Counts calls; each call blocks until ``release`` is set."""
+
+    model = "gated-1"
+
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def complete(self, prompt, system=None):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return f"explanation #{self.calls}"
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    llm = _GatedLLM()
+    monkeypatch.setattr(llm_adapter, "get_llm", lambda: llm)
+    monkeypatch.setattr(settings, "NL_PREFETCH_ENABLED", True)
+    monkeypatch.setattr(settings, "NL_PREFETCH_PER_MINUTE", 0)
+    llm_scheduler.reset_gate()
+    nl_cache.reset()
+    nl_prefetch.reset()
+    yield llm
+    llm.release.set()
+    nl_prefetch.reset(wait=True)
+    nl_cache.reset()
+    llm_scheduler.reset_gate()
+
+
+def _drain():
+    p = nl_prefetch.get_prefetcher()
+    deadline = time.monotonic() + 5
+    while (p._pending or p._running) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_plain_explain_warms_the_cache_for_nl(llm):
+    client = TestClient(app)
+    r = client.post("/api/v1/explain", json={"sql": SQL, "plan": PLAN})
+    assert r.status_code == 200 and r.json()["explanation"] is None
+    _drain()
+    assert llm.calls == 1
+    data = client.post("/api/v1/explain", json={"sql": SQL, "plan": PLAN, "nl": True}).json()
+    assert data["explanation"] == "explanation #1"
+    assert llm.calls == 1
+    # Another audience is a different prompt: generated on demand
+    data = client.post("/api/v1/explain", json={"sql": SQL, "plan": PLAN, "nl": True, "audience": "dba"}).json()
+    assert data["explanation"] == "explanation #2"
+
+
+def test_optimize_warms_the_cache_for_nl(llm, monkeypatch):
+    monkeypatch.setattr(db, "run_explain", lambda *a, **k: PLAN)
+    monkeypatch.setattr(db, "fetch_schema", lambda *a, **k: {"schema": "public", "tables": []})
+    monkeypatch.setattr(db, "fetch_table_stats", lambda *a, **k: {})
+    monkeypatch.setattr(db, "get_column_stats", lambda *a, **k: {})
+    monkeypatch.setattr(settings, "WHATIF_ENABLED", False)
+    client = TestClient(app)
+    assert client.post("/api/v1/optimize", json={"sql": SQL}).status_code == 200
+    _drain()
+    data = client.post("/api/v1/explain", json={"sql": SQL, "nl": True}).json()
+    assert data["explanation"] == "explanation #1" and llm.calls == 1
+
+
+def test_nl_request_joins_a_running_speculative_call(llm):
+    llm.release.clear()
+    client = TestClient(app)
+    client.post("/api/v1/explain", json={"sql": SQL, "plan": PLAN})
+    assert llm.started.wait(5)
+    result = {}
+    t = threading.Thread(target=lambda: result.update(client.post(
+        "/api/v1/explain", json={"sql": SQL, "plan": PLAN, "nl": True}
+    ).json()))
+    t.start()
+    time.sleep(0.1)
+    llm.release.set()
+    t.join(5)
+    assert result["explanation"] == "explanation #1" and llm.calls == 1
+
+
+def test_skipped_for_analyze_plans_and_when_disabled(llm, monkeypatch):
+    client = TestClient(app)
+    client.post("/api/v1/explain", json={"sql": SQL, "plan": PLAN, "analyze": True})
+    monkeypatch.setattr(settings, "NL_PREFETCH_ENABLED", False)
+    nl_prefetch.reset()
+    client.post("/api/v1/explain", json={"sql": SQL, "plan": PLAN})
+    time.sleep(0.1)
+    assert llm.calls == 0
+    assert nl_prefetch.get_prefetcher() is None
+
+
+def test_pending_rate_and_duplicate_limits(llm):
+    llm.release.clear()
+    now = [0.0]
+    p = Prefetcher(max_concurrent=1, max_pending=2, per_minute=3, clock=lambda: now[0])
+    try:
+        assert p.submit("q1", PLAN, [], {})
+        assert not p.submit("q1", PLAN, [], {})  # duplicate
+        assert p.submit("q2", PLAN, [], {})
+        assert not p.submit("q3", PLAN, [], {})  # two already pending
+        llm.release.set()
+        deadline = time.monotonic() + 5
+        while p._pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert p.submit("q3", PLAN, [], {})
+        assert not p.submit("q4", PLAN, [], {})  # three per minute
+        now[0] += 20.0
+        assert p.submit("q4", PLAN, [], {})
+    finally:
+        p.shutdown(wait=True)
+
+
+def test_skipped_while_interactive_callers_wait(llm, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENT", 1)
+    llm_scheduler.reset_gate()
+    gate = llm_scheduler.get_gate()
+    gate.acquire("interactive")
+
+    def queued_caller():
+        with pytest.raises(AdmissionRejected):
+            gate.acquire("interactive", max_wait_ms=300)
+
+    waiter = threading.Thread(target=queued_caller)
+    waiter.start()
+    time.sleep(0.05)
+    try:
+        p = Prefetcher()
+        assert p._generate(SQL, PLAN, [], {}) == "busy"
+        assert llm.calls == 0
+        p.shutdown()
+    finally:
+        waiter.join()
+        gate.release("interactive")
+
+
+def test_nl_request_does_not_wait_for_a_speculative_call_still_queued(llm, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_CONCURRENT", 1)
+    llm_scheduler.reset_gate()
+    gate = llm_scheduler.get_gate()
+    gate.acquire("interactive")
+    p = Prefetcher()
+    try:
+        key = nl_prefetch.explanation_setup(SQL, PLAN, [], {})[4]
+        assert p.submit(SQL, PLAN, [], {})
+        time.sleep(0.05)
+        # Queued behind the interactive slot: nothing to join yet
+        start = time.monotonic()
+        assert not p.wait(key, 2.0)
+        assert time.monotonic() - start < 0.5
+    finally:
+        gate.release("interactive")
+        p.shutdown(wait=True)
+    assert llm.calls == 1
+
+
+def test_waiting_for_a_speculative_call_stops_when_the_request_is_cancelled(llm):
+    llm.release.clear()
+    p = Prefetcher()
+    try:
+        key = nl_prefetch.explanation_setup(SQL, PLAN, [], {})[4]
+        assert p.submit(SQL, PLAN, [], {})
+        assert llm.started.wait(5)
+        scope = cancel.CancelScope()
+        scope.cancel("client_disconnect")
+        ctx = contextvars.copy_context()
+        ctx.run(cancel._current.set, scope)
+        start = time.monotonic()
+        with pytest.raises(cancel.QueryCancelled):
+            ctx.run(p.wait, key, 5.0)
+        assert time.monotonic() - start < 1.0
+    finally:
+        llm.release.set()
+        p.shutdown(wait=True)
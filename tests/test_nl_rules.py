@@ -0,0 +1,101 @@
+"""
+Tests for the rule-based explanation engine and the ``rules`` provider.
+"""
+
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core import nl_rules, plan_heuristics, prompts
+from app.main import app
+from app.providers.provider_rules import RulesLLMProvider
+
+PLAN = {
+    "Plan": {
+        "Node Type": "Limit", "Total Cost": 1200, "Plan Rows": 10, "Actual Rows": 10,
+        "Plans": [{
+            "Node Type": "Sort", "Total Cost": 1190, "Sort Key": ["o.created_at DESC"],
+            "Plans": [{
+                "Node Type": "Hash Join", "Total Cost": 1000, "Plan Rows": 5000, "Actual Rows": 90000,
+                "Hash Cond": "(o.user_id = u.id)",
+                "Plans": [
+                    {"Node Type": "Seq Scan", "Relation Name": "orders", "Total Cost": 700, "Plan Rows": 200000,
+                     "Filter": "(status = 'open'::text)"},
+                    {"Node Type": "Hash", "Total Cost": 200, "Plans": [
+                        {"Node Type": "Index Scan", "Relation Name": "users", "Index Name": "users_pkey",
+                         "Total Cost": 180, "Plan Rows": 10000},
+                    ]},
+                ],
+            }],
+        }],
+    },
+    "Planning Time": 0.3,
+    "Execution Time": 12.5,
+}
+
+
+def _explain(**kw):
+    warnings, metrics = plan_heuristics.analyze(PLAN)
+    return nl_rules.explain(PLAN, warnings, metrics, sql="SELECT ...", **kw)
+
+
+def test_overview_hot_spot_and_most_actionable_issue():
+    lines = _explain().splitlines()
+    assert lines[0] == (
+        "Overview: PostgreSQL reads orders (sequential scan) and users (index scan using users_pkey), "
+        "joins them with a hash join, then sorts the result and returns only the first rows."
+    )
+    assert lines[1] == (
+        "Hot spot: the sequential scan on orders accounts for 58% of the estimated cost "
+        "(filter (status = 'open'::text))."
+    )
+    assert lines[2] == "Issues:"
+    assert lines[3].startswith("- Sequential scan on orders with 200,000 rows: an index on the filtered columns")
+    assert lines[-1].endswith("more warning(s) omitted.")
+
+
+def test_audience_and_length_shape_the_explanation():
+    beginner = _explain(audience="beginner")
+    assert "A sequential scan reads every row of a table." in beginner
+    assert "A merge join" not in beginner
+    dba = _explain(audience="dba", length="long")
+    assert "Most expensive steps:\n- sequential scan on orders: 58%\n- sort: 16%" in dba
+    assert "Estimates: the hash join expected 5,000 rows but got 90,000 (18x off)." in dba
+    assert "Timing: planned in 0.30 ms, executed in 12.50 ms." in dba
+    assert "omitted" not in dba
+    assert "Timing" not in _explain(length="short")
+
+
+def test_without_a_plan_or_warnings():
+    assert nl_rules.explain(None, sql="update t set x = 1") == "Overview: no execution plan was available for the UPDATE statement."
+    text = nl_rules.explain({"Plan": {"Node Type": "Result", "Total Cost": 0.01}}, [], {})
+    assert text.startswith("Overview: PostgreSQL computes the result without reading a table (top node: Result).")
+    assert "nothing to flag" in text
+
+
+def test_fast_enough_for_the_request_path():
+    warnings, metrics = plan_heuristics.analyze(PLAN)
+    nl_rules.explain(PLAN, warnings, metrics)
+    n = 200
+    start = time.perf_counter()
+    for _ in range(n):
+        nl_rules.explain(PLAN, warnings, metrics)
+    assert (time.perf_counter() - start) / n < 0.001
+
+
+def test_rules_provider_without_context_uses_prompt_warnings():
+    warnings, metrics = plan_heuristics.analyze(PLAN)
+    prompt = prompts.explain_template("SELECT 1", plan=PLAN, warnings=warnings, metrics=metrics)
+    text = RulesLLMProvider().complete(prompt)
+    assert "SEQ_SCAN_LARGE" not in text and "Sequential scan on orders with 200,000 rows" in text
+
+
+def test_rules_provider_on_the_explain_endpoint(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "rules")
+    client = TestClient(app)
+    data = client.post("/api/v1/explain", json={"sql": "SELECT 1", "nl": True, "plan": PLAN, "audience": "dba"}).json()
+    assert data["explain_provider"] == "rules"
+    assert data["explanation"].startswith("Overview: PostgreSQL reads orders")
+    assert "Estimates:" in data["explanation"]
+    stream = client.post("/api/v1/explain/stream", json={"sql": "SELECT 1", "plan": PLAN}).text
+    assert '"explain_provider":"rules"' in stream.replace(" ", "")
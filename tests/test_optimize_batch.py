@@ -0,0 +1,183 @@
+"""
+Tests for POST /api/v1/optimize/batch (no database required).
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import cancel, db
+from app.main import app
+from app.routers import optimize
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    counts = {"schema": 0, "stats": 0, "colstats": 0, "colstats_single": 0, "stats_tables": None, "schemas": []}
+
+    def _no_explain(*args, **kwargs):
+        raise Exception("no db")
+
+    def _schema(*args, **kwargs):
+        counts["schema"] += 1
+        return {"schema": "public", "tables": []}
+
+    def _stats(tables, *args, **kwargs):
+        counts["stats"] += 1
+        counts["schemas"].append(kwargs.get("schema", "public"))
+        counts["stats_tables"] = sorted(tables)
+        return {"orders": {"rows": 50000, "indexes": []}, "users": {"rows": 50000, "indexes": []}}
+
+    def _colstats(tables, *args, **kwargs):
+        counts["colstats"] += 1
+        return {"orders": {"user_id": {"avg_width": 4}}, "users": {}}
+
+    def _colstats_single(schema, table, *args, **kwargs):
+        counts["colstats_single"] += 1
+        return {"user_id": {"avg_width": 4}} if table == "orders" else {}
+
+    monkeypatch.setattr(db, "run_explain", _no_explain)
+    monkeypatch.setattr(db, "fetch_schema", _schema)
+    monkeypatch.setattr(db, "fetch_table_stats", _stats)
+    monkeypatch.setattr(db, "get_column_stats_many", _colstats)
+    monkeypatch.setattr(db, "get_column_stats", _colstats_single)
+    return counts
+
+
+SQLS = [
+    "SELECT * FROM orders WHERE user_id = 1 ORDER BY created_at DESC LIMIT 5",
+    "SELECT id FROM users WHERE email = 'a'",
+    "DELETE FROM orders",
+]
+
+
+def test_batch_loads_catalog_once(calls):
+    client = TestClient(app)
+    r = client.post("/api/v1/optimize/batch", json={"sqls": SQLS})
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [x["index"] for x in results] == [0, 1, 2]
+    assert [x["sql"] for x in results] == SQLS
+    assert results[2]["ok"] is False
+    assert any(s["kind"] == "index" for s in results[0]["suggestions"])
+    assert results[0]["dataSources"] == {"plan": "none", "stats": True}
+    assert calls["schema"] == 1
+    assert calls["stats"] == 1
+    assert calls["stats_tables"] == ["orders", "users"]
+    assert calls["colstats"] == 1
+    assert calls["colstats_single"] == 0
+
+
+def test_failed_stats_are_loaded_once_and_reported_as_skipped(calls, monkeypatch):
+    def _stats(*args, **kwargs):
+        calls["stats"] += 1
+        raise Exception("stats timeout")
+
+    monkeypatch.setattr(db, "fetch_table_stats", _stats)
+    client = TestClient(app)
+    results = client.post("/api/v1/optimize/batch", json={"sqls": SQLS[:2]}).json()["results"]
+    # Not retried per statement
+    assert calls["stats"] == 1
+    assert [x["dataSources"] for x in results] == [{"plan": "none", "stats": False, "skipped": ["stats"]}] * 2
+
+
+def test_batch_matches_single_optimize(calls):
+    client = TestClient(app)
+    single = client.post("/api/v1/optimize", json={"sql": SQLS[0]}).json()
+    batch = client.post("/api/v1/optimize/batch", json={"sqls": [SQLS[0]]}).json()["results"][0]
+    batch.pop("index")
+    batch.pop("sql")
+    assert batch == single
+
+
+def test_batch_ndjson_stream(calls):
+    client = TestClient(app)
+    r = client.post("/api/v1/optimize/batch", json={"sqls": SQLS, "stream": True})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines() if line]
+    assert sorted(x["index"] for x in lines) == [0, 1, 2]
+    assert all("suggestions" in x for x in lines)
+
+
+def test_batch_stream_survives_schema_errors_and_bounds_size(calls, monkeypatch):
+    def _schema_down(*args, **kwargs):
+        raise Exception("catalog timeout")
+
+    monkeypatch.setattr(db, "fetch_schema", _schema_down)
+    client = TestClient(app)
+    r = client.post("/api/v1/optimize/batch", json={"sqls": SQLS[:2], "stream": True})
+    lines = [json.loads(line) for line in r.text.splitlines() if line]
+    assert sorted(x["index"] for x in lines) == [0, 1]
+    too_many = ["SELECT 1"] * (db.settings.BATCH_MAX_STATEMENTS + 1)
+    assert client.post("/api/v1/optimize/batch", json={"sqls": too_many}).status_code == 422
+
+
+def test_batch_on_the_shared_connection_runs_one_statement_at_a_time(calls, monkeypatch):
+    monkeypatch.setenv("QEO_GLOBAL_CONN", "1")
+    monkeypatch.setattr(db.settings, "BATCH_PARALLELISM", 4)
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def _explain(*args, **kwargs):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        raise Exception("no db")
+
+    monkeypatch.setattr(db, "run_explain", _explain)
+    # Outside a request's cancel scope (e.g. driven directly) statements would share the global session
+    results = list(optimize.iter_optimize_batch(optimize.OptimizeBatchRequest(sqls=SQLS[:2] * 2)))
+    assert len(results) == 4
+    assert peak[0] == 1
+
+
+def test_streamed_batch_stops_when_the_client_disconnects(calls, monkeypatch):
+    monkeypatch.setattr(db.settings, "BATCH_PARALLELISM", 1)
+    gone = threading.Event()
+    started = []
+
+    def _explain(*args, **kwargs):
+        # A long EXPLAIN ANALYZE: runs until the request's scope cancels it
+        started.append(1)
+        gone.set()
+        scope = cancel.current_scope()
+        for _ in range(500):
+            if scope.cancelled:
+                break
+            time.sleep(0.01)
+        cancel.checkpoint()
+        return {}
+
+    monkeypatch.setattr(db, "run_explain", _explain)
+
+    class _Request:
+        async def is_disconnected(self):
+            return gone.is_set()
+
+    async def consume():
+        req = optimize.OptimizeBatchRequest(sqls=[SQLS[0]] * 5, analyze=True, stream=True)
+        return [item async for item in cancel.iter_cancellable(_Request(), optimize.iter_optimize_batch, req)]
+
+    t0 = time.monotonic()
+    assert asyncio.run(consume()) == []
+    assert time.monotonic() - t0 < 3.0
+    # The statements still queued behind the cancelled one never ran
+    time.sleep(0.1)
+    assert len(started) == 1
+
+
+def test_batch_loads_one_catalog_per_named_schema(calls):
+    client = TestClient(app)
+    sqls = [SQLS[0], "SELECT * FROM bench_sf1.orders WHERE user_id = 1 ORDER BY created_at DESC LIMIT 5"]
+    results = client.post("/api/v1/optimize/batch", json={"sqls": sqls}).json()["results"]
+    assert sorted(calls["schemas"]) == ["bench_sf1", "public"]
+    statements = [s["statements"][0] for s in results[1]["suggestions"] if s["kind"] == "index"]
+    assert statements and "ON bench_sf1.orders" in statements[0]
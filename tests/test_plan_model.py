@@ -0,0 +1,100 @@
+"""
+Tests for the flattened plan model and the analyses built on it.
+"""
+
+from app.core import plan_diff, plan_heuristics
+from app.core.plan_model import NodeType, PlanTable, plan_table
+
+
+def _plan():
+    return {
+        "Plan": {
+            "Node Type": "Nested Loop",
+            "Total Cost": 100.0,
+            "Plan Rows": 10,
+            "Plans": [
+                {"Node Type": "Index Scan", "Relation Name": "users", "Total Cost": 8.0, "Plan Rows": 1},
+                {
+                    "Node Type": "Seq Scan",
+                    "Relation Name": "orders",
+                    "Total Cost": 60.0,
+                    "Plan Rows": 150000,
+                    "Actual Rows": 10,
+                    "Actual Loops": 3,
+                    "Shared Hit Blocks": 7,
+                    "Filter": "(status = 'paid')",
+                },
+                "not-a-node",
+            ],
+        },
+        "Planning Time": 0.5,
+        "Execution Time": 2.0,
+    }
+
+
+def test_pre_order_layout_and_links():
+    t = PlanTable.from_plan(_plan())
+    assert len(t) == 3
+    assert [t.type_name(i) for i in range(3)] == ["Nested Loop", "Index Scan", "Seq Scan"]
+    assert list(t.parent) == [-1, 0, 0]
+    assert list(t.depth) == [0, 1, 1]
+    assert t.child_list(0) == [1, 2]
+    assert t.node_type[2] == NodeType.SEQ_SCAN
+    assert t.rows(1, actual=True) is None
+    assert t.rows(2, actual=True) == 10
+    assert t.actual_loops[2] == 3
+    assert t.shared_hit_blocks[2] == 7
+    assert t.relation[2] == "orders"
+    assert t.exclusive_cost(0) == 32.0
+    assert t.planning_time_ms == 0.5
+
+
+def test_unknown_node_types_keep_their_name():
+    t = PlanTable.from_plan({"Plan": {"Node Type": "Custom Scan"}})
+    assert t.node_type[0] == NodeType.OTHER
+    assert t.type_name(0) == "Custom Scan"
+
+
+def test_plan_table_is_built_once_per_object():
+    plan = _plan()
+    assert plan_table(plan) is plan_table(plan)
+    assert plan_table(_plan()) is not plan_table(plan)
+
+
+def test_deep_plan_does_not_recurse():
+    node = {"Node Type": "Seq Scan", "Plan Rows": 1}
+    for _ in range(5000):
+        node = {"Node Type": "Limit", "Plans": [node]}
+    t = PlanTable.from_plan({"Plan": node})
+    assert len(t) == 5001
+    assert t.depth[5000] == 5000
+
+
+def test_heuristics_on_table():
+    warnings, metrics = plan_heuristics.analyze(_plan())
+    codes = [w["code"] for w in warnings]
+    assert codes == ["NESTED_LOOP_SEQ_INNER", "ESTIMATE_MISMATCH", "NO_INDEX_FILTER"]
+    assert metrics == {"planning_time_ms": 0.5, "execution_time_ms": 2.0, "node_count": 3}
+
+
+def test_heuristics_empty_plan():
+    warnings, metrics = plan_heuristics.analyze({})
+    assert warnings == []
+    assert metrics["node_count"] == 1
+
+
+def test_diff_keeps_integer_rows():
+    after = _plan()
+    after["Plan"]["Plans"][1]["Node Type"] = "Index Scan"
+    after["Plan"]["Total Cost"] = 40.0
+    out = plan_diff.diff_plans(_plan(), after)["nodes"]
+    assert out[0] == {
+        "beforeOp": "Nested Loop",
+        "afterOp": "Nested Loop",
+        "costBefore": 100.0,
+        "costAfter": 40.0,
+        "rowsBefore": 10,
+        "rowsAfter": 10,
+    }
+    assert out[2]["beforeOp"] == "Seq Scan" and out[2]["afterOp"] == "Index Scan"
+    assert isinstance(out[2]["rowsBefore"], int)
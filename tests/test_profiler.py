@@ -0,0 +1,111 @@
+"""
+Tests for the on-demand profiling endpoint (no database required).
+"""
+
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import profiler
+from app.main import app
+
+TOKEN = {"x-admin-token": "s3cret"}
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(profiler.settings, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiler.settings, "PROFILING_ADMIN_TOKEN", "s3cret")
+
+
+def _busy_loop(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def test_cpu_session_collects_collapsed_stacks():
+    stop = threading.Event()
+    t = threading.Thread(target=_busy_loop, args=(stop,), name="busy")
+    t.start()
+    session = profiler.start(mode="cpu", seconds=0.3, interval_ms=5)
+    try:
+        while not session.finished():
+            time.sleep(0.01)
+    finally:
+        profiler.finish(session)
+        stop.set()
+        t.join()
+    assert session.samples > 5
+    lines = session.collapsed().splitlines()
+    busy = [ln for ln in lines if ln.startswith("busy;")]
+    assert busy and "_busy_loop (test_profiler.py:" in busy[0]
+    stack, count = busy[0].rsplit(" ", 1)
+    assert int(count) >= 1
+    # Idle pool/selector waits are dropped by default; the sampler never samples itself
+    assert not any(ln.startswith("qeo-profiler;") for ln in lines)
+
+
+def test_alloc_session_reports_top_sites():
+    session = profiler.start(mode="alloc", seconds=1)
+    try:
+        keep = [bytearray(64 * 1024) for _ in range(20)]
+    finally:
+        profiler.finish(session)
+    report = session.summary()
+    assert report["totalKb"] >= 1000
+    assert "test_profiler.py" in report["topAllocations"][0]["site"]
+    assert len(keep) == 20
+
+
+def test_endpoint_disabled_and_token_checked(enabled, monkeypatch):
+    client = TestClient(app)
+    assert client.post("/admin/profile", json={"seconds": 0}).status_code == 403
+    monkeypatch.setattr(profiler.settings, "PROFILING_ENABLED", False)
+    assert client.post("/admin/profile", json={"seconds": 0}, headers=TOKEN).status_code == 404
+
+
+def test_endpoint_refuses_loopback_callers_without_a_configured_token(enabled, monkeypatch):
+    monkeypatch.setattr(profiler.settings, "PROFILING_ADMIN_TOKEN", "")
+    # Behind a proxy every caller looks local: the client address must not grant access
+    client = TestClient(app, client=("127.0.0.1", 50000))
+    r = client.post("/admin/profile", json={"seconds": 0}, headers=TOKEN)
+    assert r.status_code == 403 and "PROFILING_ADMIN_TOKEN" in r.json()["detail"]
+
+
+def test_endpoint_stops_after_n_requests_of_route(enabled):
+    result = {}
+
+    def run_profile():
+        client = TestClient(app)
+        result["r"] = client.post(
+            "/admin/profile",
+            json={"seconds": 30, "route": "/api/v1/lint", "requests": 3, "format": "json"},
+            headers=TOKEN,
+        )
+
+    t = threading.Thread(target=run_profile)
+    start = time.monotonic()
+    t.start()
+    client = TestClient(app)
+    while profiler._active is None and time.monotonic() - start < 5:
+        time.sleep(0.01)
+    for _ in range(3):
+        client.post("/api/v1/lint", json={"sql": "SELECT * FROM orders"})
+    t.join(timeout=10)
+    assert time.monotonic() - start < 10
+    r = result["r"]
+    assert r.status_code == 200
+    body = r.json()
+    assert body["mode"] == "cpu" and body["requests"] == 3
+    assert profiler._active is None
+
+
+def test_concurrent_session_is_rejected(enabled):
+    session = profiler.start(mode="cpu", seconds=5)
+    try:
+        r = TestClient(app).post("/admin/profile", json={"seconds": 0}, headers=TOKEN)
+        assert r.status_code == 409
+    finally:
+        profiler.finish(session)
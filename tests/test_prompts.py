@@ -0,0 +1,74 @@
+"""
+Tests for token-budgeted explanation prompts.
+"""
+
+import pytest
+
+from app.core import plan_heuristics, prompts
+from app.core.config import settings
+
+PLAN = {
+    "Plan": {
+        "Node Type": "Limit", "Total Cost": 1200, "Plan Rows": 10,
+        "Plans": [{
+            "Node Type": "Hash Join", "Total Cost": 1000, "Plan Rows": 5000, "Hash Cond": "(o.user_id = u.id)",
+            "Plans": [
+                {"Node Type": "Seq Scan", "Relation Name": "orders", "Total Cost": 700, "Plan Rows": 200000,
+                 "Filter": "(status = 'open'::text)"},
+                {"Node Type": "Hash", "Total Cost": 200, "Plans": [
+                    {"Node Type": "Index Scan", "Relation Name": "users", "Index Name": "users_pkey",
+                     "Total Cost": 180, "Plan Rows": 10000},
+                ]},
+            ],
+        }],
+    }
+}
+SQL = "SELECT * FROM orders o JOIN users u ON u.id = o.user_id WHERE status = 'open' LIMIT 10"
+
+
+def _prompt(**kw):
+    warnings, metrics = plan_heuristics.analyze(PLAN)
+    return prompts.explain_template(SQL, plan=PLAN, warnings=warnings, metrics=metrics, **kw)
+
+
+def test_prompt_summarizes_hot_nodes_warnings_and_metrics():
+    p = _prompt(audience="dba")
+    assert SQL in p
+    assert "Plan: 5 nodes, root Limit, total cost 1,200" in p
+    assert "SEQ_SCAN_LARGE" in p
+    hot = p.split("Most expensive nodes (exclusive cost):\n", 1)[1].splitlines()
+    assert hot[0].startswith("- Seq Scan on orders: 58% of cost") and "Filter: (status = 'open'::text)" in hot[0]
+    assert [line.split(":")[0] for line in hot[1:5]] == [
+        "- Limit", "- Index Scan on users using users_pkey", "- Hash Join", "- Hash",
+    ]
+    assert "Focus on plan choices" in p
+
+
+def test_prompt_fits_the_budget_and_keeps_whole_lines():
+    huge = {"Plan": {"Node Type": "Append", "Total Cost": 5000,
+                     "Plans": [{"Node Type": "Seq Scan", "Relation Name": f"t{i}", "Total Cost": 5} for i in range(1000)]}}
+    long_sql = "SELECT " + ", ".join(f"col_{i}" for i in range(3000)) + " FROM t"
+    for budget in (120, 200, 600):
+        p = prompts.explain_template(long_sql, plan=huge, warnings=[], metrics={}, max_tokens=budget)
+        assert prompts.estimate_tokens(p) <= budget
+        assert "...(truncated)" in p
+        assert p.rstrip().endswith("Be concise.")
+    # Nodes are included whole or not at all, at most the configured number
+    nodes = [line for line in p.splitlines() if line.startswith("- Seq Scan") or line.startswith("- Append")]
+    assert 0 < len(nodes) <= prompts._MAX_HOT_NODES
+
+
+def test_token_budget_follows_the_model_context_window(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PROMPT_MAX_TOKENS", 0)
+    assert prompts.token_budget("phi3:mini") == 512
+    assert prompts.token_budget("llama2:13b") == 1024
+    assert prompts.token_budget("unknown-model") == 512
+    monkeypatch.setattr(settings, "LLM_PROMPT_MAX_TOKENS", 300)
+    assert prompts.token_budget("llama2") == 300
+
+
+@pytest.mark.parametrize("plan", [None, {}])
+def test_prompt_without_a_plan_still_has_sql_and_guidance(plan):
+    p = prompts.explain_template("SELECT 1", plan=plan, audience="beginner", length="long", style="detailed")
+    assert "SELECT 1" in p and "Most expensive" not in p
+    assert p.endswith("Use simple terms and explain basic concepts. Answer in a few paragraphs. Be specific and technical.")
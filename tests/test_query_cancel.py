@@ -0,0 +1,176 @@
+"""
+Tests for cancelling in-flight DB work on client disconnect / overdue statements (no database required).
+"""
+
+import asyncio
+import threading
+
+import psycopg2
+import pytest
+
+from app.core import cancel, db
+
+
+class FakeConn:
+    """Blocks in execute() until cancel() is called, like a long EXPLAIN ANALYZE."""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.started = threading.Event()
+        self.closed = 0
+        self.rollbacks = 0
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def execute(self):
+        self.started.set()
+        if self.cancelled.wait(5):
+            self.status = psycopg2.extensions.TRANSACTION_STATUS_INERROR
+            raise Exception("canceling statement due to user request")
+        return "done"
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeRequest:
+    def __init__(self, gone: threading.Event):
+        self.gone = gone
+
+    async def is_disconnected(self):
+        return self.gone.is_set()
+
+
+@pytest.fixture
+def pooled(monkeypatch):
+    conn = FakeConn()
+    monkeypatch.setenv("QEO_GLOBAL_CONN", "0")
+    monkeypatch.setattr(db, "_POOL", [])
+    monkeypatch.setattr(db.psycopg2, "connect", lambda *a, **k: conn)
+    return conn
+
+
+def test_scope_cancels_attached_connections_and_blocks_new_work():
+    scope = cancel.CancelScope()
+    conn = FakeConn()
+    with scope.attach(conn):
+        scope.cancel("client_disconnect")
+        assert conn.cancelled.is_set()
+    assert scope.cancelled
+    with pytest.raises(cancel.QueryCancelled):
+        with scope.attach(FakeConn()):
+            pass
+
+
+def test_overdue_statement_is_cancelled_without_cancelling_scope():
+    scope = cancel.CancelScope(query_timeout_ms=100, grace_ms=50)
+    conn = FakeConn()
+    with scope.attach(conn):
+        scope.check_deadlines()
+        assert not conn.cancelled.is_set()
+        scope.check_deadlines(now=10**9)
+        assert conn.cancelled.is_set()
+    assert not scope.cancelled
+
+
+def test_disconnect_cancels_backend_and_returns_connection_to_pool(pooled):
+    gone = threading.Event()
+
+    def work():
+        with db.get_conn() as conn:
+            gone.set()  # client goes away while the statement is running
+            return conn.execute()
+
+    async def main():
+        return await cancel.run_cancellable(FakeRequest(gone), work, query_timeout_ms=60000)
+
+    with pytest.raises(cancel.QueryCancelled) as ei:
+        asyncio.run(main())
+    assert ei.value.reason == "client_disconnect"
+    assert cancel.status_code(ei.value) == 499
+    assert pooled.cancelled.is_set()
+    # Aborted transaction was rolled back and the connection reused
+    assert pooled.rollbacks == 1
+    assert db._POOL == [pooled]
+
+
+def test_worker_error_after_timeout_cancel_is_reported_as_timeout(pooled, monkeypatch):
+    monkeypatch.setattr(cancel.settings, "CANCEL_POLL_MS", 10)
+    monkeypatch.setattr(cancel.settings, "CANCEL_GRACE_MS", 0)
+
+    def work():
+        with db.get_conn() as conn:
+            return conn.execute()
+
+    async def main():
+        return await cancel.run_cancellable(FakeRequest(threading.Event()), work, query_timeout_ms=1)
+
+    with pytest.raises(cancel.QueryCancelled) as ei:
+        asyncio.run(main())
+    assert ei.value.reason == "timeout"
+    assert "timeout" in str(ei.value).lower()
+    assert db._POOL == [pooled]
+
+
+def test_completed_work_returns_result():
+    async def main():
+        return await cancel.run_cancellable(FakeRequest(threading.Event()), lambda x: x * 2, 21)
+
+    assert asyncio.run(main()) == 42
+
+
+def test_disconnect_does_not_cancel_another_requests_statement(monkeypatch):
+    # Default QEO_GLOBAL_CONN: cancellable requests still get connections of their own
+    monkeypatch.delenv("QEO_GLOBAL_CONN", raising=False)
+    monkeypatch.setattr(db, "_POOL", [])
+    conns = []
+
+    def connect(*args, **kwargs):
+        conns.append(FakeConn())
+        return conns[-1]
+
+    monkeypatch.setattr(db.psycopg2, "connect", connect)
+    gone, other_started = threading.Event(), threading.Event()
+
+    def leaving():
+        with db.get_conn() as conn:
+            other_started.wait(5)
+            gone.set()
+            return conn.execute()
+
+    def staying():
+        with db.get_conn() as conn:
+            conn.started.set()
+            other_started.set()
+            # Finishes on its own unless something cancels this session
+            if conn.cancelled.wait(0.5):
+                raise Exception("canceling statement due to user request")
+            return "plan"
+
+    async def main():
+        return await asyncio.gather(
+            cancel.run_cancellable(FakeRequest(gone), leaving, query_timeout_ms=60000),
+            cancel.run_cancellable(FakeRequest(threading.Event()), staying, query_timeout_ms=60000),
+            return_exceptions=True,
+        )
+
+    left, stayed = asyncio.run(main())
+    assert isinstance(left, cancel.QueryCancelled) and left.reason == "client_disconnect"
+    assert stayed == "plan"
+    assert len(conns) == 2 and sum(c.cancelled.is_set() for c in conns) == 1
+
+
+def test_nested_get_conn_reuses_the_outer_connection(pooled):
+    with db.get_conn() as outer:
+        with db.get_conn() as inner:
+            assert inner is outer
+    assert db._POOL == [pooled]
@@ -0,0 +1,116 @@
+"""
+Tests for the record/replay db backend (no database required).
+"""
+
+import psycopg2
+import pytest
+
+from app.core import db, replay
+from app.routers.optimize import OptimizeRequest, run_optimize
+
+SQL = "SELECT * FROM orders WHERE user_id = 42 ORDER BY created_at DESC LIMIT 10"
+
+PLAN = {
+    "Plan": {
+        "Node Type": "Limit",
+        "Total Cost": 1900.0,
+        "Plan Rows": 10,
+        "Plans": [
+            {
+                "Node Type": "Sort",
+                "Total Cost": 1890.0,
+                "Plan Rows": 50,
+                "Sort Key": ["created_at DESC"],
+                "Plans": [
+                    {
+                        "Node Type": "Seq Scan",
+                        "Relation Name": "orders",
+                        "Total Cost": 1800.0,
+                        "Plan Rows": 50,
+                        "Filter": "(user_id = 42)",
+                    }
+                ],
+            }
+        ],
+    }
+}
+
+
+@pytest.fixture(autouse=True)
+def no_connections(monkeypatch):
+    def _connect(*a, **k):
+        raise AssertionError("replay must not open a database connection")
+
+    monkeypatch.setattr(psycopg2, "connect", _connect)
+
+
+def _bundle() -> replay.Bundle:
+    b = replay.Bundle()
+    b.put("explain", "plan:" + replay.normalize_sql(SQL), PLAN)
+    b.put("schema", "public.*", {"schema": "public", "tables": []})
+    b.put("table_stats", "public.orders", {"present": True, "value": {"rows": 50000.0, "indexes": []}})
+    b.put("column_stats", "public.orders", replay.table_entry({"user_id": {"n_distinct": 1000.0, "null_frac": 0.0, "avg_width": 4}}))
+    return b
+
+
+def test_optimize_runs_from_bundle_without_database(tmp_path):
+    path = tmp_path / "bundle.json"
+    _bundle().save(str(path))
+    with replay.replaying(str(path)):
+        res = run_optimize(OptimizeRequest(sql="  " + SQL.replace(" ", "\n  ", 2)))
+        with pytest.raises(replay.ReplayMiss):
+            db.run_explain("SELECT 1")
+        with pytest.raises(replay.ReplayMiss):
+            with db.get_conn():
+                pass
+    assert res.dataSources["plan"] == "explain"
+    assert res.dataSources["stats"] is True
+    assert any(s.get("kind") == "index" for s in res.suggestions)
+    assert replay.mode() == "live"
+
+
+def test_replayed_results_are_copies():
+    b = _bundle()
+    with replay.replaying(b):
+        plan = db.run_explain(SQL)
+        plan["Plan"]["Node Type"] = "mutated"
+        assert db.run_explain(SQL)["Plan"]["Node Type"] == "Limit"
+
+
+def test_recording_keys_by_arguments_and_skips_nested_calls(tmp_path):
+    calls = []
+
+    @replay.recorded("explain_costs", key=lambda sql, **_: replay.normalize_sql(sql))
+    def inner(sql, timeout_ms=1000):
+        calls.append(sql)
+        return {"Plan": {"Total Cost": len(sql)}}
+
+    @replay.recorded("sql", key=lambda sql, **_: sql, decode=lambda rows: [tuple(r) for r in rows])
+    def outer(sql, timeout_ms=1000):
+        inner("nested " + sql)
+        return [("hypopg",)]
+
+    path = tmp_path / "rec.json"
+    with replay.recording(str(path)) as b:
+        inner("SELECT  1", timeout_ms=5)
+        assert outer("q") == [("hypopg",)]
+    assert set(b.entries["explain_costs"]) == {"SELECT 1"}
+
+    with replay.replaying(str(path)):
+        assert inner("SELECT 1", timeout_ms=99) == {"Plan": {"Total Cost": 9}}
+        assert outer("q") == [("hypopg",)]
+    assert calls == ["SELECT  1", "nested q"]
+
+
+def test_per_table_stats_replay_any_recorded_subset():
+    @replay.recorded_per_table("table_stats")
+    def stats(tables, schema="public", timeout_ms=5000):
+        return {t: {"rows": 10.0} for t in tables if t != "missing"}
+
+    with replay.recording() as b:
+        stats(["a", "b", "missing"])
+    with replay.replaying(b):
+        assert stats(["b"]) == {"b": {"rows": 10.0}}
+        assert stats(["a", "missing"]) == {"a": {"rows": 10.0}}
+        with pytest.raises(replay.ReplayMiss):
+            stats(["c"])
@@ -0,0 +1,64 @@
+"""
+Tests for the fast JSON serialization path.
+"""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import serialization
+from app.main import app
+
+
+def _plan(n):
+    return {
+        "Plan": {
+            "Node Type": "Nested Loop",
+            "Total Cost": 12.5,
+            "Plans": [{"Node Type": "Seq Scan", "Relation Name": f"t{i}", "Plan Rows": i} for i in range(n)],
+        },
+        "Planning Time": 0.1,
+    }
+
+
+def test_dumps_matches_stdlib():
+    obj = {"a": [1, 2.5, None, True], "b": {"c": "é"}, "t": (1, 2)}
+    assert json.loads(serialization.dumps(obj)) == json.loads(json.dumps(obj))
+
+
+def test_stdlib_fallback(monkeypatch):
+    monkeypatch.setattr(serialization, "_orjson", None)
+    body = serialization.FastJSONResponse(content={"plan": _plan(3)}).body
+    assert json.loads(body) == {"plan": _plan(3)}
+    assert serialization.loads('{"x": 1}') == {"x": 1}
+
+
+def test_pydantic_models_are_expanded():
+    from app.routers.optimize import OptimizeResponse
+
+    model = OptimizeResponse.model_construct(suggestions=[{"kind": "index"}])
+    data = json.loads(serialization.dumps({"results": [model]}))
+    assert data["results"][0]["suggestions"] == [{"kind": "index"}]
+    assert data["results"][0]["ranking"] == "heuristic"
+
+
+def test_explain_passes_plan_through_unchanged():
+    client = TestClient(app)
+    plan = _plan(500)
+    r = client.post("/api/v1/explain", json={"sql": "SELECT 1", "plan": plan})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/json")
+    data = r.json()
+    assert data["plan"] == plan
+    assert data["metrics"]["node_count"] == 501
+    assert data["explanation"] is None
+
+
+@pytest.mark.skipif(serialization._orjson is None, reason="orjson not installed")
+def test_psycopg2_json_typecaster_registered():
+    import psycopg2.extensions
+
+    serialization.register_psycopg2_json()
+    caster = psycopg2.extensions.string_types[114]  # json oid
+    assert caster("[{\"Plan\": {}}]", None) == [{"Plan": {}}]
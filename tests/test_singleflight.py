@@ -0,0 +1,144 @@
+"""
+Tests for single-flight coalescing of identical concurrent requests (no database required).
+"""
+
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core import cancel, db, singleflight
+from app.main import app
+
+
+def _wait_coalesced(group, n):
+    for _ in range(400):
+        if group.coalesced >= n:
+            return
+        time.sleep(0.005)
+    raise AssertionError("waiters did not join the in-flight call")
+
+
+def _run_concurrently(group, key, func, n):
+    results, errors = [], []
+
+    def worker():
+        try:
+            results.append(group.do(key, func))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    return threads, results, errors
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    group = singleflight.Group("test")
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(2)
+        return {"plan": "shared"}
+
+    threads, results, errors = _run_concurrently(group, "k", work, 5)
+    _wait_coalesced(group, 4)
+    release.set()
+    for t in threads:
+        t.join(2)
+    assert len(calls) == 1
+    assert errors == []
+    assert len(results) == 5 and all(r is results[0] for r in results)
+    assert group.inflight() == 0
+    # Nothing is cached once the leader finished
+    assert group.do("k", lambda: "fresh") == "fresh"
+
+
+def test_leader_error_is_raised_in_every_waiter():
+    group = singleflight.Group("test")
+    release = threading.Event()
+
+    def work():
+        release.wait(2)
+        raise ValueError("syntax error at or near FROM")
+
+    threads, results, errors = _run_concurrently(group, "k", work, 3)
+    _wait_coalesced(group, 2)
+    release.set()
+    for t in threads:
+        t.join(2)
+    assert results == []
+    assert len(errors) == 3 and all(isinstance(e, ValueError) for e in errors)
+
+
+def test_waiters_retry_when_the_leader_client_disconnected():
+    group = singleflight.Group("test")
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(2)
+            raise cancel.QueryCancelled("client_disconnect")
+        return "recomputed"
+
+    threads, results, errors = _run_concurrently(group, "k", work, 3)
+    _wait_coalesced(group, 2)
+    release.set()
+    for t in threads:
+        t.join(2)
+    assert len(errors) == 1 and isinstance(errors[0], cancel.QueryCancelled)
+    assert results == ["recomputed", "recomputed"]
+    # One waiter became the new leader, the other joined it (or ran after it)
+    assert len(calls) in (2, 3)
+
+
+def test_key_covers_fingerprint_options_and_catalog_version():
+    opts = {"analyze": False, "nl": True}
+    k1 = singleflight.request_key("explain", "SELECT 1  -- dashboard\n;", opts)
+    assert k1 == singleflight.request_key("explain", "/* tab 2 */ SELECT   1", {"nl": True, "analyze": False})
+    assert k1 != singleflight.request_key("explain", "SELECT 2", opts)
+    assert k1 != singleflight.request_key("explain", "SELECT 1", {"analyze": False, "nl": False})
+    assert k1 != singleflight.request_key("optimize", "SELECT 1", opts)
+    db.bump_catalog_version()
+    assert k1 != singleflight.request_key("explain", "SELECT 1", opts)
+
+
+def test_explain_endpoint_coalesces_identical_requests(monkeypatch):
+    from app.routers import explain
+
+    release = threading.Event()
+    calls = []
+    real = explain._run_explain
+
+    def slow(req):
+        calls.append(req.sql)
+        release.wait(2)
+        return real(req)
+
+    monkeypatch.setattr(explain, "_run_explain", slow)
+    before = singleflight.explain.coalesced
+    client = TestClient(app)
+    body = {"sql": "SELECT 1", "plan": {"Plan": {"Node Type": "Result"}}, "nl": True}
+    statuses = []
+    threads = [threading.Thread(target=lambda: statuses.append(client.post("/api/v1/explain", json=body).status_code)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    _wait_coalesced(singleflight.explain, before + 3)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert statuses == [200] * 4
+    assert len(calls) == 1
+
+
+def test_disabled_runs_every_request(monkeypatch):
+    monkeypatch.setattr(singleflight.settings, "SINGLEFLIGHT_ENABLED", False)
+    calls = []
+    for _ in range(2):
+        singleflight.run(singleflight.explain, "SELECT 1", {}, lambda: calls.append(1))
+    assert len(calls) == 2
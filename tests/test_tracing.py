@@ -0,0 +1,75 @@
+"""
+Tests for per-stage spans, Server-Timing and the trace file (no database required).
+"""
+
+import contextvars
+import json
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import db, tracing
+from app.main import app
+
+SQL = "SELECT * FROM orders WHERE user_id = 42 ORDER BY created_at DESC LIMIT 10"
+
+
+@pytest.fixture(autouse=True)
+def no_db(monkeypatch):
+    def _no_explain(*args, **kwargs):
+        raise Exception("no db")
+
+    monkeypatch.setattr(db, "run_explain", _no_explain)
+    monkeypatch.setattr(db, "fetch_schema", lambda *a, **k: {"schema": "public", "tables": []})
+    monkeypatch.setattr(db, "fetch_table_stats", lambda *a, **k: {"orders": {"rows": 50000, "indexes": []}})
+    monkeypatch.setattr(db, "get_column_stats", lambda *a, **k: {})
+
+
+def test_spans_from_worker_threads_are_aggregated():
+    with tracing.trace_request("r1") as trace:
+        with tracing.span("parse"):
+            pass
+
+        def trial():
+            with tracing.span("whatif_trial"):
+                time.sleep(0.001)
+
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(trial,)) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    totals = trace.totals()
+    assert list(totals) == ["parse", "whatif_trial"]
+    assert totals["whatif_trial"]["count"] == 3
+    header = trace.server_timing(total_ms=12.0)
+    assert 'whatif_trial;dur=' in header and 'desc="x3"' in header
+    assert header.endswith("total;dur=12.0")
+    assert tracing.current() is None
+
+
+def test_optimize_returns_server_timing_header():
+    client = TestClient(app)
+    r = client.post("/api/v1/optimize", json={"sql": SQL})
+    assert r.status_code == 200
+    timing = r.headers["server-timing"]
+    for stage in ("parse", "advisor", "total"):
+        assert f"{stage};dur=" in timing
+
+
+def test_trace_file_gets_one_line_per_request(tmp_path, monkeypatch):
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setattr(tracing.settings, "TRACE_FILE", str(path))
+    client = TestClient(app)
+    r = client.post("/api/v1/optimize", json={"sql": SQL}, headers={"x-request-id": "req-42"})
+    assert r.status_code == 200
+    for _ in range(100):
+        if path.exists() and path.read_text():
+            break
+        time.sleep(0.01)
+    record = json.loads(path.read_text().splitlines()[0])
+    assert record["rid"] == "req-42"
+    assert record["path"] == "/api/v1/optimize"
+    assert {"parse", "advisor"} <= {s["name"] for s in record["spans"]}
@@ -0,0 +1,195 @@
+"""
+Tests for the background workload job queue (no database required).
+"""
+
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import db, jobs
+
+
+@pytest.fixture(autouse=True)
+def no_db(monkeypatch):
+    def _no_explain(*args, **kwargs):
+        raise Exception("no db")
+
+    monkeypatch.setattr(db, "run_explain", _no_explain)
+    monkeypatch.setattr(db, "fetch_schema", lambda *a, **k: {"schema": "public", "tables": []})
+    monkeypatch.setattr(db, "fetch_table_stats", lambda *a, **k: {"orders": {"rows": 50000, "indexes": []}})
+    monkeypatch.setattr(db, "get_column_stats", lambda *a, **k: {})
+
+
+def _wait(manager, job_id, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job and job.status in jobs.TERMINAL_STATUSES:
+            return job
+        time.sleep(0.02)
+    raise AssertionError("job did not finish")
+
+
+SQLS = [
+    "SELECT * FROM orders WHERE user_id = 1 ORDER BY created_at DESC LIMIT 5",
+    "UPDATE orders SET status = 'x'",
+    "SELECT id FROM orders WHERE user_id = 2",
+]
+
+
+def test_job_runs_to_completion_and_checkpoints(tmp_path):
+    manager = jobs.JobManager(directory=str(tmp_path), max_workers=1, checkpoint_every=1)
+    try:
+        job = manager.submit(SQLS, top_k=5)
+        job = _wait(manager, job.id)
+        assert job.status == "done"
+        assert job.progress() == {"processed": 3, "total": 3, "pct": 100.0}
+        assert job.per_query[1] == {"sql": SQLS[1], "skipped": True}
+        assert any(s["kind"] == "index" for s in job.suggestions)
+        with open(tmp_path / f"{job.id}.json", encoding="utf-8") as f:
+            saved = json.load(f)
+        assert saved["status"] == "done"
+        assert saved["processed"] == 3
+        # Results live in the append-only sidecar, not the status file
+        assert "per_query" not in saved and "sqls" not in saved
+        lines = (tmp_path / f"{job.id}.results.jsonl").read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line)["sql"] for line in lines] == SQLS
+        assert saved["results_bytes"] == (tmp_path / f"{job.id}.results.jsonl").stat().st_size
+    finally:
+        manager.shutdown(wait=True)
+
+
+def test_unfinished_job_resumes_from_checkpoint(tmp_path):
+    first = {"sql": SQLS[0], "suggestions": [], "marker": "from-checkpoint"}
+    state = {
+        "id": "abc123",
+        "sqls": SQLS,
+        "top_k": 5,
+        "what_if": False,
+        "status": "running",
+        "created_at": 1.0,
+        "started_at": 2.0,
+        "finished_at": None,
+        "processed": 1,
+        "per_query": [first],
+        "suggestions": [],
+        "error": None,
+    }
+    (tmp_path / "abc123.json").write_text(json.dumps(state), encoding="utf-8")
+    manager = jobs.JobManager(directory=str(tmp_path), max_workers=1)
+    try:
+        assert manager.recover() == ["abc123"]
+        job = _wait(manager, "abc123")
+        assert job.status == "done"
+        assert job.processed == 3
+        # Already checkpointed work is kept, not recomputed
+        assert job.per_query[0]["marker"] == "from-checkpoint"
+        assert [e["sql"] for e in job.per_query] == SQLS
+    finally:
+        manager.shutdown(wait=True)
+
+
+def test_resume_drops_results_appended_after_the_last_status_write(tmp_path):
+    first = json.dumps({"sql": SQLS[0], "suggestions": [], "marker": "from-checkpoint"}) + "\n"
+    state = {
+        "id": "abc123",
+        "top_k": 5,
+        "what_if": False,
+        "status": "running",
+        "created_at": 1.0,
+        "started_at": 2.0,
+        "finished_at": None,
+        "processed": 1,
+        "suggestions": [],
+        "error": None,
+        "results_bytes": len(first.encode("utf-8")),
+    }
+    (tmp_path / "abc123.json").write_text(json.dumps(state), encoding="utf-8")
+    (tmp_path / "abc123.sqls.json").write_text(json.dumps(SQLS), encoding="utf-8")
+    # Crash mid-append: one uncommitted, torn line after the checkpointed one
+    (tmp_path / "abc123.results.jsonl").write_text(first + '{"sql": "SELECT', encoding="utf-8")
+    manager = jobs.JobManager(directory=str(tmp_path), max_workers=1, checkpoint_every=1)
+    try:
+        assert manager.recover() == ["abc123"]
+        job = _wait(manager, "abc123")
+        assert job.status == "done" and job.per_query[0]["marker"] == "from-checkpoint"
+        lines = (tmp_path / "abc123.results.jsonl").read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line)["sql"] for line in lines] == SQLS
+    finally:
+        manager.shutdown(wait=True)
+
+
+def test_only_one_manager_sharing_the_directory_resumes_a_job(tmp_path):
+    state = {
+        "id": "abc123",
+        "sqls": SQLS,
+        "status": "queued",
+        "created_at": 1.0,
+    }
+    (tmp_path / "abc123.json").write_text(json.dumps(state), encoding="utf-8")
+    first = jobs.JobManager(directory=str(tmp_path), max_workers=1)
+    second = jobs.JobManager(directory=str(tmp_path), max_workers=1)
+    try:
+        assert first.recover() == ["abc123"]
+        # Another uvicorn worker starting up on the same JOBS_DIR
+        assert second.recover() == []
+        assert _wait(first, "abc123").status == "done"
+    finally:
+        first.shutdown(wait=True)
+        second.shutdown(wait=True)
+
+
+def test_queue_full_rejected(tmp_path):
+    manager = jobs.JobManager(directory=str(tmp_path), max_workers=1, max_queued=0)
+    try:
+        with pytest.raises(jobs.JobQueueFull):
+            manager.submit(SQLS)
+    finally:
+        manager.shutdown(wait=True)
+
+
+def test_job_endpoints(tmp_path, monkeypatch):
+    from app.main import app
+
+    manager = jobs.JobManager(directory=str(tmp_path), max_workers=1)
+    monkeypatch.setattr(jobs, "get_manager", lambda: manager)
+    client = TestClient(app)
+    try:
+        r = client.post("/api/v1/workload/jobs", json={"sqls": SQLS, "top_k": 3})
+        assert r.status_code == 202
+        job_id = r.json()["id"]
+        _wait(manager, job_id)
+
+        r = client.get(f"/api/v1/workload/jobs/{job_id}")
+        assert r.status_code == 200
+        data = r.json()
+        assert data["status"] == "done"
+        assert len(data["perQuery"]) == 3
+
+        r = client.get(f"/api/v1/workload/jobs/{job_id}/stream")
+        events = [json.loads(line) for line in r.text.splitlines() if line]
+        assert [e["event"] for e in events] == ["result", "result", "result", "done"]
+
+        assert client.get("/api/v1/workload/jobs/missing").status_code == 404
+    finally:
+        manager.shutdown(wait=True)
+
+
+def test_jobs_are_visible_from_every_manager_sharing_the_directory(tmp_path):
+    owner = jobs.JobManager(directory=str(tmp_path), max_workers=1, checkpoint_every=1)
+    other = jobs.JobManager(directory=str(tmp_path), max_workers=1)
+    try:
+        job = owner.submit(SQLS, top_k=5)
+        _wait(owner, job.id)
+        # A poll that reaches another uvicorn worker reads the checkpoint
+        seen = other.get(job.id)
+        assert seen is not None and seen.status == "done"
+        assert [e["sql"] for e in other.results_since(job.id, 1)] == SQLS[1:]
+        assert [j.id for j in other.list()] == [job.id]
+        assert other.get("missing") is None and other.get("../etc") is None
+        assert other.recover() == []
+    finally:
+        owner.shutdown(wait=True)
+        other.shutdown(wait=True)
@@ -0,0 +1,65 @@
+"""
+Tests for NDJSON streaming of workload results (API and CLI, no database required).
+"""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import cli
+from app.core import db, workload
+from app.main import app
+
+
+@pytest.fixture(autouse=True)
+def no_db(monkeypatch):
+    def _no_explain(*args, **kwargs):
+        raise Exception("no db")
+
+    monkeypatch.setattr(db, "run_explain", _no_explain)
+    monkeypatch.setattr(db, "fetch_schema", lambda *a, **k: {"schema": "public", "tables": []})
+    monkeypatch.setattr(db, "fetch_table_stats", lambda *a, **k: {"orders": {"rows": 50000, "indexes": []}})
+    monkeypatch.setattr(db, "get_column_stats", lambda *a, **k: {})
+
+
+SQLS = [
+    "SELECT * FROM orders WHERE user_id = 1 ORDER BY created_at DESC LIMIT 5",
+    "SELECT * FROM orders WHERE user_id = 2 ORDER BY created_at DESC LIMIT 5",
+    "DELETE FROM orders",
+]
+
+
+def test_stream_matches_buffered_workload():
+    events = list(workload.stream_workload(SQLS, top_k=5))
+    buffered = workload.analyze_workload(SQLS, top_k=5)
+    assert [e["event"] for e in events] == ["result", "result", "result", "done"]
+    assert [e["index"] for e in events[:-1]] == [0, 1, 2]
+    assert events[-1]["processed"] == 3
+    assert events[-1]["suggestions"] == buffered["suggestions"]
+    assert events[-1]["suggestions"][0]["frequency"] == 2
+
+
+def test_stream_accepts_lazy_iterables():
+    events = list(workload.stream_workload(iter(SQLS[:1])))
+    assert [e["event"] for e in events] == ["result", "done"]
+
+
+def test_workload_endpoint_ndjson():
+    client = TestClient(app)
+    r = client.post("/api/v1/workload", json={"sqls": SQLS, "stream": True})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines() if line]
+    assert len(lines) == 4
+    assert lines[2]["skipped"] is True
+    assert lines[-1]["event"] == "done"
+
+
+def test_cli_workload_ndjson(tmp_path, capsys):
+    path = tmp_path / "w.sql"
+    path.write_text("\n".join(SQLS) + "\n\n", encoding="utf-8")
+    args = cli.build_parser().parse_args(["workload", "--file", str(path), "--format", "ndjson"])
+    assert cli.cmd_workload(args) == 0
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [e["event"] for e in lines] == ["result", "result", "result", "done"]